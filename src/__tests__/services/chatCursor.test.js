@@ -0,0 +1,58 @@
+const { query } = require('../../config/database');
+const chatServico = require('../../servicos/chat.servico');
+const { codificarCursor, decodificarCursor } = require('../../utilitarios/cursor');
+
+describe('Paginação por cursor do chat', () => {
+  beforeEach(() => {
+    query.mockReset();
+  });
+
+  it('deve devolver proximo_cursor apenas quando houver mais linhas', async () => {
+    query.mockResolvedValueOnce({
+      rows: [
+        { id: 'a', cursor_chave: '2026-01-02 10:00:00.123456' },
+        { id: 'b', cursor_chave: '2026-01-02 09:00:00' },
+        { id: 'c', cursor_chave: '2026-01-01 08:00:00' }
+      ]
+    });
+
+    const { conversas, proximoCursor } = await chatServico.listarConversas('empresa', { limite: 2 });
+
+    expect(conversas.map(c => c.id)).toEqual(['a', 'b']);
+    expect(conversas[0]).not.toHaveProperty('cursor_chave');
+    expect(decodificarCursor(proximoCursor, 2)).toEqual(['2026-01-02 09:00:00', 'b']);
+    expect(query.mock.calls[0][1]).toEqual(['empresa', 3]);
+
+    query.mockResolvedValueOnce({ rows: [{ id: 'c', cursor_chave: '2026-01-01 08:00:00' }] });
+
+    const segunda = await chatServico.listarConversas('empresa', { limite: 2, cursor: proximoCursor });
+
+    expect(segunda.proximoCursor).toBeNull();
+    expect(query.mock.calls[1][0]).toContain('< ($2::timestamp, $3::uuid)');
+    expect(query.mock.calls[1][0]).not.toContain('OFFSET');
+    expect(query.mock.calls[1][1]).toEqual(['empresa', '2026-01-02 09:00:00', 'b', 3]);
+  });
+
+  it('deve paginar mensagens do mais recente para o mais antigo com ordem desc', async () => {
+    query
+      .mockResolvedValueOnce({ rows: [{ id: 'conversa' }] })
+      .mockResolvedValueOnce({ rows: [] });
+
+    await chatServico.listarMensagens('empresa', 'conversa', {
+      limite: 10,
+      ordem: 'desc',
+      cursor: codificarCursor(['2026-01-01 08:00:00', 'm1'])
+    });
+
+    const [sql, params] = query.mock.calls[1];
+    expect(sql).toContain('(m.criado_em, m.id) < ($3::timestamp, $4::uuid)');
+    expect(sql).toContain('ORDER BY m.criado_em DESC, m.id DESC');
+    expect(params).toEqual(['conversa', 'empresa', '2026-01-01 08:00:00', 'm1', 11]);
+  });
+
+  it('deve rejeitar cursor inválido', () => {
+    expect(() => decodificarCursor('lixo', 2)).toThrow('Cursor inválido');
+    expect(() => decodificarCursor(codificarCursor(['só um']), 2)).toThrow('Cursor inválido');
+    expect(decodificarCursor(undefined, 2)).toBeNull();
+  });
+});
@@ -0,0 +1,112 @@
+describe('Busca de contatos', () => {
+  let contatoRepo;
+  let query;
+
+  beforeEach(() => {
+    // Módulo novo a cada teste: a detecção dos índices fica em memória
+    jest.resetModules();
+    ({ query } = require('../../config/database'));
+    contatoRepo = require('../../repositorios/contato.repositorio');
+    query.mockReset();
+  });
+
+  it('deve usar ILIKE enquanto os índices de busca não existirem', async () => {
+    query
+      .mockResolvedValueOnce({ rows: [{ ok: false }] })
+      .mockResolvedValueOnce({ rows: [] });
+
+    await contatoRepo.listar('empresa', { busca: 'ana' });
+
+    const [sql, params] = query.mock.calls[1];
+    expect(sql).toContain('nome ILIKE $2 OR telefone ILIKE $2');
+    expect(params).toEqual(['empresa', '%ana%']);
+  });
+
+  it('deve buscar por trigramas e texto e ordenar por relevância', async () => {
+    query
+      .mockResolvedValueOnce({ rows: [{ ok: true }] })
+      .mockResolvedValueOnce({ rows: [] });
+
+    await contatoRepo.listar('empresa', { busca: 'maria@acme', limite: 20 });
+
+    const [sql, params] = query.mock.calls[1];
+    expect(sql).toContain('nome ILIKE $2');
+    expect(sql).toContain("@@ to_tsquery('simple', $4)");
+    expect(sql).toContain('ORDER BY GREATEST(similarity(nome, $3)');
+    expect(sql).not.toContain('telefone_normalizado LIKE');
+    expect(params).toEqual(['empresa', '%maria@acme%', 'maria@acme', 'maria:* & acme:*', 20]);
+  });
+
+  it('deve buscar telefone pelos dígitos normalizados', async () => {
+    query
+      .mockResolvedValueOnce({ rows: [{ ok: true }] })
+      .mockResolvedValueOnce({ rows: [] });
+
+    await contatoRepo.listar('empresa', { busca: '(11) 9999-8', ordenarPor: 'nome', direcao: 'asc' });
+
+    const [sql, params] = query.mock.calls[1];
+    expect(sql).toContain('telefone_normalizado LIKE $3');
+    expect(sql).toContain('ORDER BY nome ASC');
+    expect(sql).not.toContain('similarity');
+    expect(params.slice(0, 3)).toEqual(['empresa', '%(11) 9999-8%', '%1199998%']);
+  });
+
+  it('deve devolver a estimativa quando o total passar do limite de contagem exata', async () => {
+    query.mockResolvedValueOnce({ rows: [{ 'QUERY PLAN': [{ Plan: { 'Plan Rows': 250000 } }] }] });
+
+    const resultado = await contatoRepo.contarComEstimativa('empresa');
+
+    expect(resultado).toEqual({ total: 250000, aproximado: true });
+    expect(query).toHaveBeenCalledTimes(1);
+  });
+
+  it('deve contar exatamente resultados pequenos', async () => {
+    query
+      .mockResolvedValueOnce({ rows: [{ 'QUERY PLAN': [{ Plan: { 'Plan Rows': 40 } }] }] })
+      .mockResolvedValueOnce({ rows: [{ count: '37' }] });
+
+    const resultado = await contatoRepo.contarComEstimativa('empresa');
+
+    expect(resultado).toEqual({ total: 37, aproximado: false });
+    expect(query.mock.calls[1][1]).toEqual(['empresa', 10001]);
+  });
+});
+
+describe('Importação de contatos em massa', () => {
+  let contatoRepo;
+  let query;
+
+  beforeEach(() => {
+    jest.resetModules();
+    ({ query } = require('../../config/database'));
+    contatoRepo = require('../../repositorios/contato.repositorio');
+    query.mockReset();
+  });
+
+  it('deve gravar o lote em um único comando e relatar erros por linha', async () => {
+    query.mockResolvedValueOnce({
+      rows: [{ existentes: [2], atualizados: 1, inseridos: ['11 98888-7777'] }]
+    });
+
+    const resultado = await contatoRepo.importarLote('empresa', [
+      { nome: 'Sem telefone' },
+      { nome: 'Ana', telefone: '5511999990000' },
+      { nome: 'Ana (antiga)', telefone: '+55 11 99999-0000' },
+      { nome: 'Bruno', telefone: '11 98888-7777' }
+    ]);
+
+    expect(query).toHaveBeenCalledTimes(1);
+    const params = query.mock.calls[0][1];
+    expect(params[1]).toEqual([3, 4]);
+    expect(params[3]).toEqual(['5511999990000', '5511988887777']);
+
+    expect(resultado).toMatchObject({
+      total_importados: 2,
+      total_criados: 1,
+      total_atualizados: 1,
+      total_inalterados: 0,
+      total_erros: 2
+    });
+    expect(resultado.erros.map(e => e.linha)).toEqual([1, 2]);
+  });
+});
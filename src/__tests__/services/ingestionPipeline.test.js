@@ -0,0 +1,102 @@
+const { IngestionPipeline } = require('../../services/ingestionPipeline');
+
+const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+describe('IngestionPipeline', () => {
+  it('deve preservar a ordem por chave entre estágios concorrentes', async () => {
+    const saida = [];
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'a', concurrency: 3, handler: async (item) => { await esperar((item.n * 7) % 5); return item; } },
+      { name: 'b', concurrency: 2, handler: async (item) => { await esperar((item.n * 3) % 4); return item; } },
+      { name: 'c', concurrency: 4, handler: async (item) => { saida.push(item); } }
+    ]);
+
+    for (let n = 0; n < 12; n++) {
+      pipeline.push(`jid${n % 3}`, { jid: `jid${n % 3}`, n });
+    }
+
+    await esperar(200);
+
+    for (const jid of ['jid0', 'jid1', 'jid2']) {
+      const ordem = saida.filter(i => i.jid === jid).map(i => i.n);
+      expect(ordem).toEqual([...ordem].sort((a, b) => a - b));
+      expect(ordem).toHaveLength(4);
+    }
+  });
+
+  it('deve interromper o item quando um estágio falha', async () => {
+    const saida = [];
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'falha', handler: async (item) => { if (item.id === 1) throw new Error('erro'); return item; } },
+      { name: 'fim', handler: async (item) => { saida.push(item); } }
+    ]);
+
+    pipeline.push('jid', { id: 1 });
+    pipeline.push('jid', { id: 2 });
+    await esperar(20);
+
+    expect(saida).toEqual([{ id: 2 }]);
+    expect(pipeline.getMetrics().stages.falha.failed).toBe(1);
+    expect(pipeline.getMetrics().inFlight).toBe(0);
+  });
+
+  it('deve respeitar o limite de concorrência e expor a profundidade da fila', () => {
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'lento', concurrency: 2, handler: () => new Promise(() => {}) }
+    ]);
+
+    for (let n = 0; n < 5; n++) pipeline.push(`jid${n}`, { n });
+
+    const { stages, inFlight } = pipeline.getMetrics();
+    expect(stages.lento.active).toBe(2);
+    expect(stages.lento.queueDepth).toBe(3);
+    expect(inFlight).toBe(5);
+  });
+
+  it('deve segurar o produtor acima de maxInFlight e liberar na ordem de chegada', async () => {
+    const liberar = [];
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'lento', concurrency: 10, handler: () => new Promise(resolve => liberar.push(resolve)) }
+    ], { maxInFlight: 2 });
+
+    const aceitos = [];
+    for (let n = 0; n < 4; n++) pipeline.push(`jid${n}`, { n }).then(() => aceitos.push(n));
+    await esperar(5);
+
+    expect(aceitos).toEqual([0, 1]);
+    expect(pipeline.getMetrics().waiting).toBe(2);
+
+    liberar.shift()();
+    await esperar(5);
+    expect(aceitos).toEqual([0, 1, 2]);
+    expect(pipeline.getMetrics().inFlight).toBe(2);
+  });
+
+  it('deve drenar lotes sem esperar a janela', async () => {
+    const lotes = [];
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'lote', batch: { size: 100, windowMs: 60000 }, handler: async (itens) => { lotes.push(itens.map(i => i.n)); } }
+    ]);
+
+    for (let n = 0; n < 3; n++) pipeline.push('jid', { n });
+
+    await expect(pipeline.drain(1000)).resolves.toBe(true);
+    expect(lotes).toEqual([[0, 1, 2]]);
+  });
+
+  it('deve agrupar itens em lote preservando a ordem por chave', async () => {
+    const lotes = [];
+    const saida = [];
+    const pipeline = new IngestionPipeline('teste', [
+      { name: 'lote', concurrency: 1, batch: { size: 4, windowMs: 10 }, handler: async (itens) => { lotes.push(itens.map(i => i.n)); } },
+      { name: 'fim', handler: async (item) => { saida.push(item.n); } }
+    ]);
+
+    for (let n = 0; n < 6; n++) pipeline.push('jid', { n });
+    await esperar(50);
+
+    expect(lotes).toEqual([[0, 1, 2, 3], [4, 5]]);
+    expect(saida).toEqual([0, 1, 2, 3, 4, 5]);
+    expect(pipeline.getMetrics().stages.lote.batches).toBe(2);
+  });
+});
@@ -0,0 +1,91 @@
+const { TieredCache } = require('../../services/tieredCache');
+const { redis, cache: l2 } = require('../../config/redis');
+
+const esperar = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+describe('TieredCache', () => {
+  it('deve agrupar misses concorrentes da mesma chave em uma única carga', async () => {
+    const cache = new TieredCache('teste');
+    const loader = jest.fn(async () => { await esperar(10); return { id: 1 }; });
+
+    const resultados = await Promise.all([1, 2, 3, 4].map(() => cache.wrap('1', loader)));
+
+    expect(loader).toHaveBeenCalledTimes(1);
+    resultados.forEach(r => expect(r).toEqual({ id: 1 }));
+    expect(cache.getStats().coalesced).toBe(3);
+  });
+
+  it('deve servir do L1 e recarregar após invalidação', async () => {
+    const cache = new TieredCache('teste');
+    let versao = 0;
+    const loader = jest.fn(async () => ({ versao: ++versao }));
+
+    expect(await cache.wrap('a', loader)).toEqual({ versao: 1 });
+    expect(await cache.wrap('a', loader)).toEqual({ versao: 1 });
+
+    await cache.invalidate('a');
+    expect(await cache.wrap('a', loader)).toEqual({ versao: 2 });
+    expect(loader).toHaveBeenCalledTimes(2);
+  });
+
+  it('não deve popular o L1 com resultado carregado antes de uma invalidação', async () => {
+    const cache = new TieredCache('teste');
+    const carga = cache.wrap('a', async () => { await esperar(10); return { antigo: true }; });
+
+    await cache.invalidate('a');
+    await carga;
+
+    expect(cache.l1.has('a')).toBe(false);
+  });
+
+  it('deve descartar a entrada menos usada ao atingir o limite', async () => {
+    const cache = new TieredCache('teste', { maxEntries: 2 });
+
+    await cache.wrap('a', async () => 'a');
+    await cache.wrap('b', async () => 'b');
+    await cache.wrap('a', async () => 'a');
+    await cache.wrap('c', async () => 'c');
+
+    expect([...cache.l1.keys()]).toEqual(['a', 'c']);
+    expect(cache.getStats().evictions).toBe(1);
+  });
+
+  it('deve cachear null apenas quando cacheNull estiver ativo', async () => {
+    const semNull = new TieredCache('teste');
+    const comNull = new TieredCache('teste', { cacheNull: true });
+    const loader = jest.fn(async () => null);
+
+    await semNull.wrap('x', loader);
+    await semNull.wrap('x', loader);
+    await comNull.wrap('x', loader);
+    await comNull.wrap('x', loader);
+
+    expect(loader).toHaveBeenCalledTimes(3);
+  });
+
+  it('deve gravar no L2 condicionado às versões lidas antes da carga', async () => {
+    l2.setIfVersion.mockClear();
+    redis.mget.mockResolvedValueOnce(['3', null]);
+    const cache = new TieredCache('cas');
+
+    await cache.wrap('k', async () => ({ id: 1 }));
+
+    expect(l2.setIfVersion).toHaveBeenCalledWith(
+      'tiered:cas:k',
+      { id: 1 },
+      300,
+      { 'tiered-v:cas': '3', 'tiered-v:cas:k': null },
+      ['tiered:cas']
+    );
+  });
+
+  it('não deve gravar no L2 sem conseguir ler as versões', async () => {
+    l2.setIfVersion.mockClear();
+    redis.mget.mockRejectedValueOnce(new Error('offline'));
+    const cache = new TieredCache('cas');
+
+    expect(await cache.wrap('k', async () => ({ id: 1 }))).toEqual({ id: 1 });
+    expect(l2.setIfVersion).not.toHaveBeenCalled();
+    expect(cache.l1.has('k')).toBe(true);
+  });
+});
@@ -1,4 +1,6 @@
 // Basic utility function tests
+const { normalizarTelefone } = require('../../utilitarios/validadores');
+
 describe('Utility Functions', () => {
   describe('String utilities', () => {
     test('should validate phone number format', () => {
@@ -63,4 +65,32 @@ describe('Utility Functions', () => {
       expect(diffDays).toBe(1);
     });
   });
+
+  describe('normalizarTelefone', () => {
+    test('should map every format of the same number to one key', () => {
+      const chaves = [
+        '(11) 98765-4321',
+        '5511987654321',
+        '+55 11 98765-4321',
+        '5511987654321@s.whatsapp.net',
+        '5511987654321:12@s.whatsapp.net',
+        '551187654321'
+      ].map(normalizarTelefone);
+
+      expect(new Set(chaves)).toEqual(new Set(['5511987654321']));
+    });
+
+    test('should keep landlines, foreign numbers and groups', () => {
+      expect(normalizarTelefone('(11) 3333-4444')).toBe('551133334444');
+      expect(normalizarTelefone('+1 212 555 1234')).toBe('12125551234');
+      expect(normalizarTelefone('12125551234@s.whatsapp.net')).toBe('12125551234');
+      expect(normalizarTelefone('120363025246125486@g.us')).toBe('120363025246125486@g.us');
+    });
+
+    test('should return null for invalid values', () => {
+      expect(normalizarTelefone(null)).toBeNull();
+      expect(normalizarTelefone('abc')).toBeNull();
+      expect(normalizarTelefone('123')).toBeNull();
+    });
+  });
 });
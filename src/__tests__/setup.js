@@ -29,6 +29,7 @@ jest.mock('../config/logger', () => ({
 // Mock database config
 jest.mock('../config/database', () => ({
   query: jest.fn(),
+  transacao: jest.fn(fn => fn()),
   pool: {
     query: jest.fn(),
     on: jest.fn(),
@@ -42,15 +43,22 @@ jest.mock('../config/redis', () => ({
     get: jest.fn(),
     set: jest.fn(),
     setex: jest.fn(),
+    mget: jest.fn(),
+    eval: jest.fn(),
     del: jest.fn(),
+    unlink: jest.fn(),
     on: jest.fn(),
     keys: jest.fn(),
+    scan: jest.fn(),
   },
   cache: {
     get: jest.fn(),
     set: jest.fn(),
+    setIfVersion: jest.fn(),
     del: jest.fn(),
     invalidatePattern: jest.fn(),
+    invalidateTag: jest.fn(),
+    getStats: jest.fn(() => ({})),
   },
 }));
 
@@ -27,6 +27,10 @@ CREATE TABLE IF NOT EXISTS conversas_chat (
   bot_ativo BOOLEAN DEFAULT false,
   etiquetas JSONB DEFAULT '[]',
 
+  -- Prévia da última mensagem (mantida junto com o INSERT em mensagens_chat)
+  ultima_mensagem_preview TEXT,
+  ultima_mensagem_tipo VARCHAR(20),
+
   -- Timestamps
   ultima_mensagem_em TIMESTAMP,
   primeira_resposta_em TIMESTAMP,
@@ -147,10 +151,14 @@ CREATE INDEX IF NOT EXISTS idx_conversas_chat_empresa ON conversas_chat(empresa_
 CREATE INDEX IF NOT EXISTS idx_conversas_chat_contato ON conversas_chat(contato_id);
 CREATE INDEX IF NOT EXISTS idx_conversas_chat_atribuido ON conversas_chat(atribuido_para);
 CREATE INDEX IF NOT EXISTS idx_conversas_chat_status ON conversas_chat(status);
+-- Paginação por cursor: (ultima_mensagem_em, id), sem mensagem no fim
+CREATE INDEX IF NOT EXISTS idx_conversas_chat_cursor ON conversas_chat(empresa_id, (COALESCE(ultima_mensagem_em, '-infinity'::timestamp)), id);
 
 CREATE INDEX IF NOT EXISTS idx_mensagens_conversa ON mensagens_chat(conversa_id);
 CREATE INDEX IF NOT EXISTS idx_mensagens_criado ON mensagens_chat(criado_em DESC);
 CREATE INDEX IF NOT EXISTS idx_mensagens_whatsapp_id ON mensagens_chat(whatsapp_mensagem_id);
+-- Paginação por cursor: (criado_em, id) dentro da conversa
+CREATE INDEX IF NOT EXISTS idx_mensagens_conversa_cursor ON mensagens_chat(conversa_id, criado_em, id);
 
 CREATE INDEX IF NOT EXISTS idx_integracoes_empresa ON integracoes(empresa_id);
 CREATE INDEX IF NOT EXISTS idx_integracoes_tipo ON integracoes(tipo);
@@ -161,11 +169,13 @@ CREATE INDEX IF NOT EXISTS idx_logs_integracao ON logs_integracao(integracao_id,
 -- TRIGGERS
 -- =====================================================
 
+DROP TRIGGER IF EXISTS trigger_conversas_chat_atualizado ON conversas_chat;
 CREATE TRIGGER trigger_conversas_chat_atualizado
   BEFORE UPDATE ON conversas_chat
   FOR EACH ROW
   EXECUTE FUNCTION atualizar_timestamp();
 
+DROP TRIGGER IF EXISTS trigger_integracoes_atualizado ON integracoes;
 CREATE TRIGGER trigger_integracoes_atualizado
   BEFORE UPDATE ON integracoes
   FOR EACH ROW
@@ -1,3 +1,4 @@
+const { AsyncLocalStorage } = require('async_hooks');
 const { Pool } = require('pg');
 const config = require('./env');
 
@@ -30,11 +31,14 @@ pool.on('error', (err) => {
   console.error('❌ PostgreSQL - Erro inesperado:', err.message);
 });
 
+// Conexão da transação em andamento (ver transacao)
+const transacaoAtual = new AsyncLocalStorage();
+
 // Função helper para executar queries
 const query = async (text, params) => {
   const start = Date.now();
   try {
-    const res = await pool.query(text, params);
+    const res = await (transacaoAtual.getStore() || pool).query(text, params);
     const duration = Date.now() - start;
     if (duration > 1000) {
       console.warn(`⚠️  Query lenta (${duration}ms): ${text.substring(0, 50)}...`);
@@ -47,6 +51,36 @@ const query = async (text, params) => {
   }
 };
 
+/**
+ * Executar `fn` em uma transação
+ *
+ * Toda chamada a query() feita dentro de `fn` (inclusive nos repositórios) usa a
+ * mesma conexão. COMMIT ao terminar, ROLLBACK se `fn` lançar erro. Chamadas
+ * aninhadas participam da transação externa.
+ */
+const transacao = async (fn) => {
+  if (transacaoAtual.getStore()) return fn();
+
+  let client = await pool.connect();
+  try {
+    await client.query('BEGIN');
+    const resultado = await transacaoAtual.run(client, fn);
+    await client.query('COMMIT');
+    return resultado;
+  } catch (error) {
+    try {
+      await client.query('ROLLBACK');
+    } catch (erroRollback) {
+      // Conexão em estado desconhecido: descartar em vez de devolver ao pool
+      client.release(erroRollback);
+      client = null;
+    }
+    throw error;
+  } finally {
+    if (client) client.release();
+  }
+};
+
 // Testar conexão inicial
 (async () => {
   try {
@@ -59,5 +93,6 @@ const query = async (text, params) => {
 
 module.exports = {
   pool,
-  query
+  query,
+  transacao
 };
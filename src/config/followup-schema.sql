@@ -111,6 +111,7 @@ CREATE TABLE IF NOT EXISTS inscricoes_followup (
   -- Progresso
   etapa_atual INTEGER DEFAULT 0,
   proxima_execucao TIMESTAMP,
+  bloqueado_ate TIMESTAMP, -- lease do executor (tarefas/followup.tarefa.js); expirado = livre
 
   -- Metadados
   inscrito_por VARCHAR(50),
@@ -150,6 +151,8 @@ CREATE INDEX IF NOT EXISTS idx_etapas_sequencia ON etapas_followup(sequencia_id,
 CREATE INDEX IF NOT EXISTS idx_inscricoes_sequencia ON inscricoes_followup(sequencia_id);
 CREATE INDEX IF NOT EXISTS idx_inscricoes_contato ON inscricoes_followup(contato_id);
 CREATE INDEX IF NOT EXISTS idx_inscricoes_proxima ON inscricoes_followup(proxima_execucao) WHERE status = 'ativa';
+-- Leases ativos (limites de concorrência do executor)
+CREATE INDEX IF NOT EXISTS idx_inscricoes_lease ON inscricoes_followup(bloqueado_ate) WHERE bloqueado_ate IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_execucoes_inscricao ON execucoes_followup(inscricao_id);
 CREATE INDEX IF NOT EXISTS idx_sequencias_ativo ON sequencias_followup(empresa_id, ativo);
 
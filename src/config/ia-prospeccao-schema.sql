@@ -153,13 +153,18 @@ CREATE TABLE IF NOT EXISTS importacoes_leads (
 
   nome_arquivo VARCHAR(255),
   total_linhas INTEGER DEFAULT 0,
+  linhas_processadas INTEGER DEFAULT 0, -- progresso, atualizado a cada lote
   linhas_importadas INTEGER DEFAULT 0,
+  linhas_ignoradas INTEGER DEFAULT 0,
   linhas_falharam INTEGER DEFAULT 0,
 
   status VARCHAR(20) DEFAULT 'processando',
   erros JSONB DEFAULT '[]',
+  mensagem_erro TEXT,
 
   criado_em TIMESTAMP DEFAULT NOW(),
+  iniciada_em TIMESTAMP,
+  finalizada_em TIMESTAMP,
   concluida_em TIMESTAMP
 );
 
@@ -172,6 +177,7 @@ CREATE TABLE IF NOT EXISTS contatos (
   empresa_id UUID REFERENCES empresas(id) ON DELETE CASCADE,
 
   telefone VARCHAR(50) NOT NULL,
+  telefone_normalizado VARCHAR(50), -- E.164 sem '+' (utilitarios/validadores.normalizarTelefone)
   nome VARCHAR(200),
   nome_push VARCHAR(200),
   avatar_url VARCHAR(500),
@@ -227,6 +233,7 @@ CREATE INDEX IF NOT EXISTS idx_importacoes_empresa ON importacoes_leads(empresa_
 
 CREATE INDEX IF NOT EXISTS idx_contatos_empresa ON contatos(empresa_id);
 CREATE INDEX IF NOT EXISTS idx_contatos_telefone ON contatos(telefone);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_contatos_telefone_normalizado ON contatos(empresa_id, telefone_normalizado);
 CREATE INDEX IF NOT EXISTS idx_contatos_atribuido ON contatos(atribuido_para);
 
 -- =====================================================
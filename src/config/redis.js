@@ -38,23 +38,129 @@ redis.on('reconnecting', () => {
   console.log('🔄 Redis reconectando...');
 });
 
+// ==================== CACHE ====================
+// Chaves podem ser registradas em tags (SET `cache:tag:<tag>`). A invalidação
+// por tag usa SMEMBERS + UNLINK em blocos; a invalidação por padrão usa SCAN
+// (nunca KEYS, que bloqueia o servidor inteiro - o mesmo usado pelas filas Bull).
+
+const TAG_PREFIX = 'cache:tag:';
+const UNLINK_CHUNK = 500;
+const SCAN_COUNT = 500;
+const TAG_TTL_SECONDS = parseInt(process.env.CACHE_TAG_TTL_SECONDS, 10) || 24 * 60 * 60;
+
+// Escrita condicional: grava o valor (e registra nas tags) só se todas as chaves de
+// versão ainda tiverem o valor lido antes da carga ('' = chave ausente)
+// KEYS: chave, ...versões, ...tags | ARGV: ttl, valor, nº de versões, ...esperadas, ttl das tags
+const SET_IF_VERSION_SCRIPT = `
+local n = tonumber(ARGV[3])
+for i = 1, n do
+  local atual = redis.call('GET', KEYS[i + 1]) or ''
+  if atual ~= ARGV[i + 3] then return 0 end
+end
+redis.call('SETEX', KEYS[1], ARGV[1], ARGV[2])
+for i = n + 2, #KEYS do
+  redis.call('SADD', KEYS[i], KEYS[1])
+  redis.call('EXPIRE', KEYS[i], ARGV[n + 4])
+end
+return 1
+`;
+
+// Contadores por prefixo de chave (primeiro segmento antes de ':')
+const stats = new Map();
+
+function statsFor(key) {
+  const prefix = String(key).split(':')[0];
+  let entry = stats.get(prefix);
+  if (!entry) {
+    entry = { hits: 0, misses: 0, sets: 0, invalidated: 0, errors: 0, totalMs: 0, maxMs: 0, ops: 0 };
+    stats.set(prefix, entry);
+  }
+  return entry;
+}
+
+function track(key, start, field) {
+  const entry = statsFor(key);
+  const elapsed = Date.now() - start;
+  if (field) entry[field]++;
+  entry.ops++;
+  entry.totalMs += elapsed;
+  if (elapsed > entry.maxMs) entry.maxMs = elapsed;
+}
+
+async function unlinkInChunks(keys) {
+  let removed = 0;
+  for (let i = 0; i < keys.length; i += UNLINK_CHUNK) {
+    removed += await redis.unlink(...keys.slice(i, i + UNLINK_CHUNK));
+  }
+  return removed;
+}
+
 // Helper functions para cache
 const cache = {
-  async get(key) {
+  async get(key, reviver) {
+    const start = Date.now();
     try {
       const value = await redis.get(key);
-      return value ? JSON.parse(value) : null;
+      track(key, start, value ? 'hits' : 'misses');
+      return value ? JSON.parse(value, reviver) : null;
     } catch (error) {
+      statsFor(key).errors++;
       console.error('Erro ao ler cache:', error.message);
       return null;
     }
   },
 
-  async set(key, value, expirationInSeconds = 3600) {
+  /**
+   * @param {string[]} tags - Tags para invalidação em grupo (ver invalidateTag)
+   */
+  async set(key, value, expirationInSeconds = 3600, tags = []) {
+    const start = Date.now();
     try {
-      await redis.setex(key, expirationInSeconds, JSON.stringify(value));
+      if (tags.length === 0) {
+        await redis.setex(key, expirationInSeconds, JSON.stringify(value));
+      } else {
+        const pipeline = redis.multi().setex(key, expirationInSeconds, JSON.stringify(value));
+        const tagTtl = Math.max(expirationInSeconds, TAG_TTL_SECONDS);
+        for (const tag of tags) {
+          pipeline.sadd(TAG_PREFIX + tag, key).expire(TAG_PREFIX + tag, tagTtl);
+        }
+        await pipeline.exec();
+      }
+      track(key, start, 'sets');
       return true;
     } catch (error) {
+      statsFor(key).errors++;
+      console.error('Erro ao escrever cache:', error.message);
+      return false;
+    }
+  },
+
+  /**
+   * Escrever só se as versões não mudaram desde a leitura (compare-and-set)
+   *
+   * @param {Object<string, string|null>} expected - chave de versão -> valor lido (null = ausente)
+   * @returns {Promise<boolean>} false se alguma versão mudou (valor descartado) ou em erro
+   */
+  async setIfVersion(key, value, expirationInSeconds, expected, tags = []) {
+    const start = Date.now();
+    try {
+      const versionKeys = Object.keys(expected);
+      const written = await redis.eval(
+        SET_IF_VERSION_SCRIPT,
+        1 + versionKeys.length + tags.length,
+        key,
+        ...versionKeys,
+        ...tags.map(tag => TAG_PREFIX + tag),
+        expirationInSeconds,
+        JSON.stringify(value),
+        versionKeys.length,
+        ...versionKeys.map(k => expected[k] ?? ''),
+        Math.max(expirationInSeconds, TAG_TTL_SECONDS)
+      );
+      track(key, start, written === 1 ? 'sets' : null);
+      return written === 1;
+    } catch (error) {
+      statsFor(key).errors++;
       console.error('Erro ao escrever cache:', error.message);
       return false;
     }
@@ -62,7 +168,7 @@ const cache = {
 
   async del(key) {
     try {
-      await redis.del(key);
+      await redis.unlink(key);
       return true;
     } catch (error) {
       console.error('Erro ao deletar cache:', error.message);
@@ -70,17 +176,70 @@ const cache = {
     }
   },
 
-  async invalidatePattern(pattern) {
+  /**
+   * Invalidar todas as chaves registradas em uma ou mais tags
+   */
+  async invalidateTag(tags) {
     try {
-      const keys = await redis.keys(pattern);
-      if (keys.length > 0) {
-        await redis.del(...keys);
+      let removed = 0;
+      for (const tag of [].concat(tags)) {
+        const tagKey = TAG_PREFIX + tag;
+        // Ler e remover o SET atomicamente para não perder registros concorrentes
+        const [[, keys]] = await redis.multi().smembers(tagKey).unlink(tagKey).exec();
+        if (keys.length > 0) {
+          removed += await unlinkInChunks(keys);
+          statsFor(tag).invalidated += keys.length;
+        }
       }
+      return removed;
+    } catch (error) {
+      console.error('Erro ao invalidar tag de cache:', error.message);
+      return 0;
+    }
+  },
+
+  /**
+   * Invalidar por padrão glob usando SCAN incremental (não bloqueia o Redis)
+   */
+  async invalidatePattern(pattern) {
+    try {
+      let cursor = '0';
+      let removed = 0;
+      do {
+        const [next, keys] = await redis.scan(cursor, 'MATCH', pattern, 'COUNT', SCAN_COUNT);
+        cursor = next;
+        if (keys.length > 0) {
+          removed += await unlinkInChunks(keys);
+        }
+      } while (cursor !== '0');
+
+      if (removed > 0) statsFor(pattern).invalidated += removed;
       return true;
     } catch (error) {
       console.error('Erro ao invalidar padrão de cache:', error.message);
       return false;
     }
+  },
+
+  /**
+   * Acertos/erros/latência por prefixo de chave
+   */
+  getStats() {
+    const result = {};
+    for (const [prefix, s] of stats) {
+      const lookups = s.hits + s.misses;
+      result[prefix] = {
+        hits: s.hits,
+        misses: s.misses,
+        hitRate: lookups > 0 ? Math.round((s.hits / lookups) * 1000) / 10 : 0,
+        sets: s.sets,
+        invalidated: s.invalidated,
+        errors: s.errors,
+        avgLatencyMs: s.ops > 0 ? Math.round((s.totalMs / s.ops) * 100) / 100 : 0,
+        maxLatencyMs: s.maxMs
+      };
+    }
+    return result;
   }
 };
 
@@ -40,6 +40,29 @@ CREATE INDEX IF NOT EXISTS idx_metrics_type ON metrics(metric_type);
 CREATE INDEX IF NOT EXISTS idx_metrics_created ON metrics(created_at);
 CREATE INDEX IF NOT EXISTS idx_metrics_period ON metrics(period_start, period_end);
 
+-- ========== TABELA: metrics_hourly ==========
+-- Contadores pré-agregados por hora (um registro por instância/tipo/hora)
+CREATE TABLE IF NOT EXISTS metrics_hourly (
+  instance_name VARCHAR(255) NOT NULL,
+  metric_type VARCHAR(50) NOT NULL,
+  bucket TIMESTAMP NOT NULL, -- início da hora, em UTC
+  value BIGINT NOT NULL DEFAULT 0,
+  metadata JSONB,
+  updated_at TIMESTAMP DEFAULT NOW(),
+  PRIMARY KEY (instance_name, metric_type, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS idx_metrics_hourly_bucket ON metrics_hourly(bucket);
+
+-- Backfill único a partir da tabela legada, que não recebe mais escritas (executa apenas
+-- enquanto metrics_hourly estiver vazia). created_at está no fuso da sessão: convertido para UTC.
+INSERT INTO metrics_hourly (instance_name, metric_type, bucket, value)
+SELECT instance_name, metric_type, date_trunc('hour', created_at::timestamptz AT TIME ZONE 'UTC'), SUM(value)
+FROM metrics
+WHERE NOT EXISTS (SELECT 1 FROM metrics_hourly LIMIT 1)
+GROUP BY 1, 2, 3
+ON CONFLICT DO NOTHING;
+
 -- ========== TABELA: scheduled_messages ==========
 -- Armazena mensagens agendadas
 CREATE TABLE IF NOT EXISTS scheduled_messages (
@@ -70,7 +93,7 @@ CREATE TABLE IF NOT EXISTS broadcast_campaigns (
   campaign_name VARCHAR(255) NOT NULL,
   message TEXT NOT NULL,
   recipients JSONB NOT NULL, -- Array de números
-  status VARCHAR(50) DEFAULT 'pending', -- pending, running, completed, failed
+  status VARCHAR(50) DEFAULT 'pending', -- draft, pending, running, paused, completed, failed, cancelled
   total_recipients INTEGER DEFAULT 0,
   sent_count INTEGER DEFAULT 0,
   failed_count INTEGER DEFAULT 0,
@@ -87,6 +110,37 @@ CREATE INDEX IF NOT EXISTS idx_broadcast_instance ON broadcast_campaigns(instanc
 CREATE INDEX IF NOT EXISTS idx_broadcast_status ON broadcast_campaigns(status);
 CREATE INDEX IF NOT EXISTS idx_broadcast_created ON broadcast_campaigns(created_at);
 
+-- Limite de envio por hora (0 = apenas delay_between_messages)
+ALTER TABLE broadcast_campaigns ADD COLUMN IF NOT EXISTS messages_per_hour INTEGER DEFAULT 0;
+-- Destinatários passaram para broadcast_recipients (coluna mantida para campanhas antigas)
+ALTER TABLE broadcast_campaigns ALTER COLUMN recipients DROP NOT NULL;
+
+-- ========== TABELA: broadcast_recipients ==========
+-- Um registro por destinatário de campanha, com status próprio
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+  id BIGSERIAL PRIMARY KEY,
+  campaign_id INTEGER NOT NULL REFERENCES broadcast_campaigns(id) ON DELETE CASCADE,
+  position INTEGER NOT NULL, -- ordem original na lista
+  recipient VARCHAR(255) NOT NULL,
+  status VARCHAR(20) DEFAULT 'pending', -- pending, sending, sent, failed, skipped
+  error TEXT,
+  sent_at TIMESTAMP,
+  updated_at TIMESTAMP DEFAULT NOW(),
+  UNIQUE (campaign_id, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_pending ON broadcast_recipients(campaign_id, position) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_status ON broadcast_recipients(campaign_id, status);
+
+-- Campanhas criadas pela API /broadcast: modelo por destinatário, intervalo aleatório,
+-- digitação simulada e janela de envio (status 'draft' até serem iniciadas)
+ALTER TABLE broadcast_campaigns ADD COLUMN IF NOT EXISTS delay_max_ms INTEGER;
+ALTER TABLE broadcast_campaigns ADD COLUMN IF NOT EXISTS humanize_typing BOOLEAN DEFAULT false;
+ALTER TABLE broadcast_campaigns ADD COLUMN IF NOT EXISTS start_at TIMESTAMP;
+ALTER TABLE broadcast_campaigns ADD COLUMN IF NOT EXISTS end_at TIMESTAMP;
+ALTER TABLE broadcast_recipients ADD COLUMN IF NOT EXISTS name VARCHAR(255);
+ALTER TABLE broadcast_recipients ADD COLUMN IF NOT EXISTS vars JSONB;
+
 -- ========== TABELA: autoresponder_configs ==========
 -- Configurações de auto-resposta com IA
 CREATE TABLE IF NOT EXISTS autoresponder_configs (
@@ -164,14 +218,39 @@ CREATE TABLE IF NOT EXISTS webhook_logs (
   error_message TEXT,
   error_type VARCHAR(50),
   response_body TEXT,
+  batch_size INTEGER, -- quantidade de eventos quando o envio é um lote
   created_at TIMESTAMP DEFAULT NOW(),
   FOREIGN KEY (instance_name) REFERENCES instances(instance_name) ON DELETE CASCADE
 );
 
+ALTER TABLE webhook_logs ADD COLUMN IF NOT EXISTS batch_size INTEGER;
+
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_instance ON webhook_logs(instance_name);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_status ON webhook_logs(status);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_event ON webhook_logs(event_type);
 CREATE INDEX IF NOT EXISTS idx_webhook_logs_created ON webhook_logs(created_at);
+-- Consultas de logs por instância (mais recentes primeiro); em bancos existentes é criado por reparar-banco
+CREATE INDEX IF NOT EXISTS idx_webhook_logs_instance_created ON webhook_logs(instance_name, created_at DESC);
+
+-- ========== TABELA: webhook_dead_letters ==========
+-- Entregas de webhook que falharam em todas as tentativas (reprocessáveis)
+CREATE TABLE IF NOT EXISTS webhook_dead_letters (
+  id SERIAL PRIMARY KEY,
+  instance_name VARCHAR(255) NOT NULL,
+  event_type VARCHAR(100) NOT NULL,
+  url TEXT NOT NULL,
+  payload JSONB NOT NULL,
+  headers JSONB DEFAULT '{}'::jsonb, -- cabeçalhos do envio original, sem o token (reconstruído no reprocessamento)
+  attempts INTEGER DEFAULT 1,
+  error_message TEXT,
+  status VARCHAR(20) DEFAULT 'pending', -- pending, replaying, replayed
+  replay_attempts INTEGER DEFAULT 0,
+  replay_started_at TIMESTAMP,
+  replayed_at TIMESTAMP,
+  created_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_dead_letters_instance ON webhook_dead_letters(instance_name, status, created_at);
 
 -- ========== TABELA: contacts ==========
 -- Gerenciamento de contatos
@@ -303,13 +382,16 @@ GROUP BY instance_name, DATE(created_at);
 -- ========== COMENTÁRIOS ==========
 
 COMMENT ON TABLE instances IS 'Armazena todas as instâncias do WhatsApp conectadas';
-COMMENT ON TABLE metrics IS 'Métricas de uso e performance das instâncias';
+COMMENT ON TABLE metrics IS 'Métricas legadas (somente leitura; substituída por metrics_hourly)';
+COMMENT ON TABLE metrics_hourly IS 'Contadores de métricas agregados por hora (UTC)';
 COMMENT ON TABLE scheduled_messages IS 'Mensagens agendadas para envio futuro';
 COMMENT ON TABLE broadcast_campaigns IS 'Campanhas de envio em massa';
+COMMENT ON TABLE broadcast_recipients IS 'Destinatários de campanhas de broadcast com status por envio';
 COMMENT ON TABLE autoresponder_configs IS 'Configurações de auto-resposta com IA';
 COMMENT ON TABLE autoresponder_history IS 'Histórico de conversas com IA';
 COMMENT ON TABLE webhook_configs IS 'Configurações avançadas de webhooks';
 COMMENT ON TABLE webhook_logs IS 'Logs de todas as chamadas de webhook';
+COMMENT ON TABLE webhook_dead_letters IS 'Webhooks não entregues após todas as tentativas';
 COMMENT ON TABLE contacts IS 'Gerenciamento de contatos por instância';
 COMMENT ON TABLE warming_configs IS 'Configurações de aquecimento de números';
 COMMENT ON TABLE warming_stats IS 'Estatísticas diárias de aquecimento';
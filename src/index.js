@@ -32,7 +32,7 @@ try {
   logger.error('Falha ao iniciar monitoramento de status:', e);
 }
 
-const { iniciarTarefaFollowup } = require('./tarefas/followup.tarefa');
+const { iniciarTarefaFollowup, pararTarefaFollowup } = require('./tarefas/followup.tarefa');
 const { iniciarTarefaWhiteLabel } = require('./tarefas/whitelabel.tarefa');
 
 // Importar rotas consolidadas
@@ -83,7 +83,10 @@ const { initAutoResponder } = require('./services/autoresponder');
 const { initWebhookAdvanced } = require('./services/webhook-advanced');
 const chatServico = require('./servicos/chat.servico');
 const { mapScraperQueue } = require('./queues/mapScraperQueue');
+// Processa os disparos de integrações enfileirados por integracao.servico
+const { integrationQueue } = require('./queues/integrationQueue');
 const telemetry = require('./services/telemetry');
+const { startMediaSweeper, touchMedia } = require('./services/mediaStore');
 
 
 const app = express();
@@ -162,6 +165,7 @@ app.use('/uploads', (req, res, next) => {
   res.setHeader('Access-Control-Allow-Headers', 'Origin, X-Requested-With, Content-Type, Accept');
   res.setHeader('Cross-Origin-Resource-Policy', 'cross-origin');
   res.setHeader('Cache-Control', 'public, max-age=31536000'); // Cache para carregar mais rápido
+  touchMedia(path.basename(req.path)); // Último acesso, usado pela varredura de mídias
   next();
 }, express.static(uploadsPath));
 
@@ -596,12 +600,23 @@ if (process.env.NODE_ENV !== 'test') {
     // Iniciar monitoramento de telemetria
     telemetry.start();
 
+    // Iniciar varredura de mídias (TTL e cota de disco; só com MEDIA_SWEEP_ENABLED=true)
+    startMediaSweeper();
+
     // Inicializar tarefa de follow-up
     iniciarTarefaFollowup();
 
     // Inicializar tarefa de white label
     iniciarTarefaWhiteLabel();
 
+    // Carregar mapa de domínios de white label (middleware sem consultas ao banco)
+    const whitelabelServico = require('./servicos/whitelabel.servico');
+    try {
+      await whitelabelServico.iniciarMapaDominios();
+    } catch (e) {
+      logger.error('Falha ao carregar mapa de domínios de white label:', e);
+    }
+
     // Inicializar tabelas de prospecção
     const prospeccaoRepo = require('./repositorios/prospeccao.repositorio');
     await prospeccaoRepo.inicializarTabelaHistorico();
@@ -612,10 +627,66 @@ if (process.env.NODE_ENV !== 'test') {
     await loadExistingSessions();
 
     // Log de filas Bull
-    logger.info('Filas Bull (Redis) inicializadas: map-scraper');
+    logger.info('Filas Bull (Redis) inicializadas: map-scraper, integration-fanout');
 
     logger.info('Todos os sistemas inicializados com sucesso!');
   });
+
+  // Desligamento: parar tarefas periódicas, fechar o servidor e gravar os logs pendentes
+  let encerrando = false;
+  const encerrar = async (sinal) => {
+    if (encerrando) return;
+    encerrando = true;
+    logger.info(`${sinal} recebido, encerrando...`);
+
+    require('./services/jobScheduler').stopAll();
+    const followupParado = pararTarefaFollowup();
+    httpServer.close();
+
+    try {
+      await followupParado;
+    } catch (e) {
+      logger.error('Falha ao aguardar etapas de follow-up:', e);
+    }
+
+    // Mensagens já recebidas: gravar e despachar antes de esvaziar os lotes de webhook
+    try {
+      const restantes = await require('./services/ingestionPipeline').drainPipelines();
+      if (restantes > 0) logger.warn(`${restantes} mensagem(ns) ainda no pipeline de ingestão ao encerrar`);
+    } catch (e) {
+      logger.error('Falha ao drenar o pipeline de ingestão:', e);
+    }
+
+    try {
+      await require('./services/webhook-advanced').flushWebhookBatches();
+    } catch (e) {
+      logger.error('Falha ao enviar lotes de webhook pendentes:', e);
+    }
+
+    // Contadores no Redis e histórico horário ainda não enviados
+    try {
+      await require('./services/metrics').flushMetrics();
+    } catch (e) {
+      logger.error('Falha ao enviar métricas pendentes:', e);
+    }
+
+    try {
+      await require('./services/webhookDeliveryLog').close();
+    } catch (e) {
+      logger.error('Falha ao gravar logs de webhook pendentes:', e);
+    }
+
+    try {
+      await require('./servicos/logger.servico').encerrar();
+    } catch (e) {
+      logger.error('Falha ao gravar logs pendentes:', e);
+    }
+
+    process.exit(0);
+  };
+
+  process.once('SIGTERM', () => encerrar('SIGTERM'));
+  process.once('SIGINT', () => encerrar('SIGINT'));
 }
 
 module.exports = app;
@@ -1,19 +1,17 @@
-const cron = require('node-cron');
 const statusMonitor = require('../services/statusMonitor');
 const statusRepository = require('../repositories/statusRepository');
+const jobScheduler = require('../services/jobScheduler');
+const { cache } = require('../config/redis');
 
-let lastResults = null;
-let isJobRunning = false;
+// Cada execução pode rodar em uma réplica diferente: o resultado anterior fica no Redis
+const LAST_RESULTS_KEY = 'status:last-results';
 
-// Executar checks a cada 1 minuto
-cron.schedule('* * * * *', async () => {
-  if (isJobRunning) {
-    console.warn('[Status] Check ignorado: Tarefa anterior ainda em execução.');
-    return;
-  }
-
-  isJobRunning = true;
-  const timeoutPromise = new Promise((_, reject) => setTimeout(() => reject(new Error('Job Timeout')), 50000));
+// Executar checks (sobreposição entre execuções é barrada pelo jobScheduler)
+async function runChecks() {
+  let timeoutTimer;
+  const timeoutPromise = new Promise((_, reject) => {
+    timeoutTimer = setTimeout(() => reject(new Error('Job Timeout')), 50000);
+  });
 
   try {
     const results = await Promise.race([
@@ -27,22 +25,26 @@ cron.schedule('* * * * *', async () => {
     }
 
     // Detectar mudanças e notificar
+    const lastResults = await cache.get(LAST_RESULTS_KEY);
     if (lastResults) {
       await statusMonitor.detectAndNotify(results, lastResults);
     }
 
-    lastResults = results;
+    await cache.set(LAST_RESULTS_KEY, results, 3600);
 
     console.log('[Status] Checks executados:', new Date().toISOString());
   } catch (error) {
     console.error('[Status] Erro ao executar checks:', error.message);
   } finally {
-    isJobRunning = false;
+    clearTimeout(timeoutTimer);
   }
-});
+}
+
+// Executar checks a cada 1 minuto
+jobScheduler.schedule('status:checks', '* * * * *', runChecks, { leaseMs: 120000 });
 
 // Agregar estatísticas diárias à meia-noite
-cron.schedule('5 0 * * *', async () => {
+jobScheduler.schedule('status:daily-stats', '5 0 * * *', async () => {
   try {
     const services = await statusRepository.getAllServices();
     const yesterday = new Date();
@@ -64,7 +66,7 @@ cron.schedule('5 0 * * *', async () => {
 });
 
 // Verificar manutenções que devem iniciar
-cron.schedule('* * * * *', async () => {
+jobScheduler.schedule('status:maintenances', '* * * * *', async () => {
   try {
     const maintenances = await statusRepository.getScheduledMaintenances();
     const now = new Date();
@@ -90,22 +92,8 @@ cron.schedule('* * * * *', async () => {
 
 console.log('[Status] Jobs de monitoramento iniciados');
 
-// Executar check inicial imediatamente
-(async () => {
-  try {
-    console.log('[Status] Executando check inicial...');
-    const results = await statusMonitor.runAllChecks();
-
-    // Salvar checks iniciais
-    for (const [slug, result] of Object.entries(results)) {
-      await statusRepository.saveCheck(slug, result);
-    }
-
-    lastResults = results;
-    console.log('[Status] Check inicial concluído com sucesso');
-  } catch (error) {
-    console.error('[Status] Erro no check inicial:', error.message);
-  }
-})();
+// Executar check inicial imediatamente (uma réplica por vez, via lease)
+console.log('[Status] Executando check inicial...');
+jobScheduler.runOnce('status:checks');
 
 module.exports = {};
@@ -1,6 +1,16 @@
 const { verificarToken } = require('../utilitarios/jwt');
 const usuarioRepositorio = require('../repositorios/usuario.repositorio');
 const empresaRepositorio = require('../repositorios/empresa.repositorio');
+const { resolverPrincipal } = require('../utilitarios/cache-autenticacao');
+
+/**
+ * Validar JWT e buscar o usuário (executado apenas em miss do cache de principais)
+ */
+async function carregarUsuarioJwt(token) {
+  const payload = verificarToken(token);
+  const usuario = await usuarioRepositorio.buscarPorId(payload.usuarioId);
+  return usuario ? { usuario, expiraEm: payload.exp ? payload.exp * 1000 : null } : null;
+}
 
 /**
  * Middleware de autenticação JWT
@@ -49,36 +59,34 @@ async function autenticarMiddleware(req, res, next) {
       }
     }
 
-    // Verificar token
-    let usuarioId;
+    // Verificar token (resultado em cache pelo hash do token)
+    let usuario;
 
     try {
-      const payload = verificarToken(token);
-      usuarioId = payload.usuarioId;
+      usuario = await resolverPrincipal('jwt', token, () => carregarUsuarioJwt(token));
     } catch (e) {
       // Se JWT falhar, verifica se é um API TOKEN
       // Apenas se o formato parecer um UUID (para evitar query desnecessária com strings JWT longas)
       if (token.length < 100) { // UUID tem 36, assumindo token simples
-        const { query } = require('../config/database');
         // Verifica se coluna existe primeiro para evitar erro em migração pendente? O setup já deve ter rodado.
         // Mas por segurança, wrap em try
         try {
-          const userRes = await query('SELECT id FROM usuarios WHERE api_token = $1', [token]);
-          if (userRes && userRes.rows.length > 0) {
-            usuarioId = userRes.rows[0].id;
-          } else {
-            throw e; // Não achou token
-          }
+          usuario = await resolverPrincipal('api', token, async () => {
+            const encontrado = await usuarioRepositorio.buscarPorApiToken(token);
+            return encontrado ? { usuario: encontrado } : null;
+          });
         } catch (dbErr) {
           throw e; // Erro de DB ou coluna inexistente
         }
+        if (!usuario) {
+          throw e; // Não achou token
+        }
       } else {
         throw e;
       }
     }
 
-    // Buscar usuário
-    const usuario = await usuarioRepositorio.buscarPorId(usuarioId);
+    // Validar usuário
     if (!usuario || !usuario.ativo) {
       return res.status(401).json({ erro: 'Usuário não encontrado ou inativo' });
     }
@@ -124,9 +132,8 @@ async function autenticarOpcional(req, res, next) {
     }
 
     const token = partes[1];
-    const payload = verificarToken(token);
+    const usuario = await resolverPrincipal('jwt', token, () => carregarUsuarioJwt(token));
 
-    const usuario = await usuarioRepositorio.buscarPorId(payload.usuarioId);
     if (usuario && usuario.ativo) {
       req.usuario = usuario;
       req.usuarioId = usuario.id;
@@ -1,4 +1,7 @@
 const { instanceTokens } = require('../services/whatsapp');
+const usuarioRepositorio = require('../repositorios/usuario.repositorio');
+const empresaRepositorio = require('../repositorios/empresa.repositorio');
+const { resolverPrincipal } = require('../utilitarios/cache-autenticacao');
 
 const API_KEY = process.env.API_KEY || 'sua-chave-secreta-aqui';
 
@@ -39,6 +42,27 @@ function authMiddleware(req, res, next) {
   next();
 }
 
+// Resolver token pessoal (api_token) em usuário ativo + empresa, usando os caches
+// de principal e de empresa (sem JOIN a cada chamada)
+async function resolverTokenPessoal(token) {
+  const usuario = await resolverPrincipal('api', token, async () => {
+    const encontrado = await usuarioRepositorio.buscarPorApiToken(token);
+    return encontrado ? { usuario: encontrado } : null;
+  });
+
+  if (!usuario || !usuario.ativo) return null;
+
+  const empresa = usuario.empresa_id ? await empresaRepositorio.buscarPorId(usuario.empresa_id) : null;
+
+  return {
+    ...usuario,
+    emp_id: empresa?.id || null,
+    emp_nome: empresa?.nome || null,
+    plano_id: empresa?.plano_id || null,
+    emp_status: empresa?.status || null
+  };
+}
+
 // Autenticação por instância (API Key OU Instance Token OU JWT)
 async function instanceAuthMiddleware(req, res, next) {
   const authHeader = req.headers['authorization'];
@@ -51,19 +75,10 @@ async function instanceAuthMiddleware(req, res, next) {
     const token = authHeader.split(' ')[1];
 
     // Tenta validar como Token Pessoal primeiro (compatibilidade com integrações externas tipo Lovable)
-    const { query } = require('../config/database');
     try {
-      const userRes = await query(`
-        SELECT u.*, e.id as emp_id, e.nome as emp_nome, e.plano_id, e.status as emp_status
-        FROM usuarios u
-        LEFT JOIN empresas e ON u.empresa_id = e.id
-        WHERE u.api_token = $1 AND u.ativo = true
-      `, [token.trim()]);
-
-      if (userRes.rows.length > 0) {
-        const usuario = userRes.rows[0];
-        console.log(`[Auth Debug] Token Pessoal aceito via Bearer: ${usuario.nome}`);
+      const usuario = await resolverTokenPessoal(token.trim());
 
+      if (usuario) {
         req.usuario = usuario;
         req.usuarioId = usuario.id;
         req.empresaId = usuario.empresa_id;
@@ -115,17 +130,9 @@ async function instanceAuthMiddleware(req, res, next) {
     // 2b. SE NÃO FOR A MASTER, verificar se é um Token Pessoal de Usuário
     try {
       const trimmedKey = apiKey.trim();
-      const userRes = await query(`
-        SELECT u.*, e.id as emp_id, e.nome as emp_nome, e.plano_id, e.status as emp_status
-        FROM usuarios u
-        LEFT JOIN empresas e ON u.empresa_id = e.id
-        WHERE u.api_token = $1 AND u.ativo = true
-      `, [trimmedKey]);
-
-      if (userRes.rows.length > 0) {
-        const usuario = userRes.rows[0];
-        console.log(`[Auth Debug] Token pessoal vlido para: ${usuario.nome}`);
+      const usuario = await resolverTokenPessoal(trimmedKey);
 
+      if (usuario) {
         // Se a empresa estiver inativa, barrar (exceto para admin se for o caso)
         if (usuario.empresa_id && usuario.emp_status !== 'ativo') {
           return res.status(403).json({ error: 'Empresa inativa' });
@@ -2,6 +2,7 @@ const Queue = require('bull');
 const { redis } = require('../config/redis');
 const broadcastRepository = require('../repositories/broadcastRepository');
 const whatsapp = require('../services/whatsapp');
+const tokenBucket = require('../services/tokenBucket');
 
 // Criar fila de broadcast
 const redisConfig = process.env.REDIS_URL || 'redis://:@412Trocar@redis:6379';
@@ -17,109 +18,143 @@ const broadcastQueue = new Queue('broadcast', redisConfig, {
   }
 });
 
+const CHUNK_SIZE = parseInt(process.env.BROADCAST_CHUNK_SIZE, 10) || 50;
+const CONCURRENCY = parseInt(process.env.BROADCAST_CONCURRENCY, 10) || 10;
+const BUCKET_BURST = parseInt(process.env.BROADCAST_BUCKET_BURST, 10) || 1;
+// Acima desta espera por token o lote é reagendado e o worker fica livre para outra instância
+const MAX_INLINE_WAIT_MS = parseInt(process.env.BROADCAST_MAX_INLINE_WAIT_MS, 10) || 5000;
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
 // Processar jobs de broadcast
+//
+// - Job sem nome ({ campaignId }): inicia/retoma a campanha e agenda o primeiro lote
+// - Job 'chunk' ({ campaignId }): envia até CHUNK_SIZE destinatários pendentes e agenda o próximo
+//
+// Cada campanha tem no máximo um lote ativo por vez; campanhas de instâncias diferentes rodam
+// em paralelo (até BROADCAST_CONCURRENCY). O ritmo de cada instância é dado por um token
+// bucket no Redis (messages_per_hour e delay_between_messages), compartilhado entre réplicas.
 broadcastQueue.process(async (job) => {
   const { campaignId } = job.data;
 
-  console.log(`[BroadcastQueue] Processando campanha ID: ${campaignId}`);
+  console.log(`[BroadcastQueue] Iniciando campanha ID: ${campaignId}`);
 
-  try {
-    // Buscar campanha
-    const campaign = await broadcastRepository.getBroadcastCampaignById(campaignId);
+  const campaign = await broadcastRepository.getCampaignForSending(campaignId);
 
-    if (!campaign) {
-      throw new Error(`Campanha ${campaignId} não encontrada`);
-    }
+  if (!campaign) {
+    throw new Error(`Campanha ${campaignId} não encontrada`);
+  }
 
-    if (campaign.status !== 'pending' && campaign.status !== 'running') {
-      console.log(`[BroadcastQueue] Campanha ${campaignId} já foi processada (status: ${campaign.status})`);
-      return { skipped: true, reason: 'already_processed' };
-    }
+  if (campaign.status !== 'pending' && campaign.status !== 'running') {
+    console.log(`[BroadcastQueue] Campanha ${campaignId} já foi processada (status: ${campaign.status})`);
+    return { skipped: true, reason: 'already_processed' };
+  }
+
+  // Campanhas criadas antes da tabela broadcast_recipients
+  await broadcastRepository.seedLegacyRecipients(campaignId);
+  await broadcastRepository.releaseStaleRecipients(campaignId);
+
+  if (campaign.status === 'pending') {
+    await broadcastRepository.updateBroadcastStatus(campaignId, 'running');
+  }
+
+  await scheduleChunk(campaignId);
+
+  return { success: true, campaignId, dispatched: true };
+});
+
+broadcastQueue.process('chunk', CONCURRENCY, async (job) => {
+  const { campaignId } = job.data;
+
+  const campaign = await broadcastRepository.getCampaignForSending(campaignId);
+
+  if (!campaign || campaign.status !== 'running') {
+    return { skipped: true, reason: campaign ? campaign.status : 'not_found' };
+  }
+
+  // Fim da janela de envio: encerrar com os destinatários restantes pendentes
+  if (campaign.end_at && new Date(campaign.end_at) <= new Date()) {
+    await broadcastRepository.updateBroadcastStatus(campaignId, 'completed');
+    console.log(`[BroadcastQueue] Campanha ${campaignId} encerrada no fim da janela de envio`);
+    return { success: true, campaignId, expired: true };
+  }
+
+  // Destinatários presos em 'sending' por um worker que caiu no meio do lote
+  await broadcastRepository.releaseStaleRecipients(campaignId);
 
+  try {
     // Verificar se a instância existe e está conectada
-    const sock = whatsapp.getSocket(campaign.instance_name);
-    if (!sock) {
+    const instance = whatsapp.getInstance(campaign.instance_name);
+    if (!instance || !instance.isConnected) {
       throw new Error(`Instância ${campaign.instance_name} não está conectada`);
     }
 
-    // Atualizar status para running
-    if (campaign.status === 'pending') {
-      await broadcastRepository.updateBroadcastStatus(campaignId, 'running');
-    }
-
-    const recipients = campaign.recipients;
-    const delay = campaign.delay_between_messages || 1000;
+    const bucketKey = `broadcast:${campaign.instance_name}`;
     let sent = 0;
     let failed = 0;
 
-    // Processar cada destinatário
-    for (let i = campaign.sent_count + campaign.failed_count; i < recipients.length; i++) {
-      const recipient = recipients[i];
+    for (let i = 0; i < CHUNK_SIZE; i++) {
+      const recipient = await broadcastRepository.claimNextRecipient(campaignId);
 
-      try {
-        // Formatar JID
-        const jid = recipient.includes('@')
-          ? recipient
-          : `${recipient}@s.whatsapp.net`;
-
-        // Enviar mensagem
-        if (campaign.media_url) {
-          await sock.sendMessage(jid, {
-            [campaign.media_type]: { url: campaign.media_url },
-            caption: campaign.message
-          });
-        } else {
-          await sock.sendMessage(jid, {
-            text: campaign.message
-          });
+      if (!recipient) {
+        const completed = await broadcastRepository.completeCampaignIfDone(campaignId);
+        if (completed) {
+          console.log(`[BroadcastQueue] ✅ Campanha ${campaignId} concluída. Enviadas: ${completed.sent_count}, Falhas: ${completed.failed_count}`);
         }
+        return { success: true, campaignId, sent, failed, completed: !!completed };
+      }
 
-        sent++;
-        console.log(`[BroadcastQueue] ✅ Enviado para ${recipient} (${i + 1}/${recipients.length})`);
-
-        // Atualizar progresso a cada 10 mensagens
-        if (sent % 10 === 0) {
-          await broadcastRepository.updateBroadcastCounters(campaignId, sent, failed);
-          sent = 0;
-          failed = 0;
+      let campaignStatus;
+      try {
+        // Intervalo sorteado entre o mínimo e o máximo da campanha a cada envio
+        const intervalMs = tokenBucket.intervalFor(campaign.messages_per_hour, randomDelay(campaign));
+        const wait = await acquireToken(bucketKey, intervalMs);
+        if (wait > 0) {
+          // Sem token: devolver o destinatário e liberar o worker até o próximo token
+          await broadcastRepository.releaseRecipient(recipient.id);
+          await scheduleChunk(campaignId, wait);
+          return { success: true, campaignId, sent, failed, deferredMs: wait };
         }
 
-        // Aguardar delay entre mensagens
-        if (i < recipients.length - 1) {
-          await new Promise(resolve => setTimeout(resolve, delay));
+        let sendError = null;
+        try {
+          await sendToRecipient(campaign, recipient);
+        } catch (error) {
+          sendError = error;
         }
 
+        if (sendError) {
+          failed++;
+          campaignStatus = await broadcastRepository.markRecipient(recipient.id, 'failed', sendError.message);
+          console.error(`[BroadcastQueue] ❌ Erro ao enviar para ${recipient.recipient}:`, sendError.message);
+        } else {
+          sent++;
+          campaignStatus = await broadcastRepository.markRecipient(recipient.id, 'sent');
+          console.log(`[BroadcastQueue] ✅ Enviado para ${recipient.recipient} (${recipient.position + 1}/${campaign.total_recipients})`);
+        }
       } catch (error) {
-        failed++;
-        console.error(`[BroadcastQueue] ❌ Erro ao enviar para ${recipient}:`, error.message);
+        // Erro inesperado (Redis, banco): devolver o destinatário para não ficar em 'sending'.
+        // Se a falha foi ao registrar um envio já feito, ele pode receber a mensagem de novo.
+        await broadcastRepository.releaseRecipient(recipient.id).catch(releaseError => {
+          console.error(`[BroadcastQueue] Erro ao devolver destinatário ${recipient.id}:`, releaseError.message);
+        });
+        throw error;
       }
 
-      // Atualizar progresso no job
-      const progress = Math.round(((i + 1) / recipients.length) * 100);
-      job.progress(progress);
+      // Pausada ou cancelada durante o lote
+      if (campaignStatus && campaignStatus !== 'running') {
+        return { success: true, campaignId, sent, failed, stopped: campaignStatus };
+      }
     }
 
-    // Atualizar contadores finais
-    await broadcastRepository.updateBroadcastCounters(campaignId, sent, failed);
-
-    // Marcar como completado
-    await broadcastRepository.updateBroadcastStatus(campaignId, 'completed');
-
-    console.log(`[BroadcastQueue] ✅ Campanha ${campaignId} concluída. Enviadas: ${campaign.sent_count + sent}, Falhas: ${campaign.failed_count + failed}`);
-
-    return {
-      success: true,
-      campaignId,
-      totalSent: campaign.sent_count + sent,
-      totalFailed: campaign.failed_count + failed,
-      completedAt: new Date().toISOString()
-    };
+    await scheduleChunk(campaignId);
+    return { success: true, campaignId, sent, failed };
 
   } catch (error) {
     console.error(`[BroadcastQueue] ❌ Erro ao processar campanha ${campaignId}:`, error.message);
 
-    // Marcar como falha se excedeu tentativas
-    if (job.attemptsMade >= 2) {
+    // Marcar como falha se excedeu tentativas (destinatários pendentes continuam na tabela)
+    if (job.attemptsMade + 1 >= (job.opts.attempts || 1)) {
       await broadcastRepository.updateBroadcastStatus(campaignId, 'failed');
     }
 
@@ -127,6 +162,79 @@ broadcastQueue.process(async (job) => {
   }
 });
 
+// Consumir um token da instância, esperando no próprio job apenas esperas curtas
+async function acquireToken(bucketKey, intervalMs) {
+  let wait = await tokenBucket.take(bucketKey, { intervalMs, capacity: BUCKET_BURST });
+
+  if (wait > 0 && wait <= MAX_INLINE_WAIT_MS) {
+    await sleep(wait);
+    wait = await tokenBucket.take(bucketKey, { intervalMs, capacity: BUCKET_BURST });
+  }
+
+  return wait;
+}
+
+// Agendar o próximo lote da campanha
+async function scheduleChunk(campaignId, delay = 0) {
+  return broadcastQueue.add('chunk', { campaignId }, delay > 0 ? { delay } : {});
+}
+
+// Espaçamento mínimo do próximo envio (entre delay_between_messages e delay_max_ms)
+function randomDelay(campaign) {
+  const min = campaign.delay_between_messages || 0;
+  const max = Math.max(min, campaign.delay_max_ms || min);
+  return min + Math.floor(Math.random() * (max - min + 1));
+}
+
+// Substituir {{variavel}}, {{name}} e {{nome}} pelos dados do destinatário
+function renderMessage(template, recipient) {
+  let message = template || '';
+  const vars = recipient.vars || {};
+
+  Object.keys(vars).forEach(key => {
+    message = message.split(`{{${key}}}`).join(vars[key]);
+  });
+
+  return message
+    .replace(/{{name}}/g, recipient.name || '')
+    .replace(/{{nome}}/g, recipient.name || '');
+}
+
+async function sendToRecipient(campaign, recipient) {
+  const instanceName = campaign.instance_name;
+  const message = renderMessage(campaign.message, recipient);
+
+  switch (campaign.media_url ? campaign.media_type : 'text') {
+    case 'text':
+      return whatsapp.sendText(instanceName, recipient.recipient, message, {
+        simulateTyping: campaign.humanize_typing,
+        typingTime: 2000 + Math.floor(Math.random() * 3001)
+      });
+
+    case 'image':
+      return whatsapp.sendImage(instanceName, recipient.recipient, campaign.media_url, message, {
+        simulateTyping: campaign.humanize_typing
+      });
+
+    case 'video':
+      return whatsapp.sendVideo(instanceName, recipient.recipient, campaign.media_url, message, {});
+
+    case 'document':
+      return whatsapp.sendDocument(
+        instanceName,
+        recipient.recipient,
+        campaign.media_url,
+        'documento.pdf',
+        'application/pdf',
+        message,
+        {}
+      );
+
+    default:
+      throw new Error(`Tipo de mensagem não suportado: ${campaign.media_type}`);
+  }
+}
+
 // Eventos da fila
 broadcastQueue.on('completed', (job, result) => {
   if (!result.skipped) {
@@ -138,45 +246,58 @@ broadcastQueue.on('failed', (job, err) => {
   console.error(`[BroadcastQueue] Job ${job.id} falhou:`, err.message);
 });
 
-broadcastQueue.on('progress', (job, progress) => {
-  console.log(`[BroadcastQueue] Job ${job.id} progresso: ${progress}%`);
-});
-
 broadcastQueue.on('stalled', (job) => {
   console.warn(`[BroadcastQueue] Job ${job.id} travado, será reprocessado`);
 });
 
-// Função auxiliar para adicionar campanha à fila
-async function startBroadcastCampaign(campaignId) {
-  return await broadcastQueue.add({ campaignId });
+// Função auxiliar para adicionar campanha à fila (delay: início agendado)
+async function startBroadcastCampaign(campaignId, delay = 0) {
+  return await broadcastQueue.add({ campaignId }, delay > 0 ? { delay } : {});
 }
 
-// Função auxiliar para pausar campanha
-async function pauseBroadcastCampaign(campaignId) {
-  const jobs = await broadcastQueue.getJobs(['active', 'waiting']);
+// Remover lotes aguardando/agendados de uma campanha
+async function removeCampaignJobs(campaignId) {
+  const jobs = await broadcastQueue.getJobs(['waiting', 'delayed']);
+  let removed = 0;
 
   for (const job of jobs) {
-    if (job.data.campaignId === campaignId) {
+    if (job && job.data.campaignId === campaignId) {
       await job.remove();
-      await broadcastRepository.updateBroadcastStatus(campaignId, 'paused');
-      console.log(`[BroadcastQueue] Campanha ${campaignId} pausada`);
-      return true;
+      removed++;
     }
   }
 
-  return false;
+  return removed;
+}
+
+// Função auxiliar para pausar campanha (o lote ativo para no próximo envio)
+async function pauseBroadcastCampaign(campaignId) {
+  const campaign = await broadcastRepository.pauseCampaign(campaignId);
+  if (!campaign) return false;
+
+  await removeCampaignJobs(campaignId);
+  console.log(`[BroadcastQueue] Campanha ${campaignId} pausada`);
+  return true;
+}
+
+// Função auxiliar para retomar campanha pausada (continua do próximo destinatário pendente)
+async function resumeBroadcastCampaign(campaignId) {
+  const campaign = await broadcastRepository.resumeCampaign(campaignId);
+  if (!campaign) return false;
+
+  await startBroadcastCampaign(campaignId);
+  console.log(`[BroadcastQueue] Campanha ${campaignId} retomada`);
+  return true;
 }
 
 // Função auxiliar para cancelar campanha
 async function cancelBroadcastCampaign(campaignId) {
-  const jobs = await broadcastQueue.getJobs(['active', 'waiting', 'delayed']);
+  const campaign = await broadcastRepository.cancelCampaign(campaignId);
+  const removed = await removeCampaignJobs(campaignId);
 
-  for (const job of jobs) {
-    if (job.data.campaignId === campaignId) {
-      await job.remove();
-      console.log(`[BroadcastQueue] Campanha ${campaignId} removida da fila`);
-      return true;
-    }
+  if (campaign || removed > 0) {
+    console.log(`[BroadcastQueue] Campanha ${campaignId} cancelada`);
+    return true;
   }
 
   return false;
@@ -216,6 +337,7 @@ module.exports = {
   broadcastQueue,
   startBroadcastCampaign,
   pauseBroadcastCampaign,
+  resumeBroadcastCampaign,
   cancelBroadcastCampaign,
   getBroadcastQueueStatus,
   cleanBroadcastQueue
@@ -0,0 +1,70 @@
+const Queue = require('bull');
+const contatoRepo = require('../repositorios/contato.repositorio');
+
+// Criar fila de importação de contatos
+const redisConfig = process.env.REDIS_URL || 'redis://:@412Trocar@redis:6379';
+const contactImportQueue = new Queue('contact-import', redisConfig, {
+  defaultJobOptions: {
+    // A importação é um upsert: reprocessar um job interrompido não duplica contatos
+    attempts: 2,
+    backoff: {
+      type: 'fixed',
+      delay: 5000
+    },
+    removeOnComplete: { age: 86400 }, // Resultado disponível para consulta por 24h
+    removeOnFail: { age: 86400 },
+    timeout: 1800000
+  }
+});
+
+// Processar importações ({ empresaId, contatos })
+// O progresso (0-100) é atualizado a cada lote gravado; o retorno do job é o relatório
+// com os totais e os erros por linha.
+contactImportQueue.process(async (job) => {
+  const { empresaId, contatos } = job.data;
+  const inicio = Date.now();
+
+  console.log(`[ContactImportQueue] Importando ${contatos.length} contatos (job ${job.id})`);
+
+  const resultado = await contatoRepo.importarLote(empresaId, contatos, (processados, total) =>
+    job.progress(Math.floor((processados / total) * 100))
+  );
+
+  const segundos = (Date.now() - inicio) / 1000;
+  console.log(
+    `[ContactImportQueue] Job ${job.id} concluído: ${resultado.total_importados} importados, ` +
+    `${resultado.total_erros} erros em ${segundos.toFixed(1)}s`
+  );
+
+  return resultado;
+});
+
+contactImportQueue.on('failed', (job, err) => {
+  console.error(`[ContactImportQueue] Job ${job.id} falhou:`, err.message);
+});
+
+// Enfileirar uma importação
+async function enqueueContactImport(empresaId, contatos) {
+  return await contactImportQueue.add({ empresaId, contatos });
+}
+
+// Consultar o andamento de uma importação (apenas da própria empresa)
+async function getContactImport(jobId, empresaId) {
+  const job = await contactImportQueue.getJob(jobId);
+  if (!job || job.data.empresaId !== empresaId) return null;
+
+  return {
+    id: job.id,
+    status: await job.getState(),
+    progresso: job.progress(),
+    total: job.data.contatos.length,
+    resultado: job.returnvalue || null,
+    erro: job.failedReason || null
+  };
+}
+
+module.exports = {
+  contactImportQueue,
+  enqueueContactImport,
+  getContactImport
+};
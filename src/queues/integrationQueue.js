@@ -0,0 +1,44 @@
+const Queue = require('bull');
+const integracaoServico = require('../servicos/integracao.servico');
+
+// Criar fila de disparo para integrações
+const redisConfig = process.env.REDIS_URL || 'redis://:@412Trocar@redis:6379';
+const integrationQueue = new Queue('integration-fanout', redisConfig, {
+  defaultJobOptions: {
+    // Cada integração já teve sua tentativa (e seu log): repetir o job dispararia todas de novo
+    attempts: 1,
+    removeOnComplete: { age: 3600 },
+    removeOnFail: { age: 86400 }
+  }
+});
+
+// Processar disparos ({ empresaId, tipo, evento, dados })
+// As integrações ativas são carregadas uma vez por job e disparadas em paralelo.
+integrationQueue.process(async (job) => {
+  const { empresaId, tipo, evento, dados } = job.data;
+  const inicio = Date.now();
+
+  const resultados = await integracaoServico.dispararParaTodasIntegracoes(empresaId, tipo, evento, dados);
+  const sucessos = resultados.filter(r => r.sucesso).length;
+
+  console.log(
+    `[IntegrationQueue] Job ${job.id} (${evento}): ${sucessos}/${resultados.length} integrações ` +
+    `com sucesso em ${Date.now() - inicio}ms`
+  );
+
+  return { total: resultados.length, sucessos, resultados };
+});
+
+integrationQueue.on('failed', (job, err) => {
+  console.error(`[IntegrationQueue] Job ${job.id} falhou:`, err.message);
+});
+
+// Enfileirar o disparo de um evento para as integrações da empresa
+async function enqueueIntegrationFanout(empresaId, tipo, evento, dados) {
+  return await integrationQueue.add({ empresaId, tipo, evento, dados });
+}
+
+module.exports = {
+  integrationQueue,
+  enqueueIntegrationFanout
+};
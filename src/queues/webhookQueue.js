@@ -1,6 +1,9 @@
 const Queue = require('bull');
 const { redis } = require('../config/redis');
 const webhookRepository = require('../repositories/webhookRepository');
+const webhookDispatcher = require('../services/webhookDispatcher');
+const webhookDeliveryLog = require('../services/webhookDeliveryLog');
+const circuitBreaker = require('../services/circuitBreaker');
 
 // Criar fila de webhooks
 // Criar fila de webhooks
@@ -25,6 +28,7 @@ webhookQueue.process(async (job) => {
 
   const startTime = Date.now();
   let lastError = null;
+  let headers = {};
 
   try {
     // Buscar configuração de webhook
@@ -36,31 +40,23 @@ webhookQueue.process(async (job) => {
     }
 
     const timeout = webhookConfig.timeout || 30000;
-    const headers = webhookConfig.headers || {};
+    headers = webhookConfig.headers || {};
 
-    // Criar AbortController para timeout
-    const controller = new AbortController();
-    const timeoutId = setTimeout(() => controller.abort(), timeout);
+    // Circuito aberto (em qualquer réplica): falhar sem enviar; o Bull tenta de novo com backoff
+    if (!(await circuitBreaker.isAvailable(url))) {
+      const circuitError = new Error('Circuito Aberto: Destino persistentemente offline (Circuit Breaker)');
+      circuitError.code = 'ECIRCUITOPEN';
+      throw circuitError;
+    }
 
     try {
-      const response = await fetch(url, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'User-Agent': 'WhatsBenemax/2.1',
-          ...headers
-        },
-        body: JSON.stringify(payload),
-        signal: controller.signal
-      });
-
-      clearTimeout(timeoutId);
+      const response = await webhookDispatcher.post(url, payload, { headers, timeout });
 
       const duration = Date.now() - startTime;
-      const responseText = await response.text();
+      const responseText = response.body;
 
-      // Adicionar log
-      await webhookRepository.addWebhookLog({
+      // Adicionar log (gravado em lote)
+      webhookDeliveryLog.record({
         instanceName,
         eventType: payload.event,
         url,
@@ -73,6 +69,7 @@ webhookQueue.process(async (job) => {
       });
 
       if (response.ok) {
+        circuitBreaker.recordSuccess(url);
         console.log(`[WebhookQueue] ✅ Webhook enviado com sucesso para ${instanceName} (${duration}ms)`);
 
         return {
@@ -83,17 +80,19 @@ webhookQueue.process(async (job) => {
         };
       } else {
         lastError = new Error(`HTTP ${response.status}: ${responseText}`);
+        if (response.status >= 500) circuitBreaker.recordFailure(url);
         throw lastError;
       }
 
     } catch (error) {
-      clearTimeout(timeoutId);
+      // Falha de rede (a resposta HTTP com erro já foi registrada acima)
+      if (error !== lastError && error.code !== 'ECIRCUITOPEN') circuitBreaker.recordFailure(url);
       lastError = error;
 
-      const errorType = error.name === 'AbortError' ? 'timeout' : 'network_error';
+      const errorType = error.code === 'ETIMEDOUT' ? 'timeout' : 'network_error';
       const duration = Date.now() - startTime;
 
-      await webhookRepository.addWebhookLog({
+      webhookDeliveryLog.record({
         instanceName,
         eventType: payload.event,
         url,
@@ -113,9 +112,9 @@ webhookQueue.process(async (job) => {
   } catch (error) {
     console.error(`[WebhookQueue] ❌ Erro ao processar webhook para ${instanceName}:`, error.message);
 
-    // Se excedeu tentativas, registrar falha final
-    if (job.attemptsMade >= 2) {
-      await webhookRepository.addWebhookLog({
+    // Última tentativa: registrar falha final e mover para dead letters
+    if (job.attemptsMade + 1 >= (job.opts.attempts || 1)) {
+      webhookDeliveryLog.record({
         instanceName,
         eventType: payload.event,
         url,
@@ -125,6 +124,16 @@ webhookQueue.process(async (job) => {
         durationMs: Date.now() - startTime,
         errorMessage: `Falhou após ${job.attemptsMade + 1} tentativas: ${error.message}`
       });
+
+      await webhookDeliveryLog.deadLetter({
+        instanceName,
+        eventType: payload.event,
+        url,
+        payload,
+        headers,
+        attempts: job.attemptsMade + 1,
+        errorMessage: error.message
+      });
     }
 
     throw error;
@@ -126,7 +126,7 @@ async function addAutoresponderHistory(historyData) {
   );
 
   // Invalidar cache de histórico
-  await cache.invalidatePattern(`autoresponder:history:${instanceName}:*`);
+  await cache.invalidateTag(`autoresponder:history:${instanceName}`);
 
   return result.rows[0];
 }
@@ -171,7 +171,7 @@ async function getChatContext(instanceName, chatId, limit = 10) {
   const context = result.rows.reverse(); // Mais antigo primeiro
 
   // Cachear por 1 minuto
-  await cache.set(cacheKey, context, 60);
+  await cache.set(cacheKey, context, 60, [`autoresponder:history:${instanceName}`]);
 
   return context;
 }
@@ -3,7 +3,8 @@ const { cache } = require('../config/redis');
 
 // ========== CRUD BÁSICO ==========
 
-// Criar campanha de broadcast
+// Criar campanha de broadcast (campanha e destinatários na mesma instrução)
+// Destinatários: números (string) ou objetos { number, name, vars }
 async function createBroadcastCampaign(campaignData) {
   const {
     instanceName,
@@ -11,30 +12,56 @@ async function createBroadcastCampaign(campaignData) {
     message,
     recipients,
     delayBetweenMessages = 1000,
+    delayMaxMs = null,
+    messagesPerHour = 0,
     mediaUrl = null,
-    mediaType = null
+    mediaType = null,
+    humanizeTyping = false,
+    startAt = null,
+    endAt = null,
+    status = 'pending'
   } = campaignData;
 
+  const rows = recipients.map(r => (
+    r && typeof r === 'object'
+      ? { number: String(r.number), name: r.name || null, vars: r.vars || null }
+      : { number: String(r) }
+  ));
+
   const result = await query(
-    `INSERT INTO broadcast_campaigns
-     (instance_name, campaign_name, message, recipients, total_recipients,
-      delay_between_messages, media_url, media_type, status)
-     VALUES ($1, $2, $3, $4, $5, $6, $7, $8, 'pending')
-     RETURNING *`,
+    `WITH campaign AS (
+       INSERT INTO broadcast_campaigns
+       (instance_name, campaign_name, message, total_recipients,
+        delay_between_messages, delay_max_ms, messages_per_hour, media_url, media_type,
+        humanize_typing, start_at, end_at, status)
+       VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+       RETURNING *
+     ), inserted AS (
+       INSERT INTO broadcast_recipients (campaign_id, position, recipient, name, vars)
+       SELECT campaign.id, r.ord - 1, r.item->>'number', r.item->>'name', r.item->'vars'
+       FROM campaign, jsonb_array_elements($14::jsonb) WITH ORDINALITY AS r(item, ord)
+     )
+     SELECT * FROM campaign`,
     [
       instanceName,
       campaignName,
       message,
-      JSON.stringify(recipients),
-      recipients.length,
+      rows.length,
       delayBetweenMessages,
+      delayMaxMs,
+      messagesPerHour,
       mediaUrl,
-      mediaType
+      mediaType,
+      humanizeTyping,
+      startAt,
+      endAt,
+      status,
+      JSON.stringify(rows)
     ]
   );
 
   // Invalidar cache
-  await cache.invalidatePattern(`broadcast:${instanceName}:*`);
+  await cache.invalidateTag(`broadcast:${instanceName}`);
 
   return result.rows[0];
 }
@@ -89,7 +116,7 @@ async function updateBroadcastStatus(id, status) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -108,7 +135,7 @@ async function updateBroadcastCounters(id, sentIncrement = 0, failedIncrement =
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -123,12 +150,138 @@ async function deleteBroadcastCampaign(id) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
 }
 
+// ========== DESTINATÁRIOS ==========
+
+// Dados da campanha necessários para o envio (sem a lista legada de destinatários)
+async function getCampaignForSending(id) {
+  const result = await query(
+    `SELECT id, instance_name, campaign_name, message, status, total_recipients,
+            sent_count, failed_count, delay_between_messages, delay_max_ms, messages_per_hour,
+            media_url, media_type, humanize_typing, end_at
+     FROM broadcast_campaigns
+     WHERE id = $1`,
+    [id]
+  );
+
+  return result.rows[0] || null;
+}
+
+// Migrar destinatários de campanhas antigas (coluna JSONB) para broadcast_recipients.
+// Os já processados pelo envio antigo entram como 'skipped' (já estão nos contadores).
+async function seedLegacyRecipients(campaignId) {
+  const result = await query(
+    `INSERT INTO broadcast_recipients (campaign_id, position, recipient, status)
+     SELECT c.id, r.ord - 1, r.value,
+            CASE WHEN r.ord <= c.sent_count + c.failed_count THEN 'skipped' ELSE 'pending' END
+     FROM broadcast_campaigns c,
+          jsonb_array_elements_text(c.recipients) WITH ORDINALITY AS r(value, ord)
+     WHERE c.id = $1
+       AND jsonb_typeof(c.recipients) = 'array'
+       AND NOT EXISTS (SELECT 1 FROM broadcast_recipients WHERE campaign_id = c.id)
+     ON CONFLICT (campaign_id, position) DO NOTHING`,
+    [campaignId]
+  );
+
+  return result.rowCount;
+}
+
+// Devolver para a fila destinatários presos em 'sending' (worker caiu no meio do envio)
+async function releaseStaleRecipients(campaignId, staleMinutes = 5) {
+  const result = await query(
+    `UPDATE broadcast_recipients
+     SET status = 'pending', updated_at = NOW()
+     WHERE campaign_id = $1
+       AND status = 'sending'
+       AND updated_at < NOW() - ($2 || ' minutes')::INTERVAL`,
+    [campaignId, String(staleMinutes)]
+  );
+
+  return result.rowCount;
+}
+
+// Reservar o próximo destinatário pendente (ordem original, sem disputa entre workers)
+async function claimNextRecipient(campaignId) {
+  const result = await query(
+    `UPDATE broadcast_recipients
+     SET status = 'sending', updated_at = NOW()
+     WHERE id = (
+       SELECT id FROM broadcast_recipients
+       WHERE campaign_id = $1 AND status = 'pending'
+       ORDER BY position
+       LIMIT 1
+       FOR UPDATE SKIP LOCKED
+     )
+     RETURNING *`,
+    [campaignId]
+  );
+
+  return result.rows[0] || null;
+}
+
+// Devolver um destinatário reservado sem envio
+async function releaseRecipient(id) {
+  await query(
+    `UPDATE broadcast_recipients
+     SET status = 'pending', updated_at = NOW()
+     WHERE id = $1 AND status = 'sending'`,
+    [id]
+  );
+}
+
+// Registrar o resultado do envio e atualizar os contadores da campanha.
+// Retorna o status atual da campanha (para o worker parar ao pausar/cancelar).
+async function markRecipient(id, status, error = null) {
+  const result = await query(
+    `WITH recipient AS (
+       UPDATE broadcast_recipients
+       SET status = $2::varchar,
+           error = $3,
+           sent_at = CASE WHEN $2::varchar = 'sent' THEN NOW() ELSE NULL END,
+           updated_at = NOW()
+       WHERE id = $1 AND status = 'sending'
+       RETURNING campaign_id, status
+     )
+     UPDATE broadcast_campaigns c
+     SET sent_count = c.sent_count + (r.status = 'sent')::int,
+         failed_count = c.failed_count + (r.status = 'failed')::int
+     FROM recipient r
+     WHERE c.id = r.campaign_id
+     RETURNING c.status`,
+    [id, status, error]
+  );
+
+  return result.rows[0] ? result.rows[0].status : null;
+}
+
+// Concluir a campanha se não houver mais destinatários pendentes
+async function completeCampaignIfDone(campaignId) {
+  const result = await query(
+    `UPDATE broadcast_campaigns
+     SET status = 'completed', completed_at = NOW()
+     WHERE id = $1
+       AND status = 'running'
+       AND NOT EXISTS (
+         SELECT 1 FROM broadcast_recipients
+         WHERE campaign_id = $1 AND status IN ('pending', 'sending')
+       )
+     RETURNING *`,
+    [campaignId]
+  );
+
+  // Invalidar cache
+  if (result.rows[0]) {
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
+  }
+
+  return result.rows[0] || null;
+}
+
 // ========== CONSULTAS ESPECIALIZADAS ==========
 
 // Buscar campanhas pendentes
@@ -155,20 +308,26 @@ async function getRunningCampaigns() {
   return result.rows;
 }
 
-// Obter progresso da campanha
+// Obter progresso da campanha (restantes contados pelo índice parcial de pendentes)
 async function getCampaignProgress(id) {
   const result = await query(
     `SELECT
-       id,
-       campaign_name,
-       status,
-       total_recipients,
-       sent_count,
-       failed_count,
-       ROUND((sent_count::DECIMAL / NULLIF(total_recipients, 0)) * 100, 2) as progress_percentage,
-       ROUND((failed_count::DECIMAL / NULLIF(sent_count + failed_count, 0)) * 100, 2) as failure_rate
-     FROM broadcast_campaigns
-     WHERE id = $1`,
+       c.id,
+       c.campaign_name,
+       c.status,
+       c.total_recipients,
+       c.sent_count,
+       c.failed_count,
+       r.remaining,
+       ROUND(((c.total_recipients - r.remaining)::DECIMAL / NULLIF(c.total_recipients, 0)) * 100, 2) as progress_percentage,
+       ROUND((c.failed_count::DECIMAL / NULLIF(c.sent_count + c.failed_count, 0)) * 100, 2) as failure_rate
+     FROM broadcast_campaigns c
+     CROSS JOIN LATERAL (
+       SELECT COUNT(*)::int as remaining
+       FROM broadcast_recipients
+       WHERE campaign_id = c.id AND status IN ('pending', 'sending')
+     ) r
+     WHERE c.id = $1`,
     [id]
   );
 
@@ -213,7 +372,7 @@ async function getBroadcastStats(instanceName) {
   }
 
   // Cachear por 3 minutos
-  await cache.set(cacheKey, stats, 180);
+  await cache.set(cacheKey, stats, 180, [`broadcast:${instanceName}`]);
 
   return stats;
 }
@@ -232,19 +391,37 @@ async function getRecentCampaigns(instanceName, days = 7, limit = 50) {
   return result.rows;
 }
 
-// Cancelar campanha pendente
+// Liberar rascunho para envio (o job da fila o passa para 'running')
+async function queueCampaign(id) {
+  const result = await query(
+    `UPDATE broadcast_campaigns
+     SET status = 'pending'
+     WHERE id = $1 AND status = 'draft'
+     RETURNING *`,
+    [id]
+  );
+
+  // Invalidar cache
+  if (result.rows[0]) {
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
+  }
+
+  return result.rows[0];
+}
+
+// Cancelar campanha (rascunho, pendente, em execução ou pausada)
 async function cancelCampaign(id) {
   const result = await query(
     `UPDATE broadcast_campaigns
      SET status = 'cancelled', completed_at = NOW()
-     WHERE id = $1 AND status = 'pending'
+     WHERE id = $1 AND status IN ('draft', 'pending', 'running', 'paused')
      RETURNING *`,
     [id]
   );
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -262,7 +439,7 @@ async function pauseCampaign(id) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -280,7 +457,7 @@ async function resumeCampaign(id) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`broadcast:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`broadcast:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -310,8 +487,16 @@ module.exports = {
   getPendingCampaigns,
   getRunningCampaigns,
   getCampaignProgress,
+  getCampaignForSending,
+  seedLegacyRecipients,
+  releaseStaleRecipients,
+  claimNextRecipient,
+  releaseRecipient,
+  markRecipient,
+  completeCampaignIfDone,
   getBroadcastStats,
   getRecentCampaigns,
+  queueCampaign,
   cancelCampaign,
   pauseCampaign,
   resumeCampaign,
@@ -37,7 +37,7 @@ async function upsertContact(instanceName, contactData) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -104,7 +104,7 @@ async function updateContactName(instanceName, phoneNumber, name) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -122,7 +122,7 @@ async function addContactTags(instanceName, phoneNumber, newTags) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -147,7 +147,7 @@ async function removeContactTags(instanceName, phoneNumber, tagsToRemove) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -165,7 +165,7 @@ async function updateContactCustomFields(instanceName, phoneNumber, customFields
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -182,7 +182,7 @@ async function updateContactNotes(instanceName, phoneNumber, notes) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -199,7 +199,7 @@ async function toggleContactBlock(instanceName, phoneNumber, isBlocked) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -223,7 +223,7 @@ async function recordContactMessage(instanceName, phoneNumber) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -237,7 +237,7 @@ async function deleteContact(instanceName, phoneNumber) {
 
   // Invalidar cache
   await cache.del(`contact:${instanceName}:${phoneNumber}`);
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rows[0];
 }
@@ -367,7 +367,7 @@ async function cleanInactiveContacts(instanceName, daysInactive = 180) {
      RETURNING COUNT(*)`
   );
 
-  await cache.invalidatePattern(`contacts:${instanceName}:*`);
+  await cache.invalidateTag(`contacts:${instanceName}`);
 
   return result.rowCount;
 }
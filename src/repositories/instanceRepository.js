@@ -21,7 +21,7 @@ async function createInstance(instanceData) {
 
   // Invalidar cache
   await cache.del(`instance:${instanceName}`);
-  await cache.invalidatePattern('instances:*');
+  await cache.invalidateTag('instances');
 
   return result.rows[0];
 }
@@ -56,7 +56,7 @@ async function getAllInstances() {
   const result = await query('SELECT * FROM instances ORDER BY created_at DESC');
 
   // Cachear por 2 minutos
-  await cache.set('instances:all', result.rows, 120);
+  await cache.set('instances:all', result.rows, 120, ['instances']);
 
   return result.rows;
 }
@@ -96,7 +96,7 @@ async function updateInstanceStatus(instanceName, status, additionalData = {}) {
 
   // Invalidar cache
   await cache.del(`instance:${instanceName}`);
-  await cache.invalidatePattern('instances:*');
+  await cache.invalidateTag('instances');
 
   return result.rows[0];
 }
@@ -113,7 +113,7 @@ async function updateInstanceWebhook(instanceName, webhookUrl, webhookEvents = [
 
   // Invalidar cache
   await cache.del(`instance:${instanceName}`);
-  await cache.invalidatePattern('instances:*');
+  await cache.invalidateTag('instances');
 
   return result.rows[0];
 }
@@ -127,7 +127,7 @@ async function deleteInstance(instanceName) {
 
   // Invalidar cache
   await cache.del(`instance:${instanceName}`);
-  await cache.invalidatePattern('instances:*');
+  await cache.invalidateTag('instances');
 
   return result.rows[0];
 }
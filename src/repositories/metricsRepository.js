@@ -1,58 +1,140 @@
 const { query } = require('../config/database');
 const { cache } = require('../config/redis');
 
-// ========== CRUD BÁSICO ==========
-
-// Adicionar métrica
-async function addMetric(instanceName, metricType, value, metadata = null) {
-  const result = await query(
-    `INSERT INTO metrics (instance_name, metric_type, value, metadata)
-     VALUES ($1, $2, $3, $4)
-     RETURNING *`,
-    [instanceName, metricType, value, metadata ? JSON.stringify(metadata) : null]
-  );
+// ========== ACUMULADOR EM MEMÓRIA ==========
+// Os incrementos são somados em memória e gravados em metrics_hourly a cada
+// FLUSH_INTERVAL_MS com um único INSERT ... ON CONFLICT DO UPDATE.
+// Os buckets são horas UTC dos dois lados (JS e banco), independente do fuso do
+// processo ou da sessão do Postgres.
+
+const FLUSH_INTERVAL_MS = parseInt(process.env.METRICS_BUCKET_FLUSH_MS, 10) || 5000;
+const PERIODS = ['hour', 'day', 'week', 'month', 'all'];
+
+let pending = new Map(); // "instance|type|bucket" -> { instanceName, metricType, bucket, value, metadata }
+let flushTimer = null;
+let flushing = null;
+
+function hourBucket(date = new Date()) {
+  const bucket = new Date(date);
+  bucket.setUTCMinutes(0, 0, 0);
+  return bucket;
+}
 
-  // Invalidar cache de métricas
-  await cache.invalidatePattern(`metrics:${instanceName}:*`);
+function periodInterval(period) {
+  switch (period) {
+    case 'hour':
+      return '1 hour';
+    case 'day':
+      return '1 day';
+    case 'week':
+      return '7 days';
+    case 'month':
+      return '30 days';
+    case 'all':
+      return null;
+    default:
+      return '1 day';
+  }
+}
 
-  return result.rows[0];
+function ensureFlushTimer() {
+  if (flushTimer) return;
+  flushTimer = setInterval(() => {
+    flushMetrics().catch(err => console.error('[MetricsRepo] Erro ao gravar métricas:', err.message));
+  }, FLUSH_INTERVAL_MS);
+  flushTimer.unref();
 }
 
-// Incrementar métrica (útil para contadores)
-async function incrementMetric(instanceName, metricType, incrementBy = 1, metadata = null) {
-  // Verificar se já existe uma métrica recente (última hora)
-  const existing = await query(
-    `SELECT * FROM metrics
-     WHERE instance_name = $1 AND metric_type = $2
-     AND created_at > NOW() - INTERVAL '1 hour'
-     ORDER BY created_at DESC
-     LIMIT 1`,
-    [instanceName, metricType]
-  );
+function accumulate(instanceName, metricType, value, metadata, bucket = hourBucket()) {
+  const key = `${instanceName}|${metricType}|${bucket.getTime()}`;
+  const entry = pending.get(key);
 
-  if (existing.rows.length > 0) {
-    // Atualizar métrica existente
-    const result = await query(
-      `UPDATE metrics
-       SET value = value + $3, metadata = $4
-       WHERE id = $1
-       RETURNING *`,
-      [existing.rows[0].id, instanceName, incrementBy, metadata ? JSON.stringify(metadata) : existing.rows[0].metadata]
-    );
-
-    await cache.invalidatePattern(`metrics:${instanceName}:*`);
-    return result.rows[0];
+  if (entry) {
+    entry.value += value;
+    if (metadata) entry.metadata = metadata;
   } else {
-    // Criar nova métrica
-    return await addMetric(instanceName, metricType, incrementBy, metadata);
+    pending.set(key, { instanceName, metricType, bucket, value, metadata });
+  }
+
+  ensureFlushTimer();
+  return { instance_name: instanceName, metric_type: metricType, bucket, pending: pending.get(key).value };
+}
+
+// Gravar deltas acumulados (uma consulta para todos os contadores)
+async function flushMetrics() {
+  if (flushing) return flushing;
+  if (pending.size === 0) return 0;
+
+  const entries = [...pending.values()];
+  pending = new Map();
+
+  flushing = (async () => {
+    try {
+      await query(
+        `INSERT INTO metrics_hourly (instance_name, metric_type, bucket, value, metadata)
+         SELECT i, t, to_timestamp(b) AT TIME ZONE 'UTC', v, m
+         FROM unnest($1::varchar[], $2::varchar[], $3::float8[], $4::bigint[], $5::jsonb[]) AS u(i, t, b, v, m)
+         ON CONFLICT (instance_name, metric_type, bucket)
+         DO UPDATE SET value = metrics_hourly.value + EXCLUDED.value,
+                       metadata = COALESCE(EXCLUDED.metadata, metrics_hourly.metadata),
+                       updated_at = NOW()`,
+        [
+          entries.map(e => e.instanceName),
+          entries.map(e => e.metricType),
+          entries.map(e => e.bucket.getTime() / 1000),
+          entries.map(e => e.value),
+          entries.map(e => (e.metadata ? JSON.stringify(e.metadata) : null))
+        ]
+      );
+    } catch (error) {
+      // Devolver os deltas para a próxima tentativa
+      for (const e of entries) {
+        accumulate(e.instanceName, e.metricType, e.value, e.metadata, e.bucket);
+      }
+      throw error;
+    }
+
+    await invalidateCache(entries);
+    return entries.length;
+  })();
+
+  try {
+    return await flushing;
+  } finally {
+    flushing = null;
+  }
+}
+
+// Invalidar apenas as chaves conhecidas afetadas (sem KEYS/SCAN)
+async function invalidateCache(entries) {
+  const keys = new Set();
+  for (const { instanceName, metricType } of entries) {
+    for (const period of PERIODS) {
+      keys.add(`metrics:${instanceName}:summary:${period}`);
+      keys.add(`metrics:${instanceName}:${metricType}:total:${period}`);
+    }
   }
+  await Promise.all([...keys].map(key => cache.del(key)));
 }
 
-// Buscar métricas por instância
+// ========== CRUD BÁSICO ==========
+
+// Adicionar métrica (somada ao bucket da hora atual)
+async function addMetric(instanceName, metricType, value, metadata = null) {
+  return accumulate(instanceName, metricType, value, metadata);
+}
+
+// Incrementar métrica (útil para contadores) - O(1), sem ida ao banco
+async function incrementMetric(instanceName, metricType, incrementBy = 1, metadata = null) {
+  return accumulate(instanceName, metricType, incrementBy, metadata);
+}
+
+// Buscar métricas por instância (buckets horários)
 async function getMetricsByInstance(instanceName, options = {}) {
   const { metricType, limit = 100, since } = options;
 
-  let queryText = 'SELECT * FROM metrics WHERE instance_name = $1';
+  let queryText = `SELECT instance_name, metric_type, value, metadata, bucket, bucket as created_at
+                   FROM metrics_hourly WHERE instance_name = $1`;
   const params = [instanceName];
   let paramIndex = 2;
 
@@ -63,12 +145,12 @@ async function getMetricsByInstance(instanceName, options = {}) {
   }
 
   if (since) {
-    queryText += ` AND created_at >= $${paramIndex}`;
+    queryText += ` AND bucket >= date_trunc('hour', $${paramIndex}::timestamptz AT TIME ZONE 'UTC')`;
     params.push(since);
     paramIndex++;
   }
 
-  queryText += ` ORDER BY created_at DESC LIMIT $${paramIndex}`;
+  queryText += ` ORDER BY bucket DESC LIMIT $${paramIndex}`;
   params.push(limit);
 
   const result = await query(queryText, params);
@@ -77,29 +159,13 @@ async function getMetricsByInstance(instanceName, options = {}) {
 
 // ========== ESTATÍSTICAS E AGREGAÇÕES ==========
 
-// Obter resumo de métricas por período
+// Obter resumo de métricas por período (count/avg/max/min são por hora)
 async function getMetricsSummary(instanceName, period = 'day') {
   const cacheKey = `metrics:${instanceName}:summary:${period}`;
   const cached = await cache.get(cacheKey);
   if (cached) return cached;
 
-  let interval;
-  switch (period) {
-    case 'hour':
-      interval = '1 hour';
-      break;
-    case 'day':
-      interval = '1 day';
-      break;
-    case 'week':
-      interval = '7 days';
-      break;
-    case 'month':
-      interval = '30 days';
-      break;
-    default:
-      interval = '1 day';
-  }
+  const interval = periodInterval(period) || '1 day';
 
   const result = await query(
     `SELECT
@@ -109,9 +175,9 @@ async function getMetricsSummary(instanceName, period = 'day') {
        AVG(value) as avg_value,
        MAX(value) as max_value,
        MIN(value) as min_value
-     FROM metrics
+     FROM metrics_hourly
      WHERE instance_name = $1
-       AND created_at >= NOW() - INTERVAL '${interval}'
+       AND bucket >= date_trunc('hour', (NOW() AT TIME ZONE 'UTC') - INTERVAL '${interval}')
      GROUP BY metric_type`,
     [instanceName]
   );
@@ -127,7 +193,7 @@ async function getMetricsSummary(instanceName, period = 'day') {
     };
   });
 
-  // Cachear por 5 minutos
+  // Cachear por 5 minutos (invalidado a cada flush)
   await cache.set(cacheKey, summary, 300);
 
   return summary;
@@ -139,33 +205,14 @@ async function getTotalMetric(instanceName, metricType, period = 'day') {
   const cached = await cache.get(cacheKey);
   if (cached !== null) return cached;
 
-  let interval;
-  switch (period) {
-    case 'hour':
-      interval = '1 hour';
-      break;
-    case 'day':
-      interval = '1 day';
-      break;
-    case 'week':
-      interval = '7 days';
-      break;
-    case 'month':
-      interval = '30 days';
-      break;
-    case 'all':
-      interval = null;
-      break;
-    default:
-      interval = '1 day';
-  }
+  const interval = periodInterval(period);
 
   let queryText = `SELECT COALESCE(SUM(value), 0) as total
-                   FROM metrics
+                   FROM metrics_hourly
                    WHERE instance_name = $1 AND metric_type = $2`;
 
   if (interval) {
-    queryText += ` AND created_at >= NOW() - INTERVAL '${interval}'`;
+    queryText += ` AND bucket >= date_trunc('hour', (NOW() AT TIME ZONE 'UTC') - INTERVAL '${interval}')`;
   }
 
   const result = await query(queryText, [instanceName, metricType]);
@@ -177,18 +224,18 @@ async function getTotalMetric(instanceName, metricType, period = 'day') {
   return total;
 }
 
-// Obter métricas agrupadas por data
+// Obter métricas agrupadas por data (dias UTC)
 async function getMetricsByDate(instanceName, metricType, days = 7) {
   const result = await query(
     `SELECT
-       DATE(created_at) as date,
+       DATE(bucket) as date,
        SUM(value) as total,
        COUNT(*) as count
-     FROM metrics
+     FROM metrics_hourly
      WHERE instance_name = $1
        AND metric_type = $2
-       AND created_at >= NOW() - INTERVAL '${days} days'
-     GROUP BY DATE(created_at)
+       AND bucket >= (NOW() AT TIME ZONE 'UTC') - INTERVAL '${parseInt(days, 10) || 7} days'
+     GROUP BY DATE(bucket)
      ORDER BY date DESC`,
     [instanceName, metricType]
   );
@@ -202,9 +249,9 @@ async function getTopMetrics(instanceName, limit = 10) {
     `SELECT
        metric_type,
        SUM(value) as total_value
-     FROM metrics
+     FROM metrics_hourly
      WHERE instance_name = $1
-       AND created_at >= NOW() - INTERVAL '7 days'
+       AND bucket >= (NOW() AT TIME ZONE 'UTC') - INTERVAL '7 days'
      GROUP BY metric_type
      ORDER BY total_value DESC
      LIMIT $2`,
@@ -216,13 +263,15 @@ async function getTopMetrics(instanceName, limit = 10) {
 
 // Limpar métricas antigas (manutenção)
 async function cleanOldMetrics(daysToKeep = 90) {
+  const days = parseInt(daysToKeep, 10) || 90;
+
   const result = await query(
-    `DELETE FROM metrics
-     WHERE created_at < NOW() - INTERVAL '${daysToKeep} days'
-     RETURNING COUNT(*)`
+    `DELETE FROM metrics_hourly
+     WHERE bucket < (NOW() AT TIME ZONE 'UTC') - INTERVAL '${days} days'`
   );
 
-  await cache.invalidatePattern('metrics:*');
+  // Tabela legada (não recebe mais escritas)
+  await query(`DELETE FROM metrics WHERE created_at < NOW() - INTERVAL '${days} days'`);
 
   return result.rowCount;
 }
@@ -230,11 +279,12 @@ async function cleanOldMetrics(daysToKeep = 90) {
 // Exportar métricas para análise
 async function exportMetrics(instanceName, startDate, endDate) {
   const result = await query(
-    `SELECT * FROM metrics
+    `SELECT instance_name, metric_type, value, metadata, bucket, bucket as created_at
+     FROM metrics_hourly
      WHERE instance_name = $1
-       AND created_at >= $2
-       AND created_at <= $3
-     ORDER BY created_at ASC`,
+       AND bucket >= date_trunc('hour', $2::timestamptz AT TIME ZONE 'UTC')
+       AND bucket <= $3::timestamptz AT TIME ZONE 'UTC'
+     ORDER BY bucket ASC`,
     [instanceName, startDate, endDate]
   );
 
@@ -244,6 +294,7 @@ async function exportMetrics(instanceName, startDate, endDate) {
 module.exports = {
   addMetric,
   incrementMetric,
+  flushMetrics,
   getMetricsByInstance,
   getMetricsSummary,
   getTotalMetric,
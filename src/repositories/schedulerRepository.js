@@ -23,7 +23,7 @@ async function createScheduledMessage(messageData) {
   );
 
   // Invalidar cache
-  await cache.invalidatePattern(`scheduled:${instanceName}:*`);
+  await cache.invalidateTag(`scheduled:${instanceName}`);
 
   return result.rows[0];
 }
@@ -83,7 +83,7 @@ async function updateScheduledMessageStatus(id, status, errorMessage = null) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`scheduled:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`scheduled:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -111,7 +111,7 @@ async function deleteScheduledMessage(id) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`scheduled:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`scheduled:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -161,7 +161,7 @@ async function cancelScheduledMessagesByInstance(instanceName) {
   );
 
   // Invalidar cache
-  await cache.invalidatePattern(`scheduled:${instanceName}:*`);
+  await cache.invalidateTag(`scheduled:${instanceName}`);
 
   return result.rows;
 }
@@ -194,7 +194,7 @@ async function getScheduledStats(instanceName) {
   });
 
   // Cachear por 2 minutos
-  await cache.set(cacheKey, stats, 120);
+  await cache.set(cacheKey, stats, 120, [`scheduled:${instanceName}`]);
 
   return stats;
 }
@@ -225,7 +225,7 @@ async function rescheduleMessage(id, newScheduledTime) {
 
   // Invalidar cache
   if (result.rows[0]) {
-    await cache.invalidatePattern(`scheduled:${result.rows[0].instance_name}:*`);
+    await cache.invalidateTag(`scheduled:${result.rows[0].instance_name}`);
   }
 
   return result.rows[0];
@@ -192,7 +192,7 @@ async function addWarmingStat(instanceName, messagesSent, stage) {
   );
 
   // Invalidar cache
-  await cache.invalidatePattern(`warming:stats:${instanceName}:*`);
+  await cache.invalidateTag(`warming:stats:${instanceName}`);
 
   return result.rows[0];
 }
@@ -212,7 +212,7 @@ async function getWarmingStats(instanceName, days = 30) {
   );
 
   // Cachear por 5 minutos
-  await cache.set(cacheKey, result.rows, 300);
+  await cache.set(cacheKey, result.rows, 300, [`warming:stats:${instanceName}`]);
 
   return result.rows;
 }
@@ -1,5 +1,9 @@
 const { query } = require('../config/database');
 const { cache } = require('../config/redis');
+const tieredCache = require('../services/tieredCache');
+
+// Consultado a cada job de webhook
+const configCache = tieredCache.create('webhook-config', { l1TtlMs: 30000, l2TtlSeconds: 300, cacheNull: true });
 
 // ========== CONFIGURAÇÕES ==========
 
@@ -47,31 +51,21 @@ async function upsertWebhookConfig(instanceName, config) {
   );
 
   // Invalidar cache
-  await cache.del(`webhook:config:${instanceName}`);
+  await configCache.invalidate(instanceName);
 
   return result.rows[0];
 }
 
 // Buscar configuração de webhook
 async function getWebhookConfig(instanceName) {
-  // Tentar cache
-  const cacheKey = `webhook:config:${instanceName}`;
-  const cached = await cache.get(cacheKey);
-  if (cached) return cached;
+  return configCache.wrap(instanceName, async () => {
+    const result = await query(
+      'SELECT * FROM webhook_configs WHERE instance_name = $1',
+      [instanceName]
+    );
 
-  const result = await query(
-    'SELECT * FROM webhook_configs WHERE instance_name = $1',
-    [instanceName]
-  );
-
-  const config = result.rows[0] || null;
-
-  // Cachear por 5 minutos
-  if (config) {
-    await cache.set(cacheKey, config, 300);
-  }
-
-  return config;
+    return result.rows[0] || null;
+  });
 }
 
 // Habilitar/desabilitar webhook
@@ -85,7 +79,7 @@ async function toggleWebhook(instanceName, enabled) {
   );
 
   // Invalidar cache
-  await cache.del(`webhook:config:${instanceName}`);
+  await configCache.invalidate(instanceName);
 
   return result.rows[0];
 }
@@ -98,7 +92,7 @@ async function deleteWebhookConfig(instanceName) {
   );
 
   // Invalidar cache
-  await cache.del(`webhook:config:${instanceName}`);
+  await configCache.invalidate(instanceName);
 
   return result.rows[0];
 }
@@ -159,11 +153,59 @@ async function addWebhookLog(logData) {
   );
 
   // Invalidar cache de logs
-  await cache.invalidatePattern(`webhook:logs:${instanceName}:*`);
+  await cache.invalidateTag(`webhook:logs:${instanceName}`);
 
   return result.rows[0];
 }
 
+// Adicionar vários logs em um único INSERT
+// O nome da instância é associado ao cadastrado em instances (mesmo com outra
+// capitalização); logs de instâncias inexistentes são ignorados em vez de
+// derrubarem o lote inteiro pela FK.
+async function addWebhookLogs(entries) {
+  if (entries.length === 0) return 0;
+
+  const columns = [[], [], [], [], [], [], [], [], [], [], [], []];
+  for (const entry of entries) {
+    const values = [
+      entry.instanceName,
+      entry.eventType,
+      entry.url,
+      entry.status,
+      entry.statusCode ?? null,
+      entry.attempt ?? 1,
+      entry.durationMs ?? null,
+      entry.errorMessage ?? null,
+      entry.errorType ?? null,
+      entry.responseBody ?? null,
+      entry.batchSize ?? null,
+      entry.createdAt
+    ];
+    values.forEach((value, i) => columns[i].push(value));
+  }
+
+  const result = await query(
+    `INSERT INTO webhook_logs
+     (instance_name, event_type, url, status, status_code, attempt,
+      duration_ms, error_message, error_type, response_body, batch_size, created_at)
+     SELECT i.instance_name, l.event_type, l.url, l.status, l.status_code, l.attempt,
+            l.duration_ms, l.error_message, l.error_type, l.response_body, l.batch_size, l.created_at
+     FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::int[], $6::int[],
+                 $7::int[], $8::text[], $9::text[], $10::text[], $11::int[], $12::timestamptz[])
+          AS l(instance_name, event_type, url, status, status_code, attempt,
+               duration_ms, error_message, error_type, response_body, batch_size, created_at)
+     CROSS JOIN LATERAL (
+       SELECT instance_name FROM instances
+       WHERE LOWER(instance_name) = LOWER(l.instance_name)
+       ORDER BY instance_name = l.instance_name DESC
+       LIMIT 1
+     ) i`,
+    columns
+  );
+
+  return result.rowCount;
+}
+
 // Buscar logs de webhook
 async function getWebhookLogs(instanceName, options = {}) {
   const { eventType, status, since, limit = 100 } = options;
@@ -200,29 +242,175 @@ async function getWebhookLogs(instanceName, options = {}) {
 // Limpar logs de webhook
 async function clearWebhookLogs(instanceName) {
   const result = await query(
-    'DELETE FROM webhook_logs WHERE instance_name = $1 RETURNING COUNT(*)',
+    'DELETE FROM webhook_logs WHERE instance_name = $1',
     [instanceName]
   );
 
   // Invalidar cache
-  await cache.invalidatePattern(`webhook:logs:${instanceName}:*`);
+  await cache.invalidateTag(`webhook:logs:${instanceName}`);
 
   return result.rowCount;
 }
 
+// Remover em partes (DELETE ... LIMIT) para não travar a tabela em uma única transação longa
+async function deleteInChunks(sql, params, chunkSize = 10000) {
+  let total = 0;
+  for (;;) {
+    const result = await query(sql, [...params, chunkSize]);
+    total += result.rowCount;
+    if (result.rowCount < chunkSize) return total;
+  }
+}
+
 // Limpar logs antigos
 async function cleanOldWebhookLogs(daysToKeep = 30) {
-  const result = await query(
-    `DELETE FROM webhook_logs
-     WHERE created_at < NOW() - INTERVAL '${daysToKeep} days'
-     RETURNING COUNT(*)`
+  const removed = await deleteInChunks(
+    `DELETE FROM webhook_logs WHERE id IN (
+       SELECT id FROM webhook_logs
+       WHERE created_at < NOW() - make_interval(days => $1)
+       LIMIT $2
+     )`,
+    [daysToKeep]
   );
 
   await cache.invalidatePattern('webhook:logs:*');
 
+  return removed;
+}
+
+// Manter no máximo `maxPerInstance` logs por instância (os mais recentes)
+async function trimWebhookLogs(maxPerInstance = 10000) {
+  return await deleteInChunks(
+    `DELETE FROM webhook_logs WHERE id IN (
+       SELECT id FROM (
+         SELECT id, ROW_NUMBER() OVER (PARTITION BY instance_name ORDER BY created_at DESC) AS position
+         FROM webhook_logs
+       ) ranked
+       WHERE position > $1
+       LIMIT $2
+     )`,
+    [maxPerInstance]
+  );
+}
+
+// ========== DEAD LETTERS ==========
+
+// Registrar entregas que falharam em todas as tentativas (um INSERT por lote)
+async function addDeadLetters(entries) {
+  if (!entries || entries.length === 0) return 0;
+
+  const result = await query(
+    `INSERT INTO webhook_dead_letters
+     (instance_name, event_type, url, payload, headers, attempts, error_message)
+     SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::jsonb[], $5::jsonb[], $6::int[], $7::text[])`,
+    [
+      entries.map(e => e.instanceName),
+      entries.map(e => e.eventType || 'unknown'),
+      entries.map(e => e.url),
+      entries.map(e => JSON.stringify(e.payload)),
+      entries.map(e => JSON.stringify(e.headers || {})),
+      entries.map(e => e.attempts ?? 1),
+      entries.map(e => e.errorMessage ?? null)
+    ]
+  );
+
   return result.rowCount;
 }
 
+// Remover dead letters antigos e manter no máximo `maxPerInstance` por instância
+async function cleanOldDeadLetters(daysToKeep = 14, maxPerInstance = 10000) {
+  const expired = await deleteInChunks(
+    `DELETE FROM webhook_dead_letters WHERE id IN (
+       SELECT id FROM webhook_dead_letters
+       WHERE created_at < NOW() - make_interval(days => $1) AND status <> 'replaying'
+       LIMIT $2
+     )`,
+    [daysToKeep]
+  );
+
+  const overLimit = await deleteInChunks(
+    `DELETE FROM webhook_dead_letters WHERE id IN (
+       SELECT id FROM (
+         SELECT id, status, ROW_NUMBER() OVER (PARTITION BY instance_name ORDER BY created_at DESC) AS position
+         FROM webhook_dead_letters
+       ) ranked
+       WHERE position > $1 AND status <> 'replaying'
+       LIMIT $2
+     )`,
+    [maxPerInstance]
+  );
+
+  return expired + overLimit;
+}
+
+// Token atual da instância (reconstruir a autenticação no reprocessamento)
+async function getInstanceToken(instanceName) {
+  const result = await query(
+    `SELECT token FROM instances
+     WHERE LOWER(instance_name) = LOWER($1)
+     ORDER BY instance_name = $1 DESC
+     LIMIT 1`,
+    [instanceName]
+  );
+
+  return result.rows[0]?.token || null;
+}
+
+// Listar dead letters de uma instância (sem o payload)
+async function getDeadLetters(instanceName, options = {}) {
+  const { status = 'pending', limit = 100 } = options;
+
+  const result = await query(
+    `SELECT id, instance_name, event_type, url, attempts, error_message, status,
+            replay_attempts, replay_started_at, replayed_at, created_at
+     FROM webhook_dead_letters
+     WHERE instance_name = $1 AND status = $2
+     ORDER BY created_at
+     LIMIT $3`,
+    [instanceName, status, limit]
+  );
+
+  return result.rows;
+}
+
+// Reservar dead letters para reprocessamento (SKIP LOCKED: duas réplicas nunca pegam o mesmo)
+// Reservas com mais de 15 minutos são de um reprocessamento interrompido e podem ser retomadas.
+async function claimDeadLetters(instanceName, options = {}) {
+  const { ids = null, limit = 100 } = options;
+
+  const result = await query(
+    `UPDATE webhook_dead_letters d
+     SET status = 'replaying', replay_started_at = NOW()
+     WHERE d.id IN (
+       SELECT id FROM webhook_dead_letters
+       WHERE instance_name = $1
+         AND (status = 'pending'
+              OR (status = 'replaying' AND replay_started_at < NOW() - INTERVAL '15 minutes'))
+         AND ($2::int[] IS NULL OR id = ANY($2::int[]))
+       ORDER BY created_at
+       LIMIT $3
+       FOR UPDATE SKIP LOCKED
+     )
+     RETURNING d.*`,
+    [instanceName, ids, limit]
+  );
+
+  return result.rows.sort((a, b) => a.created_at - b.created_at);
+}
+
+// Concluir o reprocessamento de um dead letter (falha volta para pendente)
+async function finishDeadLetterReplay(id, success, errorMessage = null) {
+  await query(
+    `UPDATE webhook_dead_letters
+     SET status = CASE WHEN $2 THEN 'replayed' ELSE 'pending' END,
+         replayed_at = CASE WHEN $2 THEN NOW() ELSE NULL END,
+         replay_attempts = replay_attempts + 1,
+         error_message = COALESCE($3, error_message)
+     WHERE id = $1`,
+    [id, success, errorMessage]
+  );
+}
+
 // ========== ESTATÍSTICAS ==========
 
 // Obter estatísticas de webhook
@@ -355,9 +543,18 @@ module.exports = {
   getActiveWebhookConfigs,
   // Logs
   addWebhookLog,
+  addWebhookLogs,
   getWebhookLogs,
   clearWebhookLogs,
   cleanOldWebhookLogs,
+  trimWebhookLogs,
+  // Dead letters
+  addDeadLetters,
+  cleanOldDeadLetters,
+  getInstanceToken,
+  getDeadLetters,
+  claimDeadLetters,
+  finishDeadLetterReplay,
   // Stats
   getWebhookStats,
   getFailedWebhookLogs,
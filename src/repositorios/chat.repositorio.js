@@ -89,61 +89,97 @@ async function buscarConversaPorContato(contatoId, empresaId, status = 'aberta')
 }
 
 /**
- * Listar conversas
+ * Buscar conversas (mais recentes) de vários contatos em uma única consulta
+ * Retorna um Map indexado por contato_id
  */
-async function listarConversas(empresaId, filtros = {}) {
+async function buscarConversasPorContatos(contatoIds, empresaId, status = 'aberta') {
+  const conversas = new Map();
+  if (!contatoIds || contatoIds.length === 0) return conversas;
+
+  const sql = `
+    SELECT DISTINCT ON (c.contato_id) c.*
+    FROM conversas_chat c
+    WHERE c.contato_id = ANY($1::uuid[]) AND c.empresa_id = $2 AND c.status = $3
+    ORDER BY c.contato_id, c.criado_em DESC
+  `;
+
+  const resultado = await query(sql, [contatoIds, empresaId, status]);
+  for (const row of resultado.rows) {
+    conversas.set(row.contato_id, row);
+  }
+  return conversas;
+}
+
+/**
+ * Criar várias conversas em um único INSERT multi-VALUES
+ */
+async function criarConversasEmLote(empresaId, instanciaId, contatoIds, status = 'aberta') {
+  if (!contatoIds || contatoIds.length === 0) return [];
+
+  const sql = `
+    INSERT INTO conversas_chat (empresa_id, instancia_id, contato_id, status)
+    SELECT $1, $2, contato_id, $3
+    FROM unnest($4::uuid[]) AS contato_id
+    RETURNING *
+  `;
+
+  const resultado = await query(sql, [empresaId, instanciaId, status, contatoIds]);
+  return resultado.rows;
+}
+
+// Chave de ordenação das conversas: sem mensagem vai para o fim (NULLS LAST)
+const ORDEM_CONVERSA = `COALESCE(c.ultima_mensagem_em, '-infinity'::timestamp)`;
+
+// Prévia da última mensagem (colunas da própria conversa, com fallback para o tipo de mídia)
+const PREVIA_ULTIMA_MENSAGEM = `
+  CASE 
+    WHEN c.ultima_mensagem_preview IS NOT NULL AND c.ultima_mensagem_preview != '' THEN c.ultima_mensagem_preview
+    WHEN c.ultima_mensagem_tipo IS NULL THEN NULL
+    WHEN c.ultima_mensagem_tipo = 'imagem' THEN '📷 Imagem'
+    WHEN c.ultima_mensagem_tipo = 'audio' THEN '🎙️ Áudio'
+    WHEN c.ultima_mensagem_tipo = 'video' THEN '🎥 Vídeo'
+    WHEN c.ultima_mensagem_tipo = 'documento' THEN '📄 Documento'
+    WHEN c.ultima_mensagem_tipo = 'sticker' THEN '🏷️ Figuninha'
+    ELSE 'Mensagem de mídia'
+  END as ultima_mensagem
+`;
+
+// Tamanho máximo da prévia guardada em conversas_chat
+const TAMANHO_PREVIA = 200;
+
+/**
+ * Montar SELECT e filtros da listagem de conversas
+ */
+function montarConsultaConversas(empresaId, filtros, colunasExtras = '') {
   let sql = `
     SELECT c.*,
+           ${PREVIA_ULTIMA_MENSAGEM.trim()},
            ct.nome as contato_nome,
            ct.telefone as contato_telefone,
            ct.email as email,
            ct.empresa as empresa,
-           u.nome as atribuido_nome
+           u.nome as atribuido_nome${colunasExtras}
     FROM conversas_chat c
     LEFT JOIN contatos ct ON c.contato_id = ct.id
     LEFT JOIN usuarios u ON c.atribuido_para = u.id
     WHERE c.empresa_id = $1
   `;
 
-  // Subconsulta para última mensagem (com fallback para tipo de mídia se conteúdo for vazio)
-  const subqueryUltimaMensagem = `
-    (SELECT 
-      CASE 
-        WHEN conteudo IS NOT NULL AND conteudo != '' THEN conteudo
-        WHEN tipo_mensagem = 'imagem' THEN '📷 Imagem'
-        WHEN tipo_mensagem = 'audio' THEN '🎙️ Áudio'
-        WHEN tipo_mensagem = 'video' THEN '🎥 Vídeo'
-        WHEN tipo_mensagem = 'documento' THEN '📄 Documento'
-        WHEN tipo_mensagem = 'sticker' THEN '🏷️ Figuninha'
-        ELSE 'Mensagem de mídia'
-      END
-     FROM mensagens_chat 
-     WHERE conversa_id = c.id 
-     ORDER BY criado_em DESC 
-     LIMIT 1) as ultima_mensagem
-  `;
-
-  sql = sql.replace('c.*,', `c.*, ${subqueryUltimaMensagem},`);
-
   const params = [empresaId];
-  let paramIndex = 2;
 
   if (filtros.status) {
-    sql += ` AND c.status = $${paramIndex}`;
     params.push(filtros.status);
-    paramIndex++;
+    sql += ` AND c.status = $${params.length}`;
   }
 
   if (filtros.atribuidoPara) {
-    sql += ` AND c.atribuido_para = $${paramIndex}`;
     params.push(filtros.atribuidoPara);
-    paramIndex++;
+    sql += ` AND c.atribuido_para = $${params.length}`;
   }
 
   if (filtros.departamento) {
-    sql += ` AND c.departamento = $${paramIndex}`;
     params.push(filtros.departamento);
-    paramIndex++;
+    sql += ` AND c.departamento = $${params.length}`;
   }
 
   if (filtros.naoLidas) {
@@ -151,28 +187,76 @@ async function listarConversas(empresaId, filtros = {}) {
   }
 
   if (filtros.instanciaId) {
-    sql += ` AND c.instancia_id = $${paramIndex}`;
     params.push(filtros.instanciaId);
-    paramIndex++;
+    sql += ` AND c.instancia_id = $${params.length}`;
   }
 
+  return { sql, params };
+}
+
+/**
+ * Separar a página (limite + 1 linhas buscadas) e a chave do próximo cursor
+ */
+function extrairPagina(linhas, limite) {
+  const pagina = linhas.slice(0, limite);
+  const ultima = pagina[pagina.length - 1];
+  const proximoCursor = linhas.length > limite && ultima ? [ultima.cursor_chave, ultima.id] : null;
+
+  for (const linha of pagina) delete linha.cursor_chave;
+
+  return { pagina, proximoCursor };
+}
+
+/**
+ * Listar conversas (paginação por LIMIT/OFFSET)
+ */
+async function listarConversas(empresaId, filtros = {}) {
+  let { sql, params } = montarConsultaConversas(empresaId, filtros);
+
   sql += ' ORDER BY c.ultima_mensagem_em DESC NULLS LAST, c.criado_em DESC';
 
   if (filtros.limite) {
-    sql += ` LIMIT $${paramIndex}`;
     params.push(filtros.limite);
-    paramIndex++;
+    sql += ` LIMIT $${params.length}`;
   }
 
   if (filtros.offset) {
-    sql += ` OFFSET $${paramIndex}`;
     params.push(filtros.offset);
+    sql += ` OFFSET $${params.length}`;
   }
 
   const resultado = await query(sql, params);
   return resultado.rows;
 }
 
+/**
+ * Listar conversas por cursor em (ultima_mensagem_em, id) - custo constante por página
+ *
+ * O id desempata conversas com o mesmo ultima_mensagem_em, mas a chave principal
+ * muda a cada mensagem: não há garantia de estabilidade entre páginas. Uma conversa
+ * que recebe mensagem durante a paginação sobe para o topo; se estava depois do
+ * cursor, não aparece nas páginas seguintes (só ao recarregar a primeira página),
+ * e nunca é repetida. As mensagens (criado_em, id) não têm esse problema.
+ * @param {object} filtros - Mesmos filtros de listarConversas + limite e cursor ([chave, id])
+ * @returns {Promise<{conversas: object[], proximoCursor: string[]|null}>}
+ */
+async function listarConversasPorCursor(empresaId, filtros = {}) {
+  const limite = filtros.limite || 50;
+  let { sql, params } = montarConsultaConversas(empresaId, filtros, `,\n           ${ORDEM_CONVERSA}::text as cursor_chave`);
+
+  if (filtros.cursor) {
+    params.push(filtros.cursor[0], filtros.cursor[1]);
+    sql += ` AND (${ORDEM_CONVERSA}, c.id) < ($${params.length - 1}::timestamp, $${params.length}::uuid)`;
+  }
+
+  params.push(limite + 1);
+  sql += ` ORDER BY ${ORDEM_CONVERSA} DESC, c.id DESC LIMIT $${params.length}`;
+
+  const resultado = await query(sql, params);
+  const { pagina, proximoCursor } = extrairPagina(resultado.rows, limite);
+  return { conversas: pagina, proximoCursor };
+}
+
 /**
  * Atualizar conversa
  */
@@ -332,16 +416,22 @@ async function marcarComoLida(conversaId, empresaId) {
 /**
  * Atualizar timestamp da última mensagem
  */
-async function atualizarUltimaMensagem(conversaId) {
+async function atualizarUltimaMensagem(conversaId, mensagem = null) {
   const sql = `
     UPDATE conversas_chat
     SET ultima_mensagem_em = NOW(),
-        total_mensagens = total_mensagens + 1
+        total_mensagens = total_mensagens + 1,
+        ultima_mensagem_preview = COALESCE(LEFT($2, ${TAMANHO_PREVIA}), ultima_mensagem_preview),
+        ultima_mensagem_tipo = COALESCE($3, ultima_mensagem_tipo)
     WHERE id = $1
     RETURNING *
   `;
 
-  const resultado = await query(sql, [conversaId]);
+  const resultado = await query(sql, [
+    conversaId,
+    mensagem ? mensagem.conteudo || '' : null,
+    mensagem ? mensagem.tipoMensagem : null
+  ]);
   return resultado.rows[0];
 }
 
@@ -378,23 +468,36 @@ async function criarMensagem(dados) {
     }
   }
 
+  // Inserir a mensagem e atualizar a conversa (data, contadores e prévia) na mesma instrução
   const sql = `
-    INSERT INTO mensagens_chat (
-      conversa_id,
-      empresa_id,
-      whatsapp_mensagem_id,
-      direcao,
-      remetente_id,
-      tipo_remetente,
-      tipo_mensagem,
-      conteudo,
-      midia_url,
-      midia_tipo,
-      midia_nome_arquivo,
-      status,
-      metadados
-    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
-    RETURNING *
+    WITH nova AS (
+      INSERT INTO mensagens_chat (
+        conversa_id,
+        empresa_id,
+        whatsapp_mensagem_id,
+        direcao,
+        remetente_id,
+        tipo_remetente,
+        tipo_mensagem,
+        conteudo,
+        midia_url,
+        midia_tipo,
+        midia_nome_arquivo,
+        status,
+        metadados
+      ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+      RETURNING *
+    ), conversa AS (
+      UPDATE conversas_chat c
+      SET ultima_mensagem_em = NOW(),
+          total_mensagens = c.total_mensagens + 1,
+          nao_lidas = c.nao_lidas + CASE WHEN nova.direcao = 'recebida' THEN 1 ELSE 0 END,
+          ultima_mensagem_preview = LEFT(COALESCE(nova.conteudo, ''), ${TAMANHO_PREVIA}),
+          ultima_mensagem_tipo = nova.tipo_mensagem
+      FROM nova
+      WHERE c.id = nova.conversa_id
+    )
+    SELECT * FROM nova
   `;
 
   const valores = [
@@ -414,16 +517,139 @@ async function criarMensagem(dados) {
   ];
 
   const resultado = await query(sql, valores);
+  return resultado.rows[0];
+}
+
+// Colunas por linha no INSERT em lote (13) -> 2000 linhas ficam abaixo do limite de 65535 parâmetros
+const LOTE_MAXIMO_MENSAGENS = 2000;
+
+/**
+ * Criar várias mensagens com um único INSERT multi-VALUES por bloco
+ * Ignora IDs do WhatsApp já persistidos e atualiza os contadores das conversas
+ * em uma única consulta. Retorna as mensagens na ordem de entrada (existentes
+ * são devolvidas no lugar das duplicadas).
+ */
+async function criarMensagensEmLote(empresaId, mensagens) {
+  if (!mensagens || mensagens.length === 0) return [];
+
+  // Evitar duplicidade (no banco e dentro do próprio lote)
+  const idsWhatsApp = [...new Set(mensagens.map(m => m.whatsappMensagemId).filter(Boolean))];
+  const existentes = new Map();
+
+  if (idsWhatsApp.length > 0) {
+    const resultado = await query(`
+      SELECT DISTINCT ON (whatsapp_mensagem_id) *
+      FROM mensagens_chat
+      WHERE empresa_id = $1 AND whatsapp_mensagem_id = ANY($2)
+      ORDER BY whatsapp_mensagem_id, criado_em ASC
+    `, [empresaId, idsWhatsApp]);
+
+    for (const row of resultado.rows) {
+      existentes.set(row.whatsapp_mensagem_id, row);
+    }
+  }
 
-  // Atualizar conversa
-  await atualizarUltimaMensagem(conversaId);
+  const novas = [];
+  const vistos = new Set();
+  for (const m of mensagens) {
+    if (m.whatsappMensagemId) {
+      if (existentes.has(m.whatsappMensagemId) || vistos.has(m.whatsappMensagemId)) continue;
+      vistos.add(m.whatsappMensagemId);
+    }
+    novas.push(m);
+  }
 
-  // Se for mensagem recebida, incrementar não lidas
-  if (direcao === 'recebida') {
-    await incrementarNaoLidas(conversaId);
+  const criadas = [];
+  for (let inicio = 0; inicio < novas.length; inicio += LOTE_MAXIMO_MENSAGENS) {
+    const bloco = novas.slice(inicio, inicio + LOTE_MAXIMO_MENSAGENS);
+    const valores = [];
+
+    const linhas = bloco.map((m, i) => {
+      const base = i * 13;
+      valores.push(
+        m.conversaId,
+        empresaId,
+        m.whatsappMensagemId || null,
+        m.direcao,
+        m.remetenteId || null,
+        m.tipoRemetente || null,
+        m.tipoMensagem,
+        m.conteudo,
+        m.midiaUrl || null,
+        m.midiaTipo || null,
+        m.midiaNomeArquivo || null,
+        m.status || 'enviada',
+        JSON.stringify(m.metadados || {})
+      );
+      const params = Array.from({ length: 13 }, (_, j) => `$${base + j + 1}`);
+      // clock_timestamp() avança a cada linha, preservando a ordem de chegada no lote
+      return `(${params.join(', ')}, clock_timestamp())`;
+    });
+
+    const resultado = await query(`
+      INSERT INTO mensagens_chat (
+        conversa_id,
+        empresa_id,
+        whatsapp_mensagem_id,
+        direcao,
+        remetente_id,
+        tipo_remetente,
+        tipo_mensagem,
+        conteudo,
+        midia_url,
+        midia_tipo,
+        midia_nome_arquivo,
+        status,
+        metadados,
+        criado_em
+      ) VALUES ${linhas.join(', ')}
+      RETURNING *
+    `, valores);
+
+    criadas.push(...resultado.rows);
   }
 
-  return resultado.rows[0];
+  // Atualizar contadores e prévia das conversas (uma consulta para o lote inteiro)
+  const contadores = new Map();
+  for (const m of criadas) {
+    const atual = contadores.get(m.conversa_id) || { total: 0, recebidas: 0 };
+    atual.total++;
+    if (m.direcao === 'recebida') atual.recebidas++;
+    atual.ultima = m; // criadas está em ordem de chegada
+    contadores.set(m.conversa_id, atual);
+  }
+
+  if (contadores.size > 0) {
+    const ids = [...contadores.keys()];
+    const ultimas = ids.map(id => contadores.get(id).ultima);
+    await query(`
+      UPDATE conversas_chat c
+      SET ultima_mensagem_em = NOW(),
+          total_mensagens = c.total_mensagens + v.total,
+          nao_lidas = c.nao_lidas + v.recebidas,
+          ultima_mensagem_preview = LEFT(COALESCE(v.conteudo, ''), ${TAMANHO_PREVIA}),
+          ultima_mensagem_tipo = v.tipo
+      FROM unnest($1::uuid[], $2::int[], $3::int[], $4::text[], $5::varchar[]) AS v(id, total, recebidas, conteudo, tipo)
+      WHERE c.id = v.id
+    `, [
+      ids,
+      ids.map(id => contadores.get(id).total),
+      ids.map(id => contadores.get(id).recebidas),
+      ultimas.map(m => m.conteudo),
+      ultimas.map(m => m.tipo_mensagem)
+    ]);
+  }
+
+  // Reordenar conforme a entrada
+  const porIdWhatsApp = new Map(existentes);
+  for (const m of criadas) {
+    if (m.whatsapp_mensagem_id && !porIdWhatsApp.has(m.whatsapp_mensagem_id)) {
+      porIdWhatsApp.set(m.whatsapp_mensagem_id, m);
+    }
+  }
+
+  const semId = criadas.filter(m => !m.whatsapp_mensagem_id);
+  return mensagens.map(m => (m.whatsappMensagemId ? porIdWhatsApp.get(m.whatsappMensagemId) : semId.shift()));
 }
 
 /**
@@ -464,6 +690,46 @@ async function listarMensagens(conversaId, empresaId, filtros = {}) {
   return resultado.rows;
 }
 
+/**
+ * Listar mensagens por cursor em (criado_em, id) - custo constante por página
+ * @param {object} filtros - direcao, limite, cursor ([criado_em, id]) e ordem ('asc' ou 'desc')
+ * @returns {Promise<{mensagens: object[], proximoCursor: string[]|null}>}
+ */
+async function listarMensagensPorCursor(conversaId, empresaId, filtros = {}) {
+  const limite = filtros.limite || 100;
+  const desc = filtros.ordem === 'desc';
+
+  let sql = `
+    SELECT m.*,
+           u.nome as remetente_nome,
+           m.criado_em::text as cursor_chave
+    FROM mensagens_chat m
+    LEFT JOIN usuarios u ON m.remetente_id = u.id
+    WHERE m.conversa_id = $1 AND m.empresa_id = $2
+  `;
+
+  const params = [conversaId, empresaId];
+
+  if (filtros.direcao) {
+    params.push(filtros.direcao);
+    sql += ` AND m.direcao = $${params.length}`;
+  }
+
+  if (filtros.cursor) {
+    params.push(filtros.cursor[0], filtros.cursor[1]);
+    sql += ` AND (m.criado_em, m.id) ${desc ? '<' : '>'} ($${params.length - 1}::timestamp, $${params.length}::uuid)`;
+  }
+
+  params.push(limite + 1);
+  sql += desc
+    ? ` ORDER BY m.criado_em DESC, m.id DESC LIMIT $${params.length}`
+    : ` ORDER BY m.criado_em ASC, m.id ASC LIMIT $${params.length}`;
+
+  const resultado = await query(sql, params);
+  const { pagina, proximoCursor } = extrairPagina(resultado.rows, limite);
+  return { mensagens: pagina, proximoCursor };
+}
+
 /**
  * Buscar mensagem por ID do WhatsApp
  */
@@ -497,7 +763,29 @@ async function atualizarStatusMensagem(id, status) {
  * Deletar mensagem
  */
 async function deletarMensagem(id, empresaId) {
-  const sql = 'DELETE FROM mensagens_chat WHERE id = $1 AND empresa_id = $2 RETURNING *';
+  // Na mesma instrução, a prévia da conversa passa para a última mensagem restante
+  // (o UPDATE ainda enxerga a linha removida, por isso ela é excluída explicitamente)
+  const sql = `
+    WITH removida AS (
+      DELETE FROM mensagens_chat
+      WHERE id = $1 AND empresa_id = $2
+      RETURNING *
+    ), conversa AS (
+      UPDATE conversas_chat c
+      SET ultima_mensagem_preview = LEFT(u.conteudo, ${TAMANHO_PREVIA}),
+          ultima_mensagem_tipo = u.tipo_mensagem
+      FROM removida r
+      LEFT JOIN LATERAL (
+        SELECT m.conteudo, m.tipo_mensagem
+        FROM mensagens_chat m
+        WHERE m.conversa_id = r.conversa_id AND m.id <> r.id
+        ORDER BY m.criado_em DESC
+        LIMIT 1
+      ) u ON true
+      WHERE c.id = r.conversa_id
+    )
+    SELECT * FROM removida
+  `;
   const resultado = await query(sql, [id, empresaId]);
   return resultado.rows[0];
 }
@@ -548,7 +836,10 @@ module.exports = {
   criarConversa,
   buscarConversaPorId,
   buscarConversaPorContato,
+  buscarConversasPorContatos,
+  criarConversasEmLote,
   listarConversas,
+  listarConversasPorCursor,
   atualizarConversa,
   atribuirConversa,
   fecharConversa,
@@ -561,7 +852,9 @@ module.exports = {
 
   // Mensagens
   criarMensagem,
+  criarMensagensEmLote,
   listarMensagens,
+  listarMensagensPorCursor,
   buscarMensagemPorWhatsAppId,
   atualizarWhatsAppId,
   atualizarStatusMensagem,
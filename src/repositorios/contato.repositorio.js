@@ -1,4 +1,5 @@
 const { query } = require('../config/database');
+const { normalizarTelefone } = require('../utilitarios/validadores');
 
 /**
  * Repositório de Contatos (CRM)
@@ -25,13 +26,14 @@ async function criar(dados) {
       empresa_id,
       nome,
       telefone,
+      telefone_normalizado,
       email,
       empresa,
       cargo,
       tags,
       campos_customizados,
       observacoes
-    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
     RETURNING *
   `;
 
@@ -39,6 +41,7 @@ async function criar(dados) {
     empresaId,
     nome,
     telefone,
+    normalizarTelefone(telefone),
     email,
     empresa,
     cargo,
@@ -47,8 +50,28 @@ async function criar(dados) {
     observacoes
   ];
 
-  const resultado = await query(sql, valores);
-  return resultado.rows[0];
+  try {
+    const resultado = await query(sql, valores);
+    return resultado.rows[0];
+  } catch (erro) {
+    throw await traduzirTelefoneDuplicado(erro, telefone, empresaId);
+  }
+}
+
+/**
+ * Violação do índice único do telefone normalizado (mesmo número em outro formato,
+ * ou contato criado em paralelo) vira um erro 409 com o contato existente
+ */
+async function traduzirTelefoneDuplicado(erro, telefone, empresaId) {
+  if (erro.code !== '23505' || erro.constraint !== 'idx_contatos_telefone_normalizado') {
+    return erro;
+  }
+
+  const duplicado = new Error('Já existe um contato com este telefone');
+  duplicado.status = 409;
+  duplicado.code = 'CONTATO_DUPLICADO';
+  duplicado.contato = await buscarPorTelefone(telefone, empresaId);
+  return duplicado;
 }
 
 /**
@@ -68,21 +91,75 @@ async function buscarPorId(id, empresaId = null) {
 }
 
 /**
- * Buscar contato por telefone
+ * Buscar contato por telefone (qualquer formatação; busca pela forma normalizada)
  */
 async function buscarPorTelefone(telefone, empresaId) {
-  // Se for um grupo, não limpamos os caracteres não-numéricos (e.g. @g.us)
-  const isGroup = telefone.includes('@g.us');
-  const telefoneBusca = isGroup ? telefone : telefone.replace(/\D/g, '');
+  const telefoneNormalizado = normalizarTelefone(telefone);
 
-  const sql = isGroup
-    ? `SELECT * FROM contatos WHERE empresa_id = $1 AND telefone = $2 LIMIT 1`
-    : `SELECT * FROM contatos WHERE empresa_id = $1 AND REPLACE(REPLACE(REPLACE(telefone, '-', ''), '(', ''), ')', '') = $2 LIMIT 1`;
+  // Sem forma canônica (ex.: identificador não numérico): comparar o valor literal
+  const sql = telefoneNormalizado
+    ? 'SELECT * FROM contatos WHERE empresa_id = $1 AND telefone_normalizado = $2 LIMIT 1'
+    : 'SELECT * FROM contatos WHERE empresa_id = $1 AND telefone = $2 LIMIT 1';
 
-  const resultado = await query(sql, [empresaId, telefoneBusca]);
+  const resultado = await query(sql, [empresaId, telefoneNormalizado || telefone]);
   return resultado.rows[0];
 }
 
+/**
+ * Buscar vários contatos por telefone em uma única consulta
+ * Retorna um Map indexado pelo telefone normalizado (ou pelo valor literal,
+ * quando não há forma canônica - mesma regra de buscarPorTelefone)
+ */
+async function buscarPorTelefones(telefones, empresaId) {
+  const contatos = new Map();
+  if (!telefones || telefones.length === 0) return contatos;
+
+  const normalizados = new Set();
+  const literais = new Set();
+  for (const telefone of telefones) {
+    const normalizado = normalizarTelefone(telefone);
+    if (normalizado) normalizados.add(normalizado);
+    else literais.add(telefone);
+  }
+
+  const sql = `
+    SELECT *
+    FROM contatos
+    WHERE empresa_id = $1
+      AND (telefone_normalizado = ANY($2) OR telefone = ANY($3))
+  `;
+
+  const resultado = await query(sql, [empresaId, [...normalizados], [...literais]]);
+  for (const row of resultado.rows) {
+    const chave = normalizados.has(row.telefone_normalizado) ? row.telefone_normalizado : row.telefone;
+    if (!contatos.has(chave)) contatos.set(chave, row);
+  }
+  return contatos;
+}
+
+/**
+ * Criar vários contatos em um único INSERT multi-VALUES
+ */
+async function criarEmLote(empresaId, contatos) {
+  if (!contatos || contatos.length === 0) return [];
+
+  const valores = [];
+  const linhas = contatos.map((c, i) => {
+    const base = i * 5;
+    valores.push(empresaId, c.nome, c.telefone, normalizarTelefone(c.telefone), JSON.stringify(c.tags || []));
+    return `($${base + 1}, $${base + 2}, $${base + 3}, $${base + 4}, $${base + 5})`;
+  });
+
+  const sql = `
+    INSERT INTO contatos (empresa_id, nome, telefone, telefone_normalizado, tags)
+    VALUES ${linhas.join(', ')}
+    RETURNING *
+  `;
+
+  const resultado = await query(sql, valores);
+  return resultado.rows;
+}
+
 /**
  * Buscar contato por email
  */
@@ -92,44 +169,134 @@ async function buscarPorEmail(email, empresaId) {
   return resultado.rows[0];
 }
 
+// ========== BUSCA ==========
+// Com pg_trgm e os índices criados por reparar-banco, a busca usa:
+// - trigramas (GIN) em nome e telefone_normalizado, para "contém"
+// - tsvector de email/empresa (índice de expressão), para palavras
+// Sem os índices, volta ao ILIKE (varredura sequencial).
+
+// Deve ser idêntica à expressão do índice idx_contatos_documento_busca
+const DOCUMENTO_BUSCA = `to_tsvector('simple', translate(COALESCE(email, ''), '@.', '  ') || ' ' || COALESCE(empresa, ''))`;
+
+// Acima disso o total é a estimativa do planejador (contar 1M linhas custa mais que a página)
+const CONTAGEM_EXATA_ATE = parseInt(process.env.CONTATOS_CONTAGEM_EXATA_ATE, 10) || 10000;
+
+let buscaIndexada = false;
+let buscaVerificadaEm = 0;
+
 /**
- * Listar contatos da empresa
+ * Verificar se os índices de busca existem e são válidos (reavalia a cada minuto enquanto ausentes)
  */
-async function listar(empresaId, filtros = {}) {
-  let sql = 'SELECT * FROM contatos WHERE empresa_id = $1';
-  const params = [empresaId];
-  let paramIndex = 2;
+async function temBuscaIndexada() {
+  if (buscaIndexada || Date.now() - buscaVerificadaEm < 60000) return buscaIndexada;
+
+  buscaVerificadaEm = Date.now();
+  try {
+    const resultado = await query(`
+      SELECT COUNT(*) FILTER (WHERE i.indisvalid) = 3 AS ok
+      FROM pg_index i
+      WHERE i.indexrelid IN (
+        to_regclass('public.idx_contatos_nome_trgm'),
+        to_regclass('public.idx_contatos_telefone_trgm'),
+        to_regclass('public.idx_contatos_documento_busca')
+      )
+    `);
+    buscaIndexada = !!resultado.rows[0].ok;
+  } catch (erro) {
+    buscaIndexada = false;
+  }
 
-  // Filtro por nome ou telefone (busca)
-  if (filtros.busca) {
-    sql += ` AND (nome ILIKE $${paramIndex} OR telefone ILIKE $${paramIndex})`;
-    params.push(`%${filtros.busca}%`);
-    paramIndex++;
+  return buscaIndexada;
+}
+
+/**
+ * Montar condições de filtro (busca e tag) compartilhadas por listar e contar
+ * @param {boolean} comRelevancia - Montar também a expressão de relevância (ORDER BY)
+ * @returns {Promise<{condicoes: string, relevancia: string|null}>}
+ */
+async function montarFiltros(filtros, params, comRelevancia = false) {
+  let condicoes = '';
+  let relevancia = null;
+
+  const busca = typeof filtros.busca === 'string' ? filtros.busca.trim() : '';
+
+  if (busca && await temBuscaIndexada()) {
+    // Parâmetros só entram quando usados: o Postgres não infere o tipo de um $n ausente do SQL
+    params.push(`%${busca.replace(/[\\%_]/g, '\\$&')}%`);
+    const alternativas = [`nome ILIKE $${params.length}`];
+    const rankings = [];
+
+    if (comRelevancia) {
+      params.push(busca);
+      rankings.push(`similarity(nome, $${params.length})`);
+    }
+
+    // Parte do telefone (apenas dígitos)
+    const digitos = busca.replace(/\D/g, '');
+    if (digitos.length >= 3 && digitos.length >= busca.replace(/[\s()+-]/g, '').length) {
+      params.push(`%${digitos}%`);
+      alternativas.push(`telefone_normalizado LIKE $${params.length}`);
+      if (comRelevancia) {
+        params.push(digitos);
+        rankings.push(`similarity(telefone_normalizado, $${params.length})`);
+      }
+    }
+
+    // Palavras de email/empresa (prefixo na última)
+    const termos = busca.toLowerCase().match(/[\p{L}\p{N}]+/gu) || [];
+    if (termos.length > 0) {
+      params.push(termos.map(t => `${t}:*`).join(' & '));
+      alternativas.push(`${DOCUMENTO_BUSCA} @@ to_tsquery('simple', $${params.length})`);
+      if (comRelevancia) {
+        rankings.push(`ts_rank(${DOCUMENTO_BUSCA}, to_tsquery('simple', $${params.length}))`);
+      }
+    }
+
+    condicoes += ` AND (${alternativas.join(' OR ')})`;
+    relevancia = comRelevancia ? `GREATEST(${rankings.join(', ')})` : null;
+  } else if (busca) {
+    params.push(`%${busca}%`);
+    condicoes += ` AND (nome ILIKE $${params.length} OR telefone ILIKE $${params.length})`;
   }
 
   // Filtro por tags
   if (filtros.tag) {
-    sql += ` AND tags @> $${paramIndex}::jsonb`;
     params.push(JSON.stringify([filtros.tag]));
-    paramIndex++;
+    condicoes += ` AND tags @> $${params.length}::jsonb`;
   }
 
-  // Ordenação
+  return { condicoes, relevancia };
+}
+
+/**
+ * Listar contatos da empresa
+ * Com busca e sem ordenarPor explícito, os resultados vêm por relevância.
+ */
+async function listar(empresaId, filtros = {}) {
   const ordenacaoValida = ['nome', 'criado_em', 'atualizado_em'];
-  const ordem = ordenacaoValida.includes(filtros.ordenarPor) ? filtros.ordenarPor : 'criado_em';
+  const params = [empresaId];
+  const { condicoes, relevancia } = await montarFiltros(filtros, params, !ordenacaoValida.includes(filtros.ordenarPor));
+
+  let sql = `SELECT * FROM contatos WHERE empresa_id = $1${condicoes}`;
+
+  // Ordenação
   const direcao = filtros.direcao === 'asc' ? 'ASC' : 'DESC';
-  sql += ` ORDER BY ${ordem} ${direcao}`;
+  if (relevancia) {
+    sql += ` ORDER BY ${relevancia} DESC, criado_em DESC`;
+  } else {
+    const ordem = ordenacaoValida.includes(filtros.ordenarPor) ? filtros.ordenarPor : 'criado_em';
+    sql += ` ORDER BY ${ordem} ${direcao}`;
+  }
 
   // Paginação
   if (filtros.limite) {
-    sql += ` LIMIT $${paramIndex}`;
     params.push(filtros.limite);
-    paramIndex++;
+    sql += ` LIMIT $${params.length}`;
   }
 
   if (filtros.offset) {
-    sql += ` OFFSET $${paramIndex}`;
     params.push(filtros.offset);
+    sql += ` OFFSET $${params.length}`;
   }
 
   const resultado = await query(sql, params);
@@ -140,23 +307,40 @@ async function listar(empresaId, filtros = {}) {
  * Contar contatos da empresa
  */
 async function contar(empresaId, filtros = {}) {
-  let sql = 'SELECT COUNT(*) FROM contatos WHERE empresa_id = $1';
   const params = [empresaId];
-  let paramIndex = 2;
+  const { condicoes } = await montarFiltros(filtros, params);
 
-  if (filtros.busca) {
-    sql += ` AND (nome ILIKE $${paramIndex} OR telefone ILIKE $${paramIndex})`;
-    params.push(`%${filtros.busca}%`);
-    paramIndex++;
-  }
+  const resultado = await query(`SELECT COUNT(*) FROM contatos WHERE empresa_id = $1${condicoes}`, params);
+  return parseInt(resultado.rows[0].count);
+}
 
-  if (filtros.tag) {
-    sql += ` AND tags @> $${paramIndex}::jsonb`;
-    params.push(JSON.stringify([filtros.tag]));
+/**
+ * Contar contatos usando a estimativa do planejador quando o resultado é grande
+ * @returns {Promise<{total: number, aproximado: boolean}>}
+ */
+async function contarComEstimativa(empresaId, filtros = {}) {
+  const params = [empresaId];
+  const { condicoes } = await montarFiltros(filtros, params);
+  const where = `WHERE empresa_id = $1${condicoes}`;
+
+  const plano = await query(`EXPLAIN (FORMAT JSON) SELECT 1 FROM contatos ${where}`, params);
+  const estimativa = Math.round(plano.rows[0]['QUERY PLAN'][0].Plan['Plan Rows']);
+
+  if (estimativa > CONTAGEM_EXATA_ATE) {
+    return { total: estimativa, aproximado: true };
   }
 
-  const resultado = await query(sql, params);
-  return parseInt(resultado.rows[0].count);
+  // Contagem exata limitada: nunca percorre mais que CONTAGEM_EXATA_ATE + 1 linhas
+  params.push(CONTAGEM_EXATA_ATE + 1);
+  const resultado = await query(
+    `SELECT COUNT(*) FROM (SELECT 1 FROM contatos ${where} LIMIT $${params.length}) t`,
+    params
+  );
+  const total = parseInt(resultado.rows[0].count);
+
+  return total > CONTAGEM_EXATA_ATE
+    ? { total: estimativa > total ? estimativa : total, aproximado: true }
+    : { total, aproximado: false };
 }
 
 /**
@@ -195,6 +379,13 @@ async function atualizar(id, empresaId, dados) {
     }
   }
 
+  // Manter a chave de busca em sincronia com o telefone
+  if (dados.telefone !== undefined) {
+    camposAtualizar.push(`telefone_normalizado = $${paramIndex}`);
+    valores.push(normalizarTelefone(dados.telefone));
+    paramIndex++;
+  }
+
   if (camposAtualizar.length === 0) {
     throw new Error('Nenhum campo para atualizar');
   }
@@ -209,8 +400,12 @@ async function atualizar(id, empresaId, dados) {
     RETURNING *
   `;
 
-  const resultado = await query(sql, valores);
-  return resultado.rows[0];
+  try {
+    const resultado = await query(sql, valores);
+    return resultado.rows[0];
+  } catch (erro) {
+    throw await traduzirTelefoneDuplicado(erro, dados.telefone, empresaId);
+  }
 }
 
 /**
@@ -294,8 +489,13 @@ async function criarOuAtualizar(dados) {
     return contatoExistente;
   }
 
-  // Criar novo
-  return await criar(dados);
+  // Criar novo (se outro processo criou no meio tempo, usar o existente)
+  try {
+    return await criar(dados);
+  } catch (erro) {
+    if (erro.code === 'CONTATO_DUPLICADO' && erro.contato) return erro.contato;
+    throw erro;
+  }
 }
 
 /**
@@ -315,6 +515,30 @@ async function registrarInteracao(id, empresaId, tipo = 'mensagem') {
   return resultado.rows[0];
 }
 
+/**
+ * Registrar interações de vários contatos em uma única consulta
+ * @param {Array<{id: string, total: number}>} interacoes
+ */
+async function registrarInteracoesEmLote(empresaId, interacoes, tipo = 'mensagem') {
+  if (!interacoes || interacoes.length === 0) return;
+
+  const sql = `
+    UPDATE contatos c
+    SET ultima_interacao_em = NOW(),
+        tipo_ultima_interacao = $1,
+        total_interacoes = c.total_interacoes + v.total
+    FROM unnest($2::uuid[], $3::int[]) AS v(id, total)
+    WHERE c.id = v.id AND c.empresa_id = $4
+  `;
+
+  await query(sql, [
+    tipo,
+    interacoes.map(i => i.id),
+    interacoes.map(i => i.total),
+    empresaId
+  ]);
+}
+
 /**
  * Buscar tags disponíveis
  */
@@ -353,40 +577,185 @@ async function exportar(empresaId, filtros = {}) {
   }));
 }
 
+// ========== IMPORTAÇÃO EM MASSA ==========
+
+// Linhas por comando: os valores vão como arrays (unnest), então o limite é memória, não $n
+const LOTE_IMPORTACAO = parseInt(process.env.CONTATOS_IMPORTACAO_LOTE, 10) || 5000;
+
+// Tamanhos das colunas de contatos: um valor maior derrubaria o lote inteiro
+const LIMITES_IMPORTACAO = { telefone: 50, nome: 200, email: 255, empresa: 255, cargo: 255 };
+
+const textoOuNulo = (valor) => (valor === undefined || valor === null ? null : String(valor).trim() || null);
+
 /**
- * Importar contatos em lote
+ * Validar e normalizar as linhas de um lote, removendo telefones repetidos no próprio lote
+ * (prevalece a última ocorrência, como aconteceria importando linha a linha)
+ * @param {number} inicio - Posição do lote na lista completa (para numerar as linhas)
  */
-async function importarLote(empresaId, contatos) {
-  if (!contatos || contatos.length === 0) {
-    return [];
+function prepararImportacao(contatos, inicio = 0) {
+  const linhas = new Map();
+  const erros = [];
+
+  contatos.forEach((dados, i) => {
+    const linha = inicio + i + 1;
+    const telefone = textoOuNulo(dados && dados.telefone);
+
+    if (!telefone) {
+      erros.push({ linha, telefone: null, erro: 'Telefone é obrigatório' });
+      return;
+    }
+
+    const contato = {
+      linha,
+      telefone,
+      normalizado: normalizarTelefone(telefone),
+      nome: textoOuNulo(dados.nome),
+      email: textoOuNulo(dados.email),
+      empresa: textoOuNulo(dados.empresa),
+      cargo: textoOuNulo(dados.cargo),
+      tags: Array.isArray(dados.tags) ? dados.tags : [],
+      campos_customizados: dados.campos_customizados && typeof dados.campos_customizados === 'object' ? dados.campos_customizados : {},
+      observacoes: textoOuNulo(dados.observacoes)
+    };
+
+    const excedido = Object.keys(LIMITES_IMPORTACAO).find(campo => contato[campo] && contato[campo].length > LIMITES_IMPORTACAO[campo]);
+    if (excedido) {
+      erros.push({ linha, telefone, erro: `Campo ${excedido} excede ${LIMITES_IMPORTACAO[excedido]} caracteres` });
+      return;
+    }
+
+    const chave = contato.normalizado || telefone;
+    const anterior = linhas.get(chave);
+    if (anterior) {
+      erros.push({ linha: anterior.linha, telefone: anterior.telefone, erro: `Telefone repetido na importação (substituído pela linha ${linha})` });
+      linhas.delete(chave);
+    }
+    linhas.set(chave, contato);
+  });
+
+  return { linhas: [...linhas.values()], erros };
+}
+
+/**
+ * Importar um lote de contatos com um único comando
+ *
+ * Os valores entram como arrays (unnest); contatos existentes (mesmo telefone normalizado
+ * ou mesmo telefone literal) recebem nome/email/empresa/cargo não vazios, os demais são
+ * inseridos. Mesma regra de criarOuAtualizar, sem uma ida ao banco por linha.
+ * @returns {Promise<{criados: number, atualizados: number, inalterados: number, erros: Array}>}
+ */
+async function importarEmMassa(empresaId, contatos, inicio = 0) {
+  const { linhas, erros } = prepararImportacao(contatos, inicio);
+  const resultado = { criados: 0, atualizados: 0, inalterados: 0, erros };
+
+  if (linhas.length === 0) return resultado;
+
+  const sql = `
+    WITH entrada AS (
+      SELECT *
+      FROM unnest(
+        $2::int[], $3::varchar[], $4::varchar[], $5::varchar[], $6::varchar[],
+        $7::varchar[], $8::varchar[], $9::jsonb[], $10::jsonb[], $11::text[]
+      ) AS e(linha, telefone, telefone_normalizado, nome, email, empresa, cargo, tags, campos_customizados, observacoes)
+    ),
+    existentes AS (
+      SELECT DISTINCT ON (e.linha) e.linha, c.id
+      FROM entrada e
+      JOIN contatos c
+        ON c.empresa_id = $1
+       AND (c.telefone_normalizado = e.telefone_normalizado OR c.telefone = e.telefone)
+      ORDER BY e.linha, (c.telefone_normalizado = e.telefone_normalizado) DESC NULLS LAST, c.criado_em
+    ),
+    atualizados AS (
+      UPDATE contatos c
+      SET nome = COALESCE(e.nome, c.nome),
+          email = COALESCE(e.email, c.email),
+          empresa = COALESCE(e.empresa, c.empresa),
+          cargo = COALESCE(e.cargo, c.cargo)
+      FROM existentes x
+      JOIN entrada e ON e.linha = x.linha
+      WHERE c.id = x.id
+        AND (
+          c.nome IS DISTINCT FROM COALESCE(e.nome, c.nome)
+          OR c.email IS DISTINCT FROM COALESCE(e.email, c.email)
+          OR c.empresa IS DISTINCT FROM COALESCE(e.empresa, c.empresa)
+          OR c.cargo IS DISTINCT FROM COALESCE(e.cargo, c.cargo)
+        )
+      RETURNING c.id
+    ),
+    inseridos AS (
+      INSERT INTO contatos (
+        empresa_id, telefone, telefone_normalizado, nome, email, empresa, cargo, tags, campos_customizados, observacoes
+      )
+      SELECT $1, e.telefone, e.telefone_normalizado, e.nome, e.email, e.empresa, e.cargo, e.tags, e.campos_customizados, e.observacoes
+      FROM entrada e
+      WHERE NOT EXISTS (SELECT 1 FROM existentes x WHERE x.linha = e.linha)
+      ON CONFLICT DO NOTHING
+      RETURNING telefone
+    )
+    SELECT
+      COALESCE((SELECT array_agg(linha) FROM existentes), '{}') AS existentes,
+      (SELECT COUNT(*) FROM atualizados)::int AS atualizados,
+      COALESCE((SELECT array_agg(telefone) FROM inseridos), '{}') AS inseridos
+  `;
+
+  const { rows } = await query(sql, [
+    empresaId,
+    linhas.map(c => c.linha),
+    linhas.map(c => c.telefone),
+    linhas.map(c => c.normalizado),
+    linhas.map(c => c.nome),
+    linhas.map(c => c.email),
+    linhas.map(c => c.empresa),
+    linhas.map(c => c.cargo),
+    linhas.map(c => JSON.stringify(c.tags)),
+    linhas.map(c => JSON.stringify(c.campos_customizados)),
+    linhas.map(c => c.observacoes)
+  ]);
+
+  const { existentes, atualizados, inseridos } = rows[0];
+  resultado.criados = inseridos.length;
+  resultado.atualizados = atualizados;
+  resultado.inalterados = existentes.length - atualizados;
+
+  // Linhas que não existiam e não entraram: outro processo criou o mesmo telefone no meio do lote
+  if (resultado.criados + existentes.length < linhas.length) {
+    const processadas = new Set(existentes);
+    const criados = new Set(inseridos);
+    linhas
+      .filter(c => !processadas.has(c.linha) && !criados.has(c.telefone))
+      .forEach(c => erros.push({ linha: c.linha, telefone: c.telefone, erro: 'Contato criado por outra operação durante a importação' }));
   }
 
-  const contatosImportados = [];
+  return resultado;
+}
+
+/**
+ * Importar contatos em lote (LOTE_IMPORTACAO linhas por comando)
+ * @param {Function} [aoProgredir] - Chamada após cada lote com (processados, total)
+ */
+async function importarLote(empresaId, contatos, aoProgredir = null) {
+  const totais = { total_criados: 0, total_atualizados: 0, total_inalterados: 0 };
   const erros = [];
 
-  for (const contatoData of contatos) {
-    try {
-      // Validar telefone (campo obrigatório)
-      if (!contatoData.telefone) {
-        erros.push({ dados: contatoData, erro: 'Telefone é obrigatório' });
-        continue;
-      }
+  for (let inicio = 0; inicio < (contatos || []).length; inicio += LOTE_IMPORTACAO) {
+    const lote = await importarEmMassa(empresaId, contatos.slice(inicio, inicio + LOTE_IMPORTACAO), inicio);
 
-      // Criar ou atualizar
-      const contato = await criarOuAtualizar({
-        empresaId,
-        ...contatoData
-      });
+    totais.total_criados += lote.criados;
+    totais.total_atualizados += lote.atualizados;
+    totais.total_inalterados += lote.inalterados;
+    erros.push(...lote.erros);
 
-      contatosImportados.push(contato);
-    } catch (erro) {
-      erros.push({ dados: contatoData, erro: erro.message });
+    if (aoProgredir) {
+      await aoProgredir(Math.min(inicio + LOTE_IMPORTACAO, contatos.length), contatos.length);
     }
   }
 
+  erros.sort((a, b) => a.linha - b.linha);
+
   return {
-    importados: contatosImportados,
-    total_importados: contatosImportados.length,
+    total_importados: totais.total_criados + totais.total_atualizados + totais.total_inalterados,
+    ...totais,
     total_erros: erros.length,
     erros
   };
@@ -394,18 +763,23 @@ async function importarLote(empresaId, contatos) {
 
 module.exports = {
   criar,
+  criarEmLote,
   buscarPorId,
   buscarPorTelefone,
+  buscarPorTelefones,
   buscarPorEmail,
   listar,
   contar,
+  contarComEstimativa,
   atualizar,
   deletar,
   adicionarTag,
   removerTag,
   criarOuAtualizar,
   registrarInteracao,
+  registrarInteracoesEmLote,
   listarTags,
   exportar,
+  importarEmMassa,
   importarLote
 };
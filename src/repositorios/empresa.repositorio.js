@@ -1,4 +1,8 @@
 const { query } = require('../config/database');
+const tieredCache = require('../services/tieredCache');
+
+// Lido em toda requisição autenticada e na verificação de créditos
+const empresasCache = tieredCache.create('empresa', { l1TtlMs: 15000, l2TtlSeconds: 120 });
 
 const empresaRepositorio = {
   /**
@@ -32,9 +36,18 @@ const empresaRepositorio = {
   },
 
   /**
-   * Buscar por ID
+   * Buscar por ID (cache L1/L2, invalidado em toda escrita)
    */
   async buscarPorId(id) {
+    if (!id) return undefined;
+    const empresa = await empresasCache.wrap(id, () => this.buscarPorIdSemCache(id));
+    return empresa || undefined;
+  },
+
+  /**
+   * Buscar por ID direto no banco (saldo atualizado para débito/crédito)
+   */
+  async buscarPorIdSemCache(id) {
     const sql = `
       SELECT e.*, p.nome as plano_nome, p.creditos_mensais
       FROM empresas e
@@ -148,6 +161,7 @@ const empresaRepositorio = {
     `;
 
     const resultado = await query(sql, valores);
+    await empresasCache.invalidate(id);
     return resultado.rows[0];
   },
 
@@ -157,6 +171,7 @@ const empresaRepositorio = {
   async deletar(id) {
     const sql = 'DELETE FROM empresas WHERE id = $1 RETURNING id';
     const resultado = await query(sql, [id]);
+    await empresasCache.invalidate(id);
     return resultado.rowCount > 0;
   },
 
@@ -168,7 +183,7 @@ const empresaRepositorio = {
 
     try {
       // Buscar saldo atual
-      const empresaAtual = await this.buscarPorId(id);
+      const empresaAtual = await this.buscarPorIdSemCache(id);
       const novoSaldo = empresaAtual.saldo_creditos + quantidade;
 
       // Atualizar saldo
@@ -181,6 +196,7 @@ const empresaRepositorio = {
       `, [id, tipo, quantidade, novoSaldo, descricao]);
 
       await query('COMMIT');
+      await empresasCache.invalidate(id);
 
       return novoSaldo;
     } catch (erro) {
@@ -197,7 +213,7 @@ const empresaRepositorio = {
 
     try {
       // Buscar saldo atual
-      const empresaAtual = await this.buscarPorId(id);
+      const empresaAtual = await this.buscarPorIdSemCache(id);
 
       if (empresaAtual.saldo_creditos < quantidade) {
         throw new Error('Créditos insuficientes');
@@ -223,6 +239,7 @@ const empresaRepositorio = {
       `, [id, -quantidade, novoSaldo, descricao, tipoReferencia, idReferencia]);
 
       await query('COMMIT');
+      await empresasCache.invalidate(id);
 
       return novoSaldo;
     } catch (erro) {
@@ -237,6 +254,17 @@ const empresaRepositorio = {
   async resetarCreditosMensais(id) {
     const sql = 'UPDATE empresas SET creditos_usados_mes = 0 WHERE id = $1';
     await query(sql, [id]);
+    await empresasCache.invalidate(id);
+  },
+
+  /**
+   * Descartar todas as empresas em cache
+   *
+   * plano_nome e creditos_mensais vêm do JOIN com planos: qualquer escrita em
+   * planos precisa chamar isto.
+   */
+  async limparCache() {
+    await empresasCache.clear();
   },
 
   /**
@@ -1,4 +1,4 @@
-const { query } = require('../config/database');
+const { query, transacao } = require('../config/database');
 
 /**
  * Repositório de Follow-up Inteligente
@@ -571,6 +571,155 @@ async function buscarInscricoesProntasParaExecutar() {
   return resultado.rows;
 }
 
+/**
+ * Reivindicar inscrições prontas para o executor
+ *
+ * As linhas são travadas com SKIP LOCKED (réplicas concorrentes pegam linhas
+ * diferentes) e recebem um lease em bloqueado_ate: enquanto ele vale, nenhuma
+ * outra réplica reivindica a inscrição. Se o processo cair, o lease expira e a
+ * inscrição volta para a fila sozinha.
+ *
+ * Os limites por empresa e por instância são aplicados na própria consulta
+ * (ROW_NUMBER por empresa/instância, descontando os leases ativos de todas as
+ * réplicas), então todas as inscrições devolvidas podem ser executadas na hora.
+ * As reivindicações são serializadas por um advisory lock: a contagem de cada
+ * réplica já enxerga os leases gravados pelas outras.
+ * O campo `lease` identifica o lease (ver renovarLease/liberarInscricao).
+ * @param {number} limite - Máximo de inscrições
+ * @param {number} leaseMs - Duração do lease
+ * @param {Object} [limites]
+ * @param {number} [limites.porEmpresa] - Máximo simultâneo por empresa
+ * @param {number} [limites.porInstancia] - Máximo simultâneo por instância
+ */
+async function reivindicarInscricoesProntas(limite, leaseMs, limites = {}) {
+  const sql = `
+    WITH em_uso_empresa AS (
+      SELECT empresa_id AS id, COUNT(*) AS em_uso
+      FROM inscricoes_followup
+      WHERE bloqueado_ate >= NOW()
+      GROUP BY empresa_id
+    ),
+    em_uso_instancia AS (
+      SELECT s.instancia_id AS id, COUNT(*) AS em_uso
+      FROM inscricoes_followup i
+      JOIN sequencias_followup s ON s.id = i.sequencia_id
+      WHERE i.bloqueado_ate >= NOW()
+      GROUP BY s.instancia_id
+    ),
+    candidatas AS (
+      SELECT
+        i.id,
+        i.proxima_execucao,
+        s.instancia_id,
+        ROW_NUMBER() OVER (PARTITION BY i.empresa_id ORDER BY i.proxima_execucao) + COALESCE(e.em_uso, 0) AS posicao_empresa,
+        ROW_NUMBER() OVER (PARTITION BY s.instancia_id ORDER BY i.proxima_execucao) + COALESCE(n.em_uso, 0) AS posicao_instancia
+      FROM inscricoes_followup i
+      JOIN sequencias_followup s ON s.id = i.sequencia_id
+      LEFT JOIN em_uso_empresa e ON e.id = i.empresa_id
+      LEFT JOIN em_uso_instancia n ON n.id = s.instancia_id
+      WHERE i.status = 'ativa'
+      AND i.proxima_execucao <= NOW()
+      AND (i.bloqueado_ate IS NULL OR i.bloqueado_ate < NOW())
+      AND s.ativo = true
+    ),
+    prontas AS (
+      SELECT i.id
+      FROM inscricoes_followup i
+      JOIN candidatas c ON c.id = i.id
+      WHERE ($3::int IS NULL OR c.posicao_empresa <= $3)
+      AND ($4::int IS NULL OR c.instancia_id IS NULL OR c.posicao_instancia <= $4)
+      -- Reavaliado após o lock: outra réplica pode ter reivindicado no meio tempo
+      AND (i.bloqueado_ate IS NULL OR i.bloqueado_ate < NOW())
+      ORDER BY c.proxima_execucao ASC
+      LIMIT $1
+      FOR UPDATE OF i SKIP LOCKED
+    )
+    UPDATE inscricoes_followup i
+    SET bloqueado_ate = NOW() + make_interval(secs => $2::double precision / 1000)
+    FROM prontas p, sequencias_followup s
+    WHERE i.id = p.id AND s.id = i.sequencia_id
+    RETURNING i.id, i.empresa_id, i.proxima_execucao, s.instancia_id, i.bloqueado_ate::text AS lease
+  `;
+
+  return transacao(async () => {
+    // A consulta seguinte só começa (e tira seu snapshot) depois do COMMIT da réplica anterior
+    await query("SELECT pg_advisory_xact_lock(hashtext('followup:reivindicar'))");
+
+    const resultado = await query(sql, [
+      limite,
+      leaseMs,
+      limites.porEmpresa || null,
+      limites.porInstancia || null
+    ]);
+    return resultado.rows;
+  });
+}
+
+/**
+ * Confirmar e renovar o lease antes de executar a etapa
+ * @returns {Promise<string|null>} Novo lease, ou null se ele expirou e outra réplica reivindicou
+ */
+async function renovarLease(id, lease, leaseMs) {
+  const resultado = await query(`
+    UPDATE inscricoes_followup
+    SET bloqueado_ate = NOW() + make_interval(secs => $3::double precision / 1000)
+    WHERE id = $1 AND bloqueado_ate::text = $2
+    RETURNING bloqueado_ate::text AS lease
+  `, [id, lease, leaseMs]);
+
+  return resultado.rows[0]?.lease || null;
+}
+
+/**
+ * Liberar o lease de uma inscrição (após executar a etapa com sucesso)
+ * @param {string} [lease] - Só libera se o lease ainda for este
+ */
+async function liberarInscricao(id, lease = null) {
+  await query(
+    'UPDATE inscricoes_followup SET bloqueado_ate = NULL WHERE id = $1 AND ($2::text IS NULL OR bloqueado_ate::text = $2)',
+    [id, lease]
+  );
+}
+
+/**
+ * Adiar uma inscrição cuja etapa falhou e liberar o lease
+ *
+ * O lease só representa etapas em execução (os limites de concorrência contam
+ * leases ativos); o intervalo até a nova tentativa fica em proxima_execucao.
+ * @param {string} lease - Só adia se o lease ainda for este
+ */
+async function adiarInscricao(id, lease, atrasoMs) {
+  await query(`
+    UPDATE inscricoes_followup
+    SET proxima_execucao = NOW() + make_interval(secs => $3::double precision / 1000),
+        bloqueado_ate = NULL
+    WHERE id = $1 AND bloqueado_ate::text = $2
+  `, [id, lease, atrasoMs]);
+}
+
+/**
+ * Backlog e atraso da fila de follow-ups
+ * @param {string} [empresaId] - Restringir a uma empresa
+ * @returns {Promise<{pendentes: number, em_execucao: number, atraso_segundos: number}>}
+ */
+async function obterMetricasFila(empresaId = null) {
+  const sql = `
+    SELECT
+      COUNT(*) FILTER (WHERE i.bloqueado_ate IS NULL OR i.bloqueado_ate < NOW())::int AS pendentes,
+      COUNT(*) FILTER (WHERE i.bloqueado_ate >= NOW())::int AS em_execucao,
+      COALESCE(EXTRACT(EPOCH FROM NOW() - MIN(i.proxima_execucao)), 0)::int AS atraso_segundos
+    FROM inscricoes_followup i
+    JOIN sequencias_followup s ON s.id = i.sequencia_id
+    WHERE i.status = 'ativa'
+    AND i.proxima_execucao <= NOW()
+    AND s.ativo = true
+    AND ($1::uuid IS NULL OR i.empresa_id = $1)
+  `;
+
+  const resultado = await query(sql, [empresaId]);
+  return resultado.rows[0];
+}
+
 // =====================================================
 // EXECUÇÕES
 // =====================================================
@@ -647,6 +796,11 @@ module.exports = {
   atualizarStatusInscricao,
   deletarInscricao,
   buscarInscricoesProntasParaExecutar,
+  reivindicarInscricoesProntas,
+  renovarLease,
+  liberarInscricao,
+  adiarInscricao,
+  obterMetricasFila,
 
   // Execuções
   criarExecucao,
@@ -253,6 +253,73 @@ async function criarLog(dados) {
   return resultado.rows[0];
 }
 
+/**
+ * Registrar vários logs de saída em um único INSERT (disparo para várias integrações)
+ * Os contadores de sucesso/erro são atualizados na mesma instrução.
+ * @returns {Promise<number>} Quantidade de logs gravados
+ */
+async function criarLogsEmLote(logs) {
+  if (!logs || logs.length === 0) return 0;
+
+  const json = (valor) => (valor ? JSON.stringify(valor) : null);
+
+  const sql = `
+    WITH novos AS (
+      INSERT INTO logs_integracao (
+        integracao_id,
+        empresa_id,
+        tipo_evento,
+        direcao,
+        url,
+        metodo,
+        payload_enviado,
+        payload_recebido,
+        codigo_http,
+        status,
+        duracao_ms,
+        mensagem_erro
+      )
+      SELECT * FROM unnest(
+        $1::uuid[], $2::uuid[], $3::varchar[], $4::varchar[], $5::varchar[], $6::varchar[],
+        $7::jsonb[], $8::jsonb[], $9::int[], $10::varchar[], $11::int[], $12::text[]
+      )
+      RETURNING integracao_id, status
+    ),
+    contagem AS (
+      UPDATE integracoes i
+      SET requisicoes_sucesso = i.requisicoes_sucesso + c.sucessos,
+          requisicoes_erro = i.requisicoes_erro + c.erros,
+          ultimo_uso_em = NOW()
+      FROM (
+        SELECT integracao_id,
+               COUNT(*) FILTER (WHERE status = 'sucesso') AS sucessos,
+               COUNT(*) FILTER (WHERE status <> 'sucesso') AS erros
+        FROM novos
+        GROUP BY integracao_id
+      ) c
+      WHERE i.id = c.integracao_id
+    )
+    SELECT COUNT(*)::int AS total FROM novos
+  `;
+
+  const resultado = await query(sql, [
+    logs.map(l => l.integracaoId),
+    logs.map(l => l.empresaId),
+    logs.map(l => l.tipoEvento),
+    logs.map(l => l.direcao),
+    logs.map(l => l.url),
+    logs.map(l => l.metodo),
+    logs.map(l => json(l.payloadEnviado)),
+    logs.map(l => json(l.payloadRecebido)),
+    logs.map(l => l.codigoHttp ?? null),
+    logs.map(l => l.status),
+    logs.map(l => l.duracaoMs ?? null),
+    logs.map(l => l.mensagemErro ?? null)
+  ]);
+
+  return resultado.rows[0].total;
+}
+
 /**
  * Listar logs da integração
  */
@@ -363,6 +430,7 @@ module.exports = {
 
   // Logs
   criarLog,
+  criarLogsEmLote,
   listarLogs,
   buscarLogPorId,
   limparLogsAntigos,
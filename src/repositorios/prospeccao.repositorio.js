@@ -264,36 +264,19 @@ async function criarLead(dados) {
   return resultado.rows[0];
 }
 
+// Linhas por INSERT em criarLeadsEmLote (valores vão como arrays: sem limite de 65.535 parâmetros)
+const LOTE_LEADS = parseInt(process.env.PROSPECCAO_LOTE_LEADS, 10) || 5000;
+
 /**
  * Criar leads em lote
+ * Cada INSERT recebe os valores como arrays (unnest), então o número de parâmetros
+ * é fixo (6) independente da quantidade de leads.
  */
 async function criarLeadsEmLote(leads) {
   if (!leads || leads.length === 0) {
     return [];
   }
 
-  // Construir query com múltiplos VALUES
-  const valoresPlaceholders = [];
-  const valores = [];
-  let paramIndex = 1;
-
-  for (const lead of leads) {
-    valoresPlaceholders.push(
-      `($${paramIndex}, $${paramIndex + 1}, $${paramIndex + 2}, $${paramIndex + 3}, $${paramIndex + 4}, $${paramIndex + 5}::jsonb)`
-    );
-
-    valores.push(
-      lead.campanhaId || null,
-      lead.empresaId,
-      lead.nome,
-      lead.telefone,
-      lead.origem || 'gmaps_scraper',
-      JSON.stringify(lead.metadados || {})
-    );
-
-    paramIndex += 6;
-  }
-
   const sql = `
     INSERT INTO leads_prospeccao (
       campanha_id,
@@ -302,12 +285,30 @@ async function criarLeadsEmLote(leads) {
       telefone,
       origem,
       metadados
-    ) VALUES ${valoresPlaceholders.join(', ')}
+    )
+    SELECT *
+    FROM unnest($1::uuid[], $2::uuid[], $3::varchar[], $4::varchar[], $5::varchar[], $6::jsonb[])
     RETURNING *
   `;
 
-  const resultado = await query(sql, valores);
-  return resultado.rows;
+  const criados = [];
+
+  for (let inicio = 0; inicio < leads.length; inicio += LOTE_LEADS) {
+    const lote = leads.slice(inicio, inicio + LOTE_LEADS);
+
+    const resultado = await query(sql, [
+      lote.map(lead => lead.campanhaId || null),
+      lote.map(lead => lead.empresaId),
+      lote.map(lead => lead.nome),
+      lote.map(lead => lead.telefone),
+      lote.map(lead => lead.origem || 'gmaps_scraper'),
+      lote.map(lead => JSON.stringify(lead.metadados || {}))
+    ]);
+
+    criados.push(...resultado.rows);
+  }
+
+  return criados;
 }
 
 /**
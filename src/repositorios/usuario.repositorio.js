@@ -1,4 +1,5 @@
 const { query } = require('../config/database');
+const { invalidarPrincipais } = require('../utilitarios/cache-autenticacao');
 
 const usuarioRepositorio = {
   /**
@@ -40,6 +41,15 @@ const usuarioRepositorio = {
     return resultado.rows[0];
   },
 
+  /**
+   * Buscar por token pessoal de API
+   */
+  async buscarPorApiToken(token) {
+    const sql = 'SELECT * FROM usuarios WHERE api_token = $1';
+    const resultado = await query(sql, [token]);
+    return resultado.rows[0];
+  },
+
   /**
    * Buscar por email
    */
@@ -186,6 +196,10 @@ const usuarioRepositorio = {
     `;
 
     const resultado = await query(sql, valores);
+
+    // Desativação, troca de api_token, função etc. precisam valer na próxima requisição
+    await invalidarPrincipais();
+
     return resultado.rows[0];
   },
 
@@ -195,6 +209,7 @@ const usuarioRepositorio = {
   async deletar(id) {
     const sql = 'DELETE FROM usuarios WHERE id = $1 RETURNING id';
     const resultado = await query(sql, [id]);
+    await invalidarPrincipais();
     return resultado.rowCount > 0;
   },
 
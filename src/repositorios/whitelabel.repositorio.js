@@ -1,4 +1,17 @@
 const { query } = require('../config/database');
+const { redis } = require('../config/redis');
+
+// O mapa domínio -> empresa (whitelabel.servico) é reconstruído em todas as
+// réplicas quando uma escrita publica neste canal
+const CANAL_ALTERACOES = 'whitelabel:alterado';
+
+async function notificarAlteracao() {
+  try {
+    await redis.publish(CANAL_ALTERACOES, String(Date.now()));
+  } catch (erro) {
+    console.error('[White Label] Erro ao notificar alteração:', erro.message);
+  }
+}
 
 // ==================== CONFIGURAÇÕES ====================
 
@@ -103,6 +116,8 @@ async function salvarConfig(empresaId, dados) {
     mostrarPoweredBy, permitirCadastroPublico, ativo
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0];
 }
 
@@ -139,6 +154,15 @@ async function buscarDominioPorNome(dominio) {
   return resultado.rows[0] || null;
 }
 
+/**
+ * Listar domínios ativos e verificados (mapa de domínios)
+ */
+async function listarDominiosAtivos() {
+  const sql = 'SELECT * FROM whitelabel_dominios WHERE ativo = true AND verificado = true';
+  const resultado = await query(sql);
+  return resultado.rows;
+}
+
 /**
  * Buscar domínio principal de uma empresa
  */
@@ -176,6 +200,8 @@ async function criarDominio(dados) {
     principal || false
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0];
 }
 
@@ -210,6 +236,8 @@ async function atualizarDominio(id, empresaId, dados) {
     ativo, principal
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0] || null;
 }
 
@@ -219,6 +247,7 @@ async function atualizarDominio(id, empresaId, dados) {
 async function deletarDominio(id, empresaId) {
   const sql = 'DELETE FROM whitelabel_dominios WHERE id = $1 AND empresa_id = $2';
   await query(sql, [id, empresaId]);
+  await notificarAlteracao();
 }
 
 // ==================== PÁGINAS ====================
@@ -284,6 +313,8 @@ async function criarPagina(dados) {
     publicada || false, mostrarMenu || true, ordemMenu || 0, template || 'padrao'
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0];
 }
 
@@ -322,6 +353,8 @@ async function atualizarPagina(id, empresaId, dados) {
     publicada, mostrarMenu, ordemMenu, template
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0] || null;
 }
 
@@ -331,6 +364,7 @@ async function atualizarPagina(id, empresaId, dados) {
 async function deletarPagina(id, empresaId) {
   const sql = 'DELETE FROM whitelabel_paginas WHERE id = $1 AND empresa_id = $2';
   await query(sql, [id, empresaId]);
+  await notificarAlteracao();
 }
 
 // ==================== SCRIPTS ====================
@@ -375,6 +409,8 @@ async function criarScript(dados) {
     posicao || 'head', ativo !== false, ordem || 0
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0];
 }
 
@@ -401,6 +437,8 @@ async function atualizarScript(id, empresaId, dados) {
     id, empresaId, nome, descricao, script, posicao, ativo, ordem
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0] || null;
 }
 
@@ -410,6 +448,7 @@ async function atualizarScript(id, empresaId, dados) {
 async function deletarScript(id, empresaId) {
   const sql = 'DELETE FROM whitelabel_scripts WHERE id = $1 AND empresa_id = $2';
   await query(sql, [id, empresaId]);
+  await notificarAlteracao();
 }
 
 // ==================== REDIRECIONAMENTOS ====================
@@ -427,6 +466,19 @@ async function listarRedirecionamentos(empresaId) {
   return resultado.rows;
 }
 
+/**
+ * Listar redirecionamentos ativos de várias empresas (mapa de domínios)
+ */
+async function listarRedirecionamentosAtivos(empresaIds) {
+  const sql = `
+    SELECT id, empresa_id, origem, destino, tipo
+    FROM whitelabel_redirecionamentos
+    WHERE ativo = true AND empresa_id = ANY($1)
+  `;
+  const resultado = await query(sql, [empresaIds]);
+  return resultado.rows;
+}
+
 /**
  * Buscar redirecionamento por origem
  */
@@ -456,6 +508,8 @@ async function criarRedirecionamento(dados) {
     empresaId, origem, destino, tipo || 301, ativo !== false
   ]);
 
+  await notificarAlteracao();
+
   return resultado.rows[0];
 }
 
@@ -479,6 +533,7 @@ async function registrarAcessoRedirecionamento(id, empresaId) {
 async function deletarRedirecionamento(id, empresaId) {
   const sql = 'DELETE FROM whitelabel_redirecionamentos WHERE id = $1 AND empresa_id = $2';
   await query(sql, [id, empresaId]);
+  await notificarAlteracao();
 }
 
 // ==================== VERIFICAÇÕES DNS ====================
@@ -588,6 +643,8 @@ async function listarCertificadosDominio(dominioId, empresaId) {
 }
 
 module.exports = {
+  CANAL_ALTERACOES,
+
   // Configurações
   buscarConfig,
   salvarConfig,
@@ -596,6 +653,7 @@ module.exports = {
   listarDominios,
   buscarDominioPorId,
   buscarDominioPorNome,
+  listarDominiosAtivos,
   buscarDominioPrincipal,
   criarDominio,
   atualizarDominio,
@@ -618,6 +676,7 @@ module.exports = {
 
   // Redirecionamentos
   listarRedirecionamentos,
+  listarRedirecionamentosAtivos,
   buscarRedirecionamentoPorOrigem,
   criarRedirecionamento,
   registrarAcessoRedirecionamento,
@@ -13,7 +13,7 @@ const {
 // Criar campanha
 router.post('/create', async (req, res) => {
   try {
-    const result = createCampaign(req.body);
+    const result = await createCampaign(req.body);
     res.json(result);
   } catch (error) {
     res.status(400).json({ error: error.message });
@@ -21,10 +21,10 @@ router.post('/create', async (req, res) => {
 });
 
 // Iniciar campanha
-router.post('/start/:campaignId', (req, res) => {
+router.post('/start/:campaignId', async (req, res) => {
   try {
     const { campaignId } = req.params;
-    const result = startCampaign(campaignId);
+    const result = await startCampaign(campaignId);
     res.json(result);
   } catch (error) {
     res.status(400).json({ error: error.message });
@@ -32,10 +32,10 @@ router.post('/start/:campaignId', (req, res) => {
 });
 
 // Pausar campanha
-router.post('/pause/:campaignId', (req, res) => {
+router.post('/pause/:campaignId', async (req, res) => {
   try {
     const { campaignId } = req.params;
-    const result = pauseCampaign(campaignId);
+    const result = await pauseCampaign(campaignId);
     res.json(result);
   } catch (error) {
     res.status(400).json({ error: error.message });
@@ -43,10 +43,10 @@ router.post('/pause/:campaignId', (req, res) => {
 });
 
 // Retomar campanha
-router.post('/resume/:campaignId', (req, res) => {
+router.post('/resume/:campaignId', async (req, res) => {
   try {
     const { campaignId } = req.params;
-    const result = resumeCampaign(campaignId);
+    const result = await resumeCampaign(campaignId);
     res.json(result);
   } catch (error) {
     res.status(400).json({ error: error.message });
@@ -54,10 +54,10 @@ router.post('/resume/:campaignId', (req, res) => {
 });
 
 // Cancelar campanha
-router.delete('/cancel/:campaignId', (req, res) => {
+router.delete('/cancel/:campaignId', async (req, res) => {
   try {
     const { campaignId } = req.params;
-    const result = cancelCampaign(campaignId);
+    const result = await cancelCampaign(campaignId);
     res.json(result);
   } catch (error) {
     res.status(400).json({ error: error.message });
@@ -65,10 +65,10 @@ router.delete('/cancel/:campaignId', (req, res) => {
 });
 
 // Obter status de campanha
-router.get('/status/:campaignId', (req, res) => {
+router.get('/status/:campaignId', async (req, res) => {
   try {
     const { campaignId } = req.params;
-    const campaign = getCampaign(campaignId);
+    const campaign = await getCampaign(campaignId);
     res.json({
       success: true,
       campaign
@@ -79,11 +79,11 @@ router.get('/status/:campaignId', (req, res) => {
 });
 
 // Listar campanhas
-router.get('/list/:instanceName', (req, res) => {
+router.get('/list/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
     const { status } = req.query;
-    const campaigns = listCampaigns(instanceName, status);
+    const campaigns = await listCampaigns(instanceName, status);
 
     res.json({
       success: true,
@@ -14,7 +14,9 @@ router.use(garantirMultiTenant);
 
 /**
  * GET /api/chat/conversas
- * Listar conversas
+ * Listar conversas (próxima página: ?cursor=<proximo_cursor>)
+ * A ordem é pela última mensagem: conversas atualizadas durante a paginação só
+ * aparecem ao recarregar a primeira página (sem cursor)
  */
 router.get('/conversas', async (req, res) => {
   try {
@@ -24,15 +26,17 @@ router.get('/conversas', async (req, res) => {
       departamento: req.query.departamento,
       naoLidas: req.query.nao_lidas === 'true',
       instanciaId: req.query.instancia_id,
-      limite: parseInt(req.query.limite) || 50,
-      offset: parseInt(req.query.offset) || 0
+      limite: Math.min(parseInt(req.query.limite) || 50, 200),
+      offset: parseInt(req.query.offset) || 0,
+      cursor: req.query.cursor
     };
 
-    const conversas = await chatServico.listarConversas(req.empresaId, filtros);
+    const { conversas, proximoCursor } = await chatServico.listarConversas(req.empresaId, filtros);
 
     res.json({
       conversas,
-      total: conversas.length
+      total: conversas.length,
+      proximo_cursor: proximoCursor
     });
   } catch (erro) {
     console.error('[Chat] Erro ao listar conversas:', erro);
@@ -218,17 +222,19 @@ router.delete('/conversas/:id', async (req, res) => {
 
 /**
  * GET /api/chat/conversas/:id/mensagens
- * Listar mensagens da conversa
+ * Listar mensagens da conversa (?ordem=desc para as mais recentes primeiro; próxima página: ?cursor=<proximo_cursor>)
  */
 router.get('/conversas/:id/mensagens', async (req, res) => {
   try {
     const filtros = {
       direcao: req.query.direcao,
-      limite: parseInt(req.query.limite) || 100,
-      offset: parseInt(req.query.offset) || 0
+      limite: Math.min(parseInt(req.query.limite) || 100, 500),
+      offset: parseInt(req.query.offset) || 0,
+      cursor: req.query.cursor,
+      ordem: req.query.ordem === 'desc' ? 'desc' : 'asc'
     };
 
-    const mensagens = await chatServico.listarMensagens(
+    const { mensagens, proximoCursor } = await chatServico.listarMensagens(
       req.empresaId,
       req.params.id,
       filtros
@@ -236,7 +242,8 @@ router.get('/conversas/:id/mensagens', async (req, res) => {
 
     res.json({
       mensagens,
-      total: mensagens.length
+      total: mensagens.length,
+      proximo_cursor: proximoCursor
     });
   } catch (erro) {
     console.error('[Chat] Erro ao listar mensagens:', erro);
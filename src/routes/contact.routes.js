@@ -4,12 +4,16 @@ const contatoRepo = require('../repositorios/contato.repositorio');
 const { autenticarMiddleware } = require('../middlewares/autenticacao');
 const { garantirMultiTenant, verificarLimite } = require('../middlewares/empresa');
 const { getInstance } = require('../services/whatsapp');
+const { enqueueContactImport, getContactImport } = require('../queues/contactImportQueue');
 const { v4: uuidv4 } = require('uuid');
 
 // Todas as rotas requerem autenticação e multi-tenant
 router.use(autenticarMiddleware);
 router.use(garantirMultiTenant);
 
+// Listas maiores que isso são importadas em segundo plano (job com progresso)
+const IMPORTACAO_SINCRONA_ATE = parseInt(process.env.CONTATOS_IMPORTACAO_SINCRONA_ATE, 10) || 1000;
+
 /**
  * POST /api/contatos/sincronizar/:instancia
  * Sincronizar contatos do WhatsApp (Baileys) para o Banco SQL
@@ -56,8 +60,7 @@ router.post('/sincronizar/:instancia', async (req, res) => {
       return res.json({ mensagem: 'Nenhum contato encontrado para sincronizar' });
     }
 
-    // Usar o método de lote existente no repositório (ou fazer loop se não existir)
-    // O contatoRepo.importarLote foi visto no `view_file` anterior (linha 245 de contact.js)
+    // Upsert em massa (um comando por lote de linhas)
     const resultado = await contatoRepo.importarLote(req.empresaId, contatosParaImportar);
 
     res.json({
@@ -111,6 +114,9 @@ router.post('/', verificarLimite('contatos'), async (req, res) => {
       contato
     });
   } catch (erro) {
+    if (erro.code === 'CONTATO_DUPLICADO') {
+      return res.status(409).json({ erro: erro.message, contato: erro.contato });
+    }
     console.error('[Contatos] Erro ao criar:', erro);
     res.status(400).json({ erro: erro.message });
   }
@@ -131,12 +137,15 @@ router.get('/', async (req, res) => {
       offset: parseInt(req.query.offset) || 0
     };
 
-    const contatos = await contatoRepo.listar(req.empresaId, filtros);
-    const total = await contatoRepo.contar(req.empresaId, filtros);
+    const [contatos, contagem] = await Promise.all([
+      contatoRepo.listar(req.empresaId, filtros),
+      contatoRepo.contarComEstimativa(req.empresaId, filtros)
+    ]);
 
     res.json({
       contatos,
-      total,
+      total: contagem.total,
+      total_aproximado: contagem.aproximado,
       limite: filtros.limite,
       offset: filtros.offset
     });
@@ -201,6 +210,9 @@ router.put('/:id', async (req, res) => {
       contato
     });
   } catch (erro) {
+    if (erro.code === 'CONTATO_DUPLICADO') {
+      return res.status(409).json({ erro: erro.message, contato: erro.contato });
+    }
     console.error('[Contatos] Erro ao atualizar:', erro);
     res.status(400).json({ erro: erro.message });
   }
@@ -306,6 +318,16 @@ router.post('/importar', async (req, res) => {
       return res.status(400).json({ erro: 'Lista de contatos é obrigatória' });
     }
 
+    if (contatos.length > IMPORTACAO_SINCRONA_ATE) {
+      const job = await enqueueContactImport(req.empresaId, contatos);
+
+      return res.status(202).json({
+        mensagem: 'Importação iniciada',
+        job_id: job.id,
+        total: contatos.length
+      });
+    }
+
     const resultado = await contatoRepo.importarLote(req.empresaId, contatos);
 
     res.json({
@@ -318,6 +340,25 @@ router.post('/importar', async (req, res) => {
   }
 });
 
+/**
+ * GET /api/contatos/importar/:jobId
+ * Consultar andamento de uma importação em segundo plano
+ */
+router.get('/importar/:jobId', async (req, res) => {
+  try {
+    const importacao = await getContactImport(req.params.jobId, req.empresaId);
+
+    if (!importacao) {
+      return res.status(404).json({ erro: 'Importação não encontrada' });
+    }
+
+    res.json(importacao);
+  } catch (erro) {
+    console.error('[Contatos] Erro ao consultar importação:', erro);
+    res.status(400).json({ erro: erro.message });
+  }
+});
+
 /**
  * GET /api/contatos/exportar
  * Exportar contatos
@@ -543,6 +543,19 @@ router.get('/estatisticas', async (req, res) => {
   }
 });
 
+/**
+ * Backlog da fila de execução (inscrições vencidas e atraso da mais antiga)
+ */
+router.get('/fila', async (req, res) => {
+  try {
+    const fila = await followupRepo.obterMetricasFila(req.empresaId);
+    res.json(fila);
+  } catch (erro) {
+    console.error('Erro ao buscar fila de follow-ups:', erro);
+    res.status(500).json({ erro: 'Erro ao buscar fila de follow-ups' });
+  }
+});
+
 // ==================== TESTE ====================
 
 /**
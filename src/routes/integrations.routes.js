@@ -203,6 +203,43 @@ router.post('/:id/disparar', async (req, res) => {
   }
 });
 
+/**
+ * POST /api/integracoes/disparar
+ * Disparar um evento para todas as integrações ativas (do tipo, se informado)
+ * Por padrão o disparo vai para a fila (202); com `aguardar: true` responde com os resultados.
+ */
+router.post('/disparar', async (req, res) => {
+  try {
+    const { tipo, evento, dados, aguardar } = req.body;
+
+    if (!evento) {
+      return res.status(400).json({ erro: 'Evento é obrigatório' });
+    }
+
+    if (aguardar) {
+      const resultados = await integracaoServico.dispararParaTodasIntegracoes(
+        req.empresaId,
+        tipo || null,
+        evento,
+        dados || {}
+      );
+      return res.json({ mensagem: 'Evento disparado', resultados });
+    }
+
+    const { job_id } = await integracaoServico.enfileirarDisparoParaTodasIntegracoes(
+      req.empresaId,
+      tipo || null,
+      evento,
+      dados || {}
+    );
+
+    res.status(202).json({ mensagem: 'Disparo enfileirado', job_id });
+  } catch (erro) {
+    console.error('[Integração] Erro ao disparar para integrações:', erro);
+    res.status(500).json({ erro: erro.message });
+  }
+});
+
 /**
  * POST /api/integracoes/test-webhook
  * Testador genérico de URL
@@ -8,12 +8,20 @@ const {
   exportMetricsCSV,
   getAggregatedStats
 } = require('../services/metrics');
+const { getIngestionMetrics } = require('../services/ingestionPipeline');
+const { cache } = require('../config/redis');
+const tieredCache = require('../services/tieredCache');
+const { obterMetricasFollowup } = require('../tarefas/followup.tarefa');
+const jobScheduler = require('../services/jobScheduler');
+const loggerServico = require('../servicos/logger.servico');
+const webhookDispatcher = require('../services/webhookDispatcher');
+const webhookDeliveryLog = require('../services/webhookDeliveryLog');
 
 // Obter métricas de uma instância específica
-router.get('/instance/:instanceName', (req, res) => {
+router.get('/instance/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
-    const metrics = getInstanceMetrics(instanceName);
+    const metrics = await getInstanceMetrics(instanceName);
 
     if (!metrics) {
       return res.status(404).json({
@@ -33,9 +41,9 @@ router.get('/instance/:instanceName', (req, res) => {
 });
 
 // Obter métricas globais
-router.get('/global', (req, res) => {
+router.get('/global', async (req, res) => {
   try {
-    const metrics = getGlobalMetrics();
+    const metrics = await getGlobalMetrics();
 
     res.json({
       success: true,
@@ -47,9 +55,9 @@ router.get('/global', (req, res) => {
 });
 
 // Obter todas as métricas (instâncias + global)
-router.get('/all', (req, res) => {
+router.get('/all', async (req, res) => {
   try {
-    const metrics = getAllMetrics();
+    const metrics = await getAllMetrics();
 
     res.json({
       success: true,
@@ -61,9 +69,9 @@ router.get('/all', (req, res) => {
 });
 
 // Obter estatísticas agregadas
-router.get('/stats', (req, res) => {
+router.get('/stats', async (req, res) => {
   try {
-    const stats = getAggregatedStats();
+    const stats = await getAggregatedStats();
 
     res.json({
       success: true,
@@ -74,19 +82,98 @@ router.get('/stats', (req, res) => {
   }
 });
 
+// Obter profundidade de fila e latência do pipeline de ingestão
+router.get('/ingestion', (req, res) => {
+  try {
+    const { instanceName } = req.query;
+    const metrics = getIngestionMetrics(instanceName || null);
+
+    if (instanceName && !metrics) {
+      return res.status(404).json({
+        error: 'Pipeline não encontrado',
+        message: `Não há pipeline de ingestão ativo para a instância ${instanceName}`
+      });
+    }
+
+    res.json({
+      success: true,
+      metrics
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Acertos/erros/latência do cache Redis por prefixo de chave e do cache em camadas
+router.get('/cache', (req, res) => {
+  try {
+    res.json({
+      success: true,
+      metrics: cache.getStats(),
+      tiered: tieredCache.getStats()
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Backlog e atraso do executor de follow-ups (fila no banco + estado desta réplica)
+router.get('/followup', async (req, res) => {
+  try {
+    res.json({
+      success: true,
+      metrics: await obterMetricasFollowup()
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Tarefas periódicas: execuções, duração, sobreposições e réplica da última execução
+router.get('/jobs', async (req, res) => {
+  try {
+    res.json({
+      success: true,
+      metrics: await jobScheduler.getJobStats()
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Logs de operações: entradas pendentes, descartadas e falhas de gravação (desta réplica)
+router.get('/logger', (req, res) => {
+  res.json({
+    success: true,
+    metrics: loggerServico.obterEstatisticas()
+  });
+});
+
+// Envio de webhooks: requisições em andamento, fila, latência e erros por destino,
+// mais o buffer de logs de entrega e dead letters (desta réplica)
+router.get('/webhooks', (req, res) => {
+  res.json({
+    success: true,
+    metrics: {
+      ...webhookDispatcher.getMetrics(),
+      deliveryLog: webhookDeliveryLog.getStats()
+    }
+  });
+});
+
 // Exportar métricas em CSV
-router.get('/export', (req, res) => {
+router.get('/export', async (req, res) => {
   try {
     const { format = 'csv' } = req.query;
 
     if (format === 'csv') {
-      const csv = exportMetricsCSV();
+      const csv = await exportMetricsCSV();
 
       res.setHeader('Content-Type', 'text/csv');
       res.setHeader('Content-Disposition', `attachment; filename="metrics-${Date.now()}.csv"`);
       res.send(csv);
     } else if (format === 'json') {
-      const metrics = getAllMetrics();
+      const metrics = await getAllMetrics();
 
       res.setHeader('Content-Type', 'application/json');
       res.setHeader('Content-Disposition', `attachment; filename="metrics-${Date.now()}.json"`);
@@ -103,9 +190,9 @@ router.get('/export', (req, res) => {
 });
 
 // Resetar todas as métricas
-router.post('/reset', (req, res) => {
+router.post('/reset', async (req, res) => {
   try {
-    resetAllMetrics();
+    await resetAllMetrics();
 
     res.json({
       success: true,
@@ -19,12 +19,12 @@ router.post('/schedule', async (req, res) => {
 });
 
 // Listar mensagens agendadas de uma instância
-router.get('/list/:instanceName', (req, res) => {
+router.get('/list/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
     const { status } = req.query;
 
-    const messages = getScheduledMessages(instanceName, status);
+    const messages = await getScheduledMessages(instanceName, status);
 
     res.json({
       success: true,
@@ -38,10 +38,10 @@ router.get('/list/:instanceName', (req, res) => {
 });
 
 // Obter status de uma mensagem específica
-router.get('/status/:messageId', (req, res) => {
+router.get('/status/:messageId', async (req, res) => {
   try {
     const { messageId } = req.params;
-    const message = getScheduledMessageStatus(messageId);
+    const message = await getScheduledMessageStatus(messageId);
 
     res.json({
       success: true,
@@ -53,10 +53,10 @@ router.get('/status/:messageId', (req, res) => {
 });
 
 // Cancelar mensagem agendada
-router.delete('/cancel/:messageId', (req, res) => {
+router.delete('/cancel/:messageId', async (req, res) => {
   try {
     const { messageId } = req.params;
-    const result = cancelScheduledMessage(messageId);
+    const result = await cancelScheduledMessage(messageId);
 
     res.json(result);
   } catch (error) {
@@ -65,9 +65,9 @@ router.delete('/cancel/:messageId', (req, res) => {
 });
 
 // Limpar mensagens antigas
-router.post('/cleanup', (req, res) => {
+router.post('/cleanup', async (req, res) => {
   try {
-    const cleaned = cleanupOldMessages();
+    const cleaned = await cleanupOldMessages();
 
     res.json({
       success: true,
@@ -2,6 +2,8 @@ const express = require('express');
 const router = express.Router();
 const whatsapp = require('../services/whatsapp');
 const webhookAdvanced = require('../services/webhook-advanced');
+const webhookDeliveryLog = require('../services/webhookDeliveryLog');
+const webhookRepository = require('../repositories/webhookRepository');
 
 // ========== CONFIGURAÇÃO BÁSICA (compatibilidade) ==========
 
@@ -82,6 +84,11 @@ router.post('/configure', (req, res) => {
       return res.status(400).json({ error: 'instanceName e config.url são obrigatórios' });
     }
 
+    const batchError = webhookAdvanced.validateBatchConfig(config.batch);
+    if (batchError) {
+      return res.status(400).json({ error: batchError });
+    }
+
     // Configurar webhook básico no whatsapp service
     whatsapp.setWebhook(instanceName, config.url, config.eventTypes || ['all']);
 
@@ -124,12 +131,12 @@ router.post('/test/:instanceName', async (req, res) => {
 // ========== LOGS DE WEBHOOK ==========
 
 // Obter logs de webhook
-router.get('/logs/:instanceName', (req, res) => {
+router.get('/logs/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
     const { eventType, status, since, limit } = req.query;
 
-    const logs = webhookAdvanced.getWebhookLogs(instanceName, {
+    const logs = await webhookAdvanced.getWebhookLogs(instanceName, {
       eventType,
       status,
       since,
@@ -147,10 +154,10 @@ router.get('/logs/:instanceName', (req, res) => {
 });
 
 // Limpar logs de webhook
-router.delete('/logs/:instanceName', (req, res) => {
+router.delete('/logs/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
-    webhookAdvanced.clearWebhookLogs(instanceName);
+    await webhookAdvanced.clearWebhookLogs(instanceName);
 
     res.json({
       success: true,
@@ -161,15 +168,59 @@ router.delete('/logs/:instanceName', (req, res) => {
   }
 });
 
+// ========== DEAD LETTERS ==========
+
+// Listar entregas que falharam em todas as tentativas
+router.get('/dead-letters/:instanceName', async (req, res) => {
+  try {
+    const { instanceName } = req.params;
+    const { status, limit } = req.query;
+
+    const deadLetters = await webhookRepository.getDeadLetters(instanceName, {
+      status: status || 'pending',
+      limit: Math.min(parseInt(limit) || 100, 1000)
+    });
+
+    res.json({
+      instanceName,
+      total: deadLetters.length,
+      deadLetters
+    });
+  } catch (error) {
+    res.status(500).json({ error: error.message });
+  }
+});
+
+// Reprocessar dead letters em segundo plano (todos os pendentes ou apenas `ids`)
+router.post('/dead-letters/replay', async (req, res) => {
+  try {
+    const { instanceName, ids, limit, ratePerSecond } = req.body;
+
+    if (!instanceName) {
+      return res.status(400).json({ error: 'instanceName é obrigatório' });
+    }
+
+    const result = await webhookDeliveryLog.replayDeadLetters(instanceName, { ids, limit, ratePerSecond });
+
+    res.status(202).json({
+      success: true,
+      message: `${result.queued} dead letters em reprocessamento`,
+      ...result
+    });
+  } catch (error) {
+    res.status(error.code === 'REPLAY_IN_PROGRESS' ? 409 : 500).json({ error: error.message });
+  }
+});
+
 // ========== ESTATÍSTICAS ==========
 
 // Obter estatísticas de webhook
-router.get('/stats/:instanceName', (req, res) => {
+router.get('/stats/:instanceName', async (req, res) => {
   try {
     const { instanceName } = req.params;
     const { period } = req.query; // hour, day, week
 
-    const stats = webhookAdvanced.getWebhookStats(instanceName, period || 'day');
+    const stats = await webhookAdvanced.getWebhookStats(instanceName, period || 'day');
 
     res.json({
       instanceName,
@@ -1,31 +1,35 @@
 const fs = require('fs');
 const path = require('path');
-const cron = require('node-cron');
-const { v4: uuidv4 } = require('uuid');
-const { sendText, sendImage, sendDocument, sendVideo } = require('./whatsapp');
-
-// Diretório de dados
+const broadcastRepository = require('../repositories/broadcastRepository');
+const {
+  startBroadcastCampaign,
+  pauseBroadcastCampaign,
+  resumeBroadcastCampaign,
+  cancelBroadcastCampaign
+} = require('../queues/broadcastQueue');
+
+// Diretório de dados (campanhas antigas em JSON, importadas na inicialização)
 const DATA_DIR = process.env.DATA_DIR || './data';
 const CAMPAIGNS_FILE = path.join(DATA_DIR, 'campaigns.json');
 
-// Armazenamento de campanhas
-let campaigns = {};
-let campaignJobs = {};
+const MESSAGE_TYPES = ['text', 'image', 'video', 'document'];
 
 // Inicializar broadcast
-function initBroadcast() {
-  loadCampaigns();
-
-  // Processar campanhas a cada 30 segundos
-  cron.schedule('*/30 * * * * *', () => {
-    processCampaigns();
-  });
+//
+// O envio é feito pela broadcastQueue (destinatários em broadcast_recipients, lotes
+// por campanha e token bucket por instância); aqui só ficam as regras da API.
+async function initBroadcast() {
+  try {
+    await importLegacyCampaigns();
+  } catch (error) {
+    console.error('[Broadcast] Erro ao importar campanhas antigas:', error.message);
+  }
 
   console.log('[Broadcast] Sistema de disparo em massa inicializado');
 }
 
-// Criar campanha
-function createCampaign(data) {
+// Criar campanha (fica em rascunho até ser iniciada)
+async function createCampaign(data) {
   const {
     name,
     instanceName,
@@ -51,63 +55,65 @@ function createCampaign(data) {
     throw new Error('Lista de destinatários inválida');
   }
 
-  const campaignId = uuidv4();
-  const campaign = {
-    id: campaignId,
-    name,
-    instanceName,
-    recipients: randomizeOrder ? shuffleArray([...recipients]) : recipients,
-    messageType,
-    messageTemplate,
-    imageUrl,
-    caption,
-    delayBetweenMessages: delayBetweenMessages || { min: 30, max: 60 },
-    messagesPerHour: messagesPerHour || 20,
-    randomizeOrder: randomizeOrder !== false,
-    humanizeTyping: humanizeTyping !== false,
-    startAt: startAt || new Date().toISOString(),
-    endAt: endAt || null,
-    status: 'draft', // draft, running, paused, completed, failed
-    progress: {
-      total: recipients.length,
-      sent: 0,
-      failed: 0,
-      pending: recipients.length,
-      currentIndex: 0,
-      currentRecipient: null,
-      lastSentAt: null
-    },
-    createdAt: new Date().toISOString(),
-    startedAt: null,
-    completedAt: null,
-    errors: []
-  };
+  if (!MESSAGE_TYPES.includes(messageType)) {
+    throw new Error(`Tipo de mensagem não suportado: ${messageType}`);
+  }
 
-  campaigns[campaignId] = campaign;
-  saveCampaigns();
+  const delay = delayBetweenMessages || { min: 30, max: 60 };
+  const minDelay = delay.min || 30;
+  const maxDelay = Math.max(minDelay, delay.max || 60);
+
+  let row;
+  try {
+    row = await broadcastRepository.createBroadcastCampaign({
+      instanceName,
+      campaignName: name,
+      message: messageTemplate || caption || '',
+      recipients: randomizeOrder ? shuffleArray([...recipients]) : recipients,
+      delayBetweenMessages: minDelay * 1000,
+      delayMaxMs: maxDelay * 1000,
+      messagesPerHour: messagesPerHour || 20,
+      mediaUrl: messageType === 'text' ? null : imageUrl,
+      mediaType: messageType === 'text' ? null : messageType,
+      humanizeTyping: humanizeTyping !== false,
+      startAt: startAt ? new Date(startAt) : null,
+      endAt: endAt ? new Date(endAt) : null,
+      status: 'draft'
+    });
+  } catch (error) {
+    // broadcast_campaigns.instance_name referencia instances
+    if (error.code === '23503') {
+      throw new Error('Instância não encontrada');
+    }
+    throw error;
+  }
 
   return {
     success: true,
-    campaignId,
-    campaign
+    campaignId: row.id,
+    campaign: formatCampaign(row)
   };
 }
 
 // Iniciar campanha
-function startCampaign(campaignId) {
-  const campaign = campaigns[campaignId];
+async function startCampaign(campaignId) {
+  const campaign = await findCampaign(campaignId);
 
-  if (!campaign) {
-    throw new Error('Campanha não encontrada');
+  if (campaign.status === 'running' || campaign.status === 'pending') {
+    throw new Error('Campanha já está rodando');
   }
 
-  if (campaign.status === 'running') {
-    throw new Error('Campanha já está rodando');
+  if (campaign.status === 'paused') {
+    return resumeCampaign(campaignId);
   }
 
-  campaign.status = 'running';
-  campaign.startedAt = new Date().toISOString();
-  saveCampaigns();
+  const queued = await broadcastRepository.queueCampaign(campaign.id);
+  if (!queued) {
+    throw new Error(`Campanha não pode ser iniciada (status: ${campaign.status})`);
+  }
+
+  const delay = queued.start_at ? new Date(queued.start_at).getTime() - Date.now() : 0;
+  await startBroadcastCampaign(queued.id, delay);
 
   return {
     success: true,
@@ -116,16 +122,13 @@ function startCampaign(campaignId) {
 }
 
 // Pausar campanha
-function pauseCampaign(campaignId) {
-  const campaign = campaigns[campaignId];
+async function pauseCampaign(campaignId) {
+  const campaign = await findCampaign(campaignId);
 
-  if (!campaign) {
-    throw new Error('Campanha não encontrada');
+  if (!await pauseBroadcastCampaign(campaign.id)) {
+    throw new Error('Campanha não está em execução');
   }
 
-  campaign.status = 'paused';
-  saveCampaigns();
-
   return {
     success: true,
     message: 'Campanha pausada'
@@ -133,16 +136,13 @@ function pauseCampaign(campaignId) {
 }
 
 // Retomar campanha
-function resumeCampaign(campaignId) {
-  const campaign = campaigns[campaignId];
+async function resumeCampaign(campaignId) {
+  const campaign = await findCampaign(campaignId);
 
-  if (!campaign) {
-    throw new Error('Campanha não encontrada');
+  if (!await resumeBroadcastCampaign(campaign.id)) {
+    throw new Error('Campanha não está pausada');
   }
 
-  campaign.status = 'running';
-  saveCampaigns();
-
   return {
     success: true,
     message: 'Campanha retomada'
@@ -150,220 +150,127 @@ function resumeCampaign(campaignId) {
 }
 
 // Cancelar campanha
-function cancelCampaign(campaignId) {
-  const campaign = campaigns[campaignId];
+async function cancelCampaign(campaignId) {
+  const campaign = await findCampaign(campaignId);
 
-  if (!campaign) {
-    throw new Error('Campanha não encontrada');
+  if (!await cancelBroadcastCampaign(campaign.id)) {
+    throw new Error(`Campanha não pode ser cancelada (status: ${campaign.status})`);
   }
 
-  campaign.status = 'cancelled';
-  campaign.completedAt = new Date().toISOString();
-  saveCampaigns();
-
   return {
     success: true,
     message: 'Campanha cancelada'
   };
 }
 
-// Obter campanha
-function getCampaign(campaignId) {
-  const campaign = campaigns[campaignId];
-
-  if (!campaign) {
-    throw new Error('Campanha não encontrada');
-  }
+// Obter campanha (progresso contado em broadcast_recipients)
+async function getCampaign(campaignId) {
+  const campaign = await findCampaign(campaignId);
+  const progress = await broadcastRepository.getCampaignProgress(campaign.id);
 
-  return campaign;
+  return formatCampaign(campaign, progress);
 }
 
 // Listar campanhas de uma instância
-function listCampaigns(instanceName, status = null) {
-  let campaignList = Object.values(campaigns)
-    .filter(c => c.instanceName === instanceName);
+async function listCampaigns(instanceName, status = null) {
+  const rows = await broadcastRepository.getBroadcastCampaignsByInstance(instanceName, { status });
+  return rows.map(row => formatCampaign(row));
+}
 
-  if (status) {
-    campaignList = campaignList.filter(c => c.status === status);
-  }
+// Buscar campanha pelo ID da API
+async function findCampaign(campaignId) {
+  const id = parseInt(campaignId, 10);
+  const campaign = Number.isInteger(id) && String(id) === String(campaignId)
+    ? await broadcastRepository.getBroadcastCampaignById(id)
+    : null;
 
-  campaignList.sort((a, b) => new Date(b.createdAt) - new Date(a.createdAt));
+  if (!campaign) {
+    throw new Error('Campanha não encontrada');
+  }
 
-  return campaignList;
+  return campaign;
 }
 
-// Processar campanhas ativas
-async function processCampaigns() {
-  const now = new Date();
+// Formato de resposta da API a partir da linha de broadcast_campaigns
+function formatCampaign(row, progress = null) {
+  const sent = row.sent_count || 0;
+  const failed = row.failed_count || 0;
+  const pending = progress
+    ? progress.remaining
+    : Math.max(0, (row.total_recipients || 0) - sent - failed);
 
-  for (const campaignId in campaigns) {
-    const campaign = campaigns[campaignId];
+  return {
+    id: row.id,
+    name: row.campaign_name,
+    instanceName: row.instance_name,
+    messageType: row.media_url ? row.media_type : 'text',
+    messageTemplate: row.message,
+    imageUrl: row.media_url,
+    delayBetweenMessages: {
+      min: Math.round((row.delay_between_messages || 0) / 1000),
+      max: Math.round((row.delay_max_ms || row.delay_between_messages || 0) / 1000)
+    },
+    messagesPerHour: row.messages_per_hour,
+    humanizeTyping: row.humanize_typing,
+    startAt: row.start_at,
+    endAt: row.end_at,
+    status: row.status,
+    progress: {
+      total: row.total_recipients,
+      sent,
+      failed,
+      pending
+    },
+    createdAt: row.created_at,
+    startedAt: row.started_at,
+    completedAt: row.completed_at
+  };
+}
 
-    // Só processar campanhas em execução
-    if (campaign.status !== 'running') continue;
+// Importar campanhas não concluídas do antigo campaigns.json (uma vez)
+//
+// Entram só os destinatários ainda não processados; campanhas em execução voltam a
+// rodar pela fila. As que falharem continuam no arquivo para a próxima inicialização.
+async function importLegacyCampaigns() {
+  if (!fs.existsSync(CAMPAIGNS_FILE)) return;
 
-    // Verificar se está dentro do horário
-    const startAt = new Date(campaign.startAt);
-    if (now < startAt) continue;
+  const legacy = JSON.parse(fs.readFileSync(CAMPAIGNS_FILE, 'utf8'));
+  const remaining = {};
+  let imported = 0;
 
-    if (campaign.endAt) {
-      const endAt = new Date(campaign.endAt);
-      if (now > endAt) {
-        campaign.status = 'completed';
-        campaign.completedAt = now.toISOString();
-        saveCampaigns();
-        continue;
-      }
-    }
+  for (const [legacyId, campaign] of Object.entries(legacy)) {
+    if (!['draft', 'running', 'paused'].includes(campaign.status)) continue;
 
-    // Verificar se todos foram enviados
-    if (campaign.progress.currentIndex >= campaign.recipients.length) {
-      campaign.status = 'completed';
-      campaign.completedAt = now.toISOString();
-      saveCampaigns();
-      continue;
-    }
+    const recipients = (campaign.recipients || []).slice(campaign.progress?.currentIndex || 0);
+    if (recipients.length === 0) continue;
 
-    // Verificar intervalo desde última mensagem
-    if (campaign.progress.lastSentAt) {
-      const lastSent = new Date(campaign.progress.lastSentAt);
-      const delayMs = getRandomDelay(campaign.delayBetweenMessages) * 1000;
-      const nextSendTime = new Date(lastSent.getTime() + delayMs);
+    try {
+      const { campaignId } = await createCampaign({ ...campaign, recipients, randomizeOrder: false });
 
-      if (now < nextSendTime) {
-        continue; // Ainda não é hora de enviar
+      if (campaign.status === 'running') {
+        await startCampaign(campaignId);
+      } else if (campaign.status === 'paused') {
+        await broadcastRepository.updateBroadcastStatus(campaignId, 'paused');
       }
-    }
 
-    // Verificar limite de mensagens por hora
-    const oneHourAgo = new Date(now.getTime() - 60 * 60 * 1000);
-    const recentMessages = campaign.errors.filter(e =>
-      e.timestamp && new Date(e.timestamp) > oneHourAgo && e.type === 'sent'
-    ).length;
-
-    if (recentMessages >= campaign.messagesPerHour) {
-      continue; // Limite atingido
+      imported++;
+      console.log(`[Broadcast] Campanha ${legacyId} importada como ${campaignId}`);
+    } catch (error) {
+      remaining[legacyId] = campaign;
+      console.error(`[Broadcast] Erro ao importar campanha ${legacyId}:`, error.message);
     }
-
-    // Enviar próxima mensagem
-    await sendNextMessage(campaignId);
   }
-}
 
-// Enviar próxima mensagem da campanha
-async function sendNextMessage(campaignId) {
-  const campaign = campaigns[campaignId];
-
-  if (!campaign || campaign.progress.currentIndex >= campaign.recipients.length) {
-    return;
+  if (Object.keys(remaining).length > 0) {
+    fs.writeFileSync(CAMPAIGNS_FILE, JSON.stringify(remaining, null, 2));
+  } else {
+    fs.renameSync(CAMPAIGNS_FILE, `${CAMPAIGNS_FILE}.imported`);
   }
 
-  const recipient = campaign.recipients[campaign.progress.currentIndex];
-  campaign.progress.currentRecipient = recipient.name || recipient.number;
-
-  try {
-    // Substituir variáveis no template
-    let message = campaign.messageTemplate;
-    if (recipient.vars) {
-      Object.keys(recipient.vars).forEach(key => {
-        const regex = new RegExp(`{{${key}}}`, 'g');
-        message = message.replace(regex, recipient.vars[key]);
-      });
-    }
-
-    // Substituir variável de nome
-    message = message.replace(/{{name}}/g, recipient.name || '');
-    message = message.replace(/{{nome}}/g, recipient.name || '');
-
-    // Enviar conforme tipo
-    let result;
-
-    switch (campaign.messageType) {
-      case 'text':
-        result = await sendText(
-          campaign.instanceName,
-          recipient.number,
-          message,
-          {
-            simulateTyping: campaign.humanizeTyping,
-            typingTime: getRandomDelay({ min: 2, max: 5 }) * 1000
-          }
-        );
-        break;
-
-      case 'image':
-        result = await sendImage(
-          campaign.instanceName,
-          recipient.number,
-          campaign.imageUrl,
-          message,
-          {
-            simulateTyping: campaign.humanizeTyping
-          }
-        );
-        break;
-
-      case 'video':
-        result = await sendVideo(
-          campaign.instanceName,
-          recipient.number,
-          campaign.imageUrl, // Usar imageUrl como videoUrl
-          message,
-          {}
-        );
-        break;
-
-      case 'document':
-        result = await sendDocument(
-          campaign.instanceName,
-          recipient.number,
-          campaign.imageUrl, // Usar imageUrl como documentUrl
-          'documento.pdf',
-          'application/pdf',
-          message,
-          {}
-        );
-        break;
-
-      default:
-        throw new Error(`Tipo de mensagem não suportado: ${campaign.messageType}`);
-    }
-
-    // Atualizar progresso
-    campaign.progress.sent++;
-    campaign.progress.pending--;
-    campaign.progress.lastSentAt = new Date().toISOString();
-    campaign.errors.push({
-      type: 'sent',
-      recipient: recipient.number,
-      timestamp: new Date().toISOString()
-    });
-
-    console.log(`[Broadcast] ${campaign.name}: Enviado para ${recipient.number} (${campaign.progress.sent}/${campaign.progress.total})`);
-
-  } catch (error) {
-    console.error(`[Broadcast] Erro ao enviar para ${recipient.number}:`, error.message);
-
-    campaign.progress.failed++;
-    campaign.progress.pending--;
-    campaign.errors.push({
-      type: 'error',
-      recipient: recipient.number,
-      error: error.message,
-      timestamp: new Date().toISOString()
-    });
-  }
-
-  // Avançar para próximo
-  campaign.progress.currentIndex++;
-  saveCampaigns();
-}
-
-// Obter delay aleatório
-function getRandomDelay(config) {
-  const min = config.min || 30;
-  const max = config.max || 60;
-  return Math.floor(Math.random() * (max - min + 1)) + min;
+  console.log('[Broadcast] Campanhas antigas importadas:', {
+    imported,
+    pending: Object.keys(remaining).length
+  });
 }
 
 // Embaralhar array
@@ -376,38 +283,6 @@ function shuffleArray(array) {
   return shuffled;
 }
 
-// Salvar campanhas
-function saveCampaigns() {
-  try {
-    if (!fs.existsSync(DATA_DIR)) {
-      fs.mkdirSync(DATA_DIR, { recursive: true });
-    }
-
-    fs.writeFileSync(CAMPAIGNS_FILE, JSON.stringify(campaigns, null, 2));
-  } catch (error) {
-    console.error('[Broadcast] Erro ao salvar campanhas:', error.message);
-  }
-}
-
-// Carregar campanhas
-function loadCampaigns() {
-  try {
-    if (fs.existsSync(CAMPAIGNS_FILE)) {
-      const data = fs.readFileSync(CAMPAIGNS_FILE, 'utf8');
-      campaigns = JSON.parse(data);
-
-      const active = Object.values(campaigns).filter(c => c.status === 'running').length;
-      console.log('[Broadcast] Campanhas carregadas:', {
-        total: Object.keys(campaigns).length,
-        running: active
-      });
-    }
-  } catch (error) {
-    console.error('[Broadcast] Erro ao carregar campanhas:', error.message);
-    campaigns = {};
-  }
-}
-
 module.exports = {
   initBroadcast,
   createCampaign,
@@ -1,50 +1,228 @@
+const crypto = require('crypto');
+const EventEmitter = require('events');
+const { redis } = require('../config/redis');
 const logger = require('../config/logger');
 
 /**
- * Sistema simples de Circuit Breaker para Webhooks
- * Evita que o sistema tente enviar webhooks para destinos que estão offline repetidamente
+ * Circuit Breaker de webhooks compartilhado entre réplicas (Redis)
+ *
+ * Evita que o sistema tente enviar webhooks para destinos que estão offline repetidamente.
+ * - O estado de cada destino fica em um hash no Redis, alterado apenas por scripts Lua
+ *   (atômicos), então todas as réplicas enxergam o mesmo circuito.
+ * - O circuito abre pela taxa de falhas em uma janela deslizante (CIRCUIT_WINDOW_MS,
+ *   dividida em baldes), com um mínimo de requisições, e não por falhas seguidas.
+ * - Passado CIRCUIT_OPEN_MS, apenas uma réplica é eleita para enviar a requisição de
+ *   teste (HALF-OPEN). Sucesso fecha o circuito; falha abre de novo.
+ * - Aberturas e fechamentos são publicados no canal `circuit:events`. Cada réplica
+ *   mantém em memória os circuitos abertos: destinos saudáveis não custam consulta
+ *   ao Redis e, ao abrir, o evento 'open' permite descartar o que está na fila.
  */
-class CircuitBreaker {
+
+const CHANNEL = 'circuit:events';
+const KEY_PREFIX = 'circuit:';
+const OWNER = crypto.randomBytes(8).toString('hex');
+
+const WINDOW_MS = parseInt(process.env.CIRCUIT_WINDOW_MS, 10) || 60000;
+const BUCKETS = 6;
+const MIN_REQUESTS = parseInt(process.env.CIRCUIT_MIN_REQUESTS, 10) || 10;
+const FAILURE_RATE = parseFloat(process.env.CIRCUIT_FAILURE_RATE) || 0.5;
+const OPEN_MS = parseInt(process.env.CIRCUIT_OPEN_MS, 10) || 60000 * 5;
+// Maior que o timeout dos webhooks: se a réplica do teste cair, outra é eleita depois disso
+const PROBE_TIMEOUT_MS = parseInt(process.env.CIRCUIT_PROBE_TIMEOUT_MS, 10) || 90000;
+const KEY_TTL_MS = (WINDOW_MS + OPEN_MS + PROBE_TIMEOUT_MS) * 2;
+
+// Relógio do Redis, para réplicas com horários diferentes concordarem
+const NOW = `
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+`;
+
+// KEYS[1] = circuito | ARGV = 's'|'f', janela, baldes, mínimo, taxa, tempo aberto, canal, url, ttl
+// Retorna {estado, aberto_ate}; estado 'OPENED' quando esta chamada abriu o circuito
+const RECORD_SCRIPT = `${NOW}
+local key = KEYS[1]
+local buckets = tonumber(ARGV[3])
+local size = math.floor(tonumber(ARGV[2]) / buckets)
+local current = math.floor(now / size)
+local slot = current % buckets
+
+if tonumber(redis.call('HGET', key, 't' .. slot) or '-1') ~= current then
+  redis.call('HSET', key, 't' .. slot, current, 's' .. slot, 0, 'f' .. slot, 0)
+end
+redis.call('HINCRBY', key, ARGV[1] .. slot, 1)
+
+local state = redis.call('HGET', key, 'state') or 'CLOSED'
+local result = {state, tonumber(redis.call('HGET', key, 'until') or '0')}
+
+if ARGV[1] == 's' then
+  if state ~= 'CLOSED' then
+    redis.call('DEL', key)
+    redis.call('PUBLISH', ARGV[7], cjson.encode({url = ARGV[8], state = 'CLOSED'}))
+    return {'CLOSED', 0}
+  end
+elseif state == 'HALF_OPEN' then
+  local openUntil = now + tonumber(ARGV[6])
+  redis.call('HSET', key, 'state', 'OPEN', 'until', openUntil)
+  redis.call('PUBLISH', ARGV[7], cjson.encode({url = ARGV[8], state = 'OPEN', ['until'] = openUntil}))
+  result = {'OPEN', openUntil}
+elseif state == 'CLOSED' then
+  local total, failures = 0, 0
+  for i = 0, buckets - 1 do
+    if tonumber(redis.call('HGET', key, 't' .. i) or '-1') > current - buckets then
+      local f = tonumber(redis.call('HGET', key, 'f' .. i) or '0')
+      total = total + f + tonumber(redis.call('HGET', key, 's' .. i) or '0')
+      failures = failures + f
+    end
+  end
+
+  if total >= tonumber(ARGV[4]) and failures / total >= tonumber(ARGV[5]) then
+    local openUntil = now + tonumber(ARGV[6])
+    redis.call('HSET', key, 'state', 'OPEN', 'until', openUntil)
+    redis.call('PUBLISH', ARGV[7], cjson.encode({url = ARGV[8], state = 'OPEN', ['until'] = openUntil, failures = failures, total = total}))
+    result = {'OPENED', openUntil}
+  end
+end
+
+redis.call('PEXPIRE', key, ARGV[9])
+return result
+`;
+
+// KEYS[1] = circuito | ARGV = dono, timeout do teste, ttl
+// Retorna {'CLOSED'|'PROBE'|'OPEN', aberto_ate}; só um chamador recebe 'PROBE'
+const TRY_PROBE_SCRIPT = `${NOW}
+local key = KEYS[1]
+local state = redis.call('HGET', key, 'state') or 'CLOSED'
+if state == 'CLOSED' then
+  return {'CLOSED', 0}
+end
+
+if state == 'HALF_OPEN' then
+  local probeUntil = tonumber(redis.call('HGET', key, 'probeUntil') or '0')
+  if now < probeUntil then
+    return {'OPEN', probeUntil}
+  end
+else
+  local openUntil = tonumber(redis.call('HGET', key, 'until') or '0')
+  if now < openUntil then
+    return {'OPEN', openUntil}
+  end
+end
+
+local probeUntil = now + tonumber(ARGV[2])
+redis.call('HSET', key, 'state', 'HALF_OPEN', 'probeUntil', probeUntil, 'probeOwner', ARGV[1])
+redis.call('PEXPIRE', key, ARGV[3])
+return {'PROBE', probeUntil}
+`;
+
+class CircuitBreaker extends EventEmitter {
     constructor() {
-        this.states = new Map(); // url -> state
-        this.threshold = 5; // Falhas seguidas para abrir o circuito
-        this.resetTimeout = 60000 * 5; // 5 minutos para tentar fechar novamente
+        super();
+        this.open = new Map(); // url -> aberto até (ms), conforme os eventos do Redis
+        this.subscriber = null;
+        this.subscribe();
     }
 
-    isAvailable(url) {
-        const state = this.states.get(url);
-        if (!state) return true;
+    key(url) {
+        return `${KEY_PREFIX}${crypto.createHash('sha1').update(url).digest('hex')}`;
+    }
+
+    subscribe() {
+        if (typeof redis.duplicate !== 'function') return;
+
+        this.subscriber = redis.duplicate();
+        this.subscriber.on('error', err => logger.error(`[CircuitBreaker] Erro no subscriber: ${err.message}`));
+        this.subscriber.on('message', (channel, raw) => {
+            if (channel !== CHANNEL) return;
+            try {
+                const event = JSON.parse(raw);
+                if (event.state === 'OPEN') this.markOpen(event.url, event.until);
+                else this.markClosed(event.url);
+            } catch (err) {
+                logger.error(`[CircuitBreaker] Evento inválido: ${err.message}`);
+            }
+        });
+        this.subscriber.subscribe(CHANNEL)
+            .catch(err => logger.error(`[CircuitBreaker] Erro ao assinar eventos: ${err.message}`));
+    }
 
-        if (state.status === 'OPEN') {
-            const now = Date.now();
-            if (now - state.lastFailure > this.resetTimeout) {
-                state.status = 'HALF-OPEN';
+    markOpen(url, until) {
+        const wasOpen = this.open.has(url);
+        this.open.set(url, Number(until));
+        if (!wasOpen) {
+            logger.warn(`[CircuitBreaker] Circuito para ${url} está ABERTO.`);
+            this.emit('open', url);
+        }
+    }
+
+    markClosed(url) {
+        if (this.open.delete(url)) {
+            logger.info(`[CircuitBreaker] Circuito para ${url} FECHADO.`);
+            this.emit('close', url);
+        }
+    }
+
+    /**
+     * O destino pode receber uma requisição agora?
+     * Com o circuito aberto e o tempo de espera vencido, apenas uma réplica recebe true
+     * (requisição de teste); as demais continuam recebendo false até o resultado.
+     */
+    async isAvailable(url) {
+        const openUntil = this.open.get(url);
+        if (openUntil === undefined) return true;
+        if (Date.now() < openUntil) return false;
+
+        try {
+            const [state, until] = await redis.eval(TRY_PROBE_SCRIPT, 1, this.key(url), OWNER, PROBE_TIMEOUT_MS, KEY_TTL_MS);
+
+            if (state === 'CLOSED') {
+                this.markClosed(url);
+                return true;
+            }
+            if (state === 'PROBE') {
                 logger.info(`[CircuitBreaker] Circuito para ${url} está HALF-OPEN. Tentando novamente...`);
                 return true;
             }
+
+            this.open.set(url, Number(until));
             return false;
+        } catch (err) {
+            // Sem Redis não há como eleger o teste: liberar, como um circuito local faria
+            logger.error(`[CircuitBreaker] Redis indisponível: ${err.message}`);
+            return true;
         }
+    }
+
+    async record(url, outcome) {
+        try {
+            const [state, until] = await redis.eval(
+                RECORD_SCRIPT, 1, this.key(url),
+                outcome, WINDOW_MS, BUCKETS, MIN_REQUESTS, FAILURE_RATE, OPEN_MS, CHANNEL, url, KEY_TTL_MS
+            );
 
-        return true;
+            // Atualizar esta réplica sem esperar o evento (ou se o evento se perdeu)
+            if (state === 'CLOSED') this.markClosed(url);
+            else if (state === 'OPEN' || state === 'OPENED') this.markOpen(url, until);
+        } catch (err) {
+            logger.error(`[CircuitBreaker] Erro ao registrar resultado: ${err.message}`);
+        }
     }
 
     recordSuccess(url) {
-        this.states.delete(url);
+        return this.record(url, 's');
     }
 
     recordFailure(url) {
-        let state = this.states.get(url) || { failures: 0, status: 'CLOSED' };
-        state.failures++;
-        state.lastFailure = Date.now();
-
-        if (state.failures >= this.threshold) {
-            if (state.status !== 'OPEN') {
-                state.status = 'OPEN';
-                logger.warn(`[CircuitBreaker] Circuito para ${url} está ABERTO após ${state.failures} falhas.`);
-            }
-        }
+        return this.record(url, 'f');
+    }
 
-        this.states.set(url, state);
+    getStats() {
+        return {
+            windowMs: WINDOW_MS,
+            minRequests: MIN_REQUESTS,
+            failureRate: FAILURE_RATE,
+            openMs: OPEN_MS,
+            open: [...this.open.entries()].map(([url, until]) => ({ url, until: new Date(until).toISOString() }))
+        };
     }
 }
 
@@ -0,0 +1,380 @@
+/**
+ * Pipeline de ingestão de mensagens recebidas (messages.upsert)
+ *
+ * Cada instância possui um pipeline com estágios assíncronos independentes
+ * (ex.: mídia -> contato -> persistência -> webhook). Cada estágio tem sua
+ * própria fila e limite de concorrência. A ordem é preservada por chave
+ * (remoteJid): um item só entra em um estágio depois que o item anterior da
+ * mesma chave saiu dele, enquanto chaves diferentes avançam em paralelo.
+ *
+ * Estágios com `batch: { size, windowMs }` recebem um array de itens e são
+ * disparados quando o lote enche ou a janela de tempo expira. Itens da mesma
+ * chave podem entrar juntos no lote, sempre em ordem.
+ *
+ * Um item que falha em um estágio (exceção do handler) não segue para os
+ * próximos. O total de itens em andamento no pipeline é limitado (maxInFlight):
+ * acima do limite, `push` só resolve quando houver espaço (backpressure para o
+ * produtor), na ordem de chegada.
+ */
+
+const DEFAULT_CONCURRENCY = 4;
+const DEFAULT_MAX_IN_FLIGHT = 1000;
+
+// Registro global de pipelines por instância (para métricas e limpeza)
+const pipelines = new Map();
+
+class PipelineStage {
+  constructor(name, handler, options = {}) {
+    this.name = name;
+    this.handler = handler;
+    this.concurrency = Math.max(1, options.concurrency || DEFAULT_CONCURRENCY);
+    this.batchSize = options.batch ? Math.max(1, options.batch.size || 1) : 0;
+    this.batchWindowMs = options.batch ? options.batch.windowMs || 0 : 0;
+    this.batchTimer = null;
+    this.flushNow = false;    // drenagem: não esperar a janela do lote
+    this.saturated = null;    // pipeline cheio com produtores esperando: idem
+    this.next = null;
+    this.onExit = null;       // item saiu do pipeline (descartado, falhou ou último estágio)
+
+    this.pending = new Map(); // chave -> fila de itens aguardando este estágio
+    this.ready = [];          // chaves com itens pendentes e sem item ativo
+    this.busy = new Set();    // chaves com item em processamento
+    this.active = 0;
+    this.depth = 0;
+
+    this.stats = {
+      processed: 0,
+      batches: 0,
+      failed: 0,
+      totalMs: 0,
+      maxMs: 0,
+      lastMs: 0
+    };
+  }
+
+  push(key, item) {
+    let queue = this.pending.get(key);
+    if (!queue) {
+      queue = [];
+      this.pending.set(key, queue);
+    }
+    queue.push(item);
+    this.depth++;
+
+    if (queue.length === 1 && !this.busy.has(key)) {
+      this.ready.push(key);
+    }
+
+    this._drain();
+  }
+
+  _drain() {
+    if (this.batchSize) {
+      this._drainBatch();
+      return;
+    }
+
+    while (this.active < this.concurrency && this.ready.length > 0) {
+      const key = this.ready.shift();
+      const queue = this.pending.get(key);
+      const item = queue.shift();
+      if (queue.length === 0) this.pending.delete(key);
+
+      this.depth--;
+      this.active++;
+      this.busy.add(key);
+      this._run(key, item);
+    }
+  }
+
+  async _run(key, item) {
+    const start = Date.now();
+    let result = item;
+
+    try {
+      const output = await this.handler(item);
+      if (output !== undefined) result = output;
+    } catch (err) {
+      // Item com falha não segue para os próximos estágios
+      result = null;
+      this.stats.failed++;
+      console.error(`[Pipeline] Erro no estágio '${this.name}' (${key}):`, err.message);
+    }
+
+    const elapsed = Date.now() - start;
+    this.stats.processed++;
+    this.stats.totalMs += elapsed;
+    this.stats.lastMs = elapsed;
+    if (elapsed > this.stats.maxMs) this.stats.maxMs = elapsed;
+
+    this.active--;
+    this.busy.delete(key);
+
+    // Handler pode retornar null para descartar o item (ex.: mensagem filtrada)
+    if (result !== null && this.next) {
+      this.next.push(key, result);
+    } else {
+      this._exit(1);
+    }
+
+    if (this.pending.has(key)) {
+      this.ready.push(key);
+    }
+
+    this._drain();
+  }
+
+  _drainBatch() {
+    while (this.active < this.concurrency && this.ready.length > 0) {
+      // Aguardar a janela se o lote ainda não encheu
+      const hurry = this.flushNow || (this.saturated && this.saturated());
+      if (this.depth < this.batchSize && this.batchWindowMs > 0 && !hurry) {
+        if (!this.batchTimer) {
+          this.batchTimer = setTimeout(() => {
+            this.batchTimer = null;
+            this._flushBatch();
+            this._drainBatch();
+          }, this.batchWindowMs);
+        }
+        return;
+      }
+      this._flushBatch();
+    }
+  }
+
+  _flushBatch() {
+    if (this.active >= this.concurrency || this.ready.length === 0) return;
+
+    if (this.batchTimer) {
+      clearTimeout(this.batchTimer);
+      this.batchTimer = null;
+    }
+
+    const entries = [];
+    while (entries.length < this.batchSize && this.ready.length > 0) {
+      const key = this.ready.shift();
+      const queue = this.pending.get(key);
+
+      while (entries.length < this.batchSize && queue.length > 0) {
+        entries.push({ key, item: queue.shift() });
+        this.depth--;
+      }
+      if (queue.length === 0) this.pending.delete(key);
+      this.busy.add(key);
+    }
+
+    this.active++;
+    this._runBatch(entries);
+  }
+
+  async _runBatch(entries) {
+    const start = Date.now();
+    let results = entries.map(e => e.item);
+
+    try {
+      const output = await this.handler(results);
+      if (Array.isArray(output)) results = output;
+    } catch (err) {
+      results = entries.map(() => null);
+      this.stats.failed += entries.length;
+      console.error(`[Pipeline] Erro no lote do estágio '${this.name}' (${entries.length} itens):`, err.message);
+    }
+
+    const elapsed = Date.now() - start;
+    this.stats.processed += entries.length;
+    this.stats.batches++;
+    this.stats.totalMs += elapsed;
+    this.stats.lastMs = elapsed;
+    if (elapsed > this.stats.maxMs) this.stats.maxMs = elapsed;
+
+    this.active--;
+
+    const keys = new Set();
+    let exited = 0;
+    entries.forEach(({ key }, i) => {
+      keys.add(key);
+      if (results[i] !== null && results[i] !== undefined && this.next) {
+        this.next.push(key, results[i]);
+      } else {
+        exited++;
+      }
+    });
+    if (exited > 0) this._exit(exited);
+
+    for (const key of keys) {
+      this.busy.delete(key);
+      if (this.pending.has(key)) this.ready.push(key);
+    }
+
+    this._drain();
+  }
+
+  _exit(count) {
+    if (this.onExit) this.onExit(count);
+  }
+
+  getMetrics() {
+    const { processed, batches, failed, totalMs, maxMs, lastMs } = this.stats;
+    return {
+      concurrency: this.concurrency,
+      queueDepth: this.depth,
+      active: this.active,
+      processed,
+      failed,
+      ...(this.batchSize ? { batches, batchSize: this.batchSize } : {}),
+      avgLatencyMs: (this.batchSize ? batches : processed) > 0
+        ? Math.round(totalMs / (this.batchSize ? batches : processed))
+        : 0,
+      maxLatencyMs: maxMs,
+      lastLatencyMs: lastMs
+    };
+  }
+}
+
+class IngestionPipeline {
+  /**
+   * @param {string} name - Nome da instância dona do pipeline
+   * @param {Array<{name: string, handler: Function, concurrency?: number, batch?: {size: number, windowMs: number}}>} stages
+   * @param {{maxInFlight?: number}} options
+   */
+  constructor(name, stages, options = {}) {
+    this.name = name;
+    this.maxInFlight = Math.max(1, options.maxInFlight || DEFAULT_MAX_IN_FLIGHT);
+    this.stages = stages.map(s => new PipelineStage(s.name, s.handler, s));
+    for (let i = 0; i < this.stages.length; i++) {
+      this.stages[i].next = this.stages[i + 1] || null;
+      this.stages[i].onExit = (count) => this._release(count);
+      this.stages[i].saturated = () => this.waiting.length > 0;
+    }
+    this.accepted = 0;
+    this.inFlight = 0;
+    this.waiting = [];   // produtores aguardando espaço (FIFO)
+    this.idle = [];      // drenagens aguardando o pipeline esvaziar
+    this.blocked = 0;    // vezes em que push precisou esperar
+  }
+
+  /**
+   * Enfileirar um item; resolve quando o item foi aceito pelo primeiro estágio
+   */
+  async push(key, item) {
+    if (this.inFlight >= this.maxInFlight || this.waiting.length > 0) {
+      this.blocked++;
+      // A vaga é reservada em _release antes de liberar o produtor
+      const admitted = new Promise(resolve => this.waiting.push(resolve));
+      // Lotes parados na janela saem agora, em vez de segurar o produtor
+      for (const stage of this.stages) if (stage.batchSize) stage._drain();
+      await admitted;
+    } else {
+      this.inFlight++;
+    }
+
+    this.accepted++;
+    this.stages[0].push(key, item);
+  }
+
+  _release(count) {
+    this.inFlight -= count;
+
+    // Liberar produtores na ordem de chegada, reservando a vaga de cada um
+    while (this.inFlight < this.maxInFlight && this.waiting.length > 0) {
+      this.inFlight++;
+      this.waiting.shift()();
+    }
+
+    if (this.inFlight === 0 && this.waiting.length === 0) {
+      for (const stage of this.stages) stage.flushNow = false;
+      this.idle.splice(0).forEach(resolve => resolve());
+    }
+  }
+
+  /**
+   * Processar tudo o que já foi aceito (lotes saem sem esperar a janela)
+   * @returns {Promise<boolean>} false se o prazo expirou antes de esvaziar
+   */
+  async drain(timeoutMs = 10000) {
+    if (this.inFlight === 0 && this.waiting.length === 0) return true;
+
+    for (const stage of this.stages) {
+      stage.flushNow = true;
+      stage._drain();
+    }
+
+    let timer;
+    const idle = new Promise(resolve => this.idle.push(() => resolve(true)));
+    const timeout = new Promise(resolve => { timer = setTimeout(() => resolve(false), timeoutMs); });
+
+    try {
+      return await Promise.race([idle, timeout]);
+    } finally {
+      clearTimeout(timer);
+    }
+  }
+
+  getMetrics() {
+    const stages = {};
+    for (const stage of this.stages) {
+      stages[stage.name] = stage.getMetrics();
+    }
+    return {
+      accepted: this.accepted,
+      inFlight: this.inFlight,
+      maxInFlight: this.maxInFlight,
+      waiting: this.waiting.length,
+      blocked: this.blocked,
+      stages
+    };
+  }
+}
+
+/**
+ * Obter (ou criar) o pipeline de uma instância
+ */
+function getPipeline(instanceName, stages, options = {}) {
+  let pipeline = pipelines.get(instanceName);
+  if (!pipeline) {
+    pipeline = new IngestionPipeline(instanceName, stages, options);
+    pipelines.set(instanceName, pipeline);
+  }
+  return pipeline;
+}
+
+/**
+ * Remover pipeline de uma instância (itens em andamento terminam normalmente)
+ */
+function removePipeline(instanceName) {
+  pipelines.delete(instanceName);
+}
+
+/**
+ * Drenar os pipelines de todas as instâncias (desligamento)
+ * @returns {Promise<number>} itens que ficaram em andamento após o prazo
+ */
+async function drainPipelines(timeoutMs = 10000) {
+  const all = [...pipelines.values()];
+  await Promise.all(all.map(pipeline => pipeline.drain(timeoutMs)));
+  return all.reduce((total, pipeline) => total + pipeline.inFlight, 0);
+}
+
+/**
+ * Métricas de fila e latência por estágio, por instância
+ */
+function getIngestionMetrics(instanceName = null) {
+  if (instanceName) {
+    const pipeline = pipelines.get(instanceName);
+    return pipeline ? pipeline.getMetrics() : null;
+  }
+
+  const result = {};
+  for (const [name, pipeline] of pipelines) {
+    result[name] = pipeline.getMetrics();
+  }
+  return result;
+}
+
+module.exports = {
+  IngestionPipeline,
+  getPipeline,
+  removePipeline,
+  drainPipelines,
+  getIngestionMetrics
+};
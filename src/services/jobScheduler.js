@@ -0,0 +1,246 @@
+const crypto = require('crypto');
+const os = require('os');
+const cron = require('node-cron');
+const { redis } = require('../config/redis');
+
+/**
+ * Agendador central de tarefas periódicas
+ *
+ * Todas as réplicas registram as mesmas tarefas, mas cada disparo de uma tarefa
+ * 'cluster' roda em uma única réplica:
+ * - Após um atraso aleatório (jitter), a réplica tenta criar a chave do disparo
+ *   (`scheduler:tick:<nome>:<segundo do slot>`) com SET NX. Só quem criou executa.
+ * - Durante a execução ela segura um lease renovável (`scheduler:lock:<nome>`).
+ *   Se o disparo anterior ainda estiver rodando (em qualquer réplica), o novo é
+ *   pulado e contado como sobreposição.
+ * Tarefas 'local' (estado só em memória do processo) rodam em todas as réplicas,
+ * apenas com a proteção contra sobreposição local.
+ *
+ * Uso:
+ *   jobScheduler.schedule('status:checks', '* * * * *', () => runChecks());
+ *   jobScheduler.schedule('metrics:uptime', '* * * * *', atualizar, { scope: 'local' });
+ */
+
+const OWNER = `${os.hostname()}:${process.pid}:${crypto.randomBytes(4).toString('hex')}`;
+const DEFAULT_JITTER_MS = parseInt(process.env.JOB_SCHEDULER_JITTER_MS, 10) || 1000;
+const DEFAULT_LEASE_MS = parseInt(process.env.JOB_SCHEDULER_LEASE_MS, 10) || 300000;
+const TICK_TTL_MS = 300000;
+
+// Remover/renovar o lease apenas se ainda for nosso
+const RELEASE_SCRIPT = `
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+`;
+const RENEW_SCRIPT = `
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+`;
+
+const jobs = new Map();
+
+function emptyStats() {
+  return {
+    runs: 0,
+    failures: 0,
+    skippedOtherReplica: 0,
+    overlaps: 0,
+    lastStartedAt: null,
+    lastDurationMs: null,
+    maxDurationMs: 0,
+    lastError: null
+  };
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+async function acquireLease(name, leaseMs) {
+  const ok = await redis.set(`scheduler:lock:${name}`, OWNER, 'PX', leaseMs, 'NX');
+  return ok === 'OK';
+}
+
+async function execute(job, tick, handler = job.handler) {
+  const { name, options, stats } = job;
+
+  if (job.running) {
+    stats.overlaps++;
+    console.warn(`[JobScheduler] ${name}: execução anterior ainda em andamento, disparo ignorado`);
+    return;
+  }
+
+  let renewTimer = null;
+  const cluster = options.scope === 'cluster';
+
+  try {
+    if (cluster) {
+      if (tick !== null && options.jitterMs > 0) {
+        await sleep(Math.floor(Math.random() * options.jitterMs));
+      }
+
+      if (tick !== null) {
+        const won = await redis.set(`scheduler:tick:${name}:${tick}`, OWNER, 'PX', TICK_TTL_MS, 'NX');
+        if (won !== 'OK') {
+          stats.skippedOtherReplica++;
+          return;
+        }
+      }
+
+      if (!(await acquireLease(name, options.leaseMs))) {
+        stats.overlaps++;
+        console.warn(`[JobScheduler] ${name}: execução anterior ainda em andamento em outra réplica, disparo ignorado`);
+        return;
+      }
+
+      renewTimer = setInterval(() => {
+        redis.eval(RENEW_SCRIPT, 1, `scheduler:lock:${name}`, OWNER, options.leaseMs)
+          .catch(err => console.error(`[JobScheduler] ${name}: erro ao renovar lease:`, err.message));
+      }, Math.max(1000, Math.floor(options.leaseMs / 3)));
+      renewTimer.unref();
+    }
+  } catch (err) {
+    // Sem Redis não há como garantir execução única: melhor pular o disparo
+    stats.failures++;
+    stats.lastError = `Redis: ${err.message}`;
+    console.error(`[JobScheduler] ${name}: Redis indisponível, disparo ignorado:`, err.message);
+    return;
+  }
+
+  job.running = true;
+  const startedAt = Date.now();
+  stats.lastStartedAt = new Date(startedAt).toISOString();
+
+  try {
+    await handler();
+    stats.runs++;
+  } catch (err) {
+    stats.failures++;
+    stats.lastError = err.message;
+    console.error(`[JobScheduler] ${name}: erro na execução:`, err.message);
+  } finally {
+    const duration = Date.now() - startedAt;
+    stats.lastDurationMs = duration;
+    stats.maxDurationMs = Math.max(stats.maxDurationMs, duration);
+    job.running = false;
+
+    if (cluster) {
+      clearInterval(renewTimer);
+      redis.multi()
+        .eval(RELEASE_SCRIPT, 1, `scheduler:lock:${name}`, OWNER)
+        .hset(`scheduler:job:${name}`, 'owner', OWNER, 'startedAt', stats.lastStartedAt, 'durationMs', duration)
+        .hincrby(`scheduler:job:${name}`, 'runs', 1)
+        .exec()
+        .catch(err => console.error(`[JobScheduler] ${name}: erro ao liberar lease:`, err.message));
+    }
+  }
+}
+
+// Segundo (epoch) do slot do cron a partir da data recebida no disparo
+function slotKey(matchedAt) {
+  const date = matchedAt instanceof Date ? matchedAt : new Date();
+  return Math.floor(date.getTime() / 1000);
+}
+
+/**
+ * Registrar uma tarefa periódica
+ * @param {string} name - Nome único da tarefa (chave do lease)
+ * @param {string} expression - Expressão node-cron
+ * @param {Function} handler - Função (pode ser async)
+ * @param {{scope?: 'cluster'|'local', jitterMs?: number, leaseMs?: number}} [options]
+ */
+function schedule(name, expression, handler, options = {}) {
+  if (jobs.has(name)) {
+    throw new Error(`Tarefa ${name} já registrada`);
+  }
+
+  const job = {
+    name,
+    expression,
+    handler,
+    options: {
+      scope: options.scope || 'cluster',
+      jitterMs: options.jitterMs ?? DEFAULT_JITTER_MS,
+      leaseMs: options.leaseMs || DEFAULT_LEASE_MS
+    },
+    stats: emptyStats(),
+    running: false,
+    task: null
+  };
+
+  // Chave do disparo: o segundo do slot agendado. O node-cron passa a data que casou
+  // com a expressão (inclusive para disparos atrasados pelo event loop), então todas
+  // as réplicas chegam à mesma chave mesmo com relógio/atraso diferentes.
+  job.task = cron.schedule(expression, (matchedAt) => {
+    execute(job, slotKey(matchedAt)).catch(() => {});
+  });
+
+  jobs.set(name, job);
+  return job.task;
+}
+
+/**
+ * Executar agora uma tarefa registrada (ou um handler avulso) respeitando o lease
+ * Útil para a execução inicial no boot sem que todas as réplicas rodem juntas.
+ */
+async function runOnce(name, handler = null, options = {}) {
+  const job = jobs.get(name) || {
+    name,
+    handler,
+    options: { scope: 'cluster', leaseMs: DEFAULT_LEASE_MS, ...options },
+    stats: emptyStats(),
+    running: false
+  };
+
+  // Sem chave de disparo nem jitter: só o lease impede execução simultânea
+  await execute(job, null, handler || job.handler);
+}
+
+/**
+ * Parar todos os agendamentos desta réplica
+ */
+function stopAll() {
+  for (const job of jobs.values()) {
+    job.task.stop();
+  }
+}
+
+/**
+ * Estatísticas das tarefas (desta réplica + última execução no cluster)
+ */
+async function getJobStats() {
+  const result = {};
+
+  for (const [name, job] of jobs) {
+    result[name] = {
+      expression: job.expression,
+      scope: job.options.scope,
+      running: job.running,
+      ...job.stats
+    };
+
+    if (job.options.scope === 'cluster') {
+      try {
+        const cluster = await redis.hgetall(`scheduler:job:${name}`);
+        result[name].cluster = {
+          lastOwner: cluster.owner || null,
+          lastStartedAt: cluster.startedAt || null,
+          lastDurationMs: cluster.durationMs ? parseInt(cluster.durationMs, 10) : null,
+          runs: parseInt(cluster.runs, 10) || 0
+        };
+      } catch (err) {
+        result[name].cluster = null;
+      }
+    }
+  }
+
+  return { owner: OWNER, jobs: result };
+}
+
+module.exports = {
+  schedule,
+  runOnce,
+  stopAll,
+  getJobStats
+};
@@ -0,0 +1,252 @@
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { Transform } = require('stream');
+const { pipeline } = require('stream/promises');
+const { query } = require('../config/database');
+
+/**
+ * Armazenamento de mídias recebidas
+ *
+ * - Download em streaming direto para o disco (sem buffer em memória e sem I/O síncrono)
+ * - Arquivos nomeados pelo SHA-256 do conteúdo: figurinhas e encaminhamentos repetidos
+ *   são gravados uma única vez
+ * - Limite de tamanho por arquivo e varredura periódica por TTL/cota de disco (LRU pelo
+ *   último acesso), opcional (MEDIA_SWEEP_ENABLED=true). A varredura só remove arquivos
+ *   que nenhuma mensagem (mensagens_chat) ou etapa de follow-up referencia.
+ *
+ * As URLs continuam no formato /uploads/<arquivo>.
+ */
+
+// Caminho absoluto IDÊNTICO ao servido pelo express.static do index.js
+const UPLOADS_DIR = '/app/uploads';
+const TMP_DIR = path.join(UPLOADS_DIR, '.tmp');
+
+const MEDIA_MAX_BYTES = parseInt(process.env.MEDIA_MAX_BYTES, 10) || 100 * 1024 * 1024; // 100MB
+const MEDIA_TTL_MS = (parseInt(process.env.MEDIA_TTL_DAYS, 10) || 30) * 24 * 60 * 60 * 1000;
+const MEDIA_QUOTA_BYTES = (parseInt(process.env.MEDIA_QUOTA_MB, 10) || 10240) * 1024 * 1024; // 10GB
+const MEDIA_SWEEP_INTERVAL_MS = parseInt(process.env.MEDIA_SWEEP_INTERVAL_MS, 10) || 60 * 60 * 1000;
+const MEDIA_SWEEP_ENABLED = process.env.MEDIA_SWEEP_ENABLED === 'true';
+// O último acesso é gravado no atime do arquivo no máximo uma vez por intervalo
+const ACCESS_TOUCH_INTERVAL_MS = 60 * 60 * 1000;
+
+// Extensões de tipos comuns cujo subtipo MIME não serve como extensão
+const MIME_EXTENSIONS = {
+  'image/jpeg': 'jpg',
+  'audio/mpeg': 'mp3',
+  'text/plain': 'txt',
+  'application/msword': 'doc',
+  'application/vnd.ms-excel': 'xls',
+  'application/vnd.ms-powerpoint': 'ppt',
+  'application/vnd.openxmlformats-officedocument.wordprocessingml.document': 'docx',
+  'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': 'xlsx',
+  'application/vnd.openxmlformats-officedocument.presentationml.presentation': 'pptx'
+};
+
+// Apenas arquivos endereçados por conteúdo entram na varredura
+const CONTENT_ADDRESSED_FILE = /^[a-f0-9]{64}\.[a-z0-9]+$/;
+
+let sweepTimer = null;
+const lastTouch = new Map();
+
+[UPLOADS_DIR, TMP_DIR].forEach(dir => {
+  if (!fs.existsSync(dir)) {
+    fs.mkdirSync(dir, { recursive: true });
+  }
+});
+
+class MediaTooLargeError extends Error {
+  constructor(maxBytes) {
+    super(`Mídia excede o limite de ${Math.round(maxBytes / 1024 / 1024)}MB`);
+    this.name = 'MediaTooLargeError';
+  }
+}
+
+/**
+ * Normalizar a extensão para o formato aceito pela varredura ([a-z0-9], até 10 caracteres)
+ */
+function sanitizeExtension(extension) {
+  const clean = String(extension || '').toLowerCase().replace(/[^a-z0-9]/g, '').slice(0, 10);
+  return clean || 'bin';
+}
+
+/**
+ * Extensão de arquivo a partir do tipo MIME (ex.: application/pdf -> pdf)
+ */
+function extensionFromMime(mimeType) {
+  const type = String(mimeType || '').split(';')[0].trim().toLowerCase();
+  return MIME_EXTENSIONS[type] || sanitizeExtension(type.split('/')[1]);
+}
+
+/**
+ * Gravar uma stream de mídia no disco, deduplicando pelo SHA-256
+ * @returns {Promise<{fileName: string, url: string, size: number, sha256: string, deduplicated: boolean}>}
+ */
+async function storeMediaStream(source, { extension = 'bin', maxBytes = MEDIA_MAX_BYTES, baseUrl = '' } = {}) {
+  const hash = crypto.createHash('sha256');
+  let size = 0;
+
+  const meter = new Transform({
+    transform(chunk, encoding, callback) {
+      size += chunk.length;
+      if (size > maxBytes) {
+        callback(new MediaTooLargeError(maxBytes));
+        return;
+      }
+      hash.update(chunk);
+      callback(null, chunk);
+    }
+  });
+
+  const tmpPath = path.join(TMP_DIR, `${Date.now()}_${crypto.randomBytes(6).toString('hex')}`);
+
+  try {
+    await pipeline(source, meter, fs.createWriteStream(tmpPath));
+  } catch (err) {
+    await fs.promises.rm(tmpPath, { force: true });
+    throw err;
+  }
+
+  const sha256 = hash.digest('hex');
+  const fileName = `${sha256}.${sanitizeExtension(extension)}`;
+  const finalPath = path.join(UPLOADS_DIR, fileName);
+
+  let deduplicated = false;
+  try {
+    // Já existe: descartar a cópia e renovar o último acesso (usado pelo LRU)
+    await fs.promises.access(finalPath);
+    await fs.promises.rm(tmpPath, { force: true });
+    const now = new Date();
+    await fs.promises.utimes(finalPath, now, now);
+    deduplicated = true;
+  } catch (e) {
+    await fs.promises.rename(tmpPath, finalPath);
+  }
+
+  return {
+    fileName,
+    url: `${baseUrl}/uploads/${fileName}`,
+    size,
+    sha256,
+    deduplicated
+  };
+}
+
+/**
+ * Registrar o acesso a uma mídia (atime), usado pelo TTL e pelo LRU da varredura
+ * Chamado pela rota /uploads; o atime do sistema de arquivos não é confiável (noatime/relatime).
+ */
+function touchMedia(fileName) {
+  if (!MEDIA_SWEEP_ENABLED || !CONTENT_ADDRESSED_FILE.test(fileName)) return;
+
+  const now = Date.now();
+  if (now - (lastTouch.get(fileName) || 0) < ACCESS_TOUCH_INTERVAL_MS) return;
+  if (lastTouch.size >= 10000) lastTouch.clear();
+  lastTouch.set(fileName, now);
+
+  const fullPath = path.join(UPLOADS_DIR, fileName);
+  fs.promises.stat(fullPath)
+    .then(stat => fs.promises.utimes(fullPath, new Date(now), stat.mtime))
+    .catch(() => {});
+}
+
+/**
+ * Arquivos do uploads ainda referenciados no banco (mensagens e etapas de follow-up)
+ */
+async function findReferencedMedia() {
+  const result = await query(`
+    SELECT substring(midia_url from '([a-f0-9]{64}\\.[a-z0-9]+)$') AS arquivo
+    FROM mensagens_chat
+    WHERE midia_url LIKE '%/uploads/%'
+    UNION
+    SELECT substring(midia_url from '([a-f0-9]{64}\\.[a-z0-9]+)$') AS arquivo
+    FROM etapas_followup
+    WHERE midia_url LIKE '%/uploads/%'
+  `);
+
+  return new Set(result.rows.map(row => row.arquivo).filter(Boolean));
+}
+
+/**
+ * Remover mídias sem referência no banco que expiraram (TTL desde o último acesso) e,
+ * se a cota for excedida, as de acesso mais antigo (LRU)
+ */
+async function sweepMedia({ ttlMs = MEDIA_TTL_MS, quotaBytes = MEDIA_QUOTA_BYTES } = {}) {
+  const now = Date.now();
+  const files = [];
+  let removed = 0;
+  let freedBytes = 0;
+  let totalBytes = 0;
+
+  // Sem a lista de referências não é seguro remover nada (a consulta falha = varredura abortada)
+  const referenced = await findReferencedMedia();
+
+  const names = await fs.promises.readdir(UPLOADS_DIR);
+  for (const name of names) {
+    if (!CONTENT_ADDRESSED_FILE.test(name)) continue;
+    const fullPath = path.join(UPLOADS_DIR, name);
+    try {
+      const stat = await fs.promises.stat(fullPath);
+      totalBytes += stat.size;
+      if (referenced.has(name)) continue;
+      files.push({ fullPath, size: stat.size, lastAccessMs: Math.max(stat.atimeMs, stat.mtimeMs) });
+    } catch (e) {
+      // Arquivo removido durante a varredura
+    }
+  }
+
+  const remove = async (file) => {
+    try {
+      await fs.promises.rm(file.fullPath, { force: true });
+      removed++;
+      freedBytes += file.size;
+      totalBytes -= file.size;
+      file.removed = true;
+    } catch (e) {
+      console.error('[MediaStore] Erro ao remover mídia:', e.message);
+    }
+  };
+
+  // 1. TTL
+  for (const file of files) {
+    if (now - file.lastAccessMs > ttlMs) await remove(file);
+  }
+
+  // 2. Cota (LRU: acesso mais antigo primeiro)
+  if (totalBytes > quotaBytes) {
+    const lru = files.filter(f => !f.removed).sort((a, b) => a.lastAccessMs - b.lastAccessMs);
+    for (const file of lru) {
+      if (totalBytes <= quotaBytes) break;
+      await remove(file);
+    }
+  }
+
+  if (removed > 0) {
+    console.log(`[MediaStore] Varredura removeu ${removed} arquivo(s) (${Math.round(freedBytes / 1024 / 1024)}MB)`);
+  }
+
+  return { removed, freedBytes, totalBytes, referenced: referenced.size };
+}
+
+/**
+ * Iniciar varredura periódica de mídias (apenas com MEDIA_SWEEP_ENABLED=true)
+ */
+function startMediaSweeper() {
+  if (sweepTimer || !MEDIA_SWEEP_ENABLED) return;
+  sweepTimer = setInterval(() => {
+    sweepMedia().catch(err => console.error('[MediaStore] Erro na varredura:', err.message));
+  }, MEDIA_SWEEP_INTERVAL_MS);
+  sweepTimer.unref();
+  console.log('[MediaStore] Varredura de mídias iniciada');
+}
+
+module.exports = {
+  UPLOADS_DIR,
+  MEDIA_MAX_BYTES,
+  MediaTooLargeError,
+  storeMediaStream,
+  extensionFromMime,
+  touchMedia,
+  sweepMedia,
+  startMediaSweeper
+};
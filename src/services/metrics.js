@@ -1,13 +1,30 @@
 const path = require('path');
 const fs = require('fs');
-const cron = require('node-cron');
 const os = require('os');
+const { redis } = require('../config/redis');
+const jobScheduler = require('./jobScheduler');
+const metricsRepository = require('../repositories/metricsRepository');
 
-// Diretório de dados
+// Diretório de dados (metrics.json é lido apenas para migrar contadores antigos)
 const DATA_DIR = process.env.DATA_DIR || './data';
 const METRICS_FILE = path.join(DATA_DIR, 'metrics.json');
 
-// Armazenamento de métricas em memória
+// Contadores compartilhados entre réplicas (HINCRBY no Redis)
+const REDIS_PREFIX = 'metrics';
+const INSTANCES_KEY = `${REDIS_PREFIX}:instances`;
+const GLOBAL_KEY = `${REDIS_PREFIX}:global`;
+const instanceKey = (instanceName) => `${REDIS_PREFIX}:instance:${instanceName}`;
+
+// Intervalo de envio dos deltas acumulados para o Redis
+const FLUSH_INTERVAL_MS = parseInt(process.env.METRICS_FLUSH_INTERVAL_MS, 10) || 1000;
+
+const MESSAGE_TYPES = ['text', 'image', 'video', 'audio', 'document', 'sticker', 'location', 'contact', 'poll', 'reaction', 'other'];
+const INSTANCE_COUNTERS = ['messagesSent', 'messagesReceived', 'messagesFailed', 'errorsToday'];
+const GLOBAL_COUNTERS = ['totalMessagesSent', 'totalMessagesReceived', 'apiRequestsToday', 'rateLimitHits'];
+// Métricas por instância que também entram no histórico horário (metrics_hourly)
+const HOURLY_METRICS = ['sent', 'received', 'failed', 'error'];
+
+// Visão local (desta réplica) - usada como fallback se o Redis estiver indisponível
 const metrics = {
   instances: {},
   global: {
@@ -22,57 +39,79 @@ const metrics = {
   }
 };
 
+// Deltas e campos pendentes de envio ao Redis
+let pendingCounters = new Map(); // chave redis -> { campo: delta }
+let pendingFields = new Map();   // chave redis -> { campo: valor }
+let flushTimer = null;
+
+function addPendingCounter(key, field, value) {
+  let fields = pendingCounters.get(key);
+  if (!fields) {
+    fields = {};
+    pendingCounters.set(key, fields);
+  }
+  fields[field] = (fields[field] || 0) + value;
+}
+
+function setPendingField(key, field, value) {
+  let fields = pendingFields.get(key);
+  if (!fields) {
+    fields = {};
+    pendingFields.set(key, fields);
+  }
+  fields[field] = value;
+}
+
 // Inicializar métricas
 function initMetrics() {
-  loadMetrics();
+  migrateMetricsFile().catch(err => console.error('[Metrics] Erro ao migrar metrics.json:', err.message));
 
-  // Salvar métricas a cada 5 minutos
-  cron.schedule('*/5 * * * *', () => {
-    saveMetrics();
-  });
+  // Enviar deltas acumulados ao Redis (o histórico horário tem o próprio intervalo,
+  // METRICS_BUCKET_FLUSH_MS, no metricsRepository)
+  flushTimer = setInterval(() => {
+    flushCounters().catch(err => console.error('[Metrics] Erro ao enviar métricas:', err.message));
+  }, FLUSH_INTERVAL_MS);
+  flushTimer.unref();
 
-  // Resetar métricas diárias à meia-noite
-  cron.schedule('0 0 * * *', () => {
-    resetDailyMetrics();
-  });
+  // Resetar métricas diárias à meia-noite (contadores no Redis: uma réplica basta)
+  jobScheduler.schedule('metrics:daily-reset', '0 0 * * *', () => resetDailyMetrics());
 
-  // Atualizar uptime a cada minuto
-  cron.schedule('* * * * *', () => {
+  // Atualizar uptime a cada minuto (valor deste processo)
+  jobScheduler.schedule('metrics:uptime', '* * * * *', () => {
     metrics.global.uptime = Math.floor(process.uptime());
-  });
+  }, { scope: 'local' });
+
+  console.log('[Metrics] Sistema de métricas inicializado (Redis)');
+}
+
+function emptyInstanceMetrics() {
+  const messageTypes = {};
+  MESSAGE_TYPES.forEach(type => { messageTypes[type] = 0; });
 
-  console.log('[Metrics] Sistema de métricas inicializado');
+  return {
+    messagesSent: 0,
+    messagesReceived: 0,
+    messagesFailed: 0,
+    uptime: 0,
+    lastActivity: null,
+    connectionStatus: 'disconnected',
+    errorsToday: 0,
+    messageTypes,
+    createdAt: new Date().toISOString()
+  };
 }
 
 // Criar métrica para nova instância
 function createInstanceMetrics(instanceName) {
   if (!metrics.instances[instanceName]) {
-    metrics.instances[instanceName] = {
-      messagesSent: 0,
-      messagesReceived: 0,
-      messagesFailed: 0,
-      uptime: 0,
-      lastActivity: null,
-      connectionStatus: 'disconnected',
-      errorsToday: 0,
-      messageTypes: {
-        text: 0,
-        image: 0,
-        video: 0,
-        audio: 0,
-        document: 0,
-        sticker: 0,
-        location: 0,
-        contact: 0,
-        poll: 0,
-        reaction: 0,
-        other: 0
-      },
-      createdAt: new Date().toISOString()
-    };
-
+    metrics.instances[instanceName] = emptyInstanceMetrics();
     metrics.global.totalInstances++;
-    saveMetrics();
+
+    redis.multi()
+      .sadd(INSTANCES_KEY, instanceName)
+      .hsetnx(instanceKey(instanceName), 'createdAt', metrics.instances[instanceName].createdAt)
+      .exec()
+      .catch(err => console.error('[Metrics] Erro ao registrar instância:', err.message));
   }
 }
 
@@ -81,11 +120,19 @@ function removeInstanceMetrics(instanceName) {
   if (metrics.instances[instanceName]) {
     delete metrics.instances[instanceName];
     metrics.global.totalInstances = Math.max(0, metrics.global.totalInstances - 1);
-    saveMetrics();
   }
+
+  pendingCounters.delete(instanceKey(instanceName));
+  pendingFields.delete(instanceKey(instanceName));
+
+  redis.multi()
+    .srem(INSTANCES_KEY, instanceName)
+    .del(instanceKey(instanceName))
+    .exec()
+    .catch(err => console.error('[Metrics] Erro ao remover instância:', err.message));
 }
 
-// Incrementar métrica
+// Incrementar métrica (O(1), sem I/O: o delta é enviado no próximo flush)
 function incrementMetric(instanceName, metric, value = 1, messageType = null) {
   // Criar métricas da instância se não existir
   if (!metrics.instances[instanceName]) {
@@ -93,43 +140,58 @@ function incrementMetric(instanceName, metric, value = 1, messageType = null) {
   }
 
   const instance = metrics.instances[instanceName];
+  const key = instanceKey(instanceName);
 
   // Atualizar métrica específica
   switch (metric) {
-    case 'sent':
+    case 'sent': {
       instance.messagesSent += value;
       metrics.global.totalMessagesSent += value;
-      if (messageType && instance.messageTypes[messageType] !== undefined) {
-        instance.messageTypes[messageType] += value;
-      } else if (messageType) {
-        instance.messageTypes.other += value;
+      addPendingCounter(key, 'messagesSent', value);
+      addPendingCounter(GLOBAL_KEY, 'totalMessagesSent', value);
+      if (messageType) {
+        const type = instance.messageTypes[messageType] !== undefined ? messageType : 'other';
+        instance.messageTypes[type] += value;
+        addPendingCounter(key, `type:${type}`, value);
       }
       break;
+    }
 
     case 'received':
       instance.messagesReceived += value;
       metrics.global.totalMessagesReceived += value;
+      addPendingCounter(key, 'messagesReceived', value);
+      addPendingCounter(GLOBAL_KEY, 'totalMessagesReceived', value);
       break;
 
     case 'failed':
       instance.messagesFailed += value;
+      addPendingCounter(key, 'messagesFailed', value);
       break;
 
     case 'error':
       instance.errorsToday += value;
+      addPendingCounter(key, 'errorsToday', value);
       break;
 
     case 'api_request':
       metrics.global.apiRequestsToday += value;
+      addPendingCounter(GLOBAL_KEY, 'apiRequestsToday', value);
       break;
 
     case 'rate_limit':
       metrics.global.rateLimitHits += value;
+      addPendingCounter(GLOBAL_KEY, 'rateLimitHits', value);
       break;
   }
 
+  if (HOURLY_METRICS.includes(metric)) {
+    metricsRepository.incrementMetric(instanceName, metric, value);
+  }
+
   // Atualizar última atividade
   instance.lastActivity = new Date().toISOString();
+  setPendingField(key, 'lastActivity', instance.lastActivity);
 }
 
 // Atualizar status de conexão
@@ -148,16 +210,101 @@ function updateConnectionStatus(instanceName, status) {
     metrics.global.connectedInstances = Math.max(0, metrics.global.connectedInstances - 1);
   }
 
-  saveMetrics();
+  setPendingField(instanceKey(instanceName), 'connectionStatus', status);
+}
+
+// Enviar deltas pendentes: contadores no Redis e histórico horário no Postgres
+async function flushMetrics() {
+  const results = await Promise.allSettled([flushCounters(), metricsRepository.flushMetrics()]);
+  const failed = results.find(r => r.status === 'rejected');
+  if (failed) throw failed.reason;
+}
+
+// Enviar deltas acumulados ao Redis em um único pipeline
+async function flushCounters() {
+  if (pendingCounters.size === 0 && pendingFields.size === 0) return;
+
+  const counters = pendingCounters;
+  const fields = pendingFields;
+  pendingCounters = new Map();
+  pendingFields = new Map();
+
+  const pipeline = redis.pipeline();
+  for (const [key, values] of counters) {
+    for (const [field, delta] of Object.entries(values)) {
+      pipeline.hincrby(key, field, delta);
+    }
+  }
+  for (const [key, values] of fields) {
+    pipeline.hset(key, values);
+  }
+
+  try {
+    await pipeline.exec();
+  } catch (error) {
+    // Devolver os deltas para a próxima tentativa
+    for (const [key, values] of counters) {
+      for (const [field, delta] of Object.entries(values)) addPendingCounter(key, field, delta);
+    }
+    for (const [key, values] of fields) {
+      for (const [field, value] of Object.entries(values)) {
+        if (!pendingFields.get(key) || pendingFields.get(key)[field] === undefined) setPendingField(key, field, value);
+      }
+    }
+    throw error;
+  }
+}
+
+// Converter hash do Redis no formato de métricas de instância
+function parseInstanceHash(hash) {
+  const result = emptyInstanceMetrics();
+  INSTANCE_COUNTERS.forEach(field => {
+    result[field] = parseInt(hash[field], 10) || 0;
+  });
+  MESSAGE_TYPES.forEach(type => {
+    result.messageTypes[type] = parseInt(hash[`type:${type}`], 10) || 0;
+  });
+  result.lastActivity = hash.lastActivity || null;
+  result.connectionStatus = hash.connectionStatus || 'disconnected';
+  result.createdAt = hash.createdAt || result.createdAt;
+  return result;
+}
+
+// Ler métricas de todas as instâncias (agregadas entre réplicas)
+async function readAllInstanceMetrics() {
+  try {
+    await flushCounters();
+    const names = await redis.smembers(INSTANCES_KEY);
+    const pipeline = redis.pipeline();
+    names.forEach(name => pipeline.hgetall(instanceKey(name)));
+    const results = await pipeline.exec();
+
+    const instances = {};
+    names.forEach((name, i) => {
+      const [err, hash] = results[i];
+      if (!err) instances[name] = parseInstanceHash(hash || {});
+    });
+    return instances;
+  } catch (error) {
+    console.error('[Metrics] Redis indisponível, usando métricas locais:', error.message);
+    return metrics.instances;
+  }
 }
 
 // Obter métricas de uma instância
-function getInstanceMetrics(instanceName) {
-  return metrics.instances[instanceName] || null;
+async function getInstanceMetrics(instanceName) {
+  try {
+    await flushCounters();
+    const hash = await redis.hgetall(instanceKey(instanceName));
+    if (!hash || Object.keys(hash).length === 0) return metrics.instances[instanceName] || null;
+    return parseInstanceHash(hash);
+  } catch (error) {
+    return metrics.instances[instanceName] || null;
+  }
 }
 
 // Obter métricas globais
-function getGlobalMetrics() {
+async function getGlobalMetrics(instances = null) {
   const freeMem = os.freemem();
   const totalMem = os.totalmem();
   const usedMem = totalMem - freeMem;
@@ -168,11 +315,25 @@ function getGlobalMetrics() {
   const cpus = os.cpus().length;
   const cpuPercent = Math.min(100, Math.round((load / cpus) * 100));
 
+  const allInstances = instances || await readAllInstanceMetrics();
+
+  let counters = metrics.global;
+  try {
+    const hash = await redis.hgetall(GLOBAL_KEY);
+    counters = {};
+    GLOBAL_COUNTERS.forEach(field => {
+      counters[field] = parseInt(hash[field], 10) || 0;
+    });
+  } catch (error) {
+    // Mantém contadores locais
+  }
+
   return {
     ...metrics.global,
+    ...counters,
     uptime: Math.floor(process.uptime()),
-    totalInstances: Object.keys(metrics.instances).length,
-    connectedInstances: Object.values(metrics.instances).filter(
+    totalInstances: Object.keys(allInstances).length,
+    connectedInstances: Object.values(allInstances).filter(
       i => i.connectionStatus === 'connected'
     ).length,
     system: {
@@ -186,16 +347,17 @@ function getGlobalMetrics() {
 }
 
 // Obter todas as métricas
-function getAllMetrics() {
+async function getAllMetrics() {
+  const instances = await readAllInstanceMetrics();
   return {
-    instances: metrics.instances,
-    global: getGlobalMetrics(),
+    instances,
+    global: await getGlobalMetrics(instances),
     timestamp: new Date().toISOString()
   };
 }
 
 // Resetar métricas diárias
-function resetDailyMetrics() {
+async function resetDailyMetrics() {
   console.log('[Metrics] Resetando métricas diárias...');
 
   // Resetar global
@@ -207,11 +369,20 @@ function resetDailyMetrics() {
     metrics.instances[instanceName].errorsToday = 0;
   });
 
-  saveMetrics();
+  try {
+    await flushCounters();
+    const names = await redis.smembers(INSTANCES_KEY);
+    const pipeline = redis.pipeline();
+    pipeline.hset(GLOBAL_KEY, { apiRequestsToday: 0, rateLimitHits: 0 });
+    names.forEach(name => pipeline.hset(instanceKey(name), 'errorsToday', 0));
+    await pipeline.exec();
+  } catch (error) {
+    console.error('[Metrics] Erro ao resetar métricas diárias:', error.message);
+  }
 }
 
 // Resetar todas as métricas
-function resetAllMetrics() {
+async function resetAllMetrics() {
   console.log('[Metrics] Resetando TODAS as métricas...');
 
   const instanceNames = Object.keys(metrics.instances);
@@ -227,25 +398,29 @@ function resetAllMetrics() {
     startedAt: new Date().toISOString(),
     uptime: 0
   };
+  pendingCounters = new Map();
+  pendingFields = new Map();
+
+  const names = await redis.smembers(INSTANCES_KEY);
+  await redis.del(GLOBAL_KEY, INSTANCES_KEY, ...names.map(instanceKey));
 
   // Recriar instâncias vazias
   instanceNames.forEach(name => {
     createInstanceMetrics(name);
   });
-
-  saveMetrics();
 }
 
 // Exportar métricas em formato CSV
-function exportMetricsCSV() {
+async function exportMetricsCSV() {
+  const instances = await readAllInstanceMetrics();
   const lines = [];
 
   // Header
   lines.push('Instance,Sent,Received,Failed,Errors,Status,Last Activity');
 
   // Dados
-  Object.keys(metrics.instances).forEach(instanceName => {
-    const m = metrics.instances[instanceName];
+  Object.keys(instances).forEach(instanceName => {
+    const m = instances[instanceName];
     lines.push(
       `${instanceName},${m.messagesSent},${m.messagesReceived},${m.messagesFailed},${m.errorsToday},${m.connectionStatus},${m.lastActivity || 'Never'}`
     );
@@ -254,60 +429,49 @@ function exportMetricsCSV() {
   return lines.join('\n');
 }
 
-// Salvar métricas em arquivo
-function saveMetrics() {
-  try {
-    if (!fs.existsSync(DATA_DIR)) {
-      fs.mkdirSync(DATA_DIR, { recursive: true });
-    }
+// Migrar contadores do antigo metrics.json (executa uma única vez por cluster)
+async function migrateMetricsFile() {
+  if (!fs.existsSync(METRICS_FILE)) return;
 
-    fs.writeFileSync(METRICS_FILE, JSON.stringify(metrics, null, 2));
-  } catch (error) {
-    console.error('[Metrics] Erro ao salvar métricas:', error.message);
-  }
-}
+  const migrated = await redis.set(`${REDIS_PREFIX}:migrated`, '1', 'NX');
+  if (migrated !== 'OK') return;
 
-// Carregar métricas do arquivo
-function loadMetrics() {
-  try {
-    if (fs.existsSync(METRICS_FILE)) {
-      const data = fs.readFileSync(METRICS_FILE, 'utf8');
-      const loaded = JSON.parse(data);
+  const loaded = JSON.parse(await fs.promises.readFile(METRICS_FILE, 'utf8'));
+  const pipeline = redis.pipeline();
 
-      // Mesclar dados carregados
-      if (loaded.instances) {
-        metrics.instances = loaded.instances;
-      }
+  for (const [name, m] of Object.entries(loaded.instances || {})) {
+    pipeline.sadd(INSTANCES_KEY, name);
+    INSTANCE_COUNTERS.forEach(field => {
+      if (m[field]) pipeline.hincrby(instanceKey(name), field, m[field]);
+    });
+    Object.entries(m.messageTypes || {}).forEach(([type, count]) => {
+      if (count) pipeline.hincrby(instanceKey(name), `type:${type}`, count);
+    });
+    if (m.createdAt) pipeline.hsetnx(instanceKey(name), 'createdAt', m.createdAt);
+    if (m.lastActivity) pipeline.hsetnx(instanceKey(name), 'lastActivity', m.lastActivity);
+  }
 
-      if (loaded.global) {
-        metrics.global = {
-          ...metrics.global,
-          ...loaded.global,
-          startedAt: new Date().toISOString() // Atualizar data de início
-        };
-      }
+  GLOBAL_COUNTERS.forEach(field => {
+    if (loaded.global?.[field]) pipeline.hincrby(GLOBAL_KEY, field, loaded.global[field]);
+  });
 
-      console.log('[Metrics] Métricas carregadas:', {
-        instances: Object.keys(metrics.instances).length,
-        totalSent: metrics.global.totalMessagesSent,
-        totalReceived: metrics.global.totalMessagesReceived
-      });
-    }
-  } catch (error) {
-    console.error('[Metrics] Erro ao carregar métricas:', error.message);
-  }
+  await pipeline.exec();
+  console.log('[Metrics] Contadores do metrics.json migrados para o Redis:', {
+    instances: Object.keys(loaded.instances || {}).length
+  });
 }
 
 // Obter estatísticas agregadas
-function getAggregatedStats() {
-  const instances = Object.keys(metrics.instances);
-  const connected = instances.filter(i => metrics.instances[i].connectionStatus === 'connected');
+async function getAggregatedStats() {
+  const allInstances = await readAllInstanceMetrics();
+  const instances = Object.keys(allInstances);
+  const connected = instances.filter(i => allInstances[i].connectionStatus === 'connected');
 
   // Top 5 instâncias por mensagens enviadas
   const topSenders = instances
     .map(name => ({
       name,
-      sent: metrics.instances[name].messagesSent
+      sent: allInstances[name].messagesSent
     }))
     .sort((a, b) => b.sent - a.sent)
     .slice(0, 5);
@@ -315,7 +479,7 @@ function getAggregatedStats() {
   // Contagem de tipos de mensagem global
   const messageTypeStats = {};
   instances.forEach(name => {
-    const types = metrics.instances[name].messageTypes;
+    const types = allInstances[name].messageTypes;
     Object.keys(types).forEach(type => {
       messageTypeStats[type] = (messageTypeStats[type] || 0) + types[type];
     });
@@ -327,7 +491,7 @@ function getAggregatedStats() {
     disconnectedInstances: instances.length - connected.length,
     topSenders,
     messageTypeStats,
-    global: getGlobalMetrics()
+    global: await getGlobalMetrics(allInstances)
   };
 }
 
@@ -344,5 +508,5 @@ module.exports = {
   resetAllMetrics,
   exportMetricsCSV,
   getAggregatedStats,
-  saveMetrics
+  flushMetrics
 };
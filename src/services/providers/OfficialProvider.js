@@ -1,15 +1,15 @@
 /**
  * Provedor Oficial do WhatsApp (Meta Cloud API)
  */
-const fs = require('fs');
-const path = require('path');
+const { Readable } = require('stream');
+const { storeMediaStream, extensionFromMime, UPLOADS_DIR } = require('../mediaStore');
 
 class OfficialProvider {
     constructor(instanceName, config) {
         this.instanceName = instanceName;
         this.config = config; // { accessToken, phoneNumberId, wabaId, verifyToken }
         this.isConnected = false;
-        this.uploadsDir = '/app/uploads'; // Alinhado com o sistema
+        this.uploadsDir = UPLOADS_DIR; // Alinhado com o sistema
     }
 
     async initialize() {
@@ -267,18 +267,17 @@ class OfficialProvider {
             const fileResponse = await fetch(mediaData.url, {
                 headers: { 'Authorization': `Bearer ${this.config.accessToken}` }
             });
-            const buffer = Buffer.from(await fileResponse.arrayBuffer());
-
-            // 3. Salvar no disco (uploads)
-            const extension = mediaData.mime_type?.split('/')[1] || 'bin';
-            const fileName = `official_${mediaId}_${Date.now()}.${extension}`;
-            const fullPath = path.join(this.uploadsDir, fileName);
+            if (!fileResponse.ok || !fileResponse.body) {
+                throw new Error(`Falha ao baixar mídia (HTTP ${fileResponse.status})`);
+            }
 
-            fs.writeFileSync(fullPath, buffer);
+            // 3. Salvar no disco em streaming (uploads, deduplicado por SHA-256)
+            const extension = extensionFromMime(mediaData.mime_type);
+            const stored = await storeMediaStream(Readable.fromWeb(fileResponse.body), { extension });
 
             return {
-                fileName,
-                url: `/uploads/${fileName}`,
+                fileName: stored.fileName,
+                url: stored.url,
                 mimeType: mediaData.mime_type
             };
         } catch (error) {
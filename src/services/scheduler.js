@@ -1,6 +1,5 @@
 const fs = require('fs');
 const path = require('path');
-const cron = require('node-cron');
 const { v4: uuidv4 } = require('uuid');
 const {
   sendText,
@@ -13,28 +12,98 @@ const {
   sendContact,
   sendPoll
 } = require('./whatsapp');
+const { redis } = require('../config/redis');
+const jobScheduler = require('./jobScheduler');
+const tokenBucket = require('./tokenBucket');
 
-// Diretório de dados
+// Diretório de dados (scheduled.json é importado para o Redis na primeira inicialização)
 const DATA_DIR = process.env.DATA_DIR || './data';
 const SCHEDULED_FILE = path.join(DATA_DIR, 'scheduled.json');
 
-// Armazenamento de mensagens agendadas
-let scheduledMessages = {};
+// Armazenamento no Redis
+// - scheduled:msg:<id>            JSON da mensagem (gravado a cada mudança de status)
+// - scheduled:due                 ZSET das pendentes, score = horário de envio (ms)
+// - scheduled:processing          ZSET das reivindicadas, score = fim do lease (ms)
+// - scheduled:instance:<nome>     ZSET por instância, score = horário agendado (listagem)
+// - scheduled:done                ZSET das enviadas/falhadas, score = conclusão (limpeza)
+// Cada ciclo retira do ZSET apenas as mensagens vencidas; várias réplicas podem
+// processar ao mesmo tempo porque a retirada é atômica (script Lua).
+const MSG_PREFIX = 'scheduled:msg:';
+const DUE_KEY = 'scheduled:due';
+const PROCESSING_KEY = 'scheduled:processing';
+const INSTANCE_PREFIX = 'scheduled:instance:';
+const DONE_KEY = 'scheduled:done';
+
+const BATCH_SIZE = parseInt(process.env.SCHEDULER_BATCH_SIZE, 10) || 200;
+const CONCURRENCY = parseInt(process.env.SCHEDULER_CONCURRENCY, 10) || 10;
+// Espaçamento mínimo entre envios da mesma instância (token bucket compartilhado entre réplicas)
+const INSTANCE_INTERVAL_MS = parseInt(process.env.SCHEDULER_INSTANCE_INTERVAL_MS, 10) || 1000;
+const INSTANCE_BURST = parseInt(process.env.SCHEDULER_INSTANCE_BURST, 10) || 5;
+// Mensagem reivindicada por uma réplica que caiu volta para a fila após o lease
+const LEASE_MS = 5 * 60 * 1000;
+
+// KEYS[1] = due, KEYS[2] = processing | ARGV = agora, limite, fim do lease
+const CLAIM_SCRIPT = `
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+  redis.call('ZREM', KEYS[1], id)
+  redis.call('ZADD', KEYS[2], ARGV[3], id)
+end
+return ids
+`;
+
+// KEYS[1] = due, KEYS[2] = processing | ARGV = id
+// Retira a mensagem da fila só se ela não estiver reivindicada por um envio em andamento.
+// Retorna 1 se retirou, 0 se não estava na fila, -1 se está sendo enviada.
+const CANCEL_SCRIPT = `
+if redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+  return -1
+end
+return redis.call('ZREM', KEYS[1], ARGV[1])
+`;
+
+// Devolver à fila as reivindicações com lease vencido
+const RECOVER_SCRIPT = `
+local ids = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 1000)
+for _, id in ipairs(ids) do
+  redis.call('ZREM', KEYS[2], id)
+  redis.call('ZADD', KEYS[1], ARGV[1], id)
+end
+return #ids
+`;
 
 // Inicializar scheduler
-function initScheduler() {
-  loadScheduledMessages();
+async function initScheduler() {
+  try {
+    await migrateLegacyFile();
+  } catch (error) {
+    console.error('[Scheduler] Erro ao importar scheduled.json:', error.message);
+  }
 
-  // Verificar mensagens agendadas a cada minuto
-  cron.schedule('* * * * *', () => {
-    processScheduledMessages();
-  });
+  // Verificar mensagens vencidas a cada 5 segundos
+  // Todas as réplicas participam: a retirada do ZSET é atômica
+  jobScheduler.schedule('scheduler:process', '*/5 * * * * *', () => processScheduledMessages(), { scope: 'local' });
 
-  console.log('[Scheduler] Sistema de agendamento inicializado');
+  console.log('[Scheduler] Sistema de agendamento inicializado (Redis)');
+}
+
+async function saveMessage(message) {
+  await redis.set(`${MSG_PREFIX}${message.id}`, JSON.stringify(message));
+}
+
+async function loadMessages(ids) {
+  if (ids.length === 0) return [];
+  const values = await redis.mget(ids.map(id => `${MSG_PREFIX}${id}`));
+  return values.filter(Boolean).map(value => JSON.parse(value));
+}
+
+async function loadMessage(messageId) {
+  const [message] = await loadMessages([messageId]);
+  return message || null;
 }
 
 // Agendar nova mensagem
-function scheduleMessage(data) {
+async function scheduleMessage(data) {
   const {
     instanceName,
     to,
@@ -70,8 +139,11 @@ function scheduleMessage(data) {
     error: null
   };
 
-  scheduledMessages[messageId] = scheduledMessage;
-  saveScheduledMessages();
+  await redis.multi()
+    .set(`${MSG_PREFIX}${messageId}`, JSON.stringify(scheduledMessage))
+    .zadd(`${INSTANCE_PREFIX}${instanceName}`, scheduledDate.getTime(), messageId)
+    .zadd(DUE_KEY, scheduledDate.getTime(), messageId)
+    .exec();
 
   return {
     success: true,
@@ -81,18 +153,27 @@ function scheduleMessage(data) {
 }
 
 // Cancelar mensagem agendada
-function cancelScheduledMessage(messageId) {
-  if (!scheduledMessages[messageId]) {
+async function cancelScheduledMessage(messageId) {
+  const message = await loadMessage(messageId);
+
+  if (!message) {
     throw new Error('Mensagem agendada não encontrada');
   }
 
-  if (scheduledMessages[messageId].status === 'sent') {
+  if (message.status === 'sent') {
     throw new Error('Mensagem já foi enviada');
   }
 
-  scheduledMessages[messageId].status = 'cancelled';
-  scheduledMessages[messageId].cancelledAt = new Date().toISOString();
-  saveScheduledMessages();
+  // Atômico em relação à reivindicação: uma mensagem fora da fila não volta a ser enviada,
+  // e uma mensagem já reivindicada termina o envio com o próprio status
+  const removed = await redis.eval(CANCEL_SCRIPT, 2, DUE_KEY, PROCESSING_KEY, messageId);
+  if (removed === -1) {
+    throw new Error('Mensagem está sendo enviada e não pode mais ser cancelada');
+  }
+
+  message.status = 'cancelled';
+  message.cancelledAt = new Date().toISOString();
+  await saveMessage(message);
 
   return {
     success: true,
@@ -100,24 +181,21 @@ function cancelScheduledMessage(messageId) {
   };
 }
 
-// Obter mensagens agendadas de uma instância
-function getScheduledMessages(instanceName, status = null) {
-  let messages = Object.values(scheduledMessages)
-    .filter(msg => msg.instanceName === instanceName);
+// Obter mensagens agendadas de uma instância (já ordenadas por data de agendamento)
+async function getScheduledMessages(instanceName, status = null) {
+  const ids = await redis.zrange(`${INSTANCE_PREFIX}${instanceName}`, 0, -1);
+  let messages = await loadMessages(ids);
 
   if (status) {
     messages = messages.filter(msg => msg.status === status);
   }
 
-  // Ordenar por data de agendamento
-  messages.sort((a, b) => new Date(a.scheduledAt) - new Date(b.scheduledAt));
-
   return messages;
 }
 
 // Obter status de uma mensagem agendada
-function getScheduledMessageStatus(messageId) {
-  const message = scheduledMessages[messageId];
+async function getScheduledMessageStatus(messageId) {
+  const message = await loadMessage(messageId);
 
   if (!message) {
     throw new Error('Mensagem agendada não encontrada');
@@ -126,28 +204,76 @@ function getScheduledMessageStatus(messageId) {
   return message;
 }
 
-// Processar mensagens agendadas
+// Processar mensagens vencidas
 async function processScheduledMessages() {
-  const now = new Date();
+  await redis.eval(RECOVER_SCRIPT, 2, DUE_KEY, PROCESSING_KEY, Date.now());
+
+  for (;;) {
+    const now = Date.now();
+    const ids = await redis.eval(CLAIM_SCRIPT, 2, DUE_KEY, PROCESSING_KEY, now, BATCH_SIZE, now + LEASE_MS);
+    if (ids.length === 0) return;
+
+    const messages = await loadMessages(ids);
+    const loaded = new Set(messages.map(m => m.id));
+    const missing = ids.filter(id => !loaded.has(id));
+    if (missing.length > 0) {
+      await redis.zrem(PROCESSING_KEY, ...missing);
+    }
 
-  for (const messageId in scheduledMessages) {
-    const message = scheduledMessages[messageId];
+    // Até CONCURRENCY envios simultâneos; o ritmo de cada instância vem do token bucket
+    let next = 0;
+    const worker = async () => {
+      while (next < messages.length) {
+        await dispatchMessage(messages[next++]);
+      }
+    };
+    await Promise.all(Array.from({ length: Math.min(CONCURRENCY, messages.length) }, worker));
 
-    // Só processar mensagens pendentes
-    if (message.status !== 'pending') continue;
+    if (ids.length < BATCH_SIZE) return;
+  }
+}
 
-    const scheduledDate = new Date(message.scheduledAt);
+// Enviar uma mensagem reivindicada (ou reagendar para o horário do token reservado)
+//
+// O token é reservado uma única vez por mensagem: se ainda não está disponível, a
+// mensagem volta para a fila no horário dele (tokenAt) e, ao vencer, é enviada sem
+// consultar o balde de novo. Mensagens da mesma instância ficam escalonadas pelo
+// balde em vez de serem todas reenfileiradas para o mesmo instante a cada ciclo.
+async function dispatchMessage(message) {
+  if (message.status !== 'pending') {
+    await redis.zrem(PROCESSING_KEY, message.id);
+    return;
+  }
+
+  if (!message.tokenAt) {
+    try {
+      const wait = await tokenBucket.reserve(`scheduler:${message.instanceName}`, {
+        intervalMs: INSTANCE_INTERVAL_MS,
+        capacity: INSTANCE_BURST
+      });
 
-    // Verificar se chegou a hora de enviar
-    if (scheduledDate <= now) {
-      await sendScheduledMessage(messageId);
+      if (wait > 0) {
+        message.tokenAt = Date.now() + wait;
+        await redis.multi()
+          .set(`${MSG_PREFIX}${message.id}`, JSON.stringify(message))
+          .zrem(PROCESSING_KEY, message.id)
+          .zadd(DUE_KEY, message.tokenAt, message.id)
+          .exec();
+        return;
+      }
+    } catch (error) {
+      // Sem Redis a mensagem fica em processing e volta à fila quando o lease vencer
+      console.error(`[Scheduler] Erro ao obter token para ${message.instanceName}:`, error.message);
+      return;
     }
   }
+
+  await sendScheduledMessage(message);
 }
 
 // Enviar mensagem agendada
-async function sendScheduledMessage(messageId) {
-  const message = scheduledMessages[messageId];
+async function sendScheduledMessage(message) {
+  const messageId = message.id;
 
   try {
     console.log(`[Scheduler] Enviando mensagem agendada ${messageId}...`);
@@ -254,103 +380,97 @@ async function sendScheduledMessage(messageId) {
     }
 
     // Atualizar status
-    updateMessageStatus(messageId, 'sent', null, result);
+    await updateMessageStatus(message, 'sent', null, result);
 
     console.log(`[Scheduler] ✓ Mensagem ${messageId} enviada com sucesso`);
 
   } catch (error) {
     console.error(`[Scheduler] ✗ Erro ao enviar mensagem ${messageId}:`, error.message);
-    updateMessageStatus(messageId, 'failed', error.message);
+    await updateMessageStatus(message, 'failed', error.message);
   }
 }
 
-// Atualizar status de mensagem
-function updateMessageStatus(messageId, status, error = null, result = null) {
-  if (!scheduledMessages[messageId]) return;
-
-  scheduledMessages[messageId].status = status;
-  scheduledMessages[messageId].error = error;
+// Atualizar status de mensagem (grava apenas a mensagem alterada)
+async function updateMessageStatus(message, status, error = null, result = null) {
+  message.status = status;
+  message.error = error;
 
   if (status === 'sent') {
-    scheduledMessages[messageId].sentAt = new Date().toISOString();
-    scheduledMessages[messageId].result = result;
+    message.sentAt = new Date().toISOString();
+    message.result = result;
   }
 
-  saveScheduledMessages();
+  try {
+    await redis.multi()
+      .set(`${MSG_PREFIX}${message.id}`, JSON.stringify(message))
+      .zrem(PROCESSING_KEY, message.id)
+      .zadd(DONE_KEY, Date.now(), message.id)
+      .exec();
+  } catch (err) {
+    console.error(`[Scheduler] Erro ao salvar status da mensagem ${message.id}:`, err.message);
+  }
 }
 
-// Limpar mensagens antigas
-function cleanupOldMessages() {
-  const sevenDaysAgo = new Date();
-  sevenDaysAgo.setDate(sevenDaysAgo.getDate() - 7);
-
+// Limpar mensagens enviadas/falhadas há mais de 7 dias
+async function cleanupOldMessages() {
+  const sevenDaysAgo = Date.now() - 7 * 24 * 60 * 60 * 1000;
   let cleaned = 0;
 
-  for (const messageId in scheduledMessages) {
-    const message = scheduledMessages[messageId];
+  for (;;) {
+    const ids = await redis.zrangebyscore(DONE_KEY, '-inf', sevenDaysAgo, 'LIMIT', 0, 500);
+    if (ids.length === 0) break;
 
-    // Remover mensagens enviadas há mais de 7 dias
-    if (message.status === 'sent' && message.sentAt) {
-      const sentDate = new Date(message.sentAt);
-      if (sentDate < sevenDaysAgo) {
-        delete scheduledMessages[messageId];
-        cleaned++;
-      }
-    }
+    const messages = await loadMessages(ids);
+    const pipeline = redis.multi();
 
-    // Remover mensagens falhadas há mais de 7 dias
-    if (message.status === 'failed') {
-      const scheduledDate = new Date(message.scheduledAt);
-      if (scheduledDate < sevenDaysAgo) {
-        delete scheduledMessages[messageId];
-        cleaned++;
-      }
+    for (const message of messages) {
+      pipeline.zrem(`${INSTANCE_PREFIX}${message.instanceName}`, message.id);
     }
+    pipeline.del(...ids.map(id => `${MSG_PREFIX}${id}`));
+    pipeline.zrem(DONE_KEY, ...ids);
+    await pipeline.exec();
+
+    cleaned += ids.length;
   }
 
   if (cleaned > 0) {
-    saveScheduledMessages();
     console.log(`[Scheduler] Limpeza: ${cleaned} mensagens antigas removidas`);
   }
 
   return cleaned;
 }
 
-// Salvar mensagens agendadas
-function saveScheduledMessages() {
-  try {
-    if (!fs.existsSync(DATA_DIR)) {
-      fs.mkdirSync(DATA_DIR, { recursive: true });
-    }
+// Importar o antigo scheduled.json (uma vez; o arquivo é renomeado depois)
+async function migrateLegacyFile() {
+  if (!fs.existsSync(SCHEDULED_FILE)) return;
 
-    fs.writeFileSync(SCHEDULED_FILE, JSON.stringify(scheduledMessages, null, 2));
-  } catch (error) {
-    console.error('[Scheduler] Erro ao salvar mensagens agendadas:', error.message);
-  }
-}
+  const legacy = Object.values(JSON.parse(fs.readFileSync(SCHEDULED_FILE, 'utf8')));
 
-// Carregar mensagens agendadas
-function loadScheduledMessages() {
-  try {
-    if (fs.existsSync(SCHEDULED_FILE)) {
-      const data = fs.readFileSync(SCHEDULED_FILE, 'utf8');
-      scheduledMessages = JSON.parse(data);
+  let imported = 0;
+  for (const message of legacy) {
+    // NX: outra réplica pode ter importado (e até enviado) a mesma mensagem
+    const created = await redis.set(`${MSG_PREFIX}${message.id}`, JSON.stringify(message), 'NX');
+    if (created !== 'OK') continue;
 
-      console.log('[Scheduler] Mensagens agendadas carregadas:', {
-        total: Object.keys(scheduledMessages).length,
-        pending: Object.values(scheduledMessages).filter(m => m.status === 'pending').length
-      });
+    const scheduledAt = new Date(message.scheduledAt).getTime();
+    const pipeline = redis.multi().zadd(`${INSTANCE_PREFIX}${message.instanceName}`, scheduledAt, message.id);
+
+    if (message.status === 'pending') {
+      pipeline.zadd(DUE_KEY, scheduledAt, message.id);
+    } else if (message.status === 'sent' || message.status === 'failed') {
+      pipeline.zadd(DONE_KEY, new Date(message.sentAt || message.scheduledAt).getTime(), message.id);
     }
-  } catch (error) {
-    console.error('[Scheduler] Erro ao carregar mensagens agendadas:', error.message);
-    scheduledMessages = {};
+
+    await pipeline.exec();
+    imported++;
   }
+
+  fs.renameSync(SCHEDULED_FILE, `${SCHEDULED_FILE}.migrated`);
+  console.log(`[Scheduler] scheduled.json importado para o Redis: ${imported} de ${legacy.length} mensagens`);
 }
 
 // Agendar limpeza automática (diariamente às 3h)
-cron.schedule('0 3 * * *', () => {
-  cleanupOldMessages();
-});
+jobScheduler.schedule('scheduler:cleanup', '0 3 * * *', () => cleanupOldMessages());
 
 module.exports = {
   initScheduler,
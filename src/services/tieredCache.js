@@ -0,0 +1,336 @@
+const crypto = require('crypto');
+const { redis, cache } = require('../config/redis');
+
+/**
+ * Cache em duas camadas para leituras quentes
+ *
+ * - L1: LRU em memória por processo, limitado em entradas e com TTL curto
+ * - L2: Redis (cache.get/cache.set, com tag por namespace)
+ * - Misses concorrentes da mesma chave compartilham uma única consulta ao banco
+ * - Invalidações são propagadas para as outras réplicas via pub/sub do Redis
+ * - A escrita no L2 é um compare-and-set sobre versões no Redis (por chave e por
+ *   namespace): uma réplica que leu o banco antes de uma invalidação em outra
+ *   réplica não regrava o valor antigo
+ *
+ * Uso:
+ *   const empresas = tieredCache.create('empresa', { l1TtlMs: 30000, l2TtlSeconds: 300 });
+ *   const empresa = await empresas.wrap(id, () => buscarNoBanco(id));
+ *   await tieredCache.invalidate('empresa', id);
+ */
+
+const CHANNEL = 'cache:tiered:invalidate';
+const NODE_ID = crypto.randomBytes(8).toString('hex');
+const DEFAULT_MAX_ENTRIES = parseInt(process.env.CACHE_L1_MAX_ENTRIES, 10) || 5000;
+// Versões precisam sobreviver a qualquer valor do L2 que possam invalidar
+const VERSION_TTL_MS = 24 * 60 * 60 * 1000;
+
+// Marcador para resultados nulos cacheados (ex.: domínio sem white label)
+const NULL_VALUE = { __null: true };
+
+// Datas voltam do JSON como string; restaurar para manter o mesmo tipo retornado pelo pg
+const ISO_DATE = /^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}Z$/;
+const reviveDates = (key, value) => (typeof value === 'string' && ISO_DATE.test(value) ? new Date(value) : value);
+
+const caches = new Map();
+let subscriber = null;
+
+class TieredCache {
+  /**
+   * @param {string} name - Namespace (prefixo das chaves no Redis e canal de invalidação)
+   * @param {{l1TtlMs?: number, l2TtlSeconds?: number, maxEntries?: number, cacheNull?: boolean}} options
+   */
+  constructor(name, options = {}) {
+    this.name = name;
+    this.l1TtlMs = options.l1TtlMs || 30000;
+    this.l2TtlSeconds = options.l2TtlSeconds || 300;
+    this.maxEntries = options.maxEntries || DEFAULT_MAX_ENTRIES;
+    this.cacheNull = !!options.cacheNull;
+
+    this.l1 = new Map();       // chave -> { value, expiresAt } (ordem de inserção = LRU)
+    this.inflight = new Map(); // chave -> Promise da carga em andamento
+    this.versions = new Map(); // chave -> versão (incrementada a cada invalidação)
+    this.epoch = 0;            // incrementado a cada clear()
+
+    this.stats = { l1Hits: 0, l2Hits: 0, misses: 0, loads: 0, coalesced: 0, invalidations: 0, evictions: 0 };
+  }
+
+  redisKey(key) {
+    return `tiered:${this.name}:${key}`;
+  }
+
+  get tag() {
+    return `tiered:${this.name}`;
+  }
+
+  versionKey(key) {
+    return versionKeyFor(this.name, key);
+  }
+
+  get epochKey() {
+    return epochKeyFor(this.name);
+  }
+
+  /**
+   * Versões no Redis lidas antes da carga (null se não foi possível ler)
+   */
+  async _readRemoteVersions(key) {
+    try {
+      const [epoch, version] = await redis.mget(this.epochKey, this.versionKey(key));
+      return { [this.epochKey]: epoch, [this.versionKey(key)]: version };
+    } catch (err) {
+      console.error('[TieredCache] Erro ao ler versões:', err.message);
+      return null;
+    }
+  }
+
+  _getL1(key) {
+    const entry = this.l1.get(key);
+    if (!entry) return undefined;
+
+    if (entry.expiresAt <= Date.now()) {
+      this.l1.delete(key);
+      return undefined;
+    }
+
+    // Reposicionar como mais recente
+    this.l1.delete(key);
+    this.l1.set(key, entry);
+    return entry.value;
+  }
+
+  _setL1(key, value) {
+    this.l1.delete(key);
+    this.l1.set(key, { value, expiresAt: Date.now() + this.l1TtlMs });
+
+    while (this.l1.size > this.maxEntries) {
+      this.l1.delete(this.l1.keys().next().value);
+      this.stats.evictions++;
+    }
+  }
+
+  _version(key) {
+    return `${this.epoch}:${this.versions.get(key) || 0}`;
+  }
+
+  /**
+   * Leitura com fallback para o loader (read-through)
+   */
+  async wrap(key, loader) {
+    key = String(key);
+
+    const local = this._getL1(key);
+    if (local !== undefined) {
+      this.stats.l1Hits++;
+      return local === NULL_VALUE ? null : local;
+    }
+
+    const pending = this.inflight.get(key);
+    if (pending) {
+      this.stats.coalesced++;
+      return pending;
+    }
+
+    const version = this._version(key);
+    const promise = this._load(key, loader, version).finally(() => {
+      if (this.inflight.get(key) === promise) this.inflight.delete(key);
+    });
+    this.inflight.set(key, promise);
+    return promise;
+  }
+
+  async _load(key, loader, version) {
+    const remote = await cache.get(this.redisKey(key), reviveDates);
+    if (remote !== null && remote !== undefined) {
+      this.stats.l2Hits++;
+      const value = remote.__null ? NULL_VALUE : remote;
+      if (this._version(key) === version) this._setL1(key, value);
+      return value === NULL_VALUE ? null : value;
+    }
+
+    this.stats.misses++;
+    this.stats.loads++;
+    const remoteVersions = await this._readRemoteVersions(key);
+    const result = await loader();
+    const value = result === null || result === undefined ? NULL_VALUE : result;
+
+    // Invalidado durante a carga: devolver o resultado sem popular as camadas
+    if (this._version(key) !== version) return value === NULL_VALUE ? null : value;
+    if (value === NULL_VALUE && !this.cacheNull) return null;
+
+    this._setL1(key, value);
+    // Sem as versões não há como saber se o valor ainda vale: fica só no L1
+    if (remoteVersions) {
+      await cache.setIfVersion(this.redisKey(key), value, this.l2TtlSeconds, remoteVersions, [this.tag]);
+    }
+    return value === NULL_VALUE ? null : value;
+  }
+
+  _dropLocal(key) {
+    key = String(key);
+    this.l1.delete(key);
+    this.inflight.delete(key);
+    this.versions.set(key, (this.versions.get(key) || 0) + 1);
+  }
+
+  _clearLocal() {
+    this.l1.clear();
+    this.inflight.clear();
+    this.versions.clear();
+    this.epoch++;
+  }
+
+  /**
+   * Invalidar uma chave nas duas camadas e nas outras réplicas
+   */
+  async invalidate(key) {
+    this._dropLocal(key);
+    this.stats.invalidations++;
+    await bumpKey(this.name, key);
+    publish({ name: this.name, key: String(key) });
+  }
+
+  /**
+   * Invalidar o namespace inteiro
+   */
+  async clear() {
+    this._clearLocal();
+    this.stats.invalidations++;
+    await bumpNamespace(this.name);
+    publish({ name: this.name, all: true });
+  }
+
+  getStats() {
+    const { l1Hits, l2Hits, misses } = this.stats;
+    const lookups = l1Hits + l2Hits + misses;
+    return {
+      ...this.stats,
+      l1Size: this.l1.size,
+      maxEntries: this.maxEntries,
+      hitRate: lookups > 0 ? Math.round(((l1Hits + l2Hits) / lookups) * 1000) / 10 : 0
+    };
+  }
+}
+
+// ==================== VERSÕES NO REDIS ====================
+
+function versionKeyFor(name, key) {
+  return `tiered-v:${name}:${key}`;
+}
+
+function epochKeyFor(name) {
+  return `tiered-v:${name}`;
+}
+
+// Incrementar a versão e remover o valor na mesma transação
+async function bumpKey(name, key) {
+  const versionKey = versionKeyFor(name, key);
+  try {
+    await redis.multi()
+      .incr(versionKey)
+      .pexpire(versionKey, VERSION_TTL_MS)
+      .unlink(`tiered:${name}:${key}`)
+      .exec();
+  } catch (err) {
+    console.error('[TieredCache] Erro ao invalidar chave:', err.message);
+  }
+}
+
+// A época é incrementada antes de limpar a tag: cargas em andamento não regravam depois
+async function bumpNamespace(name) {
+  const epochKey = epochKeyFor(name);
+  try {
+    await redis.multi().incr(epochKey).pexpire(epochKey, VERSION_TTL_MS).exec();
+  } catch (err) {
+    console.error('[TieredCache] Erro ao invalidar namespace:', err.message);
+  }
+  await cache.invalidateTag(`tiered:${name}`);
+}
+
+// ==================== PUB/SUB ====================
+
+function publish(message) {
+  if (typeof redis.publish !== 'function') return;
+  redis.publish(CHANNEL, JSON.stringify({ ...message, origin: NODE_ID }))
+    .catch(err => console.error('[TieredCache] Erro ao publicar invalidação:', err.message));
+}
+
+function ensureSubscriber() {
+  if (subscriber || typeof redis.duplicate !== 'function') return;
+
+  subscriber = redis.duplicate();
+  subscriber.on('error', err => console.error('[TieredCache] Erro no subscriber:', err.message));
+
+  // Invalidações publicadas enquanto estávamos desconectados se perderam: descartar o L1
+  let connectedBefore = false;
+  subscriber.on('ready', () => {
+    if (connectedBefore) {
+      for (const instance of caches.values()) instance._clearLocal();
+    }
+    connectedBefore = true;
+  });
+  subscriber.on('message', (channel, raw) => {
+    if (channel !== CHANNEL) return;
+    try {
+      const message = JSON.parse(raw);
+      if (message.origin === NODE_ID) return;
+
+      const target = caches.get(message.name);
+      if (!target) return;
+
+      if (message.all) target._clearLocal();
+      else target._dropLocal(message.key);
+    } catch (err) {
+      console.error('[TieredCache] Mensagem de invalidação inválida:', err.message);
+    }
+  });
+  subscriber.subscribe(CHANNEL)
+    .catch(err => console.error('[TieredCache] Erro ao assinar canal de invalidação:', err.message));
+}
+
+// ==================== REGISTRO ====================
+
+/**
+ * Criar (ou obter) o cache de um namespace
+ */
+function create(name, options = {}) {
+  let instance = caches.get(name);
+  if (!instance) {
+    instance = new TieredCache(name, options);
+    caches.set(name, instance);
+    ensureSubscriber();
+  }
+  return instance;
+}
+
+async function invalidate(name, key) {
+  const instance = caches.get(name);
+  if (instance) return instance.invalidate(key);
+
+  // Namespace não carregado neste processo: limpar o Redis e avisar as réplicas
+  await bumpKey(name, key);
+  publish({ name, key: String(key) });
+}
+
+async function clear(name) {
+  const instance = caches.get(name);
+  if (instance) return instance.clear();
+
+  await bumpNamespace(name);
+  publish({ name, all: true });
+}
+
+function getStats() {
+  const result = {};
+  for (const [name, instance] of caches) {
+    result[name] = instance.getStats();
+  }
+  return result;
+}
+
+module.exports = {
+  TieredCache,
+  create,
+  invalidate,
+  clear,
+  getStats
+};
@@ -0,0 +1,120 @@
+const { redis } = require('../config/redis');
+
+/**
+ * Token bucket distribuído (Redis)
+ *
+ * Um balde por chave (ex.: instância do WhatsApp), compartilhado entre réplicas.
+ * A reposição e o consumo acontecem em um único script Lua, então dois workers
+ * nunca consomem o mesmo token.
+ *
+ * Uso:
+ *   const espera = await tokenBucket.take('broadcast:minha-instancia', { intervalMs: 60000 });
+ *   if (espera > 0) // sem token: tentar de novo em `espera` ms
+ *
+ *   const espera = await tokenBucket.reserve('scheduler:minha-instancia', { intervalMs: 1000 });
+ *   // token já é seu: enviar daqui a `espera` ms, sem consultar o balde de novo
+ */
+
+const KEY_PREFIX = 'bucket:';
+
+// KEYS[1] = balde | ARGV = intervalo de reposição (ms), capacidade
+// Retorna 0 quando um token foi consumido, ou os ms até o próximo token.
+// O relógio é o do Redis, para réplicas com horários diferentes concordarem.
+const TAKE_SCRIPT = `
+local interval = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+
+if tokens == nil or ts == nil then
+  tokens = capacity
+  ts = now
+end
+
+local elapsed = math.max(0, now - ts)
+tokens = math.min(capacity, tokens + elapsed / interval)
+
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = math.ceil((1 - tokens) * interval)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(interval * capacity) + 60000)
+return wait
+`;
+
+// Igual ao TAKE_SCRIPT, mas sempre consome: o saldo pode ficar negativo e a espera
+// retornada é o momento em que o token reservado fica disponível. Quem chega depois
+// recebe o próximo horário livre, então N reservas custam N chamadas no total.
+const RESERVE_SCRIPT = `
+local interval = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+
+if tokens == nil or ts == nil then
+  tokens = capacity
+  ts = now
+end
+
+local elapsed = math.max(0, now - ts)
+tokens = math.min(capacity, tokens + elapsed / interval) - 1
+
+local wait = 0
+if tokens < 0 then
+  wait = math.ceil(-tokens * interval)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], wait + math.ceil(interval * capacity) + 60000)
+return wait
+`;
+
+/**
+ * Intervalo entre tokens a partir de um limite por hora e de um espaçamento mínimo
+ * @param {number} perHour - Mensagens por hora (0 = sem limite por hora)
+ * @param {number} minIntervalMs - Espaçamento mínimo entre envios
+ */
+function intervalFor(perHour, minIntervalMs = 0) {
+  const hourly = perHour > 0 ? Math.ceil(3600000 / perHour) : 0;
+  return Math.max(hourly, minIntervalMs, 1);
+}
+
+/**
+ * Tentar consumir um token
+ * @param {string} key - Identificador do balde
+ * @param {{intervalMs: number, capacity?: number}} options
+ * @returns {Promise<number>} 0 se consumiu, senão ms até haver token
+ */
+async function take(key, { intervalMs, capacity = 1 }) {
+  const wait = await redis.eval(TAKE_SCRIPT, 1, `${KEY_PREFIX}${key}`, intervalMs, capacity);
+  return parseInt(wait, 10) || 0;
+}
+
+/**
+ * Reservar o próximo token, mesmo que ainda não exista
+ * @param {string} key - Identificador do balde
+ * @param {{intervalMs: number, capacity?: number}} options
+ * @returns {Promise<number>} ms até o token reservado (0 = usar agora)
+ */
+async function reserve(key, { intervalMs, capacity = 1 }) {
+  const wait = await redis.eval(RESERVE_SCRIPT, 1, `${KEY_PREFIX}${key}`, intervalMs, capacity);
+  return parseInt(wait, 10) || 0;
+}
+
+module.exports = {
+  intervalFor,
+  take,
+  reserve
+};
@@ -1,9 +1,9 @@
 const fs = require('fs');
 const path = require('path');
 
-// Armazenamento de configurações e logs de webhook
+// Armazenamento de configurações de webhook
+// (os logs de entrega ficam na tabela webhook_logs, ver webhookDeliveryLog)
 const webhookConfigs = {};
-const webhookLogs = {};
 const DATA_DIR = process.env.DATA_DIR || './data';
 const WEBHOOK_LOGS_FILE = path.join(DATA_DIR, 'webhook-logs.json');
 const WEBHOOK_CONFIG_FILE = path.join(DATA_DIR, 'webhook-configs.json');
@@ -16,8 +16,11 @@ try {
 } catch (err) { }
 
 const circuitBreaker = require('./circuitBreaker');
+const webhookDispatcher = require('./webhookDispatcher');
+const webhookDeliveryLog = require('./webhookDeliveryLog');
+const webhookRepository = require('../repositories/webhookRepository');
 
-// Carregar configurações e logs salvos
+// Carregar configurações salvas
 function loadWebhookData() {
   try {
     if (fs.existsSync(WEBHOOK_CONFIG_FILE)) {
@@ -28,13 +31,17 @@ function loadWebhookData() {
     console.error('Erro ao carregar configurações de webhook:', err.message);
   }
 
+  // Logs do antigo webhook-logs.json: importados uma vez para o banco
   try {
     if (fs.existsSync(WEBHOOK_LOGS_FILE)) {
       const data = JSON.parse(fs.readFileSync(WEBHOOK_LOGS_FILE, 'utf8'));
-      Object.assign(webhookLogs, data);
+      Object.entries(data).forEach(([instanceName, logs]) => {
+        logs.forEach(log => addWebhookLog(instanceName, log, log.timestamp));
+      });
+      fs.renameSync(WEBHOOK_LOGS_FILE, `${WEBHOOK_LOGS_FILE}.migrated`);
     }
   } catch (err) {
-    console.error('Erro ao carregar logs de webhook:', err.message);
+    console.error('Erro ao importar logs de webhook:', err.message);
   }
 }
 
@@ -47,24 +54,42 @@ function saveWebhookConfigs() {
   }
 }
 
-// Salvar logs (limitado aos últimos 1000 logs)
-function saveWebhookLogs() {
-  try {
-    // Manter apenas os últimos 1000 logs de cada instância
-    Object.keys(webhookLogs).forEach(instanceName => {
-      if (webhookLogs[instanceName].length > 1000) {
-        webhookLogs[instanceName] = webhookLogs[instanceName].slice(-1000);
-      }
-    });
+// Limites do modo lote
+const BATCH_MAX_EVENTS_LIMIT = 500;
+const BATCH_MIN_WAIT_MS = 100;
+const BATCH_MAX_WAIT_MS = 60000;
 
-    fs.writeFileSync(WEBHOOK_LOGS_FILE, JSON.stringify(webhookLogs, null, 2));
-  } catch (err) {
-    console.error('Erro ao salvar logs de webhook:', err.message);
+// Validar a configuração do modo lote (campos omitidos usam o padrão)
+// Retorna a mensagem de erro ou null
+function validateBatchConfig(batch) {
+  if (batch === undefined || batch === null) return null;
+  if (typeof batch !== 'object' || Array.isArray(batch)) return 'batch deve ser um objeto';
+
+  const { maxEvents, maxWaitMs, eventTypes } = batch;
+
+  if (maxEvents !== undefined && (!Number.isInteger(maxEvents) || maxEvents < 1 || maxEvents > BATCH_MAX_EVENTS_LIMIT)) {
+    return `batch.maxEvents deve ser um inteiro entre 1 e ${BATCH_MAX_EVENTS_LIMIT}`;
+  }
+
+  if (maxWaitMs !== undefined && (!Number.isInteger(maxWaitMs) || maxWaitMs < BATCH_MIN_WAIT_MS || maxWaitMs > BATCH_MAX_WAIT_MS)) {
+    return `batch.maxWaitMs deve ser um inteiro entre ${BATCH_MIN_WAIT_MS} e ${BATCH_MAX_WAIT_MS}`;
   }
+
+  if (eventTypes !== undefined &&
+      (!Array.isArray(eventTypes) || eventTypes.length === 0 || !eventTypes.every(t => typeof t === 'string'))) {
+    return 'batch.eventTypes deve ser uma lista de eventos';
+  }
+
+  return null;
 }
 
 // Configurar webhook avançado para uma instância
 function configureWebhook(instanceName, config) {
+  const batchError = validateBatchConfig(config.batch);
+  if (batchError) {
+    throw new Error(batchError);
+  }
+
   webhookConfigs[instanceName] = {
     url: config.url,
     enabled: config.enabled !== false,
@@ -83,6 +108,13 @@ function configureWebhook(instanceName, config) {
     ],
     headers: config.headers || {},
     timeout: config.timeout || 60000,
+    // Modo lote (opcional): eventos de mensagem agrupados em um único POST
+    batch: {
+      enabled: config.batch?.enabled === true,
+      maxEvents: config.batch?.maxEvents || 50,
+      maxWaitMs: config.batch?.maxWaitMs || 2000,
+      eventTypes: config.batch?.eventTypes || ['messages.upsert', 'messages.update']
+    },
     createdAt: new Date().toISOString(),
     updatedAt: new Date().toISOString()
   };
@@ -104,60 +136,58 @@ function deleteWebhookConfig(instanceName) {
   saveWebhookConfigs();
 }
 
-// Adicionar log de webhook
-function addWebhookLog(instanceName, logEntry) {
-  if (!webhookLogs[instanceName]) {
-    webhookLogs[instanceName] = [];
-  }
+// Adicionar log de webhook (gravado em lote no banco)
+function addWebhookLog(instanceName, logEntry, createdAt = null) {
+  webhookDeliveryLog.record({
+    instanceName,
+    eventType: logEntry.eventType,
+    url: logEntry.url,
+    status: logEntry.status,
+    statusCode: logEntry.statusCode,
+    attempt: logEntry.attempt,
+    durationMs: logEntry.duration,
+    errorMessage: logEntry.error,
+    errorType: logEntry.errorType,
+    responseBody: logEntry.responseBody,
+    batchSize: logEntry.batchSize,
+    createdAt
+  });
+}
 
-  const log = {
-    id: `${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
-    timestamp: new Date().toISOString(),
-    ...logEntry
+// Converter linha de webhook_logs para o formato da API
+function formatLogRow(row) {
+  return {
+    id: row.id,
+    timestamp: row.created_at,
+    eventType: row.event_type,
+    status: row.status,
+    statusCode: row.status_code,
+    url: row.url,
+    attempt: row.attempt,
+    duration: row.duration_ms,
+    error: row.error_message,
+    errorType: row.error_type,
+    responseBody: row.response_body,
+    batchSize: row.batch_size
   };
-
-  webhookLogs[instanceName].push(log);
-
-  // Salvar periodicamente (a cada 10 logs)
-  if (webhookLogs[instanceName].length % 10 === 0) {
-    saveWebhookLogs();
-  }
-
-  return log;
 }
 
-// Obter logs de webhook
-function getWebhookLogs(instanceName, options = {}) {
-  const logs = webhookLogs[instanceName] || [];
-  let filtered = [...logs];
-
-  // Filtrar por tipo de evento
-  if (options.eventType) {
-    filtered = filtered.filter(log => log.eventType === options.eventType);
-  }
-
-  // Filtrar por status
-  if (options.status) {
-    filtered = filtered.filter(log => log.status === options.status);
-  }
-
-  // Filtrar por período
-  if (options.since) {
-    const sinceDate = new Date(options.since);
-    filtered = filtered.filter(log => new Date(log.timestamp) >= sinceDate);
-  }
-
-  // Limitar quantidade
-  const limit = options.limit || 100;
-  filtered = filtered.slice(-limit);
+// Obter logs de webhook (mais recentes primeiro; índice instance_name + created_at)
+async function getWebhookLogs(instanceName, options = {}) {
+  const rows = await webhookRepository.getWebhookLogs(instanceName, {
+    eventType: options.eventType,
+    status: options.status,
+    since: options.since,
+    limit: Math.min(options.limit || 100, 1000)
+  });
 
-  return filtered.reverse(); // Mais recentes primeiro
+  return rows.map(formatLogRow);
 }
 
 // Limpar logs de uma instância
-function clearWebhookLogs(instanceName) {
-  webhookLogs[instanceName] = [];
-  saveWebhookLogs();
+async function clearWebhookLogs(instanceName) {
+  await webhookDeliveryLog.flush();
+  return await webhookRepository.clearWebhookLogs(instanceName);
 }
 
 // Função para enviar webhook com retry automático
@@ -171,15 +201,25 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
 
   const timeout = webhookConfig?.timeout || 30000;
   const headers = webhookConfig?.headers || {};
+  // Lotes: um log por tentativa do lote inteiro
+  const batchSize = Array.isArray(payload.events) ? payload.events.length : undefined;
 
   let attempt = 0;
   let lastError = null;
 
+  const requestHeaders = {
+    'apikey': token || '',
+    'X-API-Key': token || '',
+    'Authorization': token ? `Bearer ${token}` : '',
+    ...headers
+  };
+
   // Verificar se o destino está disponível (Circuit Breaker)
-  if (!circuitBreaker.isAvailable(webhookUrl)) {
+  if (!(await circuitBreaker.isAvailable(webhookUrl))) {
     const cbError = 'Circuito Aberto: Destino persistentemente offline (Circuit Breaker)';
     addWebhookLog(instanceName, {
       eventType: payload.event,
+      batchSize,
       status: 'failed',
       statusCode: 0,
       url: webhookUrl,
@@ -187,40 +227,37 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
       duration: 0,
       error: cbError
     });
+    webhookDeliveryLog.deadLetter({
+      instanceName,
+      eventType: payload.event,
+      url: webhookUrl,
+      payload,
+      headers, // sem o token: reconstruído no reprocessamento
+      attempts: 0,
+      errorMessage: cbError
+    });
     return { success: false, error: cbError };
   }
 
+  // Serializado uma vez; as novas tentativas reutilizam o mesmo corpo
+  const body = webhookDispatcher.serialize(payload);
+
   while (attempt <= retryConfig.maxRetries) {
     try {
-      const controller = new AbortController();
-      const timeoutId = setTimeout(() => controller.abort(), timeout);
-
-      const startTime = Date.now();
-
-      const response = await fetch(webhookUrl, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-          'User-Agent': 'WhatsBenemax/2.1',
-          'apikey': token || '',
-          'X-API-Key': token || '',
-          'Authorization': token ? `Bearer ${token}` : '',
-          ...headers
-        },
-        body: JSON.stringify(payload),
-        signal: controller.signal
+      const response = await webhookDispatcher.post(webhookUrl, body, {
+        headers: requestHeaders,
+        timeout
       });
 
-      clearTimeout(timeoutId);
-
-      const duration = Date.now() - startTime;
-      const responseText = await response.text();
+      const duration = response.durationMs;
+      const responseText = response.body;
 
       // Log de sucesso
       if (response.ok) {
         circuitBreaker.recordSuccess(webhookUrl); // Avisar que o destino está saudável
         addWebhookLog(instanceName, {
           eventType: payload.event,
+          batchSize,
           status: 'success',
           statusCode: response.status,
           url: webhookUrl,
@@ -233,11 +270,13 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
         return { success: true, statusCode: response.status, duration };
       }
 
-      // Resposta não OK
+      // Resposta não OK (5xx conta como falha do destino; 4xx é problema do payload)
       lastError = new Error(`HTTP ${response.status}: ${responseText}`);
+      if (response.status >= 500) circuitBreaker.recordFailure(webhookUrl);
 
       addWebhookLog(instanceName, {
         eventType: payload.event,
+        batchSize,
         status: 'error',
         statusCode: response.status,
         url: webhookUrl,
@@ -252,10 +291,11 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
     } catch (error) {
       lastError = error;
 
-      const errorType = error.name === 'AbortError' ? 'timeout' : 'network_error';
+      const errorType = error.code === 'ETIMEDOUT' ? 'timeout' : 'network_error';
 
       addWebhookLog(instanceName, {
         eventType: payload.event,
+        batchSize,
         status: 'error',
         statusCode: 0,
         url: webhookUrl,
@@ -267,6 +307,12 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
 
       console.error(`[Webhook] ${instanceName} - ${errorType} na tentativa ${attempt + 1}: ${error.message}`);
 
+      // Circuito aberto enquanto o envio esperava na fila: não adianta tentar de novo
+      if (error.code === 'ECIRCUITOPEN') {
+        attempt++;
+        break;
+      }
+
       // Registrar falha para o Circuit Breaker
       circuitBreaker.recordFailure(webhookUrl);
     }
@@ -282,27 +328,142 @@ async function sendWebhookWithRetry(instanceName, webhookUrl, payload, config =
 
       console.log(`[Webhook] ${instanceName} - Aguardando ${Math.round(finalDelay)}ms antes de retry ${attempt}/${retryConfig.maxRetries}`);
       await new Promise(resolve => setTimeout(resolve, finalDelay));
+
+      // O circuito pode ter aberto (nesta ou em outra réplica) durante a espera
+      if (!(await circuitBreaker.isAvailable(webhookUrl))) break;
     }
   }
 
   // Todas as tentativas falharam
   addWebhookLog(instanceName, {
     eventType: payload.event,
+    batchSize,
     status: 'failed',
     statusCode: 0,
     url: webhookUrl,
-    attempt: retryConfig.maxRetries + 1,
+    attempt,
     duration: 0,
-    error: `Falhou após ${retryConfig.maxRetries + 1} tentativas: ${lastError?.message}`
+    error: `Falhou após ${attempt} tentativas: ${lastError?.message}`
+  });
+
+  // Dead letter: pode ser reprocessado depois (POST /webhook/dead-letters/replay)
+  await webhookDeliveryLog.deadLetter({
+    instanceName,
+    eventType: payload.event,
+    url: webhookUrl,
+    payload,
+    headers, // sem o token: reconstruído no reprocessamento
+    attempts: attempt,
+    errorMessage: lastError?.message || 'Unknown error'
   });
 
   return {
     success: false,
     error: lastError?.message || 'Unknown error',
-    attempts: retryConfig.maxRetries + 1
+    attempts: attempt
   };
 }
 
+// Lotes em formação e entregas em andamento, por instância
+const pendingBatches = {};
+const batchDeliveries = {};
+
+// Entregar um evento: envio imediato ou, com o modo lote ativo, agrupado com os próximos
+function deliverWebhook(instanceName, webhookUrl, payload, token = null) {
+  // A configuração pode ter sido salva com o nome em minúsculas (ver sendWebhook em whatsapp.js)
+  const batch = (getWebhookConfig(instanceName) || getWebhookConfig(instanceName.toLowerCase()))?.batch;
+
+  if (!batch?.enabled) {
+    return sendWebhookWithRetry(instanceName, webhookUrl, payload, {}, token);
+  }
+
+  // Com o modo lote ativo, eventos fora do lote entram na mesma fila da instância,
+  // depois do lote pendente, para não ultrapassar eventos anteriores
+  if (!batch.eventTypes.includes(payload.event)) {
+    flushBatch(instanceName);
+    return chainDelivery(instanceName, () => sendWebhookWithRetry(instanceName, webhookUrl, payload, {}, token));
+  }
+
+  let pending = pendingBatches[instanceName];
+  if (pending && (pending.url !== webhookUrl || pending.token !== token)) {
+    flushBatch(instanceName);
+    pending = null;
+  }
+
+  if (!pending) {
+    pending = {
+      url: webhookUrl,
+      token,
+      events: [],
+      timer: setTimeout(() => flushBatch(instanceName), batch.maxWaitMs)
+    };
+    pendingBatches[instanceName] = pending;
+  }
+
+  pending.events.push(payload);
+
+  if (pending.events.length >= batch.maxEvents) {
+    flushBatch(instanceName);
+  }
+
+  return Promise.resolve({ success: true, batched: true });
+}
+
+// Enviar o lote pendente de uma instância
+// Os lotes de uma instância são entregues em sequência (incluindo as novas tentativas),
+// então os eventos de cada chat chegam na ordem em que aconteceram.
+function flushBatch(instanceName) {
+  const pending = pendingBatches[instanceName];
+  if (!pending) return;
+
+  delete pendingBatches[instanceName];
+  clearTimeout(pending.timer);
+
+  const payload = {
+    event: 'batch',
+    instance: instanceName,
+    instanceName,
+    timestamp: new Date().toISOString(),
+    count: pending.events.length,
+    events: pending.events
+  };
+
+  chainDelivery(instanceName, () => sendWebhookWithRetry(instanceName, pending.url, payload, {}, pending.token))
+    .catch(err => console.error(`[Webhook] ${instanceName} - Erro ao enviar lote:`, err.message));
+}
+
+// Encadear uma entrega depois das anteriores da instância; resolve com o resultado do envio
+function chainDelivery(instanceName, send) {
+  const previous = batchDeliveries[instanceName] || Promise.resolve();
+  const result = previous.then(send);
+  // A fila segue mesmo se esta entrega falhar
+  const delivery = result
+    .catch(() => {})
+    .finally(() => {
+      if (batchDeliveries[instanceName] === delivery) {
+        delete batchDeliveries[instanceName];
+      }
+    });
+
+  batchDeliveries[instanceName] = delivery;
+  return result;
+}
+
+// Enviar todos os lotes pendentes (desligamento) e aguardar as entregas por até `timeoutMs`
+async function flushWebhookBatches(timeoutMs = 5000) {
+  Object.keys(pendingBatches).forEach(flushBatch);
+
+  const deliveries = Object.values(batchDeliveries);
+  if (deliveries.length === 0) return;
+
+  let timer;
+  await Promise.race([
+    Promise.all(deliveries),
+    new Promise(resolve => { timer = setTimeout(resolve, timeoutMs); })
+  ]);
+  clearTimeout(timer);
+}
+
 // Verificar se um tipo de evento está habilitado
 function isEventTypeEnabled(instanceName, eventType) {
   const config = getWebhookConfig(instanceName);
@@ -328,66 +489,24 @@ async function testWebhook(instanceName, webhookUrl, token = null) {
   return await sendWebhookWithRetry(instanceName, webhookUrl, testPayload, {}, token);
 }
 
-// Obter estatísticas de webhook
-function getWebhookStats(instanceName, period = 'day') {
-  const logs = webhookLogs[instanceName] || [];
-
-  const now = new Date();
-  let since;
-
-  switch (period) {
-    case 'hour':
-      since = new Date(now - 60 * 60 * 1000);
-      break;
-    case 'day':
-      since = new Date(now - 24 * 60 * 60 * 1000);
-      break;
-    case 'week':
-      since = new Date(now - 7 * 24 * 60 * 60 * 1000);
-      break;
-    default:
-      since = new Date(now - 24 * 60 * 60 * 1000);
-  }
-
-  const recentLogs = logs.filter(log => new Date(log.timestamp) >= since);
+// Obter estatísticas de webhook (agregadas no banco)
+async function getWebhookStats(instanceName, period = 'day') {
+  const stats = await webhookRepository.getWebhookStats(instanceName, period);
 
-  const stats = {
-    total: recentLogs.length,
-    success: recentLogs.filter(log => log.status === 'success').length,
-    error: recentLogs.filter(log => log.status === 'error').length,
-    failed: recentLogs.filter(log => log.status === 'failed').length,
-    byEventType: {},
-    avgDuration: 0,
-    successRate: 0
-  };
-
-  // Calcular por tipo de evento
-  recentLogs.forEach(log => {
-    if (!stats.byEventType[log.eventType]) {
-      stats.byEventType[log.eventType] = { total: 0, success: 0, error: 0 };
-    }
-    stats.byEventType[log.eventType].total++;
-    if (log.status === 'success') {
-      stats.byEventType[log.eventType].success++;
-    } else {
-      stats.byEventType[log.eventType].error++;
-    }
+  const byEventType = {};
+  Object.entries(stats.by_event_type).forEach(([eventType, counts]) => {
+    byEventType[eventType] = { total: counts.total, success: counts.success, error: counts.errors };
   });
 
-  // Calcular duração média
-  const successLogs = recentLogs.filter(log => log.status === 'success' && log.duration);
-  if (successLogs.length > 0) {
-    stats.avgDuration = Math.round(
-      successLogs.reduce((sum, log) => sum + log.duration, 0) / successLogs.length
-    );
-  }
-
-  // Calcular taxa de sucesso
-  if (stats.total > 0) {
-    stats.successRate = Math.round((stats.success / stats.total) * 100);
-  }
-
-  return stats;
+  return {
+    total: stats.total,
+    success: stats.success,
+    error: stats.error,
+    failed: stats.failed,
+    byEventType,
+    avgDuration: stats.avg_duration,
+    successRate: stats.success_rate
+  };
 }
 
 // Listar todas as configurações de webhook
@@ -399,19 +518,17 @@ function getAllWebhookConfigs() {
 function initWebhookAdvanced() {
   loadWebhookData();
   console.log('[Webhook Advanced] Sistema de webhook avançado inicializado');
-
-  // Salvar logs periodicamente (a cada 5 minutos)
-  setInterval(() => {
-    saveWebhookLogs();
-  }, 5 * 60 * 1000);
 }
 
 module.exports = {
   initWebhookAdvanced,
   configureWebhook,
+  validateBatchConfig,
   getWebhookConfig,
   deleteWebhookConfig,
   sendWebhookWithRetry,
+  deliverWebhook,
+  flushWebhookBatches,
   isEventTypeEnabled,
   testWebhook,
   getWebhookLogs,
@@ -0,0 +1,340 @@
+const webhookRepository = require('../repositories/webhookRepository');
+const webhookDispatcher = require('./webhookDispatcher');
+const FilaCircular = require('../utilitarios/fila-circular');
+const jobScheduler = require('./jobScheduler');
+
+/**
+ * Registro de entregas de webhook (tabela webhook_logs) e dead letters
+ *
+ * - `record`: cada tentativa entra em um buffer em memória e é gravada em lote
+ *   (um INSERT por até WEBHOOK_LOG_BATCH tentativas) a cada WEBHOOK_LOG_FLUSH_MS.
+ *   Se o banco ficar para trás, as tentativas mais antigas são descartadas e contadas.
+ * - `deadLetter`: entrega que falhou em todas as tentativas vai para
+ *   webhook_dead_letters, com payload e cabeçalhos, para reprocessamento. Também
+ *   gravado em lote (com o circuito aberto cada evento vira um dead letter), mas sem
+ *   descarte: um lote que falhar volta para o início da fila e é regravado no
+ *   próximo flush. O token da instância não é guardado: o reprocessamento usa o
+ *   token atual.
+ * - `replayDeadLetters`: reprocessa em segundo plano os dead letters de uma
+ *   instância, no máximo `ratePerSecond` envios por segundo.
+ * - Retenção diária (jobScheduler): logs e dead letters antigos ou acima do
+ *   limite por instância são removidos.
+ */
+
+const BUFFER_MAX = parseInt(process.env.WEBHOOK_LOG_BUFFER_MAX, 10) || 20000;
+const FLUSH_MS = parseInt(process.env.WEBHOOK_LOG_FLUSH_MS, 10) || 1000;
+const BATCH_SIZE = parseInt(process.env.WEBHOOK_LOG_BATCH, 10) || 500;
+const MAX_REPLAY_RATE = parseInt(process.env.WEBHOOK_REPLAY_MAX_RATE, 10) || 20;
+const REPLAY_TIMEOUT_MS = 30000;
+const LOG_RETENTION_DAYS = parseInt(process.env.WEBHOOK_LOG_RETENTION_DAYS, 10) || 30;
+const LOG_MAX_PER_INSTANCE = parseInt(process.env.WEBHOOK_LOG_MAX_PER_INSTANCE, 10) || 10000;
+const DEAD_LETTER_RETENTION_DAYS = parseInt(process.env.WEBHOOK_DEAD_LETTER_RETENTION_DAYS, 10) || 14;
+const DEAD_LETTER_MAX_PER_INSTANCE = parseInt(process.env.WEBHOOK_DEAD_LETTER_MAX_PER_INSTANCE, 10) || 10000;
+
+// Cabeçalhos/campos com o token da instância (não são gravados nos dead letters)
+const AUTH_HEADERS = ['apikey', 'x-api-key', 'authorization'];
+
+const buffer = new FilaCircular(BUFFER_MAX);
+// Sem limite: dead letters não podem ser sobrescritos enquanto o banco estiver fora
+const deadLetterBuffer = [];
+const replaying = new Set();
+let flushing = null;
+let timer = null;
+
+const stats = {
+  written: 0,
+  dropped: 0,
+  failedWrites: 0,
+  skippedUnknownInstance: 0,
+  deadLetters: 0,
+  deadLetterFailures: 0,
+  retentionRemovedLogs: 0,
+  retentionRemovedDeadLetters: 0,
+  replayed: 0,
+  replayFailed: 0
+};
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+function startTimer() {
+  if (timer) return;
+  timer = setInterval(() => flush(), FLUSH_MS);
+  timer.unref();
+}
+
+/**
+ * Registrar uma tentativa de entrega
+ * @param {{instanceName: string, eventType: string, url: string, status: string,
+ *   statusCode?: number, attempt?: number, durationMs?: number, errorMessage?: string,
+ *   errorType?: string, responseBody?: string, batchSize?: number, createdAt?: string}} entry
+ */
+function record(entry) {
+  if (buffer.adicionar({ ...entry, createdAt: entry.createdAt || new Date().toISOString() })) {
+    stats.dropped++;
+  }
+
+  startTimer();
+  if (buffer.tamanho >= BATCH_SIZE && !flushing) {
+    setImmediate(flush);
+  }
+}
+
+async function write() {
+  while (deadLetterBuffer.length > 0) {
+    const batch = deadLetterBuffer.splice(0, BATCH_SIZE);
+
+    try {
+      stats.deadLetters += await webhookRepository.addDeadLetters(batch);
+    } catch (err) {
+      // Devolver ao início da fila (mantendo a ordem) e tentar de novo no próximo flush
+      deadLetterBuffer.unshift(...batch);
+      stats.deadLetterFailures++;
+      console.error(
+        `[WebhookLog] Falha ao registrar ${batch.length} dead letters (${deadLetterBuffer.length} pendentes):`,
+        err.message
+      );
+      break;
+    }
+  }
+
+  while (buffer.tamanho > 0) {
+    const batch = buffer.retirar(BATCH_SIZE);
+
+    try {
+      const inserted = await webhookRepository.addWebhookLogs(batch);
+      stats.written += inserted;
+      stats.skippedUnknownInstance += batch.length - inserted;
+    } catch (err) {
+      stats.failedWrites += batch.length;
+      console.warn(`[WebhookLog] Falha ao gravar ${batch.length} logs: ${err.message}`);
+      break;
+    }
+  }
+}
+
+/**
+ * Gravar as tentativas pendentes (um ciclo por vez)
+ */
+function flush() {
+  if (!flushing) {
+    flushing = write().finally(() => {
+      flushing = null;
+    });
+  }
+  return flushing;
+}
+
+/**
+ * Gravar o que estiver pendente (desligamento)
+ */
+async function close() {
+  clearInterval(timer);
+  timer = null;
+
+  if (flushing) await flushing;
+  await flush();
+
+  if (deadLetterBuffer.length > 0) {
+    console.error(`[WebhookLog] ${deadLetterBuffer.length} dead letters não gravados no desligamento`);
+  }
+}
+
+// Remover o token da instância (cabeçalhos de autenticação e `apikey` do payload)
+function withoutAuthHeaders(headers = {}) {
+  return Object.fromEntries(
+    Object.entries(headers).filter(([name]) => !AUTH_HEADERS.includes(name.toLowerCase()))
+  );
+}
+
+function withoutApiKey(payload) {
+  if (!payload || typeof payload !== 'object') return payload;
+
+  const { apikey, ...rest } = payload;
+  if (Array.isArray(rest.events)) {
+    rest.events = rest.events.map(withoutApiKey);
+  }
+  return rest;
+}
+
+function withApiKey(payload, token) {
+  if (!payload || typeof payload !== 'object') return payload;
+
+  // Lote: o token vai em cada evento, não no envelope
+  if (Array.isArray(payload.events)) {
+    return { ...payload, events: payload.events.map(event => withApiKey(event, token)) };
+  }
+  return { ...payload, apikey: token };
+}
+
+/**
+ * Mover uma entrega para a fila de dead letters (gravada no próximo lote)
+ * @param {{instanceName: string, eventType: string, url: string, payload: Object,
+ *   headers?: Object, attempts?: number, errorMessage?: string}} entry
+ */
+async function deadLetter(entry) {
+  deadLetterBuffer.push({
+    ...entry,
+    payload: withoutApiKey(entry.payload),
+    headers: withoutAuthHeaders(entry.headers)
+  });
+
+  startTimer();
+  if (deadLetterBuffer.length >= BATCH_SIZE && !flushing) {
+    setImmediate(flush);
+  }
+}
+
+async function replayOne(letter, token) {
+  const startTime = Date.now();
+  const attempt = letter.attempts + letter.replay_attempts + 1;
+  let errorMessage = null;
+
+  // Autenticação reconstruída com o token atual da instância
+  const headers = withoutAuthHeaders(letter.headers || {});
+  if (token) {
+    headers.apikey = token;
+    headers['X-API-Key'] = token;
+    headers.Authorization = `Bearer ${token}`;
+  }
+
+  try {
+    const response = await webhookDispatcher.post(letter.url, token ? withApiKey(letter.payload, token) : letter.payload, {
+      headers,
+      timeout: REPLAY_TIMEOUT_MS
+    });
+
+    record({
+      instanceName: letter.instance_name,
+      eventType: letter.event_type,
+      url: letter.url,
+      status: response.ok ? 'success' : 'error',
+      statusCode: response.status,
+      attempt,
+      durationMs: response.durationMs,
+      errorMessage: response.ok ? null : `HTTP ${response.status}`,
+      errorType: 'replay',
+      responseBody: response.body.substring(0, 500)
+    });
+
+    if (!response.ok) errorMessage = `HTTP ${response.status}`;
+  } catch (err) {
+    errorMessage = err.message;
+    record({
+      instanceName: letter.instance_name,
+      eventType: letter.event_type,
+      url: letter.url,
+      status: 'error',
+      statusCode: 0,
+      attempt,
+      durationMs: Date.now() - startTime,
+      errorMessage,
+      errorType: 'replay'
+    });
+  }
+
+  if (errorMessage) stats.replayFailed++;
+  else stats.replayed++;
+
+  await webhookRepository.finishDeadLetterReplay(letter.id, !errorMessage, errorMessage);
+}
+
+/**
+ * Reprocessar dead letters de uma instância em segundo plano
+ * @param {string} instanceName
+ * @param {{ids?: number[], limit?: number, ratePerSecond?: number}} [options]
+ * @returns {Promise<{queued: number, ratePerSecond: number}>}
+ */
+async function replayDeadLetters(instanceName, options = {}) {
+  if (replaying.has(instanceName)) {
+    const error = new Error('Reprocessamento já em andamento para esta instância');
+    error.code = 'REPLAY_IN_PROGRESS';
+    throw error;
+  }
+
+  const limit = Math.min(Math.max(parseInt(options.limit, 10) || 100, 1), 1000);
+  const ratePerSecond = Math.min(Math.max(parseFloat(options.ratePerSecond) || 5, 0.1), MAX_REPLAY_RATE);
+  const ids = Array.isArray(options.ids) && options.ids.length > 0 ? options.ids.map(Number) : null;
+
+  replaying.add(instanceName);
+
+  let letters;
+  try {
+    letters = await webhookRepository.claimDeadLetters(instanceName, { ids, limit });
+  } catch (err) {
+    replaying.delete(instanceName);
+    throw err;
+  }
+
+  if (letters.length === 0) {
+    replaying.delete(instanceName);
+    return { queued: 0, ratePerSecond };
+  }
+
+  const interval = 1000 / ratePerSecond;
+
+  (async () => {
+    const token = await webhookRepository.getInstanceToken(instanceName).catch(() => null);
+
+    for (const letter of letters) {
+      const startedAt = Date.now();
+
+      try {
+        await replayOne(letter, token);
+      } catch (err) {
+        console.error(`[WebhookLog] Erro ao reprocessar dead letter ${letter.id}:`, err.message);
+      }
+
+      await sleep(Math.max(0, interval - (Date.now() - startedAt)));
+    }
+  })()
+    .finally(() => {
+      replaying.delete(instanceName);
+      console.log(`[WebhookLog] Reprocessamento de ${letters.length} dead letters concluído para ${instanceName}`);
+    });
+
+  return { queued: letters.length, ratePerSecond };
+}
+
+/**
+ * Retenção: remover logs e dead letters antigos ou acima do limite por instância
+ */
+async function applyRetention() {
+  await flush();
+
+  const removedLogs = await webhookRepository.cleanOldWebhookLogs(LOG_RETENTION_DAYS)
+    + await webhookRepository.trimWebhookLogs(LOG_MAX_PER_INSTANCE);
+  const removedDeadLetters = await webhookRepository.cleanOldDeadLetters(
+    DEAD_LETTER_RETENTION_DAYS,
+    DEAD_LETTER_MAX_PER_INSTANCE
+  );
+
+  stats.retentionRemovedLogs += removedLogs;
+  stats.retentionRemovedDeadLetters += removedDeadLetters;
+  console.log(`[WebhookLog] Retenção: ${removedLogs} logs e ${removedDeadLetters} dead letters removidos`);
+
+  return { removedLogs, removedDeadLetters };
+}
+
+jobScheduler.schedule('webhook:retention', '15 3 * * *', () => applyRetention());
+
+/**
+ * Contadores desta réplica
+ */
+function getStats() {
+  return {
+    pending: buffer.tamanho,
+    pendingDeadLetters: deadLetterBuffer.length,
+    replayingInstances: [...replaying],
+    ...stats
+  };
+}
+
+module.exports = {
+  record,
+  flush,
+  close,
+  deadLetter,
+  replayDeadLetters,
+  applyRetention,
+  getStats
+};
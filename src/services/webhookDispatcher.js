@@ -0,0 +1,260 @@
+const http = require('http');
+const https = require('https');
+const circuitBreaker = require('./circuitBreaker');
+
+/**
+ * Envio HTTP de webhooks
+ *
+ * Todos os envios de webhook passam por aqui. Cada destino (origem: protocolo +
+ * host + porta) tem:
+ * - um Agent keep-alive próprio, então eventos seguidos para o mesmo endpoint
+ *   reutilizam a conexão TLS em vez de abrir uma nova a cada evento;
+ * - um limite de requisições simultâneas (WEBHOOK_MAX_IN_FLIGHT). O excedente
+ *   espera em uma fila por destino (até WEBHOOK_MAX_QUEUE), assim um destino
+ *   lento não consome sockets e memória sem limite.
+ *
+ * O payload é serializado uma vez por evento (`serialize`) e o mesmo Buffer é
+ * reutilizado nas novas tentativas. Quando o circuit breaker de uma URL abre
+ * (em qualquer réplica), os envios para ela que ainda esperam na fila são
+ * rejeitados na hora com `code === 'ECIRCUITOPEN'`.
+ *
+ * Uso:
+ *   const body = webhookDispatcher.serialize(payload);
+ *   const res = await webhookDispatcher.post(url, body, { headers, timeout: 15000 });
+ *   if (!res.ok) // res.status, res.body
+ * Erros de rede rejeitam a promise; timeouts têm `code === 'ETIMEDOUT'`.
+ */
+
+const MAX_IN_FLIGHT = parseInt(process.env.WEBHOOK_MAX_IN_FLIGHT, 10) || 20;
+const MAX_QUEUE = parseInt(process.env.WEBHOOK_MAX_QUEUE, 10) || 5000;
+const DEFAULT_TIMEOUT_MS = 30000;
+// Apenas o início da resposta é guardado (os logs usam no máximo 500 caracteres)
+const RESPONSE_LIMIT = 16 * 1024;
+const USER_AGENT = 'WhatsBenemax/2.1';
+
+const destinations = new Map();
+
+function emptyStats() {
+  return {
+    sent: 0,
+    httpErrors: 0,
+    networkErrors: 0,
+    timeouts: 0,
+    rejectedQueueFull: 0,
+    shedCircuitOpen: 0,
+    totalLatencyMs: 0,
+    maxLatencyMs: 0,
+    totalQueueMs: 0,
+    maxQueueMs: 0
+  };
+}
+
+function getDestination(target) {
+  let destination = destinations.get(target.origin);
+
+  if (!destination) {
+    const Agent = target.protocol === 'https:' ? https.Agent : http.Agent;
+    destination = {
+      agent: new Agent({
+        keepAlive: true,
+        maxSockets: MAX_IN_FLIGHT,
+        maxFreeSockets: MAX_IN_FLIGHT,
+        timeout: 60000
+      }),
+      transport: target.protocol === 'https:' ? https : http,
+      inFlight: 0,
+      waiting: [],
+      stats: emptyStats()
+    };
+    destinations.set(target.origin, destination);
+  }
+
+  return destination;
+}
+
+function acquire(destination, url) {
+  if (destination.inFlight < MAX_IN_FLIGHT) {
+    destination.inFlight++;
+    return Promise.resolve();
+  }
+
+  if (destination.waiting.length >= MAX_QUEUE) {
+    destination.stats.rejectedQueueFull++;
+    const error = new Error('Fila de envio do destino cheia');
+    error.code = 'EQUEUEFULL';
+    return Promise.reject(error);
+  }
+
+  return new Promise((resolve, reject) => destination.waiting.push({ url, resolve, reject }));
+}
+
+function release(destination) {
+  const next = destination.waiting.shift();
+  if (next) {
+    next.resolve(); // a vaga passa direto para o próximo da fila
+  } else {
+    destination.inFlight--;
+  }
+}
+
+// Circuito aberto: descartar os envios para a URL que ainda não saíram
+circuitBreaker.on('open', (url) => {
+  let origin;
+  try {
+    origin = new URL(url).origin;
+  } catch (err) {
+    return;
+  }
+
+  const destination = destinations.get(origin);
+  if (!destination || destination.waiting.length === 0) return;
+
+  destination.waiting = destination.waiting.filter((entry) => {
+    if (entry.url !== url) return true;
+
+    destination.stats.shedCircuitOpen++;
+    const error = new Error('Circuito aberto para o destino');
+    error.code = 'ECIRCUITOPEN';
+    entry.reject(error);
+    return false;
+  });
+});
+
+/**
+ * Serializar o payload uma única vez
+ * @param {Object|string|Buffer} payload
+ * @returns {Buffer}
+ */
+function serialize(payload) {
+  if (Buffer.isBuffer(payload)) return payload;
+  return Buffer.from(typeof payload === 'string' ? payload : JSON.stringify(payload));
+}
+
+function send(destination, target, body, headers, timeout) {
+  return new Promise((resolve, reject) => {
+    const requestHeaders = { 'Content-Type': 'application/json', 'User-Agent': USER_AGENT };
+    for (const [name, value] of Object.entries(headers)) {
+      if (value !== undefined && value !== null) requestHeaders[name] = value;
+    }
+    requestHeaders['Content-Length'] = body.length;
+
+    const req = destination.transport.request(target, {
+      method: 'POST',
+      agent: destination.agent,
+      headers: requestHeaders
+    }, (res) => {
+      const chunks = [];
+      let size = 0;
+
+      res.on('data', (chunk) => {
+        if (size < RESPONSE_LIMIT) {
+          chunks.push(chunk);
+          size += chunk.length;
+        }
+      });
+      res.on('end', () => {
+        clearTimeout(timer);
+        resolve({
+          ok: res.statusCode >= 200 && res.statusCode < 300,
+          status: res.statusCode,
+          body: Buffer.concat(chunks).toString('utf8', 0, Math.min(size, RESPONSE_LIMIT))
+        });
+      });
+      res.on('error', reject);
+      res.on('aborted', () => reject(new Error('Resposta interrompida')));
+    });
+
+    const timer = setTimeout(() => {
+      const error = new Error(`Timeout após ${timeout}ms`);
+      error.code = 'ETIMEDOUT';
+      req.destroy(error);
+    }, timeout);
+
+    req.on('error', (error) => {
+      clearTimeout(timer);
+      reject(error);
+    });
+
+    req.end(body);
+  });
+}
+
+/**
+ * Enviar um POST para o destino
+ * @param {string} url
+ * @param {Object|string|Buffer} body - Preferencialmente o resultado de `serialize`
+ * @param {{headers?: Object, timeout?: number}} [options]
+ * @returns {Promise<{ok: boolean, status: number, body: string, durationMs: number}>}
+ */
+async function post(url, body, options = {}) {
+  const target = new URL(url);
+  const destination = getDestination(target);
+  const { stats } = destination;
+  const data = serialize(body);
+
+  const enqueuedAt = Date.now();
+  await acquire(destination, url);
+
+  const startedAt = Date.now();
+  const queueMs = startedAt - enqueuedAt;
+  stats.totalQueueMs += queueMs;
+  stats.maxQueueMs = Math.max(stats.maxQueueMs, queueMs);
+
+  try {
+    const response = await send(destination, target, data, options.headers || {}, options.timeout || DEFAULT_TIMEOUT_MS);
+    const durationMs = Date.now() - startedAt;
+
+    stats.sent++;
+    stats.totalLatencyMs += durationMs;
+    stats.maxLatencyMs = Math.max(stats.maxLatencyMs, durationMs);
+    if (!response.ok) stats.httpErrors++;
+
+    return { ...response, durationMs };
+  } catch (error) {
+    if (error.code === 'ETIMEDOUT') stats.timeouts++;
+    else stats.networkErrors++;
+    throw error;
+  } finally {
+    release(destination);
+  }
+}
+
+/**
+ * Métricas por destino: requisições em andamento, fila, latência e erros
+ */
+function getMetrics() {
+  const result = {};
+
+  for (const [origin, destination] of destinations) {
+    const { stats } = destination;
+    const finished = stats.sent + stats.networkErrors + stats.timeouts;
+
+    result[origin] = {
+      inFlight: destination.inFlight,
+      queued: destination.waiting.length,
+      sent: stats.sent,
+      httpErrors: stats.httpErrors,
+      networkErrors: stats.networkErrors,
+      timeouts: stats.timeouts,
+      rejectedQueueFull: stats.rejectedQueueFull,
+      shedCircuitOpen: stats.shedCircuitOpen,
+      avgLatencyMs: stats.sent > 0 ? Math.round(stats.totalLatencyMs / stats.sent) : 0,
+      maxLatencyMs: stats.maxLatencyMs,
+      avgQueueMs: finished > 0 ? Math.round(stats.totalQueueMs / finished) : 0,
+      maxQueueMs: stats.maxQueueMs
+    };
+  }
+
+  return {
+    maxInFlightPerDestination: MAX_IN_FLIGHT,
+    maxQueuePerDestination: MAX_QUEUE,
+    destinations: result,
+    circuits: circuitBreaker.getStats()
+  };
+}
+
+module.exports = {
+  serialize,
+  post,
+  getMetrics
+};
@@ -8,7 +8,10 @@ const { SocksProxyAgent } = require('socks-proxy-agent');
 const { v4: uuidv4 } = require('uuid');
 const { incrementMetric, updateConnectionStatus, createInstanceMetrics, removeInstanceMetrics } = require('./metrics');
 const { handleIncomingMessage } = require('./autoresponder');
-const { sendWebhookWithRetry, isEventTypeEnabled } = require('./webhook-advanced');
+const { deliverWebhook, isEventTypeEnabled } = require('./webhook-advanced');
+const webhookDispatcher = require('./webhookDispatcher');
+const { getPipeline, removePipeline } = require('./ingestionPipeline');
+const { storeMediaStream, MEDIA_MAX_BYTES } = require('./mediaStore');
 const config = require('../config/env');
 const OfficialProvider = require('./providers/OfficialProvider');
 // Nota: Baileys continuará sendo o padrão interno para evitar quebras
@@ -64,11 +67,9 @@ async function getEmpresaPadraoId() {
 // Diretório para sessões
 const SESSIONS_DIR = path.resolve(config.whatsappSessionDir || './sessions');
 const DATA_DIR = path.resolve('./data');
-// Garantir caminho absoluto IDÊNTICO ao do index.js e do Easypanel
-const UPLOADS_DIR = '/app/uploads';
 
-// Garantir que os diretórios existem
-[SESSIONS_DIR, DATA_DIR, UPLOADS_DIR].forEach(dir => {
+// Garantir que os diretórios existem (uploads é gerenciado pelo mediaStore)
+[SESSIONS_DIR, DATA_DIR].forEach(dir => {
   if (!fs.existsSync(dir)) {
     fs.mkdirSync(dir, { recursive: true });
   }
@@ -77,6 +78,293 @@ const UPLOADS_DIR = '/app/uploads';
 // Logger principal (pode ser configurado via env)
 const logger = pino({ level: process.env.LOG_LEVEL || 'info' });
 
+// ==================== PIPELINE DE INGESTÃO ====================
+
+// Concorrência por estágio (por instância). Ordem sempre preservada por remoteJid.
+const INGESTION_CONCURRENCY = {
+  media: parseInt(process.env.INGESTION_MEDIA_CONCURRENCY, 10) || 4,
+  contact: parseInt(process.env.INGESTION_CONTACT_CONCURRENCY, 10) || 8,
+  persist: parseInt(process.env.INGESTION_PERSIST_CONCURRENCY, 10) || 2,
+  dispatch: parseInt(process.env.INGESTION_DISPATCH_CONCURRENCY, 10) || 8
+};
+
+// Limite de mensagens em andamento por instância (acima dele o messages.upsert espera)
+const INGESTION_MAX_IN_FLIGHT = parseInt(process.env.INGESTION_MAX_IN_FLIGHT, 10) || 1000;
+
+// Janela de persistência em lote (flush por tamanho ou tempo)
+const INGESTION_PERSIST_BATCH = {
+  size: parseInt(process.env.INGESTION_PERSIST_BATCH_SIZE, 10) || 100,
+  windowMs: parseInt(process.env.INGESTION_PERSIST_BATCH_WINDOW_MS, 10) || 150
+};
+
+const MEDIA_EXTENSIONS = {
+  imageMessage: 'png',
+  videoMessage: 'mp4',
+  audioMessage: 'ogg',
+  documentMessage: 'bin',
+  stickerMessage: 'webp'
+};
+
+const MEDIA_PT_TYPES = {
+  imageMessage: 'imagem',
+  videoMessage: 'video',
+  audioMessage: 'audio',
+  documentMessage: 'documento',
+  stickerMessage: 'sticker'
+};
+
+function getIngestionPipeline(instanceName) {
+  return getPipeline(instanceName, [
+    { name: 'media', handler: ingestMediaStage, concurrency: INGESTION_CONCURRENCY.media },
+    { name: 'contact', handler: ingestContactStage, concurrency: INGESTION_CONCURRENCY.contact },
+    { name: 'persist', handler: ingestPersistStage, concurrency: INGESTION_CONCURRENCY.persist, batch: INGESTION_PERSIST_BATCH },
+    { name: 'dispatch', handler: ingestDispatchStage, concurrency: INGESTION_CONCURRENCY.dispatch }
+  ], { maxInFlight: INGESTION_MAX_IN_FLIGHT });
+}
+
+// Estágio 1: extrair conteúdo e baixar/armazenar mídia
+async function ingestMediaStage(ctx) {
+  const { instanceName, message } = ctx;
+
+  ctx.isFromMe = message.key.fromMe;
+  ctx.isGroup = ctx.remoteJid.endsWith('@g.us');
+  ctx.realMessage = getMessageBody(message);
+  ctx.msgType = getMessageType(message);
+  ctx.msgText = extractText(message);
+  ctx.midiaUrl = null;
+  ctx.midiaTipo = null;
+  ctx.midiaNomeArquivo = null;
+
+  const { msgType } = ctx;
+  if (!MEDIA_EXTENSIONS[msgType]) return ctx;
+
+  // Evitar o download de arquivos acima do limite quando o tamanho é conhecido
+  const declaredSize = Number(ctx.realMessage[msgType]?.fileLength || 0);
+  if (declaredSize > MEDIA_MAX_BYTES) {
+    console.warn(`[${instanceName}] ⚠️ Mídia ignorada (${Math.round(declaredSize / 1024 / 1024)}MB acima do limite)`);
+    return ctx;
+  }
+
+  try {
+    console.log(`[${instanceName}] Baixando mídia type: ${msgType}...`);
+    const stream = await downloadMediaMessage(message, 'stream', {}, { logger });
+
+    const stored = await storeMediaStream(stream, {
+      extension: MEDIA_EXTENSIONS[msgType],
+      baseUrl: config.serverUrl
+    });
+
+    ctx.midiaUrl = stored.url;
+    ctx.midiaTipo = MEDIA_PT_TYPES[msgType];
+    ctx.midiaNomeArquivo = ctx.realMessage[msgType]?.fileName || stored.fileName;
+
+    console.log(`[${instanceName}] ✓ Mídia salva em: ${ctx.midiaUrl}${stored.deduplicated ? ' (deduplicada)' : ''}`);
+  } catch (err) {
+    console.error(`[${instanceName}] ❌ ERRO AO SALVAR MIDIA:`, err.message);
+  }
+
+  return ctx;
+}
+
+// Estágio 2: resolver empresa, nome e contato (buscar ou criar) do remetente/grupo
+async function ingestContactStage(ctx) {
+  const { instanceName, message, remoteJid } = ctx;
+
+  let empresaId = instances[instanceName]?.empresaId;
+
+  // Fallback: se não tiver empresa_id em memória, tenta recuperar agora
+  if (!empresaId) {
+    console.warn(`[${instanceName}] ⚠️ empresaId está nulo. Tentando recuperar...`);
+    empresaId = await getEmpresaPadraoId();
+    if (instances[instanceName]) instances[instanceName].empresaId = empresaId;
+  }
+  ctx.empresaId = empresaId;
+
+  let contatoNome = message.pushName || remoteJid.split('@')[0];
+
+  // Se for grupo, tentar pegar o nome do grupo do cache
+  if (ctx.isGroup) {
+    try {
+      const socket = instances[instanceName]?.socket;
+      const groupMeta = socket?.groupMetadata ? await socket.groupMetadata(remoteJid).catch(() => null) : null;
+      if (groupMeta?.subject) {
+        contatoNome = groupMeta.subject;
+      }
+    } catch (e) {
+      // Fallback silencioso
+    }
+  }
+  ctx.contatoNome = contatoNome;
+
+  // Preparar dados para o Chat (Garantir tipos em Português para o Repo)
+  ctx.dadosChat = {
+    contatoTelefone: remoteJid.replace('@s.whatsapp.net', ''),
+    contatoNome,
+    whatsappMensagemId: message.key.id,
+    tipoMensagem: ctx.midiaTipo || 'texto',
+    conteudo: ctx.msgText || ctx.midiaUrl || '',
+    midiaUrl: ctx.midiaUrl,
+    midiaTipo: ctx.midiaTipo,
+    midiaNomeArquivo: ctx.midiaNomeArquivo,
+    status: ctx.isFromMe ? 'enviada' : 'recebida',
+    direcao: ctx.isFromMe ? 'enviada' : 'recebida',
+    metadados: {
+      raw: message,
+      fromParticipant: ctx.isGroup ? message.key.participant : null,
+      senderName: message.pushName
+    }
+  };
+
+  // Sem contato resolvido aqui, a persistência em lote tenta resolver de novo
+  if (empresaId) {
+    try {
+      const contatos = await chatServico.resolverContatos(empresaId, [ctx.dadosChat]);
+      ctx.contato = contatos.values().next().value || null;
+    } catch (err) {
+      console.error(`[${instanceName}] Erro ao resolver contato:`, err.message);
+      ctx.contato = null;
+    }
+  }
+
+  return ctx;
+}
+
+// Estágio 3: persistir no banco via ChatService (em lote, por empresa)
+// Falha ao gravar não interrompe a mensagem: segue com persistido = false e o
+// webhook é enviado mesmo assim
+async function ingestPersistStage(ctxs) {
+  const porEmpresa = new Map();
+  for (const ctx of ctxs) {
+    ctx.persistido = false;
+    if (!ctx.empresaId) continue; // sem empresa não há chat para gravar
+    if (!porEmpresa.has(ctx.empresaId)) porEmpresa.set(ctx.empresaId, []);
+    porEmpresa.get(ctx.empresaId).push(ctx);
+  }
+
+  for (const [empresaId, lote] of porEmpresa) {
+    const { instanceName } = lote[0];
+    try {
+      await chatServico.receberMensagensEmLote(
+        empresaId,
+        instanceName,
+        lote.map(ctx => ({ ...ctx.dadosChat, contato: ctx.contato }))
+      );
+      lote.forEach(ctx => { ctx.persistido = true; });
+    } catch (err) {
+      // Fallback: o lote foi desfeito (transação), persistir individualmente para não
+      // perder o lote inteiro por uma linha inválida
+      console.error(`[${instanceName}] Erro ao persistir lote no chat (${lote.length}), tentando individualmente:`, err.message);
+      for (const ctx of lote) {
+        try {
+          await chatServico.receberMensagem(empresaId, instanceName, ctx.dadosChat);
+          ctx.persistido = true;
+        } catch (e) {
+          console.error(`[${instanceName}] Erro ao persistir no chat:`, e.message);
+        }
+      }
+    }
+  }
+
+  return ctxs;
+}
+
+// Estágio 4: webhook, eventos, métricas e agente IA
+// Roda também para mensagens não persistidas (ctx.persistido = false): o agente
+// usa só o texto recebido, não a linha gravada
+async function ingestDispatchStage(ctx) {
+  const { instanceName, message, remoteJid, isFromMe, isGroup, realMessage, msgType, msgText, midiaUrl, midiaTipo, contatoNome, dadosChat, empresaId } = ctx;
+
+  // Preparar Webhook Payload (Fomato Evolution API v2 - Extremamente compatível)
+  const messageData = {
+    event: 'messages.upsert',
+    instance: instanceName,
+    instanceName: instanceName,
+    // Estrutura padrão data (Requisito de muitos sistemas de CRM/Lovable)
+    data: {
+      key: {
+        remoteJid,
+        fromMe: isFromMe,
+        id: message.key.id,
+        participant: isGroup ? message.key.participant : undefined
+      },
+      message: realMessage,
+      pushName: message.pushName || contatoNome,
+      messageTimestamp: message.messageTimestamp,
+      owner: instanceName,
+      source: 'ios',
+      status: isFromMe ? 2 : 1,
+      mediaUrl: midiaUrl,
+      // Mapear para inglês apenas no webhook para compatibilidade externa
+      mediaType: {
+        imagem: 'image',
+        audio: 'audio',
+        video: 'video',
+        sticker: 'sticker',
+        documento: 'document'
+      }[midiaTipo] || midiaTipo,
+      mimetype: realMessage[msgType]?.mimetype,
+      caption: msgText
+    },
+    // Campos na raiz para retrocompatibilidade
+    key: {
+      remoteJid,
+      fromMe: isFromMe,
+      id: message.key.id
+    },
+    message: realMessage,
+    pushName: message.pushName || contatoNome,
+    remoteJid: remoteJid,
+    sender: remoteJid.split('@')[0],
+    fromMe: isFromMe,
+    midiaUrl: midiaUrl,
+    midiaTipo: midiaTipo,
+    tipo_mensagem: midiaTipo, // Campo exato que o Lovable está esperando (em português)
+    ...dadosChat
+  };
+
+  // Disparar Webhook
+  if (!isFromMe) {
+    console.log(`[${instanceName}] 📥 Mensagem RECEBIDA de ${remoteJid}. Midia: ${midiaUrl || 'N/A'}`);
+  }
+  sendWebhook(instanceName, messageData);
+
+  addRecentEvent(instanceName, isFromMe ? 'message_sent' : 'message_received', {
+    id: message.key.id,
+    text: msgText,
+    from: remoteJid,
+    isFromMe
+  });
+
+  // Agente IA (apenas para recebidas e se não for de grupo para não floodar)
+  if (!isFromMe && !isGroup) {
+    incrementMetric(instanceName, 'received');
+
+    // Lógica de IA...
+    const socket = instances[instanceName]?.socket;
+    if (empresaId && msgText && socket) {
+      try {
+        const agenteIARepo = require('../repositorios/agente-ia.repositorio');
+        const agenteIAServico = require('../servicos/agente-ia.servico');
+        const agente = await agenteIARepo.buscarPorInstancia(instanceName, empresaId);
+
+        if (agente && agente.ativo) {
+          await socket.sendPresenceUpdate('composing', remoteJid);
+          const result = await agenteIAServico.processarMensagem(agente.id, empresaId, msgText, {
+            nomeContato: message.pushName || 'Cliente'
+          });
+
+          if (result?.resposta) {
+            // Apenas envia, o evento 'upsert' cuidará da persistência e webhooks
+            await socket.sendMessage(remoteJid, { text: result.resposta });
+          }
+        }
+      } catch (e) { console.error('Erro IA:', e.message); }
+    }
+  }
+
+  return ctx;
+}
+
 // ==================== FUNÇÕES DE INSTÂNCIA ====================
 
 async function createInstance(instanceNameRaw, options = {}) {
@@ -403,10 +691,12 @@ async function createInstance(instanceNameRaw, options = {}) {
   // Salvar credenciais
   socket.ev.on('creds.update', saveCreds);
 
-  // Receber mensagens
+  // Receber mensagens (enfileiradas no pipeline de ingestão da instância)
   socket.ev.on('messages.upsert', async ({ messages, type }) => {
     if (type !== 'notify' && type !== 'append') return;
 
+    const pipeline = getIngestionPipeline(instanceName);
+
     for (const message of messages) {
       if (!message.message) continue;
 
@@ -418,199 +708,10 @@ async function createInstance(instanceNameRaw, options = {}) {
         continue;
       }
 
-      let empresaId = instances[instanceName]?.empresaId;
-
-      // Fallback: se não tiver empresa_id em memória, tenta recuperar agora
-      if (!empresaId) {
-        console.warn(`[${instanceName}] ⚠️ empresaId está nulo. Tentando recuperar...`);
-        empresaId = await getEmpresaPadraoId();
-        if (instances[instanceName]) instances[instanceName].empresaId = empresaId;
-      }
-
-      instances[instanceName].lastActivity = new Date().toISOString();
-
-      const isFromMe = message.key.fromMe;
-      // remoteJid já declarado acima (Linha 322) para filtro de status
-
-
-      const realMessage = getMessageBody(message);
-      const msgType = getMessageType(message);
-      const msgText = extractText(message);
-
-      // Processar Mídia se houver
-      let midiaUrl = null;
-      let midiaTipo = null;
-      let midiaNomeArquivo = null;
-
-      const mediaTypes = ['imageMessage', 'videoMessage', 'audioMessage', 'documentMessage', 'stickerMessage'];
-      if (mediaTypes.includes(msgType)) {
-        try {
-          console.log(`[${instanceName}] Baixando mídia type: ${msgType}...`);
-          const buffer = await downloadMediaMessage(message, 'buffer', {}, { logger });
-
-          const extension = {
-            imageMessage: 'png',
-            videoMessage: 'mp4',
-            audioMessage: 'ogg',
-            documentMessage: 'bin',
-            stickerMessage: 'webp'
-          }[msgType] || 'bin';
-
-          const ptType = {
-            imageMessage: 'imagem',
-            videoMessage: 'video',
-            audioMessage: 'audio',
-            documentMessage: 'documento',
-            stickerMessage: 'sticker'
-          }[msgType] || 'texto';
-
-          const fileName = `${instanceName}_${message.key.id}_${Date.now()}.${extension}`;
-          const fullPath = path.join(UPLOADS_DIR, fileName);
-
-          console.log(`[${instanceName}] Tentando salvar mídia em: ${fullPath}`);
-          fs.writeFileSync(fullPath, buffer);
-
-          midiaUrl = `${config.serverUrl}/uploads/${fileName}`;
-          midiaTipo = ptType;
-          midiaNomeArquivo = realMessage[msgType]?.fileName || fileName;
-
-          console.log(`[${instanceName}] ✓ Mídia salva em: ${midiaUrl}`);
-        } catch (err) {
-          console.error(`[${instanceName}] ❌ ERRO AO SALVAR MIDIA:`, err.message);
-        }
-      }
-
-      const isGroup = remoteJid.endsWith('@g.us');
-      let contatoNome = message.pushName || remoteJid.split('@')[0];
-
-      // Se for grupo, tentar pegar o nome do grupo do cache
-      if (isGroup) {
-        try {
-          const groupMeta = instances[instanceName].socket.groupMetadata ? await instances[instanceName].socket.groupMetadata(remoteJid).catch(() => null) : null;
-          if (groupMeta?.subject) {
-            contatoNome = groupMeta.subject;
-          }
-        } catch (e) {
-          // Fallback silencioso
-        }
-      }
-
-      // Preparar dados para o Chat (Garantir tipos em Português para o Repo)
-      const dadosChat = {
-        contatoTelefone: remoteJid.replace('@s.whatsapp.net', ''),
-        contatoNome,
-        whatsappMensagemId: message.key.id,
-        tipoMensagem: midiaTipo || 'texto',
-        conteudo: msgText || midiaUrl || '',
-        midiaUrl,
-        midiaTipo,
-        midiaNomeArquivo,
-        status: isFromMe ? 'enviada' : 'recebida',
-        direcao: isFromMe ? 'enviada' : 'recebida',
-        metadados: {
-          raw: message,
-          fromParticipant: isGroup ? message.key.participant : null,
-          senderName: message.pushName
-        }
-      };
-
-      // Persistir no Banco via ChatService
-      if (empresaId) {
-        try {
-          await chatServico.receberMensagem(empresaId, instanceName, dadosChat);
-        } catch (err) {
-          console.error(`[${instanceName}] Erro ao persistir no chat:`, err.message);
-        }
-      }
+      if (instances[instanceName]) instances[instanceName].lastActivity = new Date().toISOString();
 
-      // Preparar Webhook Payload (Fomato Evolution API v2 - Extremamente compatível)
-      const webhookEvent = 'messages.upsert';
-
-      const messageData = {
-        event: webhookEvent,
-        instance: instanceName,
-        instanceName: instanceName,
-        // Estrutura padrão data (Requisito de muitos sistemas de CRM/Lovable)
-        data: {
-          key: {
-            remoteJid,
-            fromMe: isFromMe,
-            id: message.key.id,
-            participant: isGroup ? message.key.participant : undefined
-          },
-          message: realMessage,
-          pushName: message.pushName || contatoNome,
-          messageTimestamp: message.messageTimestamp,
-          owner: instanceName,
-          source: 'ios',
-          status: isFromMe ? 2 : 1,
-          mediaUrl: midiaUrl,
-          // Mapear para inglês apenas no webhook para compatibilidade externa
-          mediaType: {
-            imagem: 'image',
-            audio: 'audio',
-            video: 'video',
-            sticker: 'sticker',
-            documento: 'document'
-          }[midiaTipo] || midiaTipo,
-          mimetype: realMessage[msgType]?.mimetype,
-          caption: msgText
-        },
-        // Campos na raiz para retrocompatibilidade
-        key: {
-          remoteJid,
-          fromMe: isFromMe,
-          id: message.key.id
-        },
-        message: realMessage,
-        pushName: message.pushName || contatoNome,
-        remoteJid: remoteJid,
-        sender: remoteJid.split('@')[0],
-        fromMe: isFromMe,
-        midiaUrl: midiaUrl,
-        midiaTipo: midiaTipo,
-        tipo_mensagem: midiaTipo, // Campo exato que o Lovable está esperando (em português)
-        ...dadosChat
-      };
-
-      // Disparar Webhook
-      if (!isFromMe) {
-        console.log(`[${instanceName}] 📥 Mensagem RECEBIDA de ${remoteJid}. Midia: ${midiaUrl || 'N/A'}`);
-      }
-      sendWebhook(instanceName, messageData);
-
-      addRecentEvent(instanceName, isFromMe ? 'message_sent' : 'message_received', {
-        id: message.key.id,
-        text: msgText,
-        from: remoteJid,
-        isFromMe
-      });
-
-      // Agente IA (apenas para recebidas e se não for de grupo para não floodar)
-      if (!isFromMe && !remoteJid.endsWith('@g.us')) {
-        incrementMetric(instanceName, 'received');
-
-        // Lógica de IA...
-        if (empresaId && msgText) {
-          try {
-            const agenteIARepo = require('../repositorios/agente-ia.repositorio');
-            const agenteIAServico = require('../servicos/agente-ia.servico');
-            const agente = await agenteIARepo.buscarPorInstancia(instanceName, empresaId);
-
-            if (agente && agente.ativo) {
-              await socket.sendPresenceUpdate('composing', remoteJid);
-              const result = await agenteIAServico.processarMensagem(agente.id, empresaId, msgText, {
-                nomeContato: message.pushName || 'Cliente'
-              });
-
-              if (result?.resposta) {
-                // Apenas envia, o evento 'upsert' cuidará da persistência e webhooks
-                await socket.sendMessage(remoteJid, { text: result.resposta });
-              }
-            }
-          } catch (e) { console.error('Erro IA:', e.message); }
-        }
-      }
+      // Aguarda vaga no pipeline (backpressure) mantendo a ordem de chegada
+      await pipeline.push(remoteJid, { instanceName, message, remoteJid });
     }
   });
 
@@ -824,8 +925,9 @@ async function deleteInstance(instanceName) {
     delete webhooks[instanceName];
     saveInstanceTokens();
 
-    // Remover métricas da instância
+    // Remover métricas e pipeline de ingestão da instância
     removeInstanceMetrics(instanceName);
+    removePipeline(instanceName);
   }
 
   // Deletar arquivos de sessão
@@ -1765,34 +1867,36 @@ async function sendWebhook(instanceName, data) {
   };
 
   const headers = {
-    'Content-Type': 'application/json',
     'apikey': token,
     'X-API-Key': token,
-    'Authorization': `Bearer ${token}`,
-    'User-Agent': 'WhatsBenemax/2.1'
+    'Authorization': `Bearer ${token}`
   };
 
   console.log(`[Webhook] Enviando evento '${data.event}' da instância '${instanceName}' para: ${finalUrl}`);
 
   // Se webhook avançado está configurado, usar retry automático
   if (isAdvancedEnabled) {
-    // Enviar com retry e logging automático
-    sendWebhookWithRetry(instanceName, finalUrl, payload, {}, token).catch(err => {
+    // Enviar com retry e logging automático (agrupado em lotes se configurado)
+    deliverWebhook(instanceName, finalUrl, payload, token).catch(err => {
       console.error(`[${instanceName}] Erro no webhook avançado:`, err.message);
     });
   } else {
-    // Método básico usando axios
-    const axios = require('axios');
-    axios.post(finalUrl, payload, { headers, timeout: 15000 })
+    // Método básico: envio único pelo dispatcher (conexão keep-alive compartilhada)
+    webhookDispatcher.post(finalUrl, payload, { headers, timeout: 15000 })
       .then(res => {
-        console.log(`[Webhook] ✓ Sucesso (${instanceName}): ${res.status}`);
-        addRecentEvent(instanceName, 'webhook_success', { url: finalUrl, status: res.status });
+        if (res.ok) {
+          console.log(`[Webhook] ✓ Sucesso (${instanceName}): ${res.status}`);
+          addRecentEvent(instanceName, 'webhook_success', { url: finalUrl, status: res.status });
+          return;
+        }
+
+        const errorMessage = `Request failed with status code ${res.status}`;
+        console.error(`[Webhook] ❌ Falha (${instanceName}): ${res.status} - ${errorMessage} ${res.body}`);
+        addRecentEvent(instanceName, 'webhook_error', { url: webhook.url, error: errorMessage, status: res.status, response: res.body });
       })
       .catch(err => {
-        const status = err.response ? err.response.status : 'N/A';
-        const errorData = err.response ? JSON.stringify(err.response.data) : '';
-        console.error(`[Webhook] ❌ Falha (${instanceName}): ${status} - ${err.message} ${errorData}`);
-        addRecentEvent(instanceName, 'webhook_error', { url: webhook.url, error: err.message, status, response: errorData });
+        console.error(`[Webhook] ❌ Falha (${instanceName}): N/A - ${err.message}`);
+        addRecentEvent(instanceName, 'webhook_error', { url: webhook.url, error: err.message, status: 'N/A', response: '' });
       });
   }
 }
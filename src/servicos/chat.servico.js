@@ -1,5 +1,8 @@
+const { transacao } = require('../config/database');
 const chatRepo = require('../repositorios/chat.repositorio');
 const contatoRepo = require('../repositorios/contato.repositorio');
+const { codificarCursor, decodificarCursor } = require('../utilitarios/cursor');
+const { normalizarTelefone } = require('../utilitarios/validadores');
 
 /**
  * Serviço de Chat Interno
@@ -69,9 +72,21 @@ async function criarOuBuscarConversa(empresaId, instanciaId, contatoId) {
 
 /**
  * Listar conversas
+ * Sem offset, pagina por cursor (filtros.cursor = proximo_cursor da página anterior)
+ * @returns {Promise<{conversas: object[], proximoCursor: string|null}>}
  */
 async function listarConversas(empresaId, filtros = {}) {
-  return await chatRepo.listarConversas(empresaId, filtros);
+  // Compatibilidade com clientes que ainda paginam por offset
+  if (filtros.offset && !filtros.cursor) {
+    return { conversas: await chatRepo.listarConversas(empresaId, filtros), proximoCursor: null };
+  }
+
+  const { conversas, proximoCursor } = await chatRepo.listarConversasPorCursor(empresaId, {
+    ...filtros,
+    cursor: decodificarCursor(filtros.cursor, 2)
+  });
+
+  return { conversas, proximoCursor: proximoCursor ? codificarCursor(proximoCursor) : null };
 }
 
 /**
@@ -264,12 +279,18 @@ async function receberMensagem(empresaId, instanciaId, dadosMensagem) {
 
     if (!contato) {
       console.log('[Chat Service] Contato não encontrado, criando novo:', contatoTelefone);
-      contato = await contatoRepo.criar({
-        empresaId,
-        nome: contatoNome || 'Desconhecido',
-        telefone: contatoTelefone,
-        tags: ['chat']
-      });
+      try {
+        contato = await contatoRepo.criar({
+          empresaId,
+          nome: contatoNome || 'Desconhecido',
+          telefone: contatoTelefone,
+          tags: ['chat']
+        });
+      } catch (erro) {
+        // Criado em paralelo (outra mensagem do mesmo contato)
+        if (erro.code !== 'CONTATO_DUPLICADO' || !erro.contato) throw erro;
+        contato = erro.contato;
+      }
     }
 
     // Registrar interação
@@ -318,6 +339,134 @@ async function receberMensagem(empresaId, instanciaId, dadosMensagem) {
   }
 }
 
+// Mesma chave usada por contatoRepo.buscarPorTelefones
+const chaveTelefone = (telefone) => normalizarTelefone(telefone) || telefone;
+
+/**
+ * Resolver (buscar ou criar) os contatos de uma lista de { contatoTelefone, contatoNome }
+ * Retorna um Map chave do telefone -> contato. Se outro processo criar o mesmo
+ * contato ao mesmo tempo (violação do índice único), os contatos são relidos.
+ */
+async function resolverContatos(empresaId, mensagens) {
+  const contatos = await contatoRepo.buscarPorTelefones(mensagens.map(m => m.contatoTelefone), empresaId);
+
+  const faltantes = new Map();
+  for (const m of mensagens) {
+    const chave = chaveTelefone(m.contatoTelefone);
+    if (!contatos.has(chave) && !faltantes.has(chave)) {
+      faltantes.set(chave, {
+        nome: m.contatoNome || 'Desconhecido',
+        telefone: m.contatoTelefone,
+        tags: ['chat']
+      });
+    }
+  }
+
+  if (faltantes.size === 0) return contatos;
+
+  try {
+    const criados = await contatoRepo.criarEmLote(empresaId, [...faltantes.values()]);
+    for (const contato of criados) {
+      contatos.set(chaveTelefone(contato.telefone), contato);
+    }
+  } catch (erro) {
+    if (erro.code !== '23505') throw erro;
+
+    const relidos = await contatoRepo.buscarPorTelefones([...faltantes.values()].map(c => c.telefone), empresaId);
+    for (const [chave, contato] of relidos) {
+      contatos.set(chave, contato);
+    }
+  }
+
+  return contatos;
+}
+
+/**
+ * Receber várias mensagens de uma mesma instância em lote
+ * Resolve contatos e conversas com consultas "= ANY" e insere todas as
+ * mensagens em um único INSERT, reduzindo as idas ao banco durante rajadas.
+ * Mensagens com `contato` já resolvido (pipeline de ingestão) não repetem a busca.
+ * Interações, conversas e mensagens são gravadas em uma transação: se o lote
+ * falhar, nada dele fica no banco. Retorna um resultado por mensagem, na mesma
+ * ordem da entrada.
+ */
+async function receberMensagensEmLote(empresaId, instanciaId, mensagens) {
+  if (!mensagens || mensagens.length === 0) return [];
+
+  // 1. Contatos: usar os já resolvidos e buscar/criar os que faltam
+  // Fora da transação: a releitura após 23505 não funcionaria em uma transação abortada
+  const contatos = await resolverContatos(empresaId, mensagens.filter(m => !m.contato));
+  for (const m of mensagens) {
+    if (m.contato) contatos.set(chaveTelefone(m.contatoTelefone), m.contato);
+  }
+
+  const { itens, criadas, novasConversas } = await transacao(async () => {
+    // 2. Registrar interações (uma consulta para o lote)
+    const interacoes = new Map();
+    for (const m of mensagens) {
+      const contato = contatos.get(chaveTelefone(m.contatoTelefone));
+      interacoes.set(contato.id, (interacoes.get(contato.id) || 0) + 1);
+    }
+    await contatoRepo.registrarInteracoesEmLote(
+      empresaId,
+      [...interacoes].map(([id, total]) => ({ id, total }))
+    );
+
+    // 3. Conversas abertas: buscar existentes e criar as que faltam
+    const contatoIds = [...interacoes.keys()];
+    const conversas = await chatRepo.buscarConversasPorContatos(contatoIds, empresaId, 'aberta');
+
+    const semConversa = contatoIds.filter(id => !conversas.has(id));
+    const novas = semConversa.length > 0
+      ? await chatRepo.criarConversasEmLote(empresaId, instanciaId, semConversa, 'aberta')
+      : [];
+    for (const conversa of novas) {
+      conversas.set(conversa.contato_id, conversa);
+    }
+
+    // 4. Mensagens (INSERT multi-VALUES)
+    const itensLote = mensagens.map(m => {
+      const contato = contatos.get(chaveTelefone(m.contatoTelefone));
+      return { contato, conversa: conversas.get(contato.id), dados: m };
+    });
+
+    const mensagensCriadas = await chatRepo.criarMensagensEmLote(empresaId, itensLote.map(({ conversa, dados }) => ({
+      conversaId: conversa.id,
+      whatsappMensagemId: dados.whatsappMensagemId,
+      direcao: dados.direcao || 'recebida',
+      tipoMensagem: dados.tipoMensagem,
+      conteudo: dados.conteudo,
+      midiaUrl: dados.midiaUrl,
+      midiaTipo: dados.midiaTipo,
+      midiaNomeArquivo: dados.midiaNomeArquivo,
+      status: 'recebida',
+      metadados: dados.metadados
+    })));
+
+    return { itens: itensLote, criadas: mensagensCriadas, novasConversas: novas };
+  });
+
+  console.log(`[Chat Service] Lote de ${mensagens.length} mensagem(ns) persistido (${instanciaId})`);
+
+  // 5. Emitir eventos em tempo real (só após o COMMIT) na ordem de chegada
+  for (const conversa of novasConversas) {
+    emitirParaEmpresa(empresaId, 'nova_conversa', { conversa });
+  }
+
+  return itens.map(({ contato, conversa }, i) => {
+    const mensagem = criadas[i];
+
+    emitirParaConversa(conversa.id, 'nova_mensagem', { mensagem });
+    emitirParaEmpresa(empresaId, 'mensagem_recebida', {
+      conversa_id: conversa.id,
+      mensagem,
+      contato
+    });
+
+    return { conversa, mensagem, contato };
+  });
+}
+
 /**
  * Listar mensagens da conversa
  */
@@ -329,7 +478,17 @@ async function listarMensagens(empresaId, conversaId, filtros = {}) {
     throw new Error('Conversa não encontrada');
   }
 
-  return await chatRepo.listarMensagens(conversaId, empresaId, filtros);
+  // Compatibilidade com clientes que ainda paginam por offset
+  if (filtros.offset && !filtros.cursor) {
+    return { mensagens: await chatRepo.listarMensagens(conversaId, empresaId, filtros), proximoCursor: null };
+  }
+
+  const { mensagens, proximoCursor } = await chatRepo.listarMensagensPorCursor(conversaId, empresaId, {
+    ...filtros,
+    cursor: decodificarCursor(filtros.cursor, 2)
+  });
+
+  return { mensagens, proximoCursor: proximoCursor ? codificarCursor(proximoCursor) : null };
 }
 
 /**
@@ -494,6 +653,8 @@ module.exports = {
   // Mensagens
   enviarMensagem,
   receberMensagem,
+  resolverContatos,
+  receberMensagensEmLote,
   listarMensagens,
   deletarMensagem,
   atualizarStatusMensagem,
@@ -201,8 +201,10 @@ function substituirVariaveis(template, contato, empresa, negociacao = null) {
 
 /**
  * Executar etapa de follow-up
+ * @param {Object} [opcoes]
+ * @param {{valor: string, ms: number}} [opcoes.lease] - Lease do executor, confirmado antes de enviar
  */
-async function executarEtapa(inscricaoId, empresaId) {
+async function executarEtapa(inscricaoId, empresaId, opcoes = {}) {
   const inscricao = await followupRepo.buscarInscricaoPorId(inscricaoId, empresaId);
   if (!inscricao) {
     throw new Error('Inscrição não encontrada');
@@ -239,6 +241,15 @@ async function executarEtapa(inscricaoId, empresaId) {
 
   let resultado = null;
 
+  // O lease pode ter expirado (etapa lenta ou processo travado) e outra réplica reivindicado
+  if (opcoes.lease) {
+    opcoes.lease.valor = await followupRepo.renovarLease(inscricaoId, opcoes.lease.valor, opcoes.lease.ms);
+    if (!opcoes.lease.valor) {
+      console.warn(`[Follow-up] Lease da inscrição ${inscricaoId} perdido, etapa não executada`);
+      return { sucesso: false, leasePerdido: true };
+    }
+  }
+
   try {
     // Executar ação baseada no tipo
     switch (etapaAtual.tipo) {
@@ -537,12 +548,42 @@ async function executarAcaoWebhook(etapa, contato, empresa, negociacao) {
 }
 
 /**
- * Processar inscrições pendentes (chamado pelo cron)
+ * Executar a etapa de uma inscrição reivindicada pelo executor
+ *
+ * Com sucesso (ou quando não há o que executar) o lease é liberado. Em caso de
+ * erro a inscrição é adiada por `leaseMs` (intervalo entre tentativas) e o lease
+ * também é liberado: lease ativo significa etapa em execução, e é isso que os
+ * limites de concorrência contam.
+ */
+async function executarInscricaoReivindicada(inscricao, leaseMs = 300000) {
+  const lease = inscricao.lease ? { valor: inscricao.lease, ms: leaseMs } : null;
+
+  let resultado;
+  try {
+    resultado = await executarEtapa(inscricao.id, inscricao.empresa_id, { lease });
+  } catch (erro) {
+    if (lease?.valor) await followupRepo.adiarInscricao(inscricao.id, lease.valor, leaseMs);
+    throw erro;
+  }
+
+  // Só mexe na inscrição se o lease ainda for desta execução
+  if (!resultado || resultado.sucesso) {
+    await followupRepo.liberarInscricao(inscricao.id, lease?.valor);
+  } else if (!resultado.leasePerdido && lease?.valor) {
+    await followupRepo.adiarInscricao(inscricao.id, lease.valor, leaseMs);
+  }
+
+  return resultado;
+}
+
+/**
+ * Processar inscrições pendentes em uma única passada (execução manual)
+ * O processamento contínuo fica em tarefas/followup.tarefa.js.
  */
-async function processarInscricoesPendentes() {
+async function processarInscricoesPendentes(limite = 100, leaseMs = 300000) {
   console.log('[Follow-up] Iniciando processamento de inscrições pendentes...');
 
-  const inscricoes = await followupRepo.buscarInscricoesProntasParaExecutar();
+  const inscricoes = await followupRepo.reivindicarInscricoesProntas(limite, leaseMs);
 
   console.log(`[Follow-up] ${inscricoes.length} inscrições prontas para executar`);
 
@@ -551,8 +592,9 @@ async function processarInscricoesPendentes() {
 
   for (const inscricao of inscricoes) {
     try {
-      await executarEtapa(inscricao.id, inscricao.empresa_id);
-      sucessos++;
+      const resultado = await executarInscricaoReivindicada(inscricao, leaseMs);
+      if (resultado && !resultado.sucesso) erros++;
+      else sucessos++;
     } catch (erro) {
       console.error(`[Follow-up] Erro ao processar inscrição ${inscricao.id}:`, erro);
       erros++;
@@ -651,6 +693,7 @@ module.exports = {
   inscreverContatoEmSequencia,
   executarEtapa,
   processarInscricoesPendentes,
+  executarInscricaoReivindicada,
   avaliarGatilhos,
   cancelarInscricao,
   substituirVariaveis,
@@ -1,6 +1,10 @@
 const axios = require('axios');
 const integracaoRepo = require('../repositorios/integracao.repositorio');
 
+// Disparo para várias integrações: tempo máximo por integração e disparos simultâneos
+const TIMEOUT_FANOUT_MS = parseInt(process.env.INTEGRACAO_TIMEOUT_MS, 10) || 10000;
+const CONCORRENCIA_FANOUT = parseInt(process.env.INTEGRACAO_CONCORRENCIA, 10) || 10;
+
 /**
  * Serviço de Integrações (Webhooks, APIs)
  */
@@ -144,7 +148,20 @@ async function dispararWebhook(integracaoId, empresaId, evento, dados) {
     return null;
   }
 
-  const { url, metodo = 'POST', headers = {} } = integracao.configuracoes;
+  const { resultado, log } = await executarWebhook(integracao, empresaId, evento, dados, 30000);
+
+  // Registrar log
+  await integracaoRepo.criarLog(log);
+
+  return resultado;
+}
+
+/**
+ * Fazer a requisição de uma integração já carregada
+ * Não grava o log: devolve os dados para o chamador gravar (um a um ou em lote).
+ */
+async function executarWebhook(integracao, empresaId, evento, dados, timeoutMs) {
+  const { url, metodo = 'POST', headers = {} } = integracao.configuracoes || {};
 
   if (!url) {
     throw new Error('URL do webhook não configurada');
@@ -175,7 +192,9 @@ async function dispararWebhook(integracaoId, empresaId, evento, dados) {
         ...headers
       },
       data: payload,
-      timeout: 30000 // 30 segundos
+      timeout: timeoutMs,
+      // O timeout do axios só conta a espera pela resposta; o signal limita também conexão/DNS
+      signal: AbortSignal.timeout(timeoutMs)
     };
 
     const resposta = await axios(config);
@@ -184,75 +203,113 @@ async function dispararWebhook(integracaoId, empresaId, evento, dados) {
     payloadRecebido = resposta.data;
     status = 'sucesso';
 
-    console.log(`[Integração] Webhook ${integracaoId} disparado com sucesso`);
+    console.log(`[Integração] Webhook ${integracao.id} disparado com sucesso`);
 
   } catch (erro) {
-    console.error(`[Integração] Erro ao disparar webhook ${integracaoId}:`, erro.message);
+    // Cancelado pelo signal = estourou o tempo da integração
+    mensagemErro = erro.code === 'ERR_CANCELED' ? `Timeout após ${timeoutMs}ms` : erro.message;
+    console.error(`[Integração] Erro ao disparar webhook ${integracao.id}:`, mensagemErro);
 
     codigoHttp = erro.response?.status || null;
-    mensagemErro = erro.message;
     status = 'erro';
   }
 
   const duracao = Date.now() - inicio;
 
-  // Registrar log
-  await integracaoRepo.criarLog({
-    integracaoId,
-    empresaId,
-    tipoEvento: evento,
-    direcao: 'saida',
-    url,
-    metodo,
-    payloadEnviado: dados,
-    payloadRecebido,
-    codigoHttp,
-    status,
-    duracaoMs: duracao,
-    mensagemErro
-  });
-
   return {
-    sucesso: status === 'sucesso',
-    codigo_http: codigoHttp,
-    duracao_ms: duracao,
-    mensagem_erro: mensagemErro
+    resultado: {
+      sucesso: status === 'sucesso',
+      codigo_http: codigoHttp,
+      duracao_ms: duracao,
+      mensagem_erro: mensagemErro
+    },
+    log: {
+      integracaoId: integracao.id,
+      empresaId,
+      tipoEvento: evento,
+      direcao: 'saida',
+      url,
+      metodo,
+      payloadEnviado: dados,
+      payloadRecebido,
+      codigoHttp,
+      status,
+      duracaoMs: duracao,
+      mensagemErro
+    }
   };
 }
 
 /**
  * Disparar para todas as integrações ativas do tipo
+ *
+ * As integrações são disparadas em paralelo (até INTEGRACAO_CONCORRENCIA por vez),
+ * cada uma com no máximo `timeoutMs` (INTEGRACAO_TIMEOUT_MS): uma integração lenta
+ * não atrasa as demais. Os logs de todas são gravados em um único INSERT no final.
+ *
+ * @param {Object} [opcoes]
+ * @param {Array} [opcoes.integracoes] - Integrações já carregadas (evita consultar de novo)
+ * @param {number} [opcoes.timeoutMs] - Tempo máximo de cada integração
  */
-async function dispararParaTodasIntegracoes(empresaId, tipo, evento, dados) {
-  const integracoes = await integracaoRepo.listar(empresaId, {
+async function dispararParaTodasIntegracoes(empresaId, tipo, evento, dados, opcoes = {}) {
+  const integracoes = (opcoes.integracoes || await integracaoRepo.listar(empresaId, {
     tipo,
     ativo: true
-  });
-
-  const resultados = [];
-
-  for (const integracao of integracoes) {
-    try {
-      const resultado = await dispararWebhook(integracao.id, empresaId, evento, dados);
-      resultados.push({
-        integracao_id: integracao.id,
-        nome: integracao.nome,
-        ...resultado
-      });
-    } catch (erro) {
-      console.error(`[Integração] Erro ao disparar ${integracao.id}:`, erro);
-      resultados.push({
-        integracao_id: integracao.id,
-        nome: integracao.nome,
-        sucesso: false,
-        mensagem_erro: erro.message
-      });
+  })).filter(integracao => integracao.ativo && (!tipo || integracao.tipo === tipo));
+
+  const timeoutMs = opcoes.timeoutMs || TIMEOUT_FANOUT_MS;
+  const resultados = new Array(integracoes.length);
+  const logs = [];
+  let proxima = 0;
+
+  async function trabalhador() {
+    while (proxima < integracoes.length) {
+      const indice = proxima++;
+      const integracao = integracoes[indice];
+
+      try {
+        const { resultado, log } = await executarWebhook(integracao, empresaId, evento, dados, timeoutMs);
+        logs.push(log);
+        resultados[indice] = {
+          integracao_id: integracao.id,
+          nome: integracao.nome,
+          ...resultado
+        };
+      } catch (erro) {
+        console.error(`[Integração] Erro ao disparar ${integracao.id}:`, erro);
+        resultados[indice] = {
+          integracao_id: integracao.id,
+          nome: integracao.nome,
+          sucesso: false,
+          mensagem_erro: erro.message
+        };
+      }
     }
   }
 
+  const trabalhadores = Math.min(CONCORRENCIA_FANOUT, integracoes.length);
+  await Promise.all(Array.from({ length: trabalhadores }, trabalhador));
+
+  // Registrar logs (um INSERT para todas as integrações)
+  try {
+    await integracaoRepo.criarLogsEmLote(logs);
+  } catch (erro) {
+    console.error(`[Integração] Erro ao gravar ${logs.length} logs de disparo:`, erro.message);
+  }
+
   return resultados;
 }
 
+/**
+ * Enfileirar o disparo para todas as integrações (processado pela fila `integration-fanout`)
+ * Use nos handlers de requisição para não esperar pelos destinos.
+ */
+async function enfileirarDisparoParaTodasIntegracoes(empresaId, tipo, evento, dados) {
+  const { enqueueIntegrationFanout } = require('../queues/integrationQueue');
+  const job = await enqueueIntegrationFanout(empresaId, tipo, evento, dados);
+  return { job_id: job.id };
+}
+
 /**
  * Testar integração
  */
@@ -411,6 +468,7 @@ module.exports = {
   // Execução
   dispararWebhook,
   dispararParaTodasIntegracoes,
+  enfileirarDisparoParaTodasIntegracoes,
   testarIntegracao,
   processarWebhookRecebido,
 
@@ -1,15 +1,73 @@
 const { query } = require('../config/database');
 const fs = require('fs');
 const path = require('path');
+const FilaCircular = require('../utilitarios/fila-circular');
 
 const LOGS_FILE = path.join(process.cwd(), 'logs', 'operacoes.log');
 
+// Entradas aguardando gravação (por destino); acima disso as mais antigas são descartadas
+const BUFFER_MAX = parseInt(process.env.LOGGER_BUFFER_MAX, 10) || 10000;
+// Intervalo entre gravações e tamanho do lote que antecipa a gravação
+const FLUSH_MS = parseInt(process.env.LOGGER_FLUSH_MS, 10) || 1000;
+const LOTE = parseInt(process.env.LOGGER_LOTE, 10) || 200;
+
 // Garantir que a pasta de logs existe
 if (!fs.existsSync(path.dirname(LOGS_FILE))) {
     fs.mkdirSync(path.dirname(LOGS_FILE), { recursive: true });
 }
 
+/**
+ * Logger de operações (arquivo JSONL + tabela logs_sistema)
+ *
+ * `log` apenas enfileira a entrada e escreve no console; a gravação acontece em
+ * segundo plano a cada LOGGER_FLUSH_MS (ou antes, ao juntar LOGGER_LOTE entradas):
+ * - arquivo: um único write por ciclo em um WriteStream; enquanto o stream não
+ *   drenar, as linhas continuam na fila (backpressure)
+ * - banco: um INSERT de várias linhas por lote
+ * Se uma fila encher, as entradas mais antigas são descartadas e contadas.
+ * `encerrar` grava o que estiver pendente (usar no desligamento do processo).
+ */
 class LoggerService {
+    constructor() {
+        this.filaArquivo = new FilaCircular(BUFFER_MAX);
+        this.filaBanco = new FilaCircular(BUFFER_MAX);
+        this.stream = null;
+        this.arquivoOcupado = false;
+        this.gravando = null;
+        this.timer = null;
+        this.estatisticas = {
+            descartados_arquivo: 0,
+            descartados_banco: 0,
+            gravados_banco: 0,
+            falhas_banco: 0,
+            falhas_arquivo: 0
+        };
+    }
+
+    iniciarTimer() {
+        if (this.timer) return;
+        this.timer = setInterval(() => this.flush(), FLUSH_MS);
+        this.timer.unref();
+    }
+
+    abrirStream() {
+        if (this.stream) return this.stream;
+
+        this.stream = fs.createWriteStream(LOGS_FILE, { flags: 'a' });
+        this.stream.on('drain', () => {
+            this.arquivoOcupado = false;
+        });
+        this.stream.on('error', (err) => {
+            this.estatisticas.falhas_arquivo++;
+            console.error('Erro ao escrever log no arquivo:', err.message);
+            // Reabrir no próximo ciclo
+            this.stream = null;
+            this.arquivoOcupado = false;
+        });
+
+        return this.stream;
+    }
+
     /**
      * Loga uma operação tanto no arquivo quanto no Banco de Dados
      */
@@ -24,22 +82,17 @@ class LoggerService {
             dados
         };
 
-        // 1. Log no Arquivo (JSONL para fácil leitura pela IA)
-        try {
-            fs.appendFileSync(LOGS_FILE, JSON.stringify(logEntry) + '\n');
-        } catch (err) {
-            console.error('Erro ao escrever log no arquivo:', err.message);
+        // 1. Arquivo (JSONL para fácil leitura pela IA) e 2. Banco (persistente e pesquisável): em lote
+        if (this.filaArquivo.adicionar(JSON.stringify(logEntry) + '\n')) {
+            this.estatisticas.descartados_arquivo++;
+        }
+        if (this.filaBanco.adicionar(logEntry)) {
+            this.estatisticas.descartados_banco++;
         }
 
-        // 2. Log no Banco de Dados (Persistente e pesquisável)
-        try {
-            await query(`
-                INSERT INTO logs_sistema (contexto, nivel, mensagem, dados, empresa_id)
-                VALUES ($1, $2, $3, $4, $5)
-            `, [contexto, nivel, mensagem, JSON.stringify(dados), empresaId]);
-        } catch (err) {
-            // Falha silenciosa no console para não derrubar a aplicação
-            console.warn(`[Logger] Falha ao persistir no DB: ${err.message}`);
+        this.iniciarTimer();
+        if (this.filaBanco.tamanho >= LOTE && !this.gravando) {
+            setImmediate(() => this.flush());
         }
 
         // 3. Log no Console para monitoramento em tempo real (Easypanel/PM2)
@@ -58,6 +111,82 @@ class LoggerService {
     async warn(contexto, mensagem, dados, empresaId) {
         return this.log(contexto, mensagem, 'warn', dados, empresaId);
     }
+
+    /**
+     * Gravar as entradas pendentes (um ciclo por vez)
+     */
+    flush() {
+        if (!this.gravando) {
+            this.gravando = this.gravar().finally(() => {
+                this.gravando = null;
+            });
+        }
+        return this.gravando;
+    }
+
+    async gravar() {
+        this.gravarArquivo();
+
+        while (this.filaBanco.tamanho > 0) {
+            const lote = this.filaBanco.retirar(LOTE);
+            const params = [];
+            const valores = lote.map((entrada) => {
+                params.push(entrada.contexto, entrada.nivel, entrada.mensagem, JSON.stringify(entrada.dados), entrada.empresaId, entrada.timestamp);
+                const n = params.length;
+                return `($${n - 5}, $${n - 4}, $${n - 3}, $${n - 2}, $${n - 1}, $${n}::timestamptz)`;
+            });
+
+            try {
+                await query(`
+                    INSERT INTO logs_sistema (contexto, nivel, mensagem, dados, empresa_id, criado_em)
+                    VALUES ${valores.join(', ')}
+                `, params);
+                this.estatisticas.gravados_banco += lote.length;
+            } catch (err) {
+                // Falha silenciosa no console para não derrubar a aplicação (o arquivo mantém a entrada)
+                this.estatisticas.falhas_banco += lote.length;
+                console.warn(`[Logger] Falha ao persistir ${lote.length} logs no DB: ${err.message}`);
+                break;
+            }
+        }
+    }
+
+    gravarArquivo() {
+        if (this.arquivoOcupado || this.filaArquivo.tamanho === 0) return;
+
+        const linhas = this.filaArquivo.retirar(this.filaArquivo.tamanho);
+        const stream = this.abrirStream();
+
+        if (!stream.write(linhas.join(''))) {
+            this.arquivoOcupado = true;
+        }
+    }
+
+    /**
+     * Gravar tudo o que estiver pendente e fechar o arquivo
+     */
+    async encerrar() {
+        clearInterval(this.timer);
+        this.timer = null;
+
+        if (this.gravando) await this.gravando;
+        this.arquivoOcupado = false;
+        await this.flush();
+
+        if (this.stream) {
+            const stream = this.stream;
+            this.stream = null;
+            await new Promise((resolve) => stream.end(resolve));
+        }
+    }
+
+    obterEstatisticas() {
+        return {
+            pendentes_arquivo: this.filaArquivo.tamanho,
+            pendentes_banco: this.filaBanco.tamanho,
+            ...this.estatisticas
+        };
+    }
 }
 
 module.exports = new LoggerService();
@@ -3,10 +3,14 @@ const prospeccaoRepo = require('../repositorios/prospeccao.repositorio');
 const contatoRepo = require('../repositorios/contato.repositorio');
 const empresaRepositorio = require('../repositorios/empresa.repositorio');
 const { debitarCreditos } = require('../middlewares/creditos');
+const { normalizarTelefone } = require('../utilitarios/validadores');
 
 // Criar fila de prospecção
 const filaProspeccao = new Queue('prospeccao', process.env.URL_REDIS || 'redis://localhost:6379');
 
+// Leads por lote na importação (uma consulta de contatos e um INSERT por lote)
+const LOTE_IMPORTACAO_LEADS = parseInt(process.env.PROSPECCAO_LOTE_LEADS, 10) || 5000;
+
 /**
  * Serviço de Prospecção
  */
@@ -62,65 +66,68 @@ async function importarLeads(empresaId, campanhaId, leads) {
       status: 'processando'
     });
 
-    // Processar leads
-    const leadsParaInserir = [];
+    // Processar leads em lotes: contatos resolvidos com uma consulta por lote,
+    // leads gravados com um INSERT por lote e progresso salvo a cada lote
     let linhasProcessadas = 0;
     let linhasImportadas = 0;
     let linhasIgnoradas = 0;
 
-    for (const leadData of leads.dados) {
-      linhasProcessadas++;
+    for (let inicio = 0; inicio < leads.dados.length; inicio += LOTE_IMPORTACAO_LEADS) {
+      const lote = leads.dados.slice(inicio, inicio + LOTE_IMPORTACAO_LEADS);
+      const validos = [];
 
-      // Validar telefone
-      if (!leadData.telefone) {
-        linhasIgnoradas++;
-        continue;
-      }
+      for (const leadData of lote) {
+        // Validar e limpar telefone
+        const telefoneLimpo = leadData.telefone ? String(leadData.telefone).replace(/\D/g, '') : '';
 
-      // Limpar telefone
-      const telefoneLimpo = leadData.telefone.replace(/\D/g, '');
+        if (telefoneLimpo.length < 10) {
+          linhasIgnoradas++;
+          continue;
+        }
 
-      if (telefoneLimpo.length < 10) {
-        linhasIgnoradas++;
-        continue;
+        validos.push({ leadData, telefoneLimpo });
       }
 
-      // Criar ou buscar contato
-      let contato = await contatoRepo.buscarPorTelefone(telefoneLimpo, empresaId);
+      // Criar contatos que ainda não existem (apenas leads com nome)
+      const existentes = await contatoRepo.buscarPorTelefones(validos.map(v => v.telefoneLimpo), empresaId);
+      const novosContatos = validos
+        .filter(v => v.leadData.nome && !existentes.has(normalizarTelefone(v.telefoneLimpo) || v.telefoneLimpo))
+        .map(v => ({
+          nome: v.leadData.nome,
+          telefone: v.telefoneLimpo,
+          email: v.leadData.email || null,
+          empresa: v.leadData.empresa || null,
+          tags: ['prospeccao']
+        }));
 
-      if (!contato && leadData.nome) {
-        contato = await contatoRepo.criar({
+      if (novosContatos.length > 0) {
+        await contatoRepo.importarEmMassa(empresaId, novosContatos);
+      }
+
+      // Inserir leads do lote
+      if (validos.length > 0) {
+        await prospeccaoRepo.criarLeadsEmLote(validos.map(({ leadData, telefoneLimpo }) => ({
+          campanhaId,
           empresaId,
-          nome: leadData.nome,
+          nome: leadData.nome || 'Sem nome',
           telefone: telefoneLimpo,
-          email: leadData.email || null,
-          empresa: leadData.empresa || null,
-          tags: ['prospeccao']
-        });
-      }
+          variaveis: leadData.variaveis || {},
+          agendarPara: leadData.agendarPara || null
+        })));
 
-      // Adicionar lead
-      leadsParaInserir.push({
-        campanhaId,
-        empresaId,
-        contatoId: contato?.id || null,
-        nome: leadData.nome || 'Sem nome',
-        telefone: telefoneLimpo,
-        variaveis: leadData.variaveis || {},
-        agendarPara: leadData.agendarPara || null
-      });
+        await prospeccaoRepo.incrementarContadorCampanha(campanhaId, 'total_leads', validos.length);
+      }
 
-      linhasImportadas++;
-    }
+      linhasProcessadas += lote.length;
+      linhasImportadas += validos.length;
 
-    // Inserir leads em lote
-    if (leadsParaInserir.length > 0) {
-      await prospeccaoRepo.criarLeadsEmLote(leadsParaInserir);
+      await prospeccaoRepo.atualizarImportacao(importacao.id, {
+        linhasProcessadas,
+        linhasImportadas,
+        linhasIgnoradas
+      });
     }
 
-    // Atualizar campanha com total de leads
-    await prospeccaoRepo.incrementarContadorCampanha(campanhaId, 'total_leads', linhasImportadas);
-
     // Finalizar importação
     await prospeccaoRepo.atualizarImportacao(importacao.id, {
       status: 'concluida',
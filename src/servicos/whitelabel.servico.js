@@ -1,6 +1,22 @@
 const whitelabelRepo = require('../repositorios/whitelabel.repositorio');
 const crypto = require('crypto');
 const dns = require('dns').promises;
+const { redis } = require('../config/redis');
+
+// ==================== MAPA DE DOMÍNIOS ====================
+// O middleware de white label roda em toda requisição. Domínios ativos, a
+// configuração completa de cada empresa e os redirecionamentos ficam em memória;
+// o mapa é reconstruído quando o repositório publica em CANAL_ALTERACOES
+// (todas as réplicas) e periodicamente como rede de segurança.
+
+const MAPA_DEBOUNCE_MS = 200;
+const MAPA_INTERVALO_MS = parseInt(process.env.WHITELABEL_MAPA_INTERVALO_MS, 10) || 5 * 60 * 1000;
+
+let mapaDominios = null;          // dominio -> config completa (null até a primeira carga)
+let mapaRedirecionamentos = new Map(); // empresa_id -> Map(origem -> redirecionamento)
+let recargaAgendada = null;
+let recargaEmAndamento = null;
+let assinante = null;
 
 /**
  * Gerar token de verificação para domínio
@@ -310,24 +326,123 @@ async function buscarConfigCompleta(empresaId) {
 }
 
 /**
- * Buscar configuração por domínio (para middleware)
+ * Normalizar host (sem regex: executado em toda requisição)
+ */
+function normalizarDominio(dominio) {
+  let d = dominio.toLowerCase();
+
+  if (d.startsWith('https://')) d = d.slice(8);
+  else if (d.startsWith('http://')) d = d.slice(7);
+  if (d.startsWith('www.')) d = d.slice(4);
+  if (d.endsWith('/')) d = d.slice(0, -1);
+
+  const porta = d.lastIndexOf(':');
+  if (porta !== -1 && porta > d.lastIndexOf(']')) d = d.slice(0, porta);
+
+  return d;
+}
+
+/**
+ * Carregar domínios, configurações e redirecionamentos e trocar o mapa
+ */
+async function carregarMapaDominios() {
+  const dominios = await whitelabelRepo.listarDominiosAtivos();
+  const empresaIds = [...new Set(dominios.map(d => d.empresa_id))];
+
+  const configs = new Map();
+  await Promise.all(empresaIds.map(async (empresaId) => {
+    configs.set(empresaId, await buscarConfigCompleta(empresaId));
+  }));
+
+  const novoMapa = new Map();
+  for (const dominioDb of dominios) {
+    novoMapa.set(dominioDb.dominio, {
+      ...configs.get(dominioDb.empresa_id),
+      empresa_id: dominioDb.empresa_id,
+      dominio_atual: dominioDb
+    });
+  }
+
+  const novosRedirecionamentos = new Map();
+  if (empresaIds.length > 0) {
+    const redirecionamentos = await whitelabelRepo.listarRedirecionamentosAtivos(empresaIds);
+    for (const redirect of redirecionamentos) {
+      let porOrigem = novosRedirecionamentos.get(redirect.empresa_id);
+      if (!porOrigem) {
+        porOrigem = new Map();
+        novosRedirecionamentos.set(redirect.empresa_id, porOrigem);
+      }
+      porOrigem.set(redirect.origem, redirect);
+    }
+  }
+
+  mapaDominios = novoMapa;
+  mapaRedirecionamentos = novosRedirecionamentos;
+
+  return { dominios: novoMapa.size, empresas: empresaIds.length };
+}
+
+/**
+ * Agendar reconstrução do mapa (agrupa rajadas de alterações)
+ */
+function agendarRecargaMapa() {
+  if (recargaAgendada) return;
+
+  recargaAgendada = setTimeout(async () => {
+    recargaAgendada = null;
+
+    // Alteração durante uma carga: carregar de novo ao terminar
+    if (recargaEmAndamento) {
+      await recargaEmAndamento.catch(() => {});
+      agendarRecargaMapa();
+      return;
+    }
+
+    recargaEmAndamento = carregarMapaDominios()
+      .catch(erro => console.error('[White Label] Erro ao recarregar mapa de domínios:', erro.message))
+      .finally(() => { recargaEmAndamento = null; });
+  }, MAPA_DEBOUNCE_MS);
+}
+
+/**
+ * Carregar o mapa e assinar notificações de alteração
+ */
+async function iniciarMapaDominios() {
+  if (!assinante && typeof redis.duplicate === 'function') {
+    assinante = redis.duplicate();
+    assinante.on('error', erro => console.error('[White Label] Erro no assinante:', erro.message));
+    assinante.on('message', (canal) => {
+      if (canal === whitelabelRepo.CANAL_ALTERACOES) agendarRecargaMapa();
+    });
+    // Alterações perdidas enquanto desconectado
+    assinante.on('ready', agendarRecargaMapa);
+    await assinante.subscribe(whitelabelRepo.CANAL_ALTERACOES);
+
+    setInterval(agendarRecargaMapa, MAPA_INTERVALO_MS).unref();
+  }
+
+  const resultado = await carregarMapaDominios();
+  console.log(`[White Label] Mapa de domínios carregado: ${resultado.dominios} domínio(s), ${resultado.empresas} empresa(s)`);
+  return resultado;
+}
+
+/**
+ * Buscar configuração por domínio (para middleware) - consulta apenas o mapa em memória
  */
 async function buscarConfigPorDominio(dominio) {
-  // Normalizar domínio
-  dominio = dominio.toLowerCase()
-    .replace(/^https?:\/\//, '')
-    .replace(/^www\./, '')
-    .replace(/:\d+$/, '') // Remover porta
-    .replace(/\/$/, '');
+  dominio = normalizarDominio(dominio);
+
+  if (mapaDominios) {
+    return mapaDominios.get(dominio) || null;
+  }
 
-  // Buscar domínio no banco
+  // Mapa ainda não carregado (boot): consultar o banco
   const dominioDb = await whitelabelRepo.buscarDominioPorNome(dominio);
 
   if (!dominioDb || !dominioDb.ativo || !dominioDb.verificado) {
     return null;
   }
 
-  // Buscar configuração da empresa
   const config = await buscarConfigCompleta(dominioDb.empresa_id);
 
   return {
@@ -341,14 +456,17 @@ async function buscarConfigPorDominio(dominio) {
  * Processar redirecionamento
  */
 async function processarRedirecionamento(origem, empresaId) {
-  const redirect = await whitelabelRepo.buscarRedirecionamentoPorOrigem(origem, empresaId);
+  const redirect = mapaDominios
+    ? mapaRedirecionamentos.get(empresaId)?.get(origem)
+    : await whitelabelRepo.buscarRedirecionamentoPorOrigem(origem, empresaId);
 
   if (!redirect) {
     return null;
   }
 
-  // Registrar acesso
-  await whitelabelRepo.registrarAcessoRedirecionamento(redirect.id, empresaId);
+  // Registrar acesso (fora do caminho da resposta)
+  whitelabelRepo.registrarAcessoRedirecionamento(redirect.id, empresaId)
+    .catch(erro => console.error('[White Label] Erro ao registrar acesso:', erro.message));
 
   return {
     destino: redirect.destino,
@@ -520,6 +638,9 @@ module.exports = {
   // Configuração
   buscarConfigCompleta,
   buscarConfigPorDominio,
+  normalizarDominio,
+  carregarMapaDominios,
+  iniciarMapaDominios,
 
   // Redirecionamentos
   processarRedirecionamento,
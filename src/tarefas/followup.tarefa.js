@@ -1,25 +1,155 @@
-const cron = require('node-cron');
 const followupServico = require('../servicos/followup.servico');
+const followupRepo = require('../repositorios/followup.repositorio');
 
 /**
- * Tarefa cron para processar follow-ups pendentes
- * Executa a cada 5 minutos
+ * Executor contínuo de follow-ups
+ *
+ * Cada réplica mantém um pool de até FOLLOWUP_CONCORRENCIA etapas em execução.
+ * Sempre que há vaga, reivindica inscrições vencidas com SKIP LOCKED + lease
+ * (followupRepo.reivindicarInscricoesProntas), então réplicas diferentes nunca
+ * executam a mesma inscrição. Empresas e instâncias de WhatsApp têm limites
+ * próprios de concorrência, para um cliente grande não ocupar o pool inteiro
+ * nem disparar várias mensagens ao mesmo tempo pelo mesmo número. Os limites valem
+ * para todas as réplicas juntas: a consulta de reivindicação conta os leases
+ * ativos no banco. Toda inscrição reivindicada é executada na hora (nada fica
+ * parado segurando lease), e o lease é confirmado logo antes do envio.
  */
-function iniciarTarefaFollowup() {
-  console.log('[Cron] Tarefa de follow-up iniciada - executa a cada 5 minutos');
-
-  // Executar a cada 5 minutos
-  cron.schedule('*/5 * * * *', async () => {
-    try {
-      console.log('[Cron] Iniciando processamento de follow-ups...');
-      const resultado = await followupServico.processarInscricoesPendentes();
-      console.log('[Cron] Follow-ups processados:', resultado);
-    } catch (erro) {
-      console.error('[Cron] Erro ao processar follow-ups:', erro);
-    }
+
+const CONCORRENCIA = parseInt(process.env.FOLLOWUP_CONCORRENCIA, 10) || 20;
+const CONCORRENCIA_EMPRESA = parseInt(process.env.FOLLOWUP_CONCORRENCIA_EMPRESA, 10) || 5;
+const CONCORRENCIA_INSTANCIA = parseInt(process.env.FOLLOWUP_CONCORRENCIA_INSTANCIA, 10) || 1;
+// Espera entre consultas quando não há inscrições vencidas
+const INTERVALO_OCIOSO_MS = parseInt(process.env.FOLLOWUP_INTERVALO_MS, 10) || 2000;
+// Duração do lease; também é o intervalo até nova tentativa de uma etapa com erro (adiarInscricao)
+const LEASE_MS = parseInt(process.env.FOLLOWUP_LEASE_MS, 10) || 300000;
+
+const estado = {
+  rodando: false,
+  emExecucao: 0,
+  emAndamento: new Set(),
+  processadas: 0,
+  erros: 0,
+  ultimoAtrasoMs: 0,
+  maiorAtrasoMs: 0,
+  acordar: null
+};
+
+function executar(inscricao) {
+  estado.emExecucao++;
+
+  const atraso = Date.now() - new Date(inscricao.proxima_execucao).getTime();
+  estado.ultimoAtrasoMs = Math.max(0, atraso);
+  estado.maiorAtrasoMs = Math.max(estado.maiorAtrasoMs, estado.ultimoAtrasoMs);
+
+  const execucao = followupServico.executarInscricaoReivindicada(inscricao, LEASE_MS)
+    .then(resultado => {
+      estado.processadas++;
+      if (resultado && !resultado.sucesso && !resultado.leasePerdido) estado.erros++;
+    })
+    .catch(erro => {
+      estado.erros++;
+      console.error(`[Follow-up] Erro ao processar inscrição ${inscricao.id}:`, erro.message);
+    })
+    .finally(() => {
+      estado.emAndamento.delete(execucao);
+      estado.emExecucao--;
+      if (estado.acordar) estado.acordar();
+    });
+
+  estado.emAndamento.add(execucao);
+}
+
+// Dormir até uma vaga abrir ou o intervalo acabar
+function esperar(ms) {
+  return new Promise(resolve => {
+    const timer = setTimeout(resolve, ms);
+    estado.acordar = () => {
+      clearTimeout(timer);
+      estado.acordar = null;
+      resolve();
+    };
   });
+}
+
+async function ciclo() {
+  while (estado.rodando) {
+    const vagas = CONCORRENCIA - estado.emExecucao;
+    let reivindicadas = 0;
+
+    if (vagas > 0) {
+      try {
+        const inscricoes = await followupRepo.reivindicarInscricoesProntas(vagas, LEASE_MS, {
+          porEmpresa: CONCORRENCIA_EMPRESA,
+          porInstancia: CONCORRENCIA_INSTANCIA
+        });
+        reivindicadas = inscricoes.length;
+        inscricoes.forEach(executar);
+      } catch (erro) {
+        console.error('[Follow-up] Erro ao reivindicar inscrições:', erro.message);
+      }
+    }
+
+    // Fila vazia ou pool cheio: dormir até uma etapa terminar ou o intervalo acabar.
+    // Lote cheio com vagas sobrando: buscar de novo imediatamente.
+    if (vagas <= 0 || reivindicadas < vagas) {
+      await esperar(INTERVALO_OCIOSO_MS);
+    }
+  }
+}
 
-  console.log('[Cron] ✅ Tarefa de follow-up agendada com sucesso');
+/**
+ * Iniciar o executor de follow-ups
+ */
+function iniciarTarefaFollowup() {
+  if (estado.rodando) return;
+
+  estado.rodando = true;
+  ciclo().catch(erro => console.error('[Follow-up] Executor interrompido:', erro));
+
+  console.log(
+    `[Follow-up] ✅ Executor iniciado (concorrência ${CONCORRENCIA}, ` +
+    `${CONCORRENCIA_EMPRESA}/empresa, ${CONCORRENCIA_INSTANCIA}/instância)`
+  );
+}
+
+/**
+ * Parar de reivindicar novas inscrições e aguardar as etapas em execução
+ * @param {number} [timeoutMs] - Espera máxima; o que não terminar volta à fila quando o lease expirar
+ */
+async function pararTarefaFollowup(timeoutMs = 8000) {
+  estado.rodando = false;
+  if (estado.acordar) estado.acordar();
+
+  if (estado.emAndamento.size === 0) return;
+
+  console.log(`[Follow-up] Aguardando ${estado.emAndamento.size} etapa(s) em execução...`);
+  let timer;
+  await Promise.race([
+    Promise.allSettled([...estado.emAndamento]),
+    new Promise(resolve => {
+      timer = setTimeout(resolve, timeoutMs);
+    })
+  ]);
+  clearTimeout(timer);
+}
+
+/**
+ * Métricas do executor: backlog e atraso da fila (banco) + estado desta réplica
+ * @param {string} [empresaId] - Restringir o backlog a uma empresa
+ */
+async function obterMetricasFollowup(empresaId = null) {
+  const fila = await followupRepo.obterMetricasFila(empresaId);
+
+  return {
+    ...fila,
+    replica: {
+      em_execucao: estado.emExecucao,
+      processadas: estado.processadas,
+      erros: estado.erros,
+      ultimo_atraso_ms: estado.ultimoAtrasoMs,
+      maior_atraso_ms: estado.maiorAtrasoMs
+    }
+  };
 }
 
-module.exports = { iniciarTarefaFollowup };
+module.exports = { iniciarTarefaFollowup, pararTarefaFollowup, obterMetricasFollowup };
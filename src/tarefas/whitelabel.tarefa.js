@@ -1,4 +1,4 @@
-const cron = require('node-cron');
+const jobScheduler = require('../services/jobScheduler');
 const whitelabelServico = require('../servicos/whitelabel.servico');
 
 /**
@@ -9,7 +9,7 @@ function iniciarTarefaWhiteLabel() {
   console.log('[Cron] Tarefa de white label iniciada - executa a cada 1 hora');
 
   // Executar a cada 1 hora
-  cron.schedule('0 * * * *', async () => {
+  jobScheduler.schedule('whitelabel:dns-check', '0 * * * *', async () => {
     try {
       console.log('[Cron] Iniciando processamento de verificações DNS...');
       const resultado = await whitelabelServico.processarVerificacoesPendentes();
@@ -0,0 +1,194 @@
+/**
+ * Benchmark - Autenticação com e sem cache de principais
+ *
+ * Executa autenticarMiddleware (JWT) e instanceAuthMiddleware (token pessoal)
+ * em processo, com o banco simulado por uma latência fixa por consulta e o
+ * Redis simulado em memória (com as versões e a escrita condicional do L2 do
+ * tieredCache). Roda duas vezes: AUTH_CACHE_TTL_MS=0 (antes) e com o cache
+ * padrão (depois), e imprime requisições/segundo.
+ *
+ * O Redis simulado não tem latência de rede: o ganho medido é o do L1 com o L2
+ * funcionando, não o custo de um L2 remoto.
+ *
+ * Uso: node src/tests/bench-autenticacao.js [segundos] [concorrencia]
+ * Variáveis: BENCH_DB_LATENCIA_MS (padrão 2)
+ */
+
+const { fork } = require('child_process');
+
+const DURACAO_S = parseInt(process.argv[2], 10) || 5;
+const CONCORRENCIA = parseInt(process.argv[3], 10) || 50;
+const DB_LATENCIA_MS = parseInt(process.env.BENCH_DB_LATENCIA_MS, 10) || 2;
+
+// ==================== PROCESSO FILHO ====================
+
+function instalarSimulacoes() {
+  const usuario = {
+    id: '11111111-1111-1111-1111-111111111111',
+    empresa_id: '22222222-2222-2222-2222-222222222222',
+    nome: 'Benchmark',
+    email: 'bench@teste.com',
+    senha_hash: 'x',
+    funcao: 'admin',
+    ativo: true,
+    api_token: 'bench-token-pessoal'
+  };
+  const empresa = { id: usuario.empresa_id, nome: 'Empresa Bench', status: 'ativo', plano_id: null, saldo_creditos: 100 };
+
+  let consultas = 0;
+  const query = async (sql) => {
+    consultas++;
+    await new Promise(resolve => setTimeout(resolve, DB_LATENCIA_MS));
+    if (sql.includes('FROM empresas')) return { rows: [empresa], rowCount: 1 };
+    if (sql.includes('FROM usuarios')) return { rows: [usuario], rowCount: 1 };
+    return { rows: [], rowCount: 0 };
+  };
+
+  const kv = new Map();
+  const sets = new Map();
+  const redis = {
+    on() {},
+    async get(k) { return kv.get(k) ?? null; },
+    async mget(...ks) { return ks.map(k => kv.get(k) ?? null); },
+    async incr(k) { const v = parseInt(kv.get(k) || '0', 10) + 1; kv.set(k, String(v)); return v; },
+    async pexpire() { return 1; },
+    async setex(k, ttl, v) { kv.set(k, v); },
+    async unlink(...ks) { ks.forEach(k => { kv.delete(k); sets.delete(k); }); return ks.length; },
+    async smembers(k) { return [...(sets.get(k) || [])]; },
+    async sadd(k, v) { if (!sets.has(k)) sets.set(k, new Set()); sets.get(k).add(v); return 1; },
+    async expire() { return 1; },
+    async publish() { return 0; },
+    // Só usado via cache.setIfVersion, que aqui é simulado sem Lua
+    async eval() { throw new Error('eval não suportado no Redis simulado'); },
+    duplicate() {
+      return { on() {}, async subscribe() { return 1; } };
+    },
+    multi() {
+      const ops = [];
+      const m = new Proxy({}, {
+        get: (_, nome) => nome === 'exec'
+          ? async () => Promise.all(ops.map(async ([op, args]) => [null, await redis[op](...args)]))
+          : (...args) => { ops.push([nome, args]); return m; }
+      });
+      return m;
+    }
+  };
+
+  const simular = (modulo, exports) => {
+    const arquivo = require.resolve(modulo);
+    require.cache[arquivo] = { id: arquivo, filename: arquivo, loaded: true, exports };
+  };
+
+  simular('../config/database', { query, pool: { query, on() {} } });
+  simular('../config/redis', { redis, cache: criarCache(redis) });
+  simular('../services/whatsapp', { instanceTokens: {} });
+
+  return { usuario, empresa, consultas: () => consultas };
+}
+
+function criarCache(redis) {
+  // Mesmo contrato de config/redis.js (sem métricas)
+  return {
+    async get(key, reviver) { const v = await redis.get(key); return v ? JSON.parse(v, reviver) : null; },
+    async set(key, value, ttl = 3600, tags = []) {
+      await redis.setex(key, ttl, JSON.stringify(value));
+      for (const tag of tags) await redis.sadd(`cache:tag:${tag}`, key);
+      return true;
+    },
+    async setIfVersion(key, value, ttl, expected, tags = []) {
+      // Mesma regra do script Lua: versão ausente = ''
+      for (const [versionKey, seen] of Object.entries(expected)) {
+        if ((await redis.get(versionKey) ?? '') !== (seen ?? '')) return false;
+      }
+      return this.set(key, value, ttl, tags);
+    },
+    async del(key) { await redis.unlink(key); return true; },
+    async invalidateTag(tag) { const keys = await redis.smembers(`cache:tag:${tag}`); if (keys.length) await redis.unlink(...keys); return keys.length; },
+    async invalidatePattern() { return true; }
+  };
+}
+
+async function medir(nome, middleware, criarReq) {
+  let concluidas = 0;
+  let falhas = 0;
+  const fim = Date.now() + DURACAO_S * 1000;
+
+  const trabalhador = async () => {
+    while (Date.now() < fim) {
+      await new Promise(resolve => {
+        const res = {
+          status() { falhas++; resolve(); return this; },
+          json() { return this; }
+        };
+        middleware(criarReq(), res, () => { concluidas++; resolve(); });
+      });
+    }
+  };
+
+  await Promise.all(Array.from({ length: CONCORRENCIA }, trabalhador));
+  return { nome, rps: Math.round(concluidas / DURACAO_S), falhas };
+}
+
+async function executarFilho() {
+  process.env.NODE_ENV = 'production';
+  const simulacao = instalarSimulacoes();
+
+  const { gerarTokenAcesso } = require('../utilitarios/jwt');
+  const { autenticarMiddleware } = require('../middlewares/autenticacao');
+  const { instanceAuthMiddleware } = require('../middlewares/auth');
+
+  const jwtToken = gerarTokenAcesso(simulacao.usuario, simulacao.empresa);
+
+  const resultados = [];
+  resultados.push(await medir('JWT (autenticarMiddleware)', autenticarMiddleware, () => ({
+    headers: { authorization: `Bearer ${jwtToken}` }
+  })));
+  resultados.push(await medir('Token pessoal (instanceAuthMiddleware)', instanceAuthMiddleware, () => ({
+    headers: { 'x-api-key': simulacao.usuario.api_token },
+    query: {},
+    params: {},
+    body: {}
+  })));
+
+  process.send({ resultados, consultas: simulacao.consultas() });
+  process.exit(0);
+}
+
+// ==================== PROCESSO PRINCIPAL ====================
+
+function rodar(env) {
+  return new Promise((resolve, reject) => {
+    const filho = fork(__filename, [String(DURACAO_S), String(CONCORRENCIA), '--filho'], {
+      env: { ...process.env, ...env }
+    });
+    filho.on('message', resolve);
+    filho.on('error', reject);
+    filho.on('exit', codigo => codigo !== 0 && reject(new Error(`Processo terminou com código ${codigo}`)));
+  });
+}
+
+async function principal() {
+  console.log('\n🔐 Benchmark de autenticação\n');
+  console.log('='.repeat(60));
+  console.log(`   Duração por cenário: ${DURACAO_S}s`);
+  console.log(`   Concorrência: ${CONCORRENCIA}`);
+  console.log(`   Latência simulada do banco: ${DB_LATENCIA_MS}ms por consulta`);
+  console.log('='.repeat(60));
+
+  const antes = await rodar({ AUTH_CACHE_TTL_MS: '0' });
+  const depois = await rodar({ AUTH_CACHE_TTL_MS: '30000' });
+
+  console.log('\nCenário'.padEnd(42) + 'Sem cache'.padStart(15) + 'Com cache'.padStart(15) + 'Ganho'.padStart(9));
+  antes.resultados.forEach((r, i) => {
+    const d = depois.resultados[i];
+    const ganho = r.rps > 0 ? `${(d.rps / r.rps).toFixed(1)}x` : '-';
+    console.log(r.nome.padEnd(41) + `${r.rps} req/s`.padStart(15) + `${d.rps} req/s`.padStart(15) + ganho.padStart(9));
+  });
+  console.log(`\nConsultas ao banco: ${antes.consultas} sem cache, ${depois.consultas} com cache\n`);
+}
+
+if (process.argv.includes('--filho')) {
+  executarFilho().catch(erro => { console.error(erro); process.exit(1); });
+} else {
+  principal().catch(erro => { console.error('❌ Erro no benchmark:', erro.message); process.exit(1); });
+}
@@ -0,0 +1,83 @@
+const crypto = require('crypto');
+const tieredCache = require('../services/tieredCache');
+
+/**
+ * Cache de principais autenticados (token -> usuário)
+ *
+ * Integrações enviam milhares de chamadas por minuto com o mesmo token; o
+ * resultado da validação (JWT ou token pessoal) fica em cache pelo hash SHA-256
+ * do token, nunca pelo token em si. A empresa não entra no cache do principal:
+ * é lida de empresaRepositorio.buscarPorId, que tem cache próprio invalidado
+ * em toda escrita (inclusive mudança de status).
+ *
+ * Qualquer alteração de usuário (desativação, troca de api_token, exclusão)
+ * chama invalidarPrincipais(), que descarta o namespace em todas as réplicas.
+ */
+
+const NAMESPACE = 'auth-principal';
+const AUTH_CACHE_TTL_MS = process.env.AUTH_CACHE_TTL_MS !== undefined
+  ? parseInt(process.env.AUTH_CACHE_TTL_MS, 10) || 0
+  : 30000;
+const CACHE_ATIVO = AUTH_CACHE_TTL_MS > 0; // AUTH_CACHE_TTL_MS=0 desativa
+
+// Campos que não devem ir para o Redis nem ficar no request
+const CAMPOS_SENSIVEIS = ['senha_hash', 'token_redefinir_senha', 'token_verificacao_email'];
+
+const principais = tieredCache.create(NAMESPACE, {
+  l1TtlMs: AUTH_CACHE_TTL_MS || 1,
+  l2TtlSeconds: Math.max(1, Math.ceil(AUTH_CACHE_TTL_MS / 1000) * 2)
+});
+
+function hashToken(token) {
+  return crypto.createHash('sha256').update(token).digest('hex');
+}
+
+function limparUsuario(usuario) {
+  const limpo = { ...usuario };
+  for (const campo of CAMPOS_SENSIVEIS) delete limpo[campo];
+  return limpo;
+}
+
+/**
+ * Resolver o usuário de um token usando o cache
+ * @param {string} tipo - 'jwt' ou 'api' (mesmo token não colide entre os dois fluxos)
+ * @param {Function} carregar - async () => ({ usuario, expiraEm? }) ou null
+ * @returns {Promise<object|null>} usuário (sem campos sensíveis)
+ */
+async function resolverPrincipal(tipo, token, carregar) {
+  const carregarPrincipal = async () => {
+    const resultado = await carregar();
+    if (!resultado || !resultado.usuario) return null;
+    return { usuario: limparUsuario(resultado.usuario), expiraEm: resultado.expiraEm || null };
+  };
+
+  if (!CACHE_ATIVO) {
+    const principal = await carregarPrincipal();
+    return principal ? principal.usuario : null;
+  }
+
+  const chave = `${tipo}:${hashToken(token)}`;
+
+  let principal = await principais.wrap(chave, carregarPrincipal);
+
+  // JWT expirou enquanto estava em cache: validar de novo (o loader lança 'Token expirado')
+  if (principal && principal.expiraEm && principal.expiraEm <= Date.now()) {
+    await principais.invalidate(chave);
+    principal = await principais.wrap(chave, carregarPrincipal);
+  }
+
+  return principal ? principal.usuario : null;
+}
+
+/**
+ * Descartar todos os principais em cache (todas as réplicas)
+ */
+async function invalidarPrincipais() {
+  await tieredCache.clear(NAMESPACE);
+}
+
+module.exports = {
+  hashToken,
+  resolverPrincipal,
+  invalidarPrincipais
+};
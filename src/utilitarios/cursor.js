@@ -0,0 +1,44 @@
+/**
+ * Cursores opacos para paginação por chave (keyset)
+ *
+ * O cursor guarda os valores da chave de ordenação do último item da página
+ * (ex.: [ultima_mensagem_em, id]) em base64url. O cliente apenas devolve o
+ * `proximo_cursor` recebido; o formato interno pode mudar sem quebrar a API.
+ */
+
+/**
+ * Codificar os valores da chave em um cursor
+ * @param {string[]} valores
+ * @returns {string}
+ */
+function codificarCursor(valores) {
+  return Buffer.from(JSON.stringify(valores)).toString('base64url');
+}
+
+/**
+ * Decodificar um cursor recebido do cliente
+ * @param {string} cursor
+ * @param {number} tamanho - Quantidade de valores esperada na chave
+ * @returns {string[]|null} null se não houver cursor
+ */
+function decodificarCursor(cursor, tamanho) {
+  if (!cursor) return null;
+
+  let valores;
+  try {
+    valores = JSON.parse(Buffer.from(String(cursor), 'base64url').toString('utf8'));
+  } catch (erro) {
+    valores = null;
+  }
+
+  if (!Array.isArray(valores) || valores.length !== tamanho || !valores.every(v => typeof v === 'string')) {
+    throw new Error('Cursor inválido');
+  }
+
+  return valores;
+}
+
+module.exports = {
+  codificarCursor,
+  decodificarCursor
+};
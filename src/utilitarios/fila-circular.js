@@ -0,0 +1,49 @@
+/**
+ * Fila circular de capacidade fixa: ao encher, sobrescreve a entrada mais antiga
+ *
+ * Usada pelos buffers de gravação em lote (logs), onde perder as entradas mais
+ * antigas é preferível a crescer sem limite quando o destino está lento.
+ */
+class FilaCircular {
+  constructor(capacidade) {
+    this.itens = new Array(capacidade);
+    this.capacidade = capacidade;
+    this.inicio = 0;
+    this.tamanho = 0;
+  }
+
+  /**
+   * @returns {boolean} true se uma entrada antiga foi descartada
+   */
+  adicionar(item) {
+    const fim = (this.inicio + this.tamanho) % this.capacidade;
+    this.itens[fim] = item;
+
+    if (this.tamanho < this.capacidade) {
+      this.tamanho++;
+      return false;
+    }
+
+    this.inicio = (this.inicio + 1) % this.capacidade;
+    return true;
+  }
+
+  /**
+   * Retirar até `quantidade` entradas, das mais antigas para as mais novas
+   */
+  retirar(quantidade) {
+    const total = Math.min(quantidade, this.tamanho);
+    const retirados = new Array(total);
+
+    for (let i = 0; i < total; i++) {
+      retirados[i] = this.itens[this.inicio];
+      this.itens[this.inicio] = undefined;
+      this.inicio = (this.inicio + 1) % this.capacidade;
+    }
+
+    this.tamanho -= total;
+    return retirados;
+  }
+}
+
+module.exports = FilaCircular;
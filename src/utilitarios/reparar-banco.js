@@ -1,5 +1,9 @@
 const { query } = require('../config/database');
 const logger = require('../config/logger');
+const { normalizarTelefone } = require('./validadores');
+
+// Linhas por UPDATE no preenchimento de contatos.telefone_normalizado
+const LOTE_TELEFONES = 5000;
 
 async function repararBanco() {
     logger.info('Iniciando reparo do banco de dados...');
@@ -43,7 +47,8 @@ async function repararBanco() {
             { nome: 'observacoes', tipo: 'TEXT' },
             { nome: 'ultima_interacao_em', tipo: 'TIMESTAMP' },
             { nome: 'tipo_ultima_interacao', tipo: 'VARCHAR(50)' },
-            { nome: 'total_interacoes', tipo: 'INTEGER DEFAULT 0' }
+            { nome: 'total_interacoes', tipo: 'INTEGER DEFAULT 0' },
+            { nome: 'telefone_normalizado', tipo: 'VARCHAR(50)' }
         ];
 
         for (const col of colunasContatos) {
@@ -63,6 +68,17 @@ async function repararBanco() {
             }
         }
 
+        // 2.1 Preencher telefone_normalizado e criar o índice único (enquanto o índice não existir)
+        try {
+            const tabela = await query(`SELECT to_regclass('public.contatos') AS tabela, to_regclass('public.idx_contatos_telefone_normalizado') AS indice`);
+
+            if (tabela.rows[0].tabela && !tabela.rows[0].indice) {
+                await preencherTelefonesNormalizados();
+            }
+        } catch (err) {
+            logger.error('Erro ao normalizar telefones de contatos:', err.message);
+        }
+
         // 3. Criar ALIASES (VIEWS) para resolver inconsistências
         logger.info('Verificando aliases de tabelas (Views)...');
         const aliases = [
@@ -135,13 +151,133 @@ async function repararBanco() {
             logger.error('Erro ao reparar tabela usuarios (api_token):', err.message);
         }
 
+        // 7.1 Prévia da última mensagem em conversas_chat (+ backfill ao criar as colunas)
+        try {
+            const res = await query(`
+                SELECT column_name 
+                FROM information_schema.columns 
+                WHERE table_name = 'conversas_chat' AND column_name = 'ultima_mensagem_preview'
+            `);
+            const existeTabela = await query(`SELECT to_regclass('public.conversas_chat')`);
+
+            if (existeTabela.rows[0].to_regclass && res.rows.length === 0) {
+                logger.info('Adicionando prévia da última mensagem em conversas_chat...');
+                // Uma única chamada (transação implícita): colunas e backfill entram juntos
+                await query(`
+                    ALTER TABLE conversas_chat ADD COLUMN IF NOT EXISTS ultima_mensagem_preview TEXT;
+                    ALTER TABLE conversas_chat ADD COLUMN IF NOT EXISTS ultima_mensagem_tipo VARCHAR(20);
+                    UPDATE conversas_chat c
+                    SET ultima_mensagem_preview = LEFT(COALESCE(m.conteudo, ''), 200),
+                        ultima_mensagem_tipo = m.tipo_mensagem
+                    FROM (
+                        SELECT DISTINCT ON (conversa_id) conversa_id, conteudo, tipo_mensagem
+                        FROM mensagens_chat
+                        ORDER BY conversa_id, criado_em DESC
+                    ) m
+                    WHERE c.id = m.conversa_id;
+                `);
+                logger.info('Prévia da última mensagem preenchida.');
+            }
+        } catch (err) {
+            logger.error('Erro ao adicionar prévia da última mensagem:', err.message);
+        }
+
+        // 7.2 Busca de contatos: trigramas (nome/telefone) e texto (email/empresa)
+        // CONCURRENTLY para não travar escrita em tabelas grandes durante o deploy
+        try {
+            const existeTabela = await query(`SELECT to_regclass('public.contatos')`);
+
+            if (existeTabela.rows[0].to_regclass) {
+                await query('CREATE EXTENSION IF NOT EXISTS pg_trgm');
+
+                const indicesBusca = {
+                    idx_contatos_nome_trgm: 'USING GIN (nome gin_trgm_ops)',
+                    idx_contatos_telefone_trgm: 'USING GIN (telefone_normalizado gin_trgm_ops)',
+                    idx_contatos_documento_busca: `USING GIN ((to_tsvector('simple', translate(COALESCE(email, ''), '@.', '  ') || ' ' || COALESCE(empresa, ''))))`
+                };
+
+                for (const [nome, definicao] of Object.entries(indicesBusca)) {
+                    // Um CREATE CONCURRENTLY interrompido deixa o índice inválido: recriar
+                    const invalido = await query(`
+                        SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('public.${nome}') AND NOT indisvalid
+                    `);
+                    if (invalido.rows.length > 0) {
+                        await query(`DROP INDEX CONCURRENTLY IF EXISTS ${nome}`);
+                    }
+
+                    await query(`CREATE INDEX CONCURRENTLY IF NOT EXISTS ${nome} ON contatos ${definicao}`);
+                }
+            }
+        } catch (err) {
+            logger.error('Erro ao criar índices de busca de contatos:', err.message);
+        }
+
+        // 7.3 Progresso das importações de leads (colunas usadas por atualizarImportacao)
+        try {
+            const existeTabela = await query(`SELECT to_regclass('public.importacoes_leads')`);
+
+            if (existeTabela.rows[0].to_regclass) {
+                await query(`
+                    ALTER TABLE importacoes_leads
+                        ADD COLUMN IF NOT EXISTS linhas_processadas INTEGER DEFAULT 0,
+                        ADD COLUMN IF NOT EXISTS linhas_ignoradas INTEGER DEFAULT 0,
+                        ADD COLUMN IF NOT EXISTS mensagem_erro TEXT,
+                        ADD COLUMN IF NOT EXISTS iniciada_em TIMESTAMP,
+                        ADD COLUMN IF NOT EXISTS finalizada_em TIMESTAMP
+                `);
+            }
+        } catch (err) {
+            logger.error('Erro ao reparar tabela importacoes_leads:', err.message);
+        }
+
+        // 7.4 Lease do executor de follow-ups (followup-schema.sql não é reexecutável)
+        try {
+            const existeTabela = await query(`SELECT to_regclass('public.inscricoes_followup')`);
+
+            if (existeTabela.rows[0].to_regclass) {
+                await query('ALTER TABLE inscricoes_followup ADD COLUMN IF NOT EXISTS bloqueado_ate TIMESTAMP');
+                await query(`
+                    CREATE INDEX IF NOT EXISTS idx_inscricoes_lease
+                    ON inscricoes_followup(bloqueado_ate) WHERE bloqueado_ate IS NOT NULL
+                `);
+            }
+        } catch (err) {
+            logger.error('Erro ao reparar tabela inscricoes_followup:', err.message);
+        }
+
+        // 7.5 Consulta de logs de webhook por instância + período (tabela grande: CONCURRENTLY)
+        try {
+            const existeTabela = await query(`SELECT to_regclass('public.webhook_logs')`);
+
+            if (existeTabela.rows[0].to_regclass) {
+                const invalido = await query(`
+                    SELECT 1 FROM pg_index WHERE indexrelid = to_regclass('public.idx_webhook_logs_instance_created') AND NOT indisvalid
+                `);
+                if (invalido.rows.length > 0) {
+                    await query('DROP INDEX CONCURRENTLY IF EXISTS idx_webhook_logs_instance_created');
+                }
+
+                await query('CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_webhook_logs_instance_created ON webhook_logs (instance_name, created_at DESC)');
+            }
+        } catch (err) {
+            logger.error('Erro ao criar índice de logs de webhook:', err.message);
+        }
+
         // 8. Boost limites do plano Starter por segurança
         try {
             logger.info('Ajustando limites do plano Starter...');
-            await query("UPDATE planos SET max_instancias = 10, max_usuarios = 10 WHERE slug = 'starter'");
+            const planos = await query(`
+                UPDATE planos SET max_instancias = 10, max_usuarios = 10
+                WHERE slug = 'starter' AND (max_instancias IS DISTINCT FROM 10 OR max_usuarios IS DISTINCT FROM 10)
+            `);
 
             // Garantir que a primeira empresa tenha plano e status ativo
-            await query("UPDATE empresas SET plano_id = (SELECT id FROM planos WHERE slug = 'starter'), status = 'ativo' WHERE status IS NULL OR status != 'ativo'");
+            const empresas = await query("UPDATE empresas SET plano_id = (SELECT id FROM planos WHERE slug = 'starter'), status = 'ativo' WHERE status IS NULL OR status != 'ativo'");
+
+            // Empresas em cache trazem dados do plano: descartar se algo mudou
+            if (planos.rowCount > 0 || empresas.rowCount > 0) {
+                await require('../repositorios/empresa.repositorio').limparCache();
+            }
         } catch (err) {
             logger.error('Erro ao ajustar limites do plano:', err.message);
         }
@@ -152,4 +288,75 @@ async function repararBanco() {
     }
 }
 
+/**
+ * Backfill de contatos.telefone_normalizado com o mesmo normalizador usado na escrita.
+ * Duplicados (mesmo número escrito de formas diferentes) mantêm a chave apenas no
+ * contato mais antigo; os demais ficam com NULL e não bloqueiam o índice único.
+ */
+async function preencherTelefonesNormalizados() {
+    logger.info('Preenchendo contatos.telefone_normalizado...');
+
+    // Backfill não é edição do contato: não mexer em atualizado_em
+    const gatilho = await query(`
+        SELECT 1 FROM pg_trigger
+        WHERE tgname = 'trigger_contatos_atualizado' AND tgrelid = 'contatos'::regclass
+    `);
+    const temGatilho = gatilho.rows.length > 0;
+    if (temGatilho) {
+        await query('ALTER TABLE contatos DISABLE TRIGGER trigger_contatos_atualizado');
+    }
+
+    try {
+        let ultimoId = null;
+        let total = 0;
+
+        for (;;) {
+            const lote = await query(`
+                SELECT id, telefone
+                FROM contatos
+                WHERE telefone_normalizado IS NULL AND ($1::uuid IS NULL OR id > $1)
+                ORDER BY id
+                LIMIT $2
+            `, [ultimoId, LOTE_TELEFONES]);
+
+            if (lote.rows.length === 0) break;
+            ultimoId = lote.rows[lote.rows.length - 1].id;
+
+            const linhas = lote.rows
+                .map(c => ({ id: c.id, normalizado: normalizarTelefone(c.telefone) }))
+                .filter(c => c.normalizado);
+
+            if (linhas.length > 0) {
+                await query(`
+                    UPDATE contatos c
+                    SET telefone_normalizado = v.normalizado
+                    FROM unnest($1::uuid[], $2::varchar[]) AS v(id, normalizado)
+                    WHERE c.id = v.id
+                `, [linhas.map(c => c.id), linhas.map(c => c.normalizado)]);
+            }
+
+            total += linhas.length;
+        }
+
+        const duplicados = await query(`
+            UPDATE contatos c
+            SET telefone_normalizado = NULL
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY empresa_id, telefone_normalizado ORDER BY criado_em, id) AS ordem
+                FROM contatos
+                WHERE telefone_normalizado IS NOT NULL
+            ) d
+            WHERE c.id = d.id AND d.ordem > 1
+        `);
+
+        await query('CREATE UNIQUE INDEX IF NOT EXISTS idx_contatos_telefone_normalizado ON contatos(empresa_id, telefone_normalizado)');
+
+        logger.info(`Telefones normalizados: ${total} (duplicados sem chave: ${duplicados.rowCount})`);
+    } finally {
+        if (temGatilho) {
+            await query('ALTER TABLE contatos ENABLE TRIGGER trigger_contatos_atualizado');
+        }
+    }
+}
+
 module.exports = { repararBanco };
@@ -175,6 +175,37 @@ function formatarTelefone(telefone) {
   return telefone;
 }
 
+/**
+ * Normalizar telefone para a forma canônica E.164 (somente dígitos, sem '+')
+ * Usada em contatos.telefone_normalizado: o mesmo número escrito de formas
+ * diferentes ("(11) 98765-4321", "5511987654321@s.whatsapp.net") vira a mesma chave.
+ * - Números nacionais (10/11 dígitos, sem '+') recebem o DDI 55; JIDs do WhatsApp
+ *   (com '@') já vêm sempre com o DDI e não passam por essa regra
+ * - Celulares brasileiros sem o nono dígito recebem o 9
+ * - Grupos (@g.us) são mantidos como estão
+ * Retorna null se não for possível obter um número válido.
+ */
+function normalizarTelefone(telefone) {
+  if (telefone === undefined || telefone === null) return null;
+
+  const valor = String(telefone).trim();
+  if (valor.includes('@g.us')) return valor;
+
+  // Remover sufixo de JID e de dispositivo (5511...:12@s.whatsapp.net)
+  let numeros = valor.split('@')[0].split(':')[0].replace(/\D/g, '');
+  numeros = numeros.replace(/^0+/, '');
+
+  if (!valor.startsWith('+') && !valor.includes('@') && (numeros.length === 10 || numeros.length === 11)) {
+    numeros = `55${numeros}`;
+  }
+
+  if (numeros.length === 12 && numeros.startsWith('55') && ['6', '7', '8', '9'].includes(numeros.charAt(4))) {
+    numeros = `${numeros.slice(0, 4)}9${numeros.slice(4)}`;
+  }
+
+  return numeros.length >= 8 && numeros.length <= 15 ? numeros : null;
+}
+
 /**
  * Validar objeto com schema
  */
@@ -247,5 +278,6 @@ module.exports = {
   formatarCPF,
   formatarCNPJ,
   formatarTelefone,
+  normalizarTelefone,
   validarSchema
 };